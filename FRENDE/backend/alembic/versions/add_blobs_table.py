@@ -0,0 +1,38 @@
+"""Add content-addressed blobs table
+
+Revision ID: add_blobs_table
+Revises: database_optimization_indexes
+Create Date: 2024-02-01 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_blobs_table'
+down_revision = 'database_optimization_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Create blobs table
+    op.create_table('blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('key', sa.String(length=128), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('released_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    
+    # Garbage collection looks up unreferenced blobs by release time
+    op.create_index('ix_blobs_gc', 'blobs', ['ref_count', 'released_at'])
+
+def downgrade() -> None:
+    # Drop index
+    op.drop_index('ix_blobs_gc', table_name='blobs')
+    
+    # Drop table
+    op.drop_table('blobs')
@@ -0,0 +1,38 @@
+"""Add pre-generated task pool table
+
+Revision ID: add_task_pool_table
+Revises: add_blobs_table
+Create Date: 2024-02-08 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_task_pool_table'
+down_revision = 'add_blobs_table'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Create task pool table
+    op.create_table('task_pool',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_type', sa.String(length=50), nullable=False),
+        sa.Column('difficulty', sa.String(length=20), nullable=False),
+        sa.Column('interest_category', sa.String(length=50), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    
+    # Draws take the oldest task in a bucket
+    op.create_index('ix_task_pool_bucket', 'task_pool', ['task_type', 'difficulty', 'interest_category', 'id'])
+
+def downgrade() -> None:
+    # Drop index
+    op.drop_index('ix_task_pool_bucket', table_name='task_pool')
+    
+    # Drop table
+    op.drop_table('task_pool')
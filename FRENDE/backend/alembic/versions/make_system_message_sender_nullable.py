@@ -0,0 +1,25 @@
+"""Allow chat messages without a sender for system messages
+
+Revision ID: make_system_message_sender_nullable
+Revises: add_task_pool_table
+Create Date: 2024-02-10 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'make_system_message_sender_nullable'
+down_revision = 'add_task_pool_table'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # System messages were written with sender_id 0, which no user has
+    op.alter_column('chat_messages', 'sender_id', existing_type=sa.Integer(), nullable=True)
+    op.execute("UPDATE chat_messages SET sender_id = NULL WHERE sender_id = 0")
+
+def downgrade() -> None:
+    # Rows without a sender can't satisfy NOT NULL again
+    op.execute("DELETE FROM chat_messages WHERE sender_id IS NULL")
+    op.alter_column('chat_messages', 'sender_id', existing_type=sa.Integer(), nullable=False)
@@ -10,7 +10,7 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import logging
 
-from core.database import get_async_session
+from core.database import get_read_session
 from core.auth import current_active_user
 from core.performance_monitor import get_performance_monitor
 from core.monitoring import SystemMonitor
@@ -27,7 +27,7 @@ router = APIRouter(prefix="/analytics", tags=["analytics"])
 @router.get("/overview")
 async def get_analytics_overview(
     current_user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get comprehensive analytics overview"""
     try:
@@ -102,7 +102,7 @@ async def get_performance_analytics(
 @router.get("/users")
 async def get_user_analytics(
     current_user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get user engagement analytics"""
     try:
@@ -167,7 +167,7 @@ async def get_error_analytics(
 @router.get("/business")
 async def get_business_analytics(
     current_user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get business metrics and KPIs"""
     try:
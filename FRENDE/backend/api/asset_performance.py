@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 
 from core.asset_performance_monitor import asset_performance_monitor
 from core.auth import current_active_user
+from core.file_io import storage_stats
 from models.user import User
 
 router = APIRouter(prefix="/asset-performance", tags=["asset-performance"])
@@ -198,6 +199,29 @@ async def get_cdn_statistics(
             detail=f"Error retrieving CDN statistics: {str(e)}"
         )
 
+@router.get("/storage-stats")
+async def get_storage_statistics(
+    current_user: User = Depends(current_active_user)
+) -> Dict[str, Any]:
+    """Get upload storage statistics (running totals, no directory walk)"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, 
+            detail="Access denied. Admin privileges required."
+        )
+    
+    try:
+        return {
+            "success": True,
+            "data": storage_stats.get_stats(),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving storage statistics: {str(e)}"
+        )
+
 @router.post("/track")
 async def track_asset_performance(
     asset_path: str,
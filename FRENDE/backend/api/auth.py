@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from core.database import get_async_session
-from core.security import verify_password
+from core.security import password_hasher
 from core.auth import current_active_user
 from models.user import User
 from schemas.user import (
@@ -22,8 +22,6 @@ async def register(
     session: AsyncSession = Depends(get_async_session)
 ):
     """Register a new user."""
-    from core.security import get_password_hash
-    
     # Check if user already exists
     result = await session.execute(select(User).where(User.email == user_create.email))
     if result.scalar_one_or_none():
@@ -54,7 +52,7 @@ async def register(
         interests=user_create.interests,
         age_preference_min=user_create.age_preference_min,
         age_preference_max=user_create.age_preference_max,
-        hashed_password=get_password_hash(user_create.password)
+        hashed_password=await password_hasher.hash(user_create.password)
     )
     
     session.add(user)
@@ -76,12 +74,20 @@ async def login(
     result = await session.execute(select(User).where(User.email == login_data.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if user:
+        # Hashing runs on the bounded password pool; 503 when it is saturated
+        is_valid, new_hash = await password_hasher.verify(login_data.password, user.hashed_password)
+    
+    if not user or not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    if new_hash:
+        # Stored hash uses a deprecated scheme; saved with the session below
+        user.hashed_password = new_hash
+    
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -238,17 +244,16 @@ async def change_password(
     session: AsyncSession = Depends(get_async_session)
 ):
     """Change user password."""
-    from core.security import get_password_hash, verify_password
-    
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    is_valid, _ = await password_hasher.verify(password_data.current_password, current_user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    current_user.hashed_password = await password_hasher.hash(password_data.new_password)
     await session.commit()
     
     return {"message": "Password changed successfully"}
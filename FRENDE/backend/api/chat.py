@@ -5,9 +5,10 @@ import logging
 from datetime import datetime
 from sqlalchemy import select, func
 
-from core.database import get_async_session
-from core.auth import current_active_user
-from models.user import User
+from core.database import get_async_session, get_read_session
+from core.auth import current_user_id
+from core.conditional_requests import conditional_get
+from core.hot_queries import match_for_user
 from models.match import Match
 from models.chat import ChatMessage
 from services.chat import chat_service
@@ -25,14 +26,26 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+async def chat_status_version(
+    match_id: int,
+    user_id: int = Depends(current_user_id),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """ETag version for the room status: its activity columns and online users"""
+    # Outsiders get no version, so the endpoint turns them away itself
+    result = await session.execute(match_for_user(match_id, user_id))
+    if result.scalar_one_or_none() is None:
+        return None
+    return (match_id, await chat_service.get_chat_room_status_version(match_id, session))
+
 @router.get("/{match_id}/history", response_model=ChatHistoryPage)
 async def get_chat_history(
     match_id: int,
     limit: int = 50,
     page: int = 1,
     include_system: bool = False,
-    current_user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    user_id: int = Depends(current_user_id),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get chat history for a match - Minimal working version"""
     try:
@@ -40,7 +53,7 @@ async def get_chat_history(
         result = await session.execute(
             select(Match).where(
                 Match.id == match_id,
-                (Match.user1_id == current_user.id) | (Match.user2_id == current_user.id)
+                (Match.user1_id == user_id) | (Match.user2_id == user_id)
             )
         )
         match = result.scalar_one_or_none()
@@ -79,8 +92,8 @@ async def get_chat_history_cursor(
     direction: str = "older",
     limit: int = 50,
     include_system: bool = False,
-    current_user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    user_id: int = Depends(current_user_id),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get chat history using cursor pagination"""
     try:
@@ -88,7 +101,7 @@ async def get_chat_history_cursor(
         if cursor:
             cursor_dt = datetime.fromisoformat(cursor)
         page_data = await chat_service.get_chat_history_cursor(
-            match_id, current_user.id, cursor_dt, limit, direction, include_system, session
+            match_id, user_id, cursor_dt, limit, direction, include_system, session
         )
         return ChatHistoryPage(
             match_id=match_id,
@@ -110,14 +123,25 @@ async def get_chat_history_cursor(
             detail="Failed to retrieve chat history"
         )
 
-@router.get("/{match_id}/status", response_model=ChatRoomStatus)
+@router.get(
+    "/{match_id}/status",
+    response_model=ChatRoomStatus,
+    dependencies=[Depends(conditional_get("chat.status", chat_status_version))]
+)
 async def get_chat_status(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get chat room online and typing status"""
     try:
+        result = await session.execute(match_for_user(match_id, user_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User not authorized for this match"
+            )
+        
         status_data = await chat_service.get_chat_room_status(match_id, session)
         return ChatRoomStatus(
             match_id=match_id,
@@ -125,6 +149,8 @@ async def get_chat_status(
             total_users=len(status_data.get("online_users", [])),
             last_activity=status_data.get("last_activity").isoformat() if status_data.get("last_activity") else None,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting chat status: {str(e)}")
         raise HTTPException(
@@ -135,12 +161,12 @@ async def get_chat_status(
 @router.get("/{match_id}/unread-count")
 async def get_unread_count(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get unread message count for a match"""
     try:
-        count = await chat_service.get_unread_count(match_id, current_user.id, session)
+        count = await chat_service.get_unread_count(match_id, user_id, session)
         return {"match_id": match_id, "unread_count": count}
     except Exception as e:
         logger.error(f"Error getting unread count: {str(e)}")
@@ -164,14 +190,14 @@ async def get_unread_count(
 async def send_message(
     match_id: int,
     message_request: ChatMessageRequest,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Send a message to a match"""
     try:
         message = await chat_service.send_message_to_match(
             match_id, 
-            current_user.id, 
+            user_id, 
             message_request.message_text,
             message_request.message_type,
             session
@@ -202,13 +228,13 @@ async def send_message(
 async def mark_messages_as_read(
     match_id: int,
     read_request: MessageReadRequest,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Mark messages as read"""
     try:
         success = await chat_service.mark_messages_as_read(
-            match_id, current_user.id, read_request.message_ids, session
+            match_id, user_id, read_request.message_ids, session
         )
         
         if success:
@@ -233,12 +259,12 @@ async def mark_messages_as_read(
 @router.get("/{match_id}/typing", response_model=TypingStatusResponse)
 async def get_typing_status(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get typing status for a match"""
     try:
-        typing_users = await chat_service.get_typing_status(match_id, current_user.id, session)
+        typing_users = await chat_service.get_typing_status(match_id, user_id, session)
         return TypingStatusResponse(
             match_id=match_id,
             typing_users=typing_users
@@ -260,7 +286,7 @@ async def react_to_message(
     match_id: int,
     message_id: int,
     reaction: str,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """React to a message (future feature)"""
@@ -274,7 +300,7 @@ async def react_to_message(
 async def delete_message(
     match_id: int,
     message_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Delete a message (future feature)"""
@@ -287,7 +313,7 @@ async def delete_message(
 @router.get("/{match_id}/test", response_model=Dict)
 async def test_chat_endpoint(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Simple test endpoint to verify chat functionality"""
@@ -296,7 +322,7 @@ async def test_chat_endpoint(
         result = await session.execute(
             select(Match).where(
                 Match.id == match_id,
-                (Match.user1_id == current_user.id) | (Match.user2_id == current_user.id)
+                (Match.user1_id == user_id) | (Match.user2_id == user_id)
             )
         )
         match = result.scalar_one_or_none()
@@ -310,7 +336,7 @@ async def test_chat_endpoint(
         # Return simple success response
         return {
             "match_id": match_id,
-            "user_id": current_user.id,
+            "user_id": user_id,
             "status": "success",
             "message": "Chat endpoint is working"
         }
@@ -4,7 +4,8 @@ from sqlalchemy import select
 from typing import List, Optional
 
 from core.database import get_async_session
-from core.auth import current_active_user
+from core.auth import current_user_id
+from core.conditional_requests import conditional_get
 from core.exceptions import UserNotFoundError, MatchNotFoundError, NoAvailableSlotsError, MatchNotPendingError
 from models.user import User
 from models.match import Match
@@ -17,9 +18,36 @@ from services.matching import matching_service
 
 router = APIRouter(prefix="/matches", tags=["matches"])
 
-@router.get("/", response_model=List[MatchRead])
+async def user_matches_version(
+    user_id: int = Depends(current_user_id),
+    session: AsyncSession = Depends(get_async_session),
+    status: Optional[str] = Query(None, description="Filter by match status"),
+    limit: int = Query(10, ge=1, le=100, description="Number of matches to return"),
+    offset: int = Query(0, ge=0, description="Number of matches to skip")
+):
+    """ETag version for a page of matches: its columns, without the eager loads"""
+    rows = await matching_service.get_user_matches_version(
+        user_id, session, status=status, limit=limit, offset=offset
+    )
+    return (user_id, status, limit, offset, rows)
+
+COMPATIBILITY_OPTIONS_VERSION = (
+    tuple(community.value for community in Community),
+    tuple(location.value for location in Location),
+    tuple(interest.value for interest in InterestCategory)
+)
+
+def compatibility_options_version():
+    """ETag version for the compatibility options: the enum values themselves"""
+    return COMPATIBILITY_OPTIONS_VERSION
+
+@router.get(
+    "/",
+    response_model=List[MatchRead],
+    dependencies=[Depends(conditional_get("matches.list", user_matches_version))]
+)
 async def get_matches(
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session),
     status: Optional[str] = Query(None, description="Filter by match status"),
     limit: int = Query(10, ge=1, le=100, description="Number of matches to return"),
@@ -28,7 +56,7 @@ async def get_matches(
     """Get all matches for the current user"""
     try:
         matches = await matching_service.get_user_matches(
-            user_id=current_user.id,
+            user_id=user_id,
             session=session,
             status=status,
             limit=limit,
@@ -41,14 +69,14 @@ async def get_matches(
 @router.get("/{match_id}", response_model=MatchRead)
 async def get_match(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get a specific match by ID"""
     try:
         match = await matching_service.get_match(
             match_id=match_id,
-            user_id=current_user.id,
+            user_id=user_id,
             session=session
         )
         return match
@@ -60,13 +88,13 @@ async def get_match(
 @router.post("/", response_model=MatchRead)
 async def create_match(
     match_data: MatchCreate,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Create a new match request"""
     try:
         match = await matching_service.create_match(
-            user_id=current_user.id,
+            user_id=user_id,
             match_data=match_data,
             session=session
         )
@@ -79,14 +107,14 @@ async def create_match(
 @router.put("/{match_id}/accept", response_model=MatchRead)
 async def accept_match(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Accept a match request"""
     try:
         match = await matching_service.accept_match(
             match_id=match_id,
-            user_id=current_user.id,
+            user_id=user_id,
             session=session
         )
         return match
@@ -98,14 +126,14 @@ async def accept_match(
 @router.put("/{match_id}/reject", response_model=MatchRead)
 async def reject_match(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Reject a match request"""
     try:
         match = await matching_service.reject_match(
             match_id=match_id,
-            user_id=current_user.id,
+            user_id=user_id,
             session=session
         )
         return match
@@ -117,14 +145,14 @@ async def reject_match(
 @router.delete("/{match_id}")
 async def delete_match(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Delete a match"""
     try:
         await matching_service.delete_match(
             match_id=match_id,
-            user_id=current_user.id,
+            user_id=user_id,
             session=session
         )
         return {"message": "Match deleted successfully"}
@@ -133,7 +161,11 @@ async def delete_match(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/compatibility/options", response_model=CommunityLocationOptions)
+@router.get(
+    "/compatibility/options",
+    response_model=CommunityLocationOptions,
+    dependencies=[Depends(conditional_get("matches.compatibility_options", compatibility_options_version))]
+)
 async def get_compatibility_options():
     """Get available community, location, and interest options"""
     return CommunityLocationOptions(
@@ -145,7 +177,7 @@ async def get_compatibility_options():
 @router.post("/compatibility/preview", response_model=CompatibilityPreviewResponse)
 async def preview_compatibility(
     request: CompatibilityPreviewRequest,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Preview compatibility with another user"""
@@ -161,7 +193,7 @@ async def preview_compatibility(
         
         # Calculate compatibility
         compatibility_result = await matching_service._calculate_compatibility(
-            current_user.id, target_user.id, session
+            user_id, target_user.id, session
         )
         
         # Convert target user to dict for response
@@ -18,6 +18,7 @@ from core.config import settings
 from core.monitoring import SystemMonitor
 from core.performance_monitor import get_performance_monitor
 from core.database import get_async_session, check_database_health
+from core.pool_monitor import pool_monitor
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
@@ -57,6 +58,27 @@ DATABASE_CONNECTIONS = Gauge(
     registry=registry
 )
 
+DATABASE_POOL_WAIT_P95 = Gauge(
+    'database_pool_checkout_wait_p95_ms',
+    'p95 time spent waiting for a pooled connection in milliseconds',
+    ['pool'],
+    registry=registry
+)
+
+DATABASE_POOL_HOLD_P95 = Gauge(
+    'database_pool_hold_p95_ms',
+    'p95 time a pooled connection is held in milliseconds',
+    ['pool'],
+    registry=registry
+)
+
+DATABASE_POOL_TIMEOUTS = Gauge(
+    'database_pool_timeouts',
+    'Connection pool checkout timeouts since startup',
+    ['pool'],
+    registry=registry
+)
+
 AI_REQUESTS = Counter(
     'ai_requests_total',
     'Total AI service requests',
@@ -71,6 +93,20 @@ AI_REQUEST_DURATION = Histogram(
     registry=registry
 )
 
+AI_CIRCUIT_STATE = Gauge(
+    'ai_circuit_state',
+    'AI circuit breaker state (0 closed, 1 half-open, 2 open)',
+    ['service'],
+    registry=registry
+)
+
+AI_FALLBACKS = Counter(
+    'ai_fallbacks_total',
+    'AI responses replaced by built-in content',
+    ['kind', 'reason'],
+    registry=registry
+)
+
 TASK_COMPLETIONS = Counter(
     'task_completions_total',
     'Total task completions',
@@ -181,6 +217,11 @@ async def update_application_metrics():
             DATABASE_CONNECTIONS.labels(status="overflow").set(pool.get("overflow", 0))
             DATABASE_CONNECTIONS.labels(status="invalid").set(pool.get("invalid", 0))
         
+        for pool_name, pool_stats in pool_monitor.get_stats().items():
+            DATABASE_POOL_WAIT_P95.labels(pool=pool_name).set(pool_stats["wait_ms"]["p95"])
+            DATABASE_POOL_HOLD_P95.labels(pool=pool_name).set(pool_stats["hold_ms"]["p95"])
+            DATABASE_POOL_TIMEOUTS.labels(pool=pool_name).set(pool_stats["timeouts"])
+        
         # Performance metrics
         performance_monitor = get_performance_monitor()
         perf_summary = performance_monitor.get_performance_summary(hours=1)
@@ -211,6 +252,22 @@ def record_ai_request(service: str, status: str, duration: float):
         # Don't fail if metrics recording fails
         pass
 
+def record_ai_circuit_state(service: str, state: str):
+    """Record an AI circuit breaker state change"""
+    try:
+        AI_CIRCUIT_STATE.labels(service=service).set({"closed": 0, "half_open": 1, "open": 2}[state])
+    except Exception:
+        # Don't fail if metrics recording fails
+        pass
+
+def record_ai_fallback(kind: str, reason: str):
+    """Record built-in content served in place of an AI response"""
+    try:
+        AI_FALLBACKS.labels(kind=kind, reason=reason).inc()
+    except Exception:
+        # Don't fail if metrics recording fails
+        pass
+
 def record_task_completion(task_type: str, status: str):
     """Record task completion metrics"""
     try:
@@ -7,9 +7,25 @@ from sqlalchemy import text
 
 from core.database import get_async_session, get_database_stats
 from core.database_optimization import db_optimizer
-from core.auth import current_active_user
+from core.pool_monitor import pool_monitor, admission_gate
+from core.expiry import get_expiry_stats
+from core.compression_middleware import get_compression_stats
+from core.security import password_hasher
+from core.conditional_requests import get_conditional_stats
+from core.auth import current_active_user, get_auth_cache_stats
+from core.logging_config import get_logging_stats
+from core.file_io import get_file_io_stats
+from core.static_optimization import sendfile_metrics
 from models.user import User
 from services.socket_analytics import socket_analytics
+from services.image_pipeline import image_pipeline
+from services.image_processing import image_processor
+from services.upload_spool import upload_spool
+from services.blob_store import blob_store
+from services.image_derivatives import image_derivatives
+from services.ai import ai_service
+from services.task_pool import task_pool
+from services.tasks import task_service
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +68,193 @@ async def get_database_performance_stats(
             detail=f"Error retrieving database statistics: {str(e)}"
         )
 
+@router.get("/database/pool")
+async def get_database_pool_stats(
+    current_user: User = Depends(current_active_user)
+):
+    """Get connection pool wait/hold statistics and a pool sizing recommendation"""
+    try:
+        # Check if user is admin
+        if not current_user.is_superuser:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied. Admin privileges required."
+            )
+        
+        return {
+            "pools": pool_monitor.get_stats(),
+            "pool_status": {name: pool_monitor.get_pool_status(name) for name in pool_monitor.engines},
+            "recommendation": pool_monitor.recommend_pool_size("primary"),
+            "admission_control": admission_gate.get_stats(),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting database pool stats: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving database pool statistics: {str(e)}"
+        )
+
+@router.get("/database/expiry")
+async def get_expiry_job_stats(
+    current_user: User = Depends(current_active_user)
+):
+    """Get duration and row counts for the set-based expiry jobs"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "jobs": get_expiry_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/compression")
+async def get_compression_middleware_stats(
+    current_user: User = Depends(current_active_user)
+):
+    """Get response compression counters and precompressed cache hit rate"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "compression": get_compression_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/conditional-requests")
+async def get_conditional_request_stats(
+    current_user: User = Depends(current_active_user)
+):
+    """Get per-route ETag validation counts and 304 hit rates"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "routes": get_conditional_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/auth/cache")
+async def get_auth_cache_statistics(
+    current_user: User = Depends(current_active_user)
+):
+    """Get hit rates of the auth caches and token blacklist"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "auth_cache": get_auth_cache_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/auth/password-hashing")
+async def get_password_hashing_stats(
+    current_user: User = Depends(current_active_user)
+):
+    """Get password hashing pool latency and queue statistics"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "password_hashing": password_hasher.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/images")
+async def get_image_pipeline_stats(
+    current_user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Get image pool queue, job, per-stage timing and blob store statistics"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "image_pipeline": image_pipeline.get_stats(),
+        "uploads": image_processor.metrics,
+        "spool": upload_spool.get_stats(),
+        "blob_store": {**blob_store.get_stats(), **await blob_store.get_usage(session)},
+        "derivatives": image_derivatives.get_stats(),
+        "sendfile": sendfile_metrics,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/ai")
+async def get_ai_scheduler_stats(
+    current_user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Get AI request queue depth, batching and latency statistics, and task pool stock"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    stock = await task_pool.get_stock(session)
+    return {
+        "ai": ai_service.get_stats(),
+        "task_pool": {
+            **task_pool.get_stats(),
+            "stock": {"/".join(bucket): count for bucket, count in sorted(stock.items())}
+        },
+        "task_sources": task_service.generation_sources,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/storage")
+async def get_storage_stats(
+    current_user: User = Depends(current_active_user)
+):
+    """Get running upload storage totals and file I/O offload counts"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "file_io": get_file_io_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/logging")
+async def get_logging_pipeline_stats(
+    current_user: User = Depends(current_active_user)
+):
+    """Get log queue depth, dropped records and sampling counts"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin privileges required."
+        )
+    
+    return {
+        "logging": get_logging_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 @router.get("/database/tables/{table_name}")
 async def get_table_performance(
     table_name: str,
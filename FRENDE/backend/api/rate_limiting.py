@@ -138,7 +138,7 @@ async def get_rate_limit_status(
                 "total_requests": analytics["total_requests"],
                 "total_violations": analytics["total_violations"],
                 "violation_rate": analytics["violation_rate"],
-                "memory_limits_count": len(rate_limiter.memory_limits),
+                "memory_limits_count": len(rate_limiter.memory_limiter),
                 "timestamp": datetime.utcnow().isoformat()
             }
         }
@@ -6,12 +6,11 @@ import time
 from typing import Dict, List, Optional
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
-from core.database import get_async_session, async_session
+from core.database import get_async_session, session_scope, with_unit_of_work
+from core.hot_queries import active_match_for_user
 from core.auth import get_current_user
 from models.user import User
-from models.match import Match
 from models.chat import ChatMessage
 
 logger = logging.getLogger(__name__)
@@ -41,33 +40,29 @@ connected_users: Dict[str, Dict] = {}
 user_rooms: Dict[str, List[str]] = {}
 
 @sio.event
+@with_unit_of_work
 async def connect(sid, environ, auth):
     """Handle client connection"""
     try:
-        logger.info(f"🔌 Socket.IO: Connection attempt from {sid}")
-        logger.info(f"🔌 Socket.IO: Environment keys: {list(environ.keys())}")
+        logger.debug(f"Socket.IO: Connection attempt from {sid}")
         
-        # Extract token from query parameters or headers
+        # Extract token from query parameters or headers (never logged)
         token = None
         if 'HTTP_AUTHORIZATION' in environ:
             auth_header = environ['HTTP_AUTHORIZATION']
-            logger.info(f"🔌 Socket.IO: Auth header found: {auth_header[:20]}...")
             if auth_header.startswith('Bearer '):
                 token = auth_header[7:]
         elif 'QUERY_STRING' in environ:
             query_string = environ['QUERY_STRING']
-            logger.info(f"🔌 Socket.IO: Query string: {query_string}")
             if 'token=' in query_string:
                 token = query_string.split('token=')[1].split('&')[0]
         
-        logger.info(f"🔌 Socket.IO: Token extracted: {token[:20] if token else 'None'}...")
-        
         if not token:
             logger.warning(f"Connection attempt without token from {sid}")
             return False
         
         # Verify token and get user
-        async with async_session() as session:
+        async with session_scope() as session:
             try:
                 # Create a mock credentials object for the token
                 from fastapi.security import HTTPAuthorizationCredentials
@@ -139,6 +134,7 @@ async def disconnect(sid):
         logger.error(f"Error in disconnect handler: {e}")
 
 @sio.event
+@with_unit_of_work
 async def join_chat_room(sid, data):
     """Join a chat room for a specific match"""
     try:
@@ -155,14 +151,8 @@ async def join_chat_room(sid, data):
         user_id = user_info['user_id']
         
         # Verify user is part of this match
-        async with async_session() as session:
-            result = await session.execute(
-                select(Match).where(
-                    (Match.user1_id == user_id) | (Match.user2_id == user_id),
-                    Match.id == match_id,
-                    Match.status == "active"
-                )
-            )
+        async with session_scope() as session:
+            result = await session.execute(active_match_for_user(match_id, user_id))
             match = result.scalar_one_or_none()
             
             if not match:
@@ -231,6 +221,7 @@ async def leave_chat_room(sid, data):
         logger.error(f"Error leaving chat room: {e}")
 
 @sio.event
+@with_unit_of_work
 async def send_message(sid, data):
     """Send a message to a chat room"""
     start_time = time.time()
@@ -254,16 +245,10 @@ async def send_message(sid, data):
         user_id = user_info['user_id']
         
         # Save message to database
-        async with async_session() as session:
+        async with session_scope() as session:
             try:
                 # Verify user is part of this match
-                result = await session.execute(
-                    select(Match).where(
-                        (Match.user1_id == user_id) | (Match.user2_id == user_id),
-                        Match.id == match_id,
-                        Match.status == "active"
-                    )
-                )
+                result = await session.execute(active_match_for_user(match_id, user_id))
                 match = result.scalar_one_or_none()
                 
                 if not match:
@@ -389,6 +374,7 @@ async def typing_stop(sid, data):
         logger.error(f"Error in typing_stop: {e}")
 
 @sio.event
+@with_unit_of_work
 async def mark_messages_read(sid, data):
     """Mark messages as read"""
     try:
@@ -402,7 +388,7 @@ async def mark_messages_read(sid, data):
         user_id = user_info['user_id']
         
         # Update messages in database
-        async with async_session() as session:
+        async with session_scope() as session:
             try:
                 # Mark messages as read
                 await session.execute(
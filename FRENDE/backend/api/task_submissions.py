@@ -270,12 +270,9 @@ async def upload_evidence(
 ):
     """Upload evidence file for a submission"""
     try:
-        # Read file data
-        file_data = await file.read()
-        
-        # Upload evidence
+        # Upload evidence (streamed to storage, never read whole)
         file_url = await task_submission_service.upload_submission_evidence(
-            submission_id, file_data, file.filename, file.content_type, session
+            submission_id, file, session
         )
         
         return EvidenceUploadResponse(
@@ -4,7 +4,8 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 import logging
 
-from core.auth import current_active_user
+from core.auth import current_active_user, current_user_id
+from core.conditional_requests import conditional_get
 from core.database import get_async_session
 from models.user import User
 from models.task import Task
@@ -26,19 +27,36 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
-@router.get("/matches/{match_id}/tasks", response_model=TaskListResponse)
+async def match_tasks_version(
+    match_id: int,
+    page: int = Query(1, ge=1, description="Page number"),
+    size: int = Query(20, ge=1, le=100, description="Page size"),
+    user_id: int = Depends(current_user_id),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """ETag version for a match's task list: the mutable columns of its open tasks"""
+    rows = await task_service.get_match_tasks_version(match_id, user_id, session)
+    if rows is None:
+        return None
+    return (user_id, match_id, page, size, rows)
+
+@router.get(
+    "/matches/{match_id}/tasks",
+    response_model=TaskListResponse,
+    dependencies=[Depends(conditional_get("tasks.match_tasks", match_tasks_version))]
+)
 async def get_match_tasks(
     match_id: int,
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(20, ge=1, le=100, description="Page size"),
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get tasks for a specific match"""
     try:
         # Verify user is part of the match
         match = await matching_service.get_match_details(
-            match_id, current_user.id, session
+            match_id, user_id, session
         )
         if not match:
             raise HTTPException(
@@ -48,7 +66,7 @@ async def get_match_tasks(
         
         # Get tasks for the match
         tasks = await task_service.get_match_tasks(
-            match_id, current_user.id, session
+            match_id, user_id, session
         )
         
         # Pagination
@@ -75,7 +93,7 @@ async def get_match_tasks(
 @router.post("/", response_model=TaskRead)
 async def generate_task(
     task_data: TaskCreate,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Generate a new task for a match"""
@@ -103,15 +121,15 @@ async def generate_task(
 async def complete_task(
     task_id: int,
     completion_data: TaskCompletionRequest,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Mark a task as completed by the current user"""
     try:
-        task = await task_service.complete_task(task_id, current_user.id, session)
+        task = await task_service.complete_task(task_id, user_id, session)
         
         # Get progress information
-        progress = await task_service.get_task_progress(task_id, current_user.id, session)
+        progress = await task_service.get_task_progress(task_id, user_id, session)
         
         return TaskCompletionResponse(
             task=task,
@@ -138,12 +156,12 @@ async def complete_task(
 @router.get("/{task_id}", response_model=TaskRead)
 async def get_task_details(
     task_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get detailed information about a specific task"""
     try:
-        task = await task_service.get_task_details(task_id, current_user.id, session)
+        task = await task_service.get_task_details(task_id, user_id, session)
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -161,12 +179,12 @@ async def get_task_details(
 @router.get("/{task_id}/progress", response_model=TaskProgressResponse)
 async def get_task_progress(
     task_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get detailed progress information for a task"""
     try:
-        progress = await task_service.get_task_progress(task_id, current_user.id, session)
+        progress = await task_service.get_task_progress(task_id, user_id, session)
         return TaskProgressResponse(**progress)
     except TaskNotFoundError as e:
         raise HTTPException(
@@ -188,14 +206,14 @@ async def get_task_progress(
 async def submit_task_validation(
     task_id: int,
     validation_data: TaskValidationRequest,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Submit task validation for tasks that require it"""
     try:
         task = await task_service.submit_task_validation(
             task_id, 
-            current_user.id, 
+            user_id, 
             validation_data.submission_text,
             validation_data.submission_evidence,
             session
@@ -230,13 +248,13 @@ async def submit_task_validation(
 @router.delete("/{task_id}")
 async def replace_task(
     task_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Replace an expired task with a new one"""
     try:
         # Get task to verify ownership
-        task = await task_service.get_task_details(task_id, current_user.id, session)
+        task = await task_service.get_task_details(task_id, user_id, session)
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -275,12 +293,12 @@ async def replace_task(
 
 @router.get("/history", response_model=TaskHistoryResponse)
 async def get_task_history(
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get task completion history for the current user"""
     try:
-        history = await task_service.get_task_history(current_user.id, session)
+        history = await task_service.get_task_history(user_id, session)
         return TaskHistoryResponse(**history)
     except Exception as e:
         raise HTTPException(
@@ -290,12 +308,12 @@ async def get_task_history(
 
 @router.get("/statistics", response_model=TaskStatisticsResponse)
 async def get_task_statistics(
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get comprehensive task statistics for the current user"""
     try:
-        statistics = await task_service.get_task_statistics(current_user.id, session)
+        statistics = await task_service.get_task_statistics(user_id, session)
         return TaskStatisticsResponse(**statistics)
     except Exception as e:
         raise HTTPException(
@@ -306,14 +324,14 @@ async def get_task_statistics(
 @router.get("/matches/{match_id}/active")
 async def get_active_tasks(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get active tasks for a match"""
     try:
         # Verify user is part of the match
         match = await matching_service.get_match_details(
-            match_id, current_user.id, session
+            match_id, user_id, session
         )
         if not match:
             raise HTTPException(
@@ -322,12 +340,12 @@ async def get_active_tasks(
             )
         
         # Get active tasks
-        tasks = await task_service.get_match_tasks(match_id, current_user.id, session)
+        tasks = await task_service.get_match_tasks(match_id, user_id, session)
         
         # Add progress information for each task
         tasks_with_progress = []
         for task in tasks:
-            progress = await task_service.get_task_progress(task.id, current_user.id, session)
+            progress = await task_service.get_task_progress(task.id, user_id, session)
             task_dict = task.to_dict()
             task_dict.update(progress)
             tasks_with_progress.append(task_dict)
@@ -352,14 +370,14 @@ async def auto_generate_tasks(
     count: int = Query(5, ge=1, le=10, description="Number of tasks to generate"),
     difficulty: TaskDifficulty = Query(TaskDifficulty.MEDIUM, description="Task difficulty"),
     category: TaskCategory = Query(TaskCategory.BONDING, description="Task category"),
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Automatically generate multiple tasks for a match"""
     try:
         # Verify user is part of the match
         match = await matching_service.get_match_details(
-            match_id, current_user.id, session
+            match_id, user_id, session
         )
         if not match:
             raise HTTPException(
@@ -367,21 +385,15 @@ async def auto_generate_tasks(
                 detail="Match not found"
             )
         
-        # Generate tasks
-        generated_tasks = []
-        for i in range(count):
-            try:
-                task = await task_service.generate_task(
-                    match_id, 
-                    "bonding", 
-                    difficulty, 
-                    category, 
-                    session
-                )
-                generated_tasks.append(task)
-            except Exception as e:
-                logger.error(f"Failed to generate task {i+1}: {str(e)}")
-                continue
+        # Generate tasks; the ones not drawn from the pool share AI calls
+        generated_tasks = await task_service.generate_tasks(
+            match_id,
+            count,
+            "bonding",
+            difficulty,
+            category,
+            session
+        )
         
         return {
             "match_id": match_id,
@@ -418,7 +430,7 @@ async def generate_conversation_starter(
         
         # Generate conversation starter
         starter = await task_service.generate_conversation_starter(
-            match_id, session
+            match_id, session, user_id=current_user.id
         )
         
         return {
@@ -447,14 +459,14 @@ async def generate_conversation_starter(
 @router.post("/matches/{match_id}/replace-expired", response_model=List[TaskRead])
 async def replace_expired_tasks_for_match(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Replace expired tasks for a specific match"""
     try:
         # Verify user is part of the match
         match = await matching_service.get_match_details(
-            match_id, current_user.id, session
+            match_id, user_id, session
         )
         if not match:
             raise HTTPException(
@@ -480,14 +492,14 @@ async def replace_expired_tasks_for_match(
 @router.get("/matches/{match_id}/expired", response_model=List[TaskRead])
 async def get_expired_tasks_for_match(
     match_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get expired tasks for a specific match"""
     try:
         # Verify user is part of the match
         match = await matching_service.get_match_details(
-            match_id, current_user.id, session
+            match_id, user_id, session
         )
         if not match:
             raise HTTPException(
@@ -513,13 +525,13 @@ async def get_expired_tasks_for_match(
 @router.post("/{task_id}/replace", response_model=TaskRead)
 async def replace_specific_expired_task(
     task_id: int,
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Replace a specific expired task"""
     try:
         # Verify user has access to the task
-        task = await task_service.get_task_details(task_id, current_user.id, session)
+        task = await task_service.get_task_details(task_id, user_id, session)
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -548,7 +560,7 @@ async def replace_specific_expired_task(
 
 @router.post("/replace-all-expired", response_model=Dict[str, Any])
 async def replace_all_expired_tasks(
-    current_user: User = Depends(current_active_user),
+    user_id: int = Depends(current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Replace all expired tasks system-wide (admin function)"""
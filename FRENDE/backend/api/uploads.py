@@ -0,0 +1,87 @@
+"""
+Upload serving endpoint for the Frende backend application.
+Serves stored images by content hash, resized and converted on request.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Response, status
+from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import file_io
+from core.conditional_requests import etag_matches
+from core.config import settings
+from core.database import get_async_session
+from core.static_optimization import SendfileResponse
+from services.blob_store import blob_store
+from services.image_derivatives import DerivativeNotFound, UndecodableImage, image_derivatives
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+# Content never changes under a hash
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{content_hash}")
+async def get_upload(
+    content_hash: str = Path(..., pattern="^[0-9a-f]{64}$"),
+    w: Optional[int] = Query(default=None, ge=1, le=4096, description="Width to scale down to"),
+    fmt: Optional[str] = Query(default=None, pattern="^(auto|jpeg|webp|avif|png)$", description="Output format; auto negotiates from Accept"),
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Get a stored upload, or an image derivative of it when ``w`` or ``fmt`` is given"""
+    # The original, as stored
+    if w is None and fmt is None:
+        # Looked up first: a released upload is gone, whatever the client has cached
+        blob = await blob_store.get_blob(session, content_hash)
+        if blob is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+
+        etag = f'"{content_hash}"'
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        path = blob_store.backend.local_path(blob.key)
+        if path is None:
+            return RedirectResponse(blob_store.url(blob.key), status_code=status.HTTP_302_FOUND)
+
+        stat_result = await file_io.stat(path)
+        if stat_result is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+        return SendfileResponse(
+            path, stat_result=stat_result, media_type=blob.content_type,
+            headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag}
+        )
+
+    width = image_derivatives.snap_width(w)
+    image_format, negotiated = image_derivatives.negotiate(fmt, accept)
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": f'"{content_hash}-w{width or 0}-{image_format}"'
+    }
+    if negotiated:
+        headers["Vary"] = "Accept"
+
+    if etag_matches(if_none_match, headers["ETag"]):
+        if await blob_store.get_blob(session, content_hash) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        path, stat_result, content_type = await image_derivatives.get(session, content_hash, width, image_format)
+    except DerivativeNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    except UndecodableImage:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Image could not be decoded")
+
+    accel_redirect = None
+    if settings.IMAGE_ACCEL_REDIRECT_PREFIX:
+        relative = path.relative_to(image_derivatives.cache.directory).as_posix()
+        accel_redirect = f"{settings.IMAGE_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative}"
+
+    return SendfileResponse(
+        path, stat_result=stat_result, media_type=content_type,
+        headers=headers, accel_redirect=accel_redirect
+    )
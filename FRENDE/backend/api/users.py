@@ -4,7 +4,8 @@ from sqlalchemy import select
 from typing import List, Optional
 
 from core.auth import current_active_user
-from core.database import get_async_session
+from core.conditional_requests import conditional_get
+from core.database import get_async_session, get_read_session
 from models.user import User
 from models.match import Match
 from models.task import Task
@@ -19,7 +20,15 @@ from core.exceptions import (
 
 router = APIRouter(tags=["users"])
 
-@router.get("/me", response_model=UserRead)
+async def current_user_version(current_user: User = Depends(current_active_user)):
+    """ETag version for the profile: the row's last write"""
+    return (current_user.id, current_user.updated_at or current_user.created_at)
+
+@router.get(
+    "/me",
+    response_model=UserRead,
+    dependencies=[Depends(conditional_get("users.me", current_user_version))]
+)
 async def get_current_user_profile(
     current_user: User = Depends(current_active_user)
 ):
@@ -57,12 +66,9 @@ async def upload_profile_picture(
 ):
     """Upload profile picture"""
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Update profile picture
+        # Update profile picture (the upload is streamed, never read whole)
         updated_user = await user_service.update_profile_picture(
-            current_user.id, file_content, file.filename, session
+            current_user.id, file, session
         )
         
         return updated_user
@@ -77,6 +83,9 @@ async def upload_profile_picture(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+    except HTTPException:
+        # e.g. 503 when the image pool is saturated
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -109,7 +118,7 @@ async def delete_profile_picture(
 @router.get("/me/stats")
 async def get_current_user_stats(
     current_user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get current user's statistics"""
     try:
@@ -218,7 +227,7 @@ async def search_users(
     query: str = Query(..., min_length=1, description="Search query"),
     limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
     current_user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Search for users"""
     try:
@@ -6,7 +6,7 @@ Monitors the health and performance of AI services including Gemini API.
 import asyncio
 import time
 import httpx
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List
 from datetime import datetime, timedelta
 import logging
 
@@ -24,6 +24,11 @@ class AIHealthChecker:
         self.gemini_api_url = settings.GEMINI_API_URL
         self.health_history: List[Dict[str, Any]] = []
         self.max_history_size = 100
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call ``listener`` with every health check result (e.g. to route AI calls)"""
+        self._listeners.append(listener)
         
     async def check_gemini_health(self) -> Dict[str, Any]:
         """Check Gemini AI service health"""
@@ -190,6 +195,12 @@ class AIHealthChecker:
         # Keep only the last N entries
         if len(self.health_history) > self.max_history_size:
             self.health_history = self.health_history[-self.max_history_size:]
+        
+        for listener in self._listeners:
+            try:
+                listener(health_result)
+            except Exception as e:
+                logger.error(f"AI health listener failed: {e}")
     
     async def run_continuous_monitoring(self, interval_seconds: int = 300):
         """Run continuous AI health monitoring"""
@@ -1,5 +1,7 @@
 import logging
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
 from fastapi import Depends, Request, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi_users import BaseUserManager, FastAPIUsers
@@ -9,12 +11,15 @@ from fastapi_users.authentication import (
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from jose import JWTError, jwt
 
 from core.config import settings
 from core.database import get_async_session
+from core.hot_queries import user_by_id, user_principal
+from core.security import blacklist_token
+from core.token_blacklist import token_blacklist
 from models.user import User
 from schemas.user import UserCreate, UserUpdate, UserRead
 
@@ -37,6 +42,9 @@ class UserManager(BaseUserManager[User, int]):
     ):
         logger.info(f"Verification requested for user {user.id}. Verification token: {token}")
 
+    async def on_after_update(self, user: User, update_dict: Dict[str, Any], request=None):
+        invalidate_user_principal(user.id)
+
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
     yield SQLAlchemyUserDatabase(session, User)
 
@@ -72,47 +80,172 @@ current_superuser = fastapi_users.current_user(active=True, superuser=True)
 
 security = HTTPBearer()
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: AsyncSession = Depends(get_async_session)
-) -> User:
-    """Get current user from JWT token"""
-    try:
-        # Decode the JWT token
-        payload = jwt.decode(
-            credentials.credentials, 
-            settings.JWT_SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM]
+class ExpiringLRUCache:
+    """In-process LRU whose entries also expire after a per-entry TTL"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.metrics["hits"] += 1
+        return entry[1]
+    
+    def put(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+    
+    def invalidate(self, key: Hashable) -> None:
+        if self._entries.pop(key, None) is not None:
+            self.metrics["invalidations"] += 1
+    
+    def clear(self) -> None:
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "hit_rate": round(self.metrics["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+class UserPrincipal:
+    """The identity fields most endpoints need, without the full user row"""
+    
+    __slots__ = ("id", "is_active", "is_superuser")
+    
+    def __init__(self, id: int, is_active: bool, is_superuser: bool):
+        self.id = id
+        self.is_active = is_active
+        self.is_superuser = is_superuser
+
+# Verified claims keyed by token hash, and principals keyed by user id. Both are
+# per process: a deactivation reaches other workers within the principal TTL.
+claims_cache = ExpiringLRUCache(settings.AUTH_CACHE_MAX_ENTRIES)
+principal_cache = ExpiringLRUCache(settings.AUTH_CACHE_MAX_ENTRIES)
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    """Get claims, principal and token blacklist statistics"""
+    return {
+        "claims": claims_cache.get_stats(),
+        "principals": principal_cache.get_stats(),
+        "blacklist": token_blacklist.get_stats()
+    }
+
+def invalidate_user_principal(user_id: int) -> None:
+    """Drop a cached principal after the user's flags may have changed"""
+    principal_cache.invalidate(user_id)
+
+def cache_user_principal(user: Any) -> UserPrincipal:
+    """Cache the principal of a user row (or an (id, is_active, is_superuser) row)"""
+    principal = UserPrincipal(user.id, bool(user.is_active), bool(user.is_superuser))
+    principal_cache.put(principal.id, principal, settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS)
+    return principal
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal_on_write(mapper, connection, target: User) -> None:
+    invalidate_user_principal(target.id)
+
+def decode_token_claims(token: str, token_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Verify and decode a JWT, reusing the claims of a recently verified token"""
+    key = token_hash or blacklist_token(token)
+    claims = claims_cache.get(key)
+    if claims is not None:
+        return claims
+    
+    claims = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    ttl = settings.AUTH_CLAIMS_CACHE_TTL_SECONDS
+    if "exp" in claims:
+        # Never serve claims past the token's own expiry
+        ttl = min(ttl, claims["exp"] - time.time())
+    claims_cache.put(key, claims, ttl)
+    return claims
+
+def _user_id_from_credentials(credentials: HTTPAuthorizationCredentials) -> int:
+    """Get the user ID from a bearer token, raising 401 when it doesn't verify"""
+    token = credentials.credentials
+    token_hash = blacklist_token(token)
+    
+    # In memory: a bloom filter miss answers the common case
+    if token_blacklist.contains(token_hash):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        user_id: str = payload.get("sub")
-        
+    
+    try:
+        user_id = decode_token_claims(token, token_hash).get("sub")
         if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
-    except JWTError:
+            raise JWTError("Token has no subject")
+        return int(user_id)
+    except (JWTError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+def _user_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="User not found",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_async_session)
+) -> User:
+    """Get current user from JWT token"""
+    user_id = _user_id_from_credentials(credentials)
     
     # Get user from database
-    result = await session.execute(select(User).where(User.id == int(user_id)))
+    result = await session.execute(user_by_id(user_id))
     user = result.scalar_one_or_none()
     
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _user_not_found()
     
+    cache_user_principal(user)
     return user
 
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_async_session)
+) -> UserPrincipal:
+    """Get the current user's principal, from cache when possible"""
+    user_id = _user_id_from_credentials(credentials)
+    
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        # The session only opens a connection on this miss path
+        result = await session.execute(user_principal(user_id))
+        row = result.first()
+        if row is None:
+            raise _user_not_found()
+        principal = cache_user_principal(row)
+    
+    return principal
+
 async def current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -122,4 +255,15 @@ async def current_active_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
-    return current_user 
\ No newline at end of file
+    return current_user
+
+async def current_user_id(
+    principal: UserPrincipal = Depends(get_current_principal)
+) -> int:
+    """Get the current active user's ID without loading the user row"""
+    if not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
+    return principal.id 
\ No newline at end of file
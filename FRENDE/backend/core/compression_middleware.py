@@ -1,136 +1,379 @@
 """
 Compression middleware for the Frende backend application.
-Provides gzip and brotli compression for API responses and static assets.
+Provides zstd, brotli and gzip compression for API responses and static assets.
+
+Complete bodies are compressed in one shot, off the event loop once they are
+large; streaming bodies are compressed chunk by chunk as they are sent. Levels
+are picked by payload size and content type, and compressed bytes of responses
+carrying a strong ETag are kept in an LRU so identical responses are only
+compressed once. ETags are only unique per resource (Starlette's file ETags
+come from mtime and size), so cached bodies are keyed by the request target
+as well. Partial (206) responses are never compressed.
 """
 
+import asyncio
 import gzip
 import logging
-from typing import Callable, Optional
-from fastapi import Request, Response
-from fastapi.responses import StreamingResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import brotli
 
+try:
+    import zstandard
+except ImportError:  # zstd is offered only when the package is installed
+    zstandard = None
+
 from core.config import settings
 
 logger = logging.getLogger(__name__)
 
-class CompressionMiddleware(BaseHTTPMiddleware):
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/xml',
+    'application/javascript', 'application/css',
+    'application/x-yaml', 'application/x-www-form-urlencoded',
+    'application/x-ndjson'
+)
+
+# Long-lived assets are worth the slowest, densest settings
+STATIC_TYPES = ('text/css', 'javascript', 'image/svg+xml')
+
+# Streams whose chunks must reach the client as soon as they are produced
+FLUSH_EACH_CHUNK_TYPES = ('text/event-stream', 'application/x-ndjson')
+
+# (max payload bytes, gzip level, brotli quality, zstd level); payloads above the
+# last bound use the fastest settings so large bodies don't stall a worker
+LEVEL_TIERS = (
+    (64 * 1024, 6, 5, 6),
+    (1024 * 1024, 5, 4, 3),
+    (float("inf"), 1, 1, 1),
+)
+
+class CompressionCache:
+    """LRU of compressed bodies keyed by (request target, ETag, encoding), bounded in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, target: str, etag: str, encoding: str) -> Optional[bytes]:
+        key = (target, etag, encoding)
+        body = self._entries.get(key)
+        if body is None:
+            self.metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.metrics["hits"] += 1
+        return body
+
+    def put(self, target: str, etag: str, encoding: str, body: bytes) -> None:
+        if len(body) > self.max_bytes // 8:
+            return
+        key = (target, etag, encoding)
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key))
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.metrics["evictions"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+            **self.metrics
+        }
+
+compression_cache = CompressionCache(settings.COMPRESSION_CACHE_MAX_BYTES)
+
+# Counters across all responses
+compression_stats = {
+    "responses": 0,
+    "streamed": 0,
+    "offloaded": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+}
+
+def get_compression_stats() -> Dict[str, Any]:
+    """Get compression counters and precompressed cache statistics"""
+    ratio = compression_stats["bytes_out"] / compression_stats["bytes_in"] if compression_stats["bytes_in"] else 1.0
+    return {**compression_stats, "ratio": round(ratio, 3), "cache": compression_cache.get_stats()}
+
+class StreamCompressor:
+    """Incremental compressor producing one encoded stream across many chunks"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress a chunk; ``flush`` forces out everything buffered so far"""
+        if self.encoding == 'br':
+            output = self._compressor.process(data)
+            return output + self._compressor.flush() if flush else output
+
+        output = self._compressor.compress(data)
+        if flush:
+            if self.encoding == 'zstd':
+                output += self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            else:
+                output += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return output
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+class CompressionMiddleware:
     """Middleware to provide compression for responses"""
-    
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
+
+    SKIP_PATHS = {
+        '/health', '/metrics', '/docs', '/redoc', '/openapi.json',
+        '/favicon.ico', '/robots.txt'
+    }
+
+    def __init__(self, app: ASGIApp, cache: CompressionCache = compression_cache):
+        self.app = app
+        self.cache = cache
         self.min_size = settings.COMPRESSION_MIN_SIZE
         self.compression_level = settings.COMPRESSION_LEVEL
         self.brotli_enabled = settings.BROTLI_ENABLED
         self.brotli_quality = settings.BROTLI_QUALITY
-        
-    def _should_compress(self, response: Response, content_type: str) -> bool:
-        """Determine if response should be compressed"""
+        self.zstd_enabled = settings.ZSTD_ENABLED and zstandard is not None
+        self.zstd_level = settings.ZSTD_LEVEL
+        self.offload_threshold = settings.COMPRESSION_OFFLOAD_THRESHOLD
+
+    def _should_compress(self, headers, content_type: str) -> bool:
+        """Determine if a response with these headers should be compressed"""
         # Check if content type is compressible
-        compressible_types = [
-            'text/', 'application/json', 'application/xml', 
-            'application/javascript', 'application/css',
-            'application/x-yaml', 'application/x-www-form-urlencoded'
-        ]
-        
-        is_compressible = any(ct in content_type for ct in compressible_types)
-        
+        is_compressible = any(ct in content_type for ct in COMPRESSIBLE_TYPES)
+
         # Check if response size is large enough to benefit from compression
-        content_length = response.headers.get('content-length')
+        content_length = headers.get('content-length')
         if content_length:
             try:
                 size = int(content_length)
                 return is_compressible and size >= self.min_size
             except ValueError:
                 pass
-        
+
         return is_compressible
-    
-    def _compress_gzip(self, content: bytes) -> bytes:
+
+    def _select_level(self, encoding: str, size: Optional[int], content_type: str, cacheable: bool = False) -> int:
+        """Pick a level for this payload: densest for cached or static bodies, faster as size grows"""
+        dense = cacheable or any(ct in content_type for ct in STATIC_TYPES)
+        if dense and size is not None and size <= LEVEL_TIERS[1][0]:
+            return {'zstd': self.zstd_level, 'br': self.brotli_quality}.get(encoding, self.compression_level)
+
+        # Streams of unknown length use the middle tier
+        size = LEVEL_TIERS[0][0] + 1 if size is None else size
+        for bound, gzip_level, brotli_quality, zstd_level in LEVEL_TIERS:
+            if size <= bound:
+                return {'zstd': zstd_level, 'br': brotli_quality}.get(encoding, gzip_level)
+
+    def _compress_gzip(self, content: bytes, level: int = None) -> bytes:
         """Compress content using gzip"""
         try:
-            return gzip.compress(content, compresslevel=self.compression_level)
+            return gzip.compress(content, compresslevel=level or self.compression_level)
         except Exception as e:
             logger.error(f"Gzip compression failed: {str(e)}")
             return content
-    
-    def _compress_brotli(self, content: bytes) -> bytes:
+
+    def _compress_brotli(self, content: bytes, quality: int = None) -> bytes:
         """Compress content using brotli"""
         try:
-            return brotli.compress(content, quality=self.brotli_quality)
+            return brotli.compress(content, quality=self.brotli_quality if quality is None else quality)
         except Exception as e:
             logger.error(f"Brotli compression failed: {str(e)}")
             return content
-    
-    def _get_compression_type(self, request: Request) -> Optional[str]:
+
+    def _compress_zstd(self, content: bytes, level: int = None) -> bytes:
+        """Compress content using zstd"""
+        try:
+            return zstandard.ZstdCompressor(level=level or self.zstd_level).compress(content)
+        except Exception as e:
+            logger.error(f"Zstd compression failed: {str(e)}")
+            return content
+
+    def _compress(self, encoding: str, content: bytes, level: int) -> bytes:
+        if encoding == 'zstd':
+            return self._compress_zstd(content, level)
+        if encoding == 'br':
+            return self._compress_brotli(content, level)
+        return self._compress_gzip(content, level)
+
+    async def _compress_body(self, encoding: str, content: bytes, level: int) -> bytes:
+        """Compress a complete body, in a worker thread once it is large"""
+        if len(content) < self.offload_threshold:
+            return self._compress(encoding, content, level)
+        compression_stats["offloaded"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._compress, encoding, content, level)
+
+    def _get_compression_type(self, headers) -> Optional[str]:
         """Get the preferred compression type from request headers"""
-        accept_encoding = request.headers.get('accept-encoding', '').lower()
-        
-        # Check for brotli support first (better compression)
-        if self.brotli_enabled and 'br' in accept_encoding:
+        accepted = set()
+        for part in headers.get('accept-encoding', '').lower().split(','):
+            coding, _, params = part.partition(';')
+            name, _, value = params.partition('=')
+            try:
+                quality = float(value) if name.strip() == 'q' else 1.0
+            except ValueError:
+                quality = 0.0
+            if quality > 0:
+                accepted.add(coding.strip())
+
+        # Prefer zstd, then brotli (better compression), then gzip
+        if self.zstd_enabled and 'zstd' in accepted:
+            return 'zstd'
+        if self.brotli_enabled and 'br' in accepted:
             return 'br'
-        
-        # Fallback to gzip
-        if 'gzip' in accept_encoding:
+        if 'gzip' in accepted:
             return 'gzip'
-        
+
         return None
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Skip compression for certain paths
-        skip_paths = {
-            '/health', '/metrics', '/docs', '/redoc', '/openapi.json',
-            '/favicon.ico', '/robots.txt'
-        }
-        
-        if request.url.path in skip_paths:
-            return await call_next(request)
-        
-        # Get the response
-        response = await call_next(request)
-        
-        # Check if compression is needed and supported
-        compression_type = self._get_compression_type(request)
-        if not compression_type:
-            return response
-        
-        content_type = response.headers.get('content-type', '')
-        if not self._should_compress(response, content_type):
-            return response
-        
-        # Get response content
-        if hasattr(response, 'body'):
-            content = response.body
+
+    def _set_encoding_headers(self, headers: MutableHeaders, encoding: str, length: Optional[int]):
+        headers['content-encoding'] = encoding
+        if length is None:
+            del headers['content-length']
         else:
-            # For streaming responses, we can't compress easily
-            return response
-        
-        if not content:
-            return response
-        
-        # Compress content
-        if compression_type == 'br':
-            compressed_content = self._compress_brotli(content)
-            if compressed_content != content:
-                response.headers['content-encoding'] = 'br'
-                response.headers['content-length'] = str(len(compressed_content))
-                response.body = compressed_content
-        elif compression_type == 'gzip':
-            compressed_content = self._compress_gzip(content)
-            if compressed_content != content:
-                response.headers['content-encoding'] = 'gzip'
-                response.headers['content-length'] = str(len(compressed_content))
-                response.body = compressed_content
-        
+            headers['content-length'] = str(length)
+
+        # Strong validators describe the identity body; weaken them for the encoded one
+        etag = headers.get('etag')
+        if etag and not etag.startswith('W/'):
+            headers['etag'] = f'W/{etag}'
+
         # Add Vary header for proper caching
-        if 'vary' not in response.headers:
-            response.headers['vary'] = 'Accept-Encoding'
-        elif 'accept-encoding' not in response.headers['vary'].lower():
-            response.headers['vary'] = f"{response.headers['vary']}, Accept-Encoding"
-        
-        return response
+        if 'vary' not in headers:
+            headers['vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in headers['vary'].lower():
+            headers['vary'] = f"{headers['vary']}, Accept-Encoding"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Skip compression for certain paths
+        if scope["type"] != "http" or scope["path"] in self.SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._get_compression_type(Headers(scope=scope))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        content_type = ""
+        passthrough = False
+        stream: Optional[StreamCompressor] = None
+        flush_each_chunk = False
+
+        async def compressing_send(message: Message):
+            nonlocal start_message, content_type, passthrough, stream, flush_each_chunk
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get('content-type', '')
+                if (
+                    message["status"] in (204, 206, 304)
+                    or 'content-encoding' in headers
+                    or 'content-range' in headers
+                    or not self._should_compress(headers, content_type)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the headers until the first body chunk shows how the body is sent
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            content = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if stream is None and not more_body:
+                # Complete body in a single message
+                if len(content) < self.min_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                headers = MutableHeaders(scope=start_message)
+                etag = headers.get('etag')
+                cacheable = bool(etag) and not etag.startswith('W/')
+                # ETags are only unique within a resource
+                target = f"{scope['path']}?{scope.get('query_string', b'').decode('latin-1')}"
+
+                compressed = self.cache.get(target, etag, encoding) if cacheable else None
+                if compressed is None:
+                    level = self._select_level(encoding, len(content), content_type, cacheable)
+                    compressed = await self._compress_body(encoding, content, level)
+                    if cacheable and compressed != content:
+                        self.cache.put(target, etag, encoding, compressed)
+
+                compression_stats["responses"] += 1
+                compression_stats["bytes_in"] += len(content)
+                if compressed != content:
+                    self._set_encoding_headers(headers, encoding, len(compressed))
+                    content = compressed
+                compression_stats["bytes_out"] += len(content)
+
+                await send(start_message)
+                await send({"type": "http.response.body", "body": content})
+                return
+
+            if stream is None:
+                # Streaming body: compress incrementally with an unknown final length
+                level = self._select_level(encoding, None, content_type)
+                stream = StreamCompressor(encoding, level)
+                flush_each_chunk = any(ct in content_type for ct in FLUSH_EACH_CHUNK_TYPES)
+                self._set_encoding_headers(MutableHeaders(scope=start_message), encoding, None)
+                compression_stats["responses"] += 1
+                compression_stats["streamed"] += 1
+                await send(start_message)
+
+            if len(content) >= self.offload_threshold:
+                compression_stats["offloaded"] += 1
+                loop = asyncio.get_running_loop()
+                output = await loop.run_in_executor(None, stream.compress, content, flush_each_chunk)
+            else:
+                output = stream.compress(content, flush=flush_each_chunk) if content else b""
+            if not more_body:
+                output += stream.finish()
+            compression_stats["bytes_in"] += len(content)
+            compression_stats["bytes_out"] += len(output)
+
+            if output or not more_body:
+                await send({"type": "http.response.body", "body": output, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
 
 def create_compression_middleware(app: ASGIApp) -> ASGIApp:
     """Create and apply compression middleware"""
@@ -0,0 +1,111 @@
+"""
+Conditional GET support for read-heavy API endpoints.
+
+An endpoint declares a cheap version source - an ``updated_at`` column, a
+narrow version query or a hash of a static payload - and the dependency built
+by ``conditional_get`` turns it into a weak ETag. When the client's
+``If-None-Match`` matches, the request is answered with 304 before the
+endpoint runs its full query or serialises a response.
+"""
+
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+logger = logging.getLogger(__name__)
+
+# Clients must revalidate, but may keep the representation
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+class NotModified(HTTPException):
+    """Raised from a dependency to answer a conditional GET with 304"""
+
+    def __init__(self, etag: str):
+        super().__init__(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+        )
+        self.etag = etag
+
+class ConditionalRouteStats:
+    """Validation counts for one conditional route"""
+
+    def __init__(self):
+        self.checks = 0
+        self.not_modified = 0
+        self.unversioned = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "checks": self.checks,
+            "not_modified": self.not_modified,
+            "unversioned": self.unversioned,
+            "hit_rate": round(self.not_modified / self.checks, 3) if self.checks else 0.0
+        }
+
+_route_stats: Dict[str, ConditionalRouteStats] = {}
+
+def get_conditional_stats() -> Dict[str, Any]:
+    """Get per-route 304 hit rates"""
+    return {route: stats.to_dict() for route, stats in sorted(_route_stats.items())}
+
+def reset_conditional_stats() -> None:
+    """Clear the per-route counters"""
+    _route_stats.clear()
+
+def make_etag(route: str, version: Any) -> str:
+    """Derive a weak ETag from a route name and its version value"""
+    digest = hashlib.blake2b(f"{route}:{version!r}".encode(), digest_size=12).hexdigest()
+    # Weak: the version identifies the representation, not its exact bytes
+    # (the compression layer re-encodes the body per Accept-Encoding)
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+def conditional_get(route: str, version_source: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Build a dependency answering ``If-None-Match`` from ``version_source``.
+
+    ``version_source`` is itself a FastAPI dependency, so it can take the same
+    path/query parameters, ``current_active_user`` and session as the endpoint
+    (dependency caching means they are resolved once). It returns any value
+    with a stable ``repr`` that changes whenever the response would, or None
+    to skip validation for this request. Add the result to the route's
+    ``dependencies`` so it runs before the endpoint's own work.
+    """
+    async def check_conditional(
+        request: Request,
+        response: Response,
+        version: Any = Depends(version_source)
+    ) -> Optional[str]:
+        stats = _route_stats.get(route)
+        if stats is None:
+            stats = _route_stats[route] = ConditionalRouteStats()
+        stats.checks += 1
+
+        if version is None:
+            stats.unversioned += 1
+            return None
+
+        etag = make_etag(route, version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            stats.not_modified += 1
+            raise NotModified(etag)
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
+        return etag
+
+    return check_conditional
@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings
 from .secrets_manager import secrets_manager
@@ -24,6 +24,18 @@ class Settings(BaseSettings):
     DATABASE_POOL_SIZE: int = Field(default=10, description="Database pool size")
     DATABASE_MAX_OVERFLOW: int = Field(default=20, description="Database max overflow")
     DATABASE_POOL_TIMEOUT: int = Field(default=30, description="Database pool timeout")
+    DATABASE_QUERY_CACHE_SIZE: int = Field(default=1200, description="SQLAlchemy compiled statement cache size per engine")
+    DATABASE_PREPARED_STATEMENT_CACHE_SIZE: int = Field(default=500, description="asyncpg prepared statement cache size per connection (0 disables)")
+    DATABASE_READ_REPLICA_URLS: List[str] = Field(
+        default_factory=list,
+        description="Read replica database URLs"
+    )
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = Field(default=5.0, description="Maximum replication lag before reads fall back to the primary")
+    DATABASE_REPLICA_HEALTH_CHECK_INTERVAL: int = Field(default=15, description="Replica health/lag check interval in seconds")
+    DATABASE_ADMISSION_CONTROL_ENABLED: bool = Field(default=False, description="Queue excess requests before they reach the connection pool")
+    DATABASE_ADMISSION_LIMIT: int = Field(default=0, description="Concurrent requests admitted (0 = pool size + max overflow)")
+    DATABASE_ADMISSION_MAX_QUEUE: int = Field(default=100, description="Requests allowed to wait for admission")
+    DATABASE_ADMISSION_QUEUE_TIMEOUT: float = Field(default=5.0, description="Seconds a request may wait for admission")
     
     # =============================================================================
     # SECURITY CONFIGURATION
@@ -38,6 +50,17 @@ class Settings(BaseSettings):
     TOKEN_ROTATION_ENABLED: bool = Field(default=True, description="Enable automatic token rotation")
     MAX_ACTIVE_SESSIONS: int = Field(default=5, description="Maximum active sessions per user")
     TOKEN_FINGERPRINT_ENABLED: bool = Field(default=True, description="Enable token fingerprinting for security")
+    AUTH_CLAIMS_CACHE_TTL_SECONDS: int = Field(default=60, description="How long verified JWT claims are reused (capped at the token's expiry)")
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: int = Field(default=30, description="How long a user's id/active/superuser flags are cached")
+    AUTH_CACHE_MAX_ENTRIES: int = Field(default=10000, description="Maximum entries in each in-process auth cache")
+    TOKEN_BLACKLIST_BLOOM_CAPACITY: int = Field(default=100000, description="Blacklisted tokens the bloom filter is sized for (it grows past this)")
+    TOKEN_BLACKLIST_BLOOM_ERROR_RATE: float = Field(default=0.001, description="Target bloom filter false positive rate")
+    TOKEN_BLACKLIST_CHANNEL: str = Field(default="frende:token_blacklist", description="Redis pub/sub channel sharing blacklist updates across workers")
+    TOKEN_BLACKLIST_RELOAD_INTERVAL: float = Field(default=30.0, description="Seconds between reads of new blacklist rows when Redis pub/sub is off")
+    PASSWORD_HASH_SCHEME: str = Field(default="bcrypt", description="Password hash scheme for new hashes: bcrypt or argon2 (needs argon2-cffi)")
+    PASSWORD_HASH_WORKERS: int = Field(default=2, description="Threads dedicated to password hashing")
+    PASSWORD_HASH_MAX_QUEUE: int = Field(default=32, description="Hash/verify calls allowed to wait for a hashing thread")
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = Field(default=2.0, description="Seconds a hash/verify call may wait before 503")
     BCRYPT_ROUNDS: int = Field(default=12, description="BCrypt rounds for password hashing")
     
     # CORS Configuration
@@ -75,6 +98,9 @@ class Settings(BaseSettings):
     RATE_LIMIT_AUTH: int = Field(default=5, description="Auth requests per minute")
     RATE_LIMIT_UPLOAD: int = Field(default=10, description="Upload requests per hour")
     RATE_LIMIT_WEBSOCKET: int = Field(default=10, description="WebSocket connections per minute")
+    RATE_LIMIT_GLOBAL: int = Field(default=0, description="Requests per minute across all clients (0 disables)")
+    RATE_LIMIT_MEMORY_MAX_KEYS: int = Field(default=100000, description="Maximum keys tracked by the in-memory rate limiter")
+    RATE_LIMIT_MEMORY_SWEEP_INTERVAL: int = Field(default=60, description="Seconds between sweeps of idle in-memory rate limit keys")
     
     # Redis Configuration for Rate Limiting
     REDIS_URL: str = Field(default="redis://localhost:6379", description="Redis connection URL")
@@ -89,6 +115,10 @@ class Settings(BaseSettings):
     COMPRESSION_LEVEL: int = Field(default=6, description="Gzip compression level (1-9)")
     BROTLI_ENABLED: bool = Field(default=True, description="Enable Brotli compression")
     BROTLI_QUALITY: int = Field(default=11, description="Brotli compression quality (0-11)")
+    ZSTD_ENABLED: bool = Field(default=True, description="Enable zstd compression when the zstandard package is installed")
+    ZSTD_LEVEL: int = Field(default=12, description="Zstd level for cached and static responses (1-22)")
+    COMPRESSION_OFFLOAD_THRESHOLD: int = Field(default=131072, description="Bodies at least this large (bytes) are compressed in a worker thread")
+    COMPRESSION_CACHE_MAX_BYTES: int = Field(default=33554432, description="Memory for compressed bodies cached by ETag (bytes)")
 
     # CDN Configuration
     CDN_ENABLED: bool = Field(default=True, description="Enable CDN optimization")
@@ -104,6 +134,14 @@ class Settings(BaseSettings):
     FONT_SUBSETTING: bool = Field(default=True, description="Enable font subsetting")
     WEBP_ENABLED: bool = Field(default=True, description="Enable WebP image format")
     AVIF_ENABLED: bool = Field(default=False, description="Enable AVIF image format")
+    IMAGE_PIPELINE_WORKERS: int = Field(default=2, description="Worker processes for image decode/resize/encode")
+    IMAGE_PIPELINE_MAX_QUEUE: int = Field(default=16, description="Image jobs allowed to wait for a worker process")
+    IMAGE_PIPELINE_QUEUE_TIMEOUT: float = Field(default=5.0, description="Seconds an upload may wait for a worker before 503")
+    IMAGE_DERIVATIVE_CACHE_DIR: str = Field(default="cache/derivatives", description="Directory for resized/converted images generated on request")
+    IMAGE_DERIVATIVE_CACHE_MB: int = Field(default=512, description="Disk budget for generated images; least recently used are evicted")
+    IMAGE_DERIVATIVE_WIDTHS: str = Field(default="40,80,120,160,240,320,480,640,960,1200", description="Widths images are generated at; requests snap up to the next one")
+    IMAGE_DERIVATIVE_QUALITY: int = Field(default=82, description="Encoder quality for generated images")
+    IMAGE_ACCEL_REDIRECT_PREFIX: Optional[str] = Field(default=None, description="Internal nginx location for generated images (X-Accel-Redirect); unset to send files from the app")
 
     # SSL/TLS Configuration
     SSL_ENABLED: bool = Field(default=False, description="Enable SSL/TLS")
@@ -157,6 +195,16 @@ class Settings(BaseSettings):
     # Request Size Limits
     REQUEST_SIZE_LIMIT: str = Field(default="10MB", description="Maximum request size")
     UPLOAD_SIZE_LIMIT: str = Field(default="30MB", description="Maximum upload size")
+    UPLOAD_SPOOL_DIR: str = Field(default="temp/uploads", description="Directory uploads are streamed to before processing")
+    IMAGE_MAX_PIXELS: int = Field(default=40_000_000, description="Largest image (width x height) accepted for decoding")
+    
+    # Content-addressed upload storage
+    BLOB_STORE_BACKEND: str = Field(default="local", description="Blob store backend: local or s3")
+    BLOB_STORE_BUCKET: Optional[str] = Field(default=None, description="Bucket for the s3 blob store backend (defaults to CDN_BUCKET_NAME)")
+    BLOB_STORE_REGION: str = Field(default="us-east-1", description="Region for the s3 blob store backend")
+    BLOB_GC_GRACE_HOURS: int = Field(default=24, description="Hours an unreferenced blob is kept before garbage collection")
+    BLOB_GC_BATCH_SIZE: int = Field(default=500, description="Blobs deleted per garbage collection pass")
+    STORAGE_STATS_RECONCILE_HOURS: float = Field(default=6.0, description="Hours between walks of the upload tree that correct the running storage statistics")
     
     # Security Monitoring
     SECURITY_LOG_LEVEL: str = Field(default="WARNING", description="Security log level")
@@ -172,6 +220,28 @@ class Settings(BaseSettings):
     )
     AI_RATE_LIMIT_PER_MINUTE: int = Field(default=60, description="AI rate limit per minute")
     AI_MAX_TOKENS_PER_REQUEST: int = Field(default=1000, description="Maximum tokens per AI request")
+    AI_SCHEDULER_WORKERS: int = Field(default=4, description="Threads making concurrent Gemini calls")
+    AI_SCHEDULER_MAX_QUEUE: int = Field(default=64, description="AI requests allowed to wait for a model call")
+    AI_REQUEST_DEADLINE: float = Field(default=20.0, description="Seconds an AI request may wait for a worker and rate limit token")
+    AI_BATCH_SIZE: int = Field(default=5, description="Task requests packed into one Gemini prompt")
+    AI_BATCH_WINDOW_MS: int = Field(default=50, description="Milliseconds to wait for more requests to fill a batch")
+    AI_CALL_TIMEOUT: float = Field(default=10.0, description="Seconds a single Gemini call may take before it counts as failed")
+    AI_LATENCY_BUDGET_MS: int = Field(default=2000, description="Milliseconds to wait for an AI task or starter before serving a built-in one")
+    AI_CIRCUIT_FAILURE_RATE: float = Field(default=0.5, description="Share of failed Gemini calls in the window that opens the circuit")
+    AI_CIRCUIT_MIN_CALLS: int = Field(default=5, description="Calls in the window before the failure rate can open the circuit")
+    AI_CIRCUIT_WINDOW: int = Field(default=60, description="Seconds of Gemini call outcomes the failure rate covers")
+    AI_CIRCUIT_COOLDOWN: int = Field(default=30, description="Seconds the circuit stays open before probing Gemini again")
+    AI_CACHE_MAX_ENTRIES: int = Field(default=1000, description="Context signatures kept in the AI response cache")
+    AI_CACHE_TTL: int = Field(default=21600, description="Seconds a cached AI response may be served")
+    AI_CACHE_VARIETY: int = Field(default=5, description="Different responses collected per signature before serving from the cache")
+    AI_CACHE_BACKEND: str = Field(default="memory", description="Where the AI response cache is persisted: memory, disk or redis")
+    AI_CACHE_PATH: str = Field(default="cache/ai_responses.json", description="File the AI response cache is saved to with the disk backend")
+    AI_CACHE_SAVE_INTERVAL: int = Field(default=300, description="Seconds between AI response cache saves")
+    TASK_POOL_ENABLED: bool = Field(default=True, description="Assign tasks from a stock generated ahead of time")
+    TASK_POOL_TARGET_PER_BUCKET: int = Field(default=6, description="Pre-generated tasks kept per task type, difficulty and interest category")
+    TASK_POOL_BATCH_SIZE: int = Field(default=5, description="Pre-generated tasks requested per Gemini call")
+    TASK_POOL_RATE_SHARE: float = Field(default=0.25, description="Share of the AI rate limit the task pool may use for refills")
+    TASK_POOL_REFILL_INTERVAL: int = Field(default=60, description="Seconds between task pool stock checks")
     
     # =============================================================================
     # LOGGING CONFIGURATION
@@ -182,6 +252,8 @@ class Settings(BaseSettings):
     LOG_ROTATION_SIZE: str = Field(default="10MB", description="Log rotation size")
     LOG_ROTATION_COUNT: int = Field(default=5, description="Number of log files to keep")
     LOG_RETENTION_DAYS: int = Field(default=30, description="Log retention in days")
+    LOG_QUEUE_SIZE: int = Field(default=10000, description="Records buffered for the background log writer before new ones are dropped")
+    LOG_SAMPLE_RATES: str = Field(default="api=0.1,performance=0.1", description="Per-logger sampling of INFO and below, as name=rate pairs")
     
     # Performance Monitoring Configuration
     PERFORMANCE_MONITORING_ENABLED: bool = Field(default=True, description="Enable performance monitoring")
@@ -356,6 +428,12 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in v.split(",")]
         return v
     
+    @validator("DATABASE_READ_REPLICA_URLS", pre=True)
+    def parse_read_replica_urls(cls, v):
+        if isinstance(v, str):
+            return [url.strip() for url in v.split(",") if url.strip()]
+        return v
+    
     @validator("REQUEST_SIZE_LIMIT")
     def validate_request_size_limit(cls, v):
         # Convert size strings to bytes for validation
@@ -530,6 +608,30 @@ class Settings(BaseSettings):
         }
         return level_map.get(self.ERROR_LOG_LEVEL, logging.ERROR)
     
+    def get_log_sample_rates(self) -> Dict[str, float]:
+        """Get per-logger sample rates, clamped to [0, 1]"""
+        rates = {}
+        for pair in self.LOG_SAMPLE_RATES.split(","):
+            name, _, rate = pair.partition("=")
+            if not name.strip() or not rate.strip():
+                continue
+            try:
+                rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+            except ValueError:
+                continue
+        return rates
+    
+    def get_image_derivative_widths(self) -> List[int]:
+        """Get the widths images are generated at, ascending"""
+        widths = set()
+        for width in self.IMAGE_DERIVATIVE_WIDTHS.split(","):
+            try:
+                if int(width) > 0:
+                    widths.add(int(width))
+            except ValueError:
+                continue
+        return sorted(widths)
+    
     def get_log_rotation_size_bytes(self) -> int:
         """Get log rotation size in bytes"""
         size_map = {"KB": 1024, "MB": 1024**2, "GB": 1024**3}
@@ -7,84 +7,154 @@ import os
 import ssl
 from core.config import settings
 from core.database_optimization import db_optimizer
+from core.read_replicas import ReplicaRouter, is_replica_failure
+from core.pool_monitor import pool_monitor, InstrumentedAsyncAdaptedQueuePool
 from sqlalchemy import text
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional, Dict, Any, Set
+import inspect
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
 
 # Database URL - use environment variable or default to SQLite for development
 DATABASE_URL = settings.DATABASE_URL
 
+def create_database_engine(database_url: str, name: str = "primary"):
+    """Create an async engine for the primary database or a read replica"""
+    if database_url.startswith("sqlite"):
+        # SQLite configuration for development
+        async_database_url = database_url.replace("sqlite:///", "sqlite+aiosqlite:///")
+        engine = create_async_engine(
+            async_database_url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+            query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
+            echo=True  # Enable SQL logging for development
+        )
+    else:
+        # PostgreSQL configuration for production with SSL/TLS
+        async_database_url = database_url.replace("postgresql://", "postgresql+asyncpg://")
+    
+        # SSL configuration for production
+        ssl_context = None
+        if settings.is_production():
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = True
+            ssl_context.verify_mode = ssl.CERT_REQUIRED
+    
+        engine = create_async_engine(
+            async_database_url,
+            poolclass=InstrumentedAsyncAdaptedQueuePool,  # Reports checkout wait and timeouts
+            pool_pre_ping=True,
+            pool_recycle=300,
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+            query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
+            echo=False,  # Disable SQL logging for production
+            connect_args={
+                "ssl": ssl_context,
+                "prepared_statement_cache_size": settings.DATABASE_PREPARED_STATEMENT_CACHE_SIZE,
+                "server_settings": {
+                    "application_name": "frende_backend",
+                    "jit": "off",  # Disable JIT for better performance
+                    "random_page_cost": "1.1",  # Optimize for SSD
+                    "effective_cache_size": "256MB",  # Optimize cache size
+                    "work_mem": "4MB",  # Optimize work memory
+                    "maintenance_work_mem": "64MB",  # Optimize maintenance memory
+                    "shared_preload_libraries": "pg_stat_statements",  # Enable query statistics
+                    "pg_stat_statements.track": "all",  # Track all queries
+                    "pg_stat_statements.max": "10000",  # Maximum tracked queries
+                    "log_statement": "none",  # Disable statement logging in production
+                    "log_min_duration_statement": "1000",  # Log queries taking more than 1 second
+                    "log_checkpoints": "on",  # Log checkpoints
+                    "log_connections": "off",  # Disable connection logging
+                    "log_disconnections": "off",  # Disable disconnection logging
+                    "log_lock_waits": "on",  # Log lock waits
+                    "log_temp_files": "0",  # Log all temporary files
+                    "log_autovacuum_min_duration": "0",  # Log all autovacuum operations
+                    "autovacuum": "on",  # Enable autovacuum
+                    "autovacuum_vacuum_scale_factor": "0.1",  # Vacuum when 10% of rows are dead
+                    "autovacuum_analyze_scale_factor": "0.05",  # Analyze when 5% of rows are dead
+                    "autovacuum_vacuum_cost_limit": "2000",  # Autovacuum cost limit
+                    "autovacuum_vacuum_cost_delay": "20ms",  # Autovacuum cost delay
+                    "checkpoint_completion_target": "0.9",  # Spread checkpoint writes
+                    "wal_buffers": "16MB",  # WAL buffers size
+                    "default_statistics_target": "100",  # Default statistics target
+                    "track_activities": "on",  # Track activities
+                    "track_counts": "on",  # Track counts
+                    "track_io_timing": "on",  # Track I/O timing
+                    "track_functions": "all",  # Track all functions
+                    "track_activity_query_size": "1024",  # Track activity query size
+                } if settings.is_production() else {}
+            }
+        )
+    
+        # Apply database optimization configuration
+        db_optimizer.configure_engine_optimization(engine)
+    
+    # Track checkout wait, hold time per endpoint, overflow and timeouts
+    pool_monitor.instrument(engine, name)
+    
+    return engine
+
 # Create async engine
-if DATABASE_URL.startswith("sqlite"):
-    # SQLite configuration for development
-    async_database_url = DATABASE_URL.replace("sqlite:///", "sqlite+aiosqlite:///")
-    engine = create_async_engine(
-        async_database_url,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-        echo=True  # Enable SQL logging for development
-    )
-else:
-    # PostgreSQL configuration for production with SSL/TLS
-    async_database_url = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-    
-    # SSL configuration for production
-    ssl_context = None
-    if settings.is_production():
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = True
-        ssl_context.verify_mode = ssl.CERT_REQUIRED
-    
-    engine = create_async_engine(
-        async_database_url,
-        pool_pre_ping=True,
-        pool_recycle=300,
-        pool_size=settings.DATABASE_POOL_SIZE,
-        max_overflow=settings.DATABASE_MAX_OVERFLOW,
-        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
-        echo=False,  # Disable SQL logging for production
-        connect_args={
-            "ssl": ssl_context,
-            "server_settings": {
-                "application_name": "frende_backend",
-                "jit": "off",  # Disable JIT for better performance
-                "random_page_cost": "1.1",  # Optimize for SSD
-                "effective_cache_size": "256MB",  # Optimize cache size
-                "work_mem": "4MB",  # Optimize work memory
-                "maintenance_work_mem": "64MB",  # Optimize maintenance memory
-                "shared_preload_libraries": "pg_stat_statements",  # Enable query statistics
-                "pg_stat_statements.track": "all",  # Track all queries
-                "pg_stat_statements.max": "10000",  # Maximum tracked queries
-                "log_statement": "none",  # Disable statement logging in production
-                "log_min_duration_statement": "1000",  # Log queries taking more than 1 second
-                "log_checkpoints": "on",  # Log checkpoints
-                "log_connections": "off",  # Disable connection logging
-                "log_disconnections": "off",  # Disable disconnection logging
-                "log_lock_waits": "on",  # Log lock waits
-                "log_temp_files": "0",  # Log all temporary files
-                "log_autovacuum_min_duration": "0",  # Log all autovacuum operations
-                "autovacuum": "on",  # Enable autovacuum
-                "autovacuum_vacuum_scale_factor": "0.1",  # Vacuum when 10% of rows are dead
-                "autovacuum_analyze_scale_factor": "0.05",  # Analyze when 5% of rows are dead
-                "autovacuum_vacuum_cost_limit": "2000",  # Autovacuum cost limit
-                "autovacuum_vacuum_cost_delay": "20ms",  # Autovacuum cost delay
-                "checkpoint_completion_target": "0.9",  # Spread checkpoint writes
-                "wal_buffers": "16MB",  # WAL buffers size
-                "default_statistics_target": "100",  # Default statistics target
-                "track_activities": "on",  # Track activities
-                "track_counts": "on",  # Track counts
-                "track_io_timing": "on",  # Track I/O timing
-                "track_functions": "all",  # Track all functions
-                "track_activity_query_size": "1024",  # Track activity query size
-            } if settings.is_production() else {}
-        }
-    )
+engine = create_database_engine(DATABASE_URL)
+
+# Optional read replicas for read-only sessions
+replica_router = ReplicaRouter(
+    engine,
+    [
+        create_database_engine(url, name=f"replica_{index}")
+        for index, url in enumerate(settings.DATABASE_READ_REPLICA_URLS)
+    ],
+    max_lag_seconds=settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.DATABASE_REPLICA_HEALTH_CHECK_INTERVAL
+)
+
+# Unit of work for the current request or socket event
+_current_unit_of_work: ContextVar[Optional["UnitOfWork"]] = ContextVar("current_unit_of_work", default=None)
+
+# Unit of work statistics
+unit_of_work_metrics = {
+    "units_completed": 0,
+    "sessions_opened": 0,
+    "leaked_sessions": 0,
+    "max_sessions_per_unit": 0
+}
+
+class TrackedAsyncSession(AsyncSession):
+    """AsyncSession that registers itself with the active unit of work for leak detection"""
     
-    # Apply database optimization configuration
-    db_optimizer.configure_engine_optimization(engine)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.origin = _caller_location()
+        unit = _current_unit_of_work.get()
+        if unit is not None:
+            unit.register(self)
+    
+    async def close(self) -> None:
+        unit = _current_unit_of_work.get()
+        if unit is not None:
+            unit.unregister(self)
+        await super().close()
+
+def _caller_location() -> str:
+    """Best-effort file:line of the code that opened a session"""
+    try:
+        frame = sys._getframe(3)
+        return f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+    except ValueError:
+        return "unknown"
 
 # Create session factory
 async_session = sessionmaker(
     engine,
-    class_=AsyncSession,
+    class_=TrackedAsyncSession,
     expire_on_commit=False,
     autoflush=False,
     autocommit=False
@@ -93,16 +163,168 @@ async_session = sessionmaker(
 # Base class for models
 Base = declarative_base()
 
-async def get_async_session() -> AsyncSession:
-    """Get async database session with optimization"""
+class UnitOfWork:
+    """One lazily opened session shared by everything running in a request or socket event"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._session: Optional[AsyncSession] = None
+        self.open_sessions: Set[AsyncSession] = set()
+        self.sessions_opened = 0
+        self.closed = False
+    
+    def register(self, session: AsyncSession) -> None:
+        self.open_sessions.add(session)
+        self.sessions_opened += 1
+    
+    def unregister(self, session: AsyncSession) -> None:
+        self.open_sessions.discard(session)
+    
+    @property
+    def session(self) -> AsyncSession:
+        """The shared session, opened on first use"""
+        if self._session is None:
+            self._session = async_session()
+        return self._session
+    
+    async def close(self) -> None:
+        """Close the shared session and report any session left open"""
+        self.closed = True
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        
+        leaked = list(self.open_sessions)
+        for session in leaked:
+            logger.warning(
+                f"Database session leaked in {self.name}: opened at {session.origin} "
+                f"and still open at the end of the unit of work"
+            )
+            await session.close()
+        
+        unit_of_work_metrics["units_completed"] += 1
+        unit_of_work_metrics["sessions_opened"] += self.sessions_opened
+        unit_of_work_metrics["leaked_sessions"] += len(leaked)
+        unit_of_work_metrics["max_sessions_per_unit"] = max(
+            unit_of_work_metrics["max_sessions_per_unit"], self.sessions_opened
+        )
+
+@asynccontextmanager
+async def unit_of_work(name: str = "unit_of_work"):
+    """Scope a request or socket event to a single database session"""
+    current = _current_unit_of_work.get()
+    if current is not None and not current.closed:
+        # Nested scopes join the outer unit of work
+        yield current
+        return
+    
+    unit = UnitOfWork(name)
+    token = _current_unit_of_work.set(unit)
+    try:
+        yield unit
+    finally:
+        try:
+            await unit.close()
+        finally:
+            _current_unit_of_work.reset(token)
+
+def with_unit_of_work(func):
+    """Run a socket event handler (or any coroutine) inside its own unit of work"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        async with unit_of_work(f"event:{func.__name__}"):
+            return await func(*args, **kwargs)
+    
+    return wrapper
+
+@asynccontextmanager
+async def session_scope():
+    """
+    Get a database session for service code.
+    
+    Joins the current unit of work when one is active; otherwise opens a
+    session that is closed deterministically on exit.
+    """
+    unit = _current_unit_of_work.get()
+    # Tasks spawned from a request inherit its context but outlive it
+    if unit is not None and not unit.closed:
+        session = unit.session
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        return
+    
     async with async_session() as session:
         try:
             yield session
         except Exception:
             await session.rollback()
             raise
-        finally:
-            await session.close()
+
+async def get_async_session() -> AsyncSession:
+    """Get async database session with optimization"""
+    async with session_scope() as session:
+        yield session
+
+def get_unit_of_work_stats() -> Dict[str, Any]:
+    """Get unit of work and session leak statistics"""
+    completed = unit_of_work_metrics["units_completed"]
+    return {
+        **unit_of_work_metrics,
+        "average_sessions_per_unit": (
+            unit_of_work_metrics["sessions_opened"] / completed if completed else 0
+        )
+    }
+
+def async_read_session() -> AsyncSession:
+    """Create a session bound to a read replica (or the primary when none is usable)"""
+    return TrackedAsyncSession(
+        bind=replica_router.get_read_engine(),
+        expire_on_commit=False,
+        autoflush=False
+    )
+
+@asynccontextmanager
+async def read_session_scope():
+    """Get a read-only session; joins the unit of work when no replicas are configured"""
+    if not replica_router.enabled:
+        async with session_scope() as session:
+            yield session
+        return
+    
+    async with async_read_session() as session:
+        try:
+            yield session
+        except Exception as e:
+            # Only connection and driver errors count against the replica, not 404s or bad input
+            if is_replica_failure(e):
+                replica_router.mark_failed(session.bind, e)
+            await session.rollback()
+            raise
+        replica_router.mark_succeeded(session.bind)
+
+async def get_read_session() -> AsyncSession:
+    """Get a read-only async database session routed to a replica"""
+    async with read_session_scope() as session:
+        yield session
+
+def read_only(func):
+    """Route a service method to a read replica when the caller doesn't pass a session"""
+    signature = inspect.signature(func)
+    
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        if bound.arguments.get("session") is not None:
+            return await func(*args, **kwargs)
+        
+        async with read_session_scope() as session:
+            bound.arguments["session"] = session
+            return await func(*bound.args, **bound.kwargs)
+    
+    return wrapper
 
 # Database initialization
 async def init_db():
@@ -140,6 +362,7 @@ async def init_db():
 # Database cleanup
 async def close_db():
     """Close database connections"""
+    await replica_router.stop()
     await engine.dispose()
     print("Database connections closed")
 
@@ -147,7 +370,12 @@ async def close_db():
 async def get_database_stats():
     """Get database performance statistics"""
     if DATABASE_URL.startswith("sqlite"):
-        return {"database_type": "sqlite", "optimization": "limited"}
+        return {
+            "database_type": "sqlite",
+            "optimization": "limited",
+            "read_replicas": replica_router.get_status(),
+            "pool_monitor": pool_monitor.get_stats()
+        }
     
     async with async_session() as session:
         # Get database statistics
@@ -200,7 +428,9 @@ async def get_database_stats():
             "table_statistics": [dict(row._mapping) for row in stats],
             "index_usage": [dict(row._mapping) for row in index_stats],
             "slow_queries": [dict(row._mapping) for row in query_stats],
-            "optimization_metrics": db_optimizer.get_performance_metrics()
+            "optimization_metrics": db_optimizer.get_performance_metrics(),
+            "read_replicas": replica_router.get_status(),
+            "pool_monitor": pool_monitor.get_stats()
         }
 
 async def check_database_health():
@@ -215,7 +445,10 @@ async def check_database_health():
                 "status": "healthy",
                 "database_type": "sqlite" if DATABASE_URL.startswith("sqlite") else "postgresql",
                 "connection": "active",
-                "response_time_ms": 0  # Could be measured if needed
+                "response_time_ms": 0,  # Could be measured if needed
+                "pool_status": pool_monitor.get_pool_status("primary"),
+                "read_replicas": replica_router.get_status(),
+                "unit_of_work": get_unit_of_work_stats()
             }
     except Exception as e:
         return {
@@ -0,0 +1,62 @@
+"""
+Database session middleware for the Frende backend application.
+Gives every HTTP request a single lazily opened database session and
+optionally bounds how many requests compete for the connection pool.
+"""
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.database import unit_of_work
+from core.pool_monitor import AdmissionGate, admission_gate, current_request_scope
+
+class UnitOfWorkMiddleware:
+    """Scope each HTTP request to one database session shared through a contextvar"""
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        token = current_request_scope.set(scope)
+        try:
+            async with unit_of_work(f"{scope['method']} {scope['path']}"):
+                await self.app(scope, receive, send)
+        finally:
+            current_request_scope.reset(token)
+
+class AdmissionControlMiddleware:
+    """Queue excess HTTP requests instead of letting them time out inside the pool"""
+
+    SKIP_PATHS = ("/health", "/api/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+    def __init__(self, app: ASGIApp, gate: AdmissionGate = admission_gate):
+        self.app = app
+        self.gate = gate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.SKIP_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.gate.acquire():
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", b"1")
+                ]
+            })
+            await send({
+                "type": "http.response.body",
+                "body": b'{"detail":"Server busy, please retry"}'
+            })
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.gate.release()
@@ -7,9 +7,10 @@ import logging
 import traceback
 from typing import Dict, Any, Optional
 from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from core.conditional_requests import NotModified
 from core.config import settings
 from core.exceptions import (
     FrendeException, ValidationError, AuthenticationError, PermissionError,
@@ -160,6 +161,10 @@ async def handle_task_error(request: Request, exc: TaskError) -> JSONResponse:
     """Handle task errors"""
     return await handle_frende_exception(request, exc)
 
+async def handle_not_modified(request: Request, exc: NotModified) -> Response:
+    """Answer a matched conditional GET: no body, not logged as an error"""
+    return Response(status_code=exc.status_code, headers=exc.headers)
+
 async def handle_http_exception(request: Request, exc: HTTPException) -> JSONResponse:
     """Handle FastAPI HTTP exceptions"""
     request_id = getattr(request.state, "request_id", None)
@@ -300,6 +305,9 @@ def register_exception_handlers(app):
     app.add_exception_handler(MatchError, handle_match_error)
     app.add_exception_handler(TaskError, handle_task_error)
     
+    # Conditional GET hits are HTTPExceptions but must stay bodiless 304s
+    app.add_exception_handler(NotModified, handle_not_modified)
+    
     # Register generic exception handlers
     app.add_exception_handler(HTTPException, handle_http_exception)
     app.add_exception_handler(StarletteHTTPException, handle_starlette_http_exception)
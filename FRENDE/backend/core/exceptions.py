@@ -246,8 +246,9 @@ class AIError(FrendeException):
     def __init__(self, message: str = "AI service error", 
                  service: Optional[str] = None,
                  prompt: Optional[str] = None,
-                 tokens_used: Optional[int] = None):
-        details = {}
+                 tokens_used: Optional[int] = None,
+                 details: Optional[Dict[str, Any]] = None):
+        details = dict(details or {})
         if service:
             details["service"] = service
         if prompt:
@@ -280,6 +281,24 @@ class AIGenerationError(AIError):
             details=details
         )
 
+class AICircuitOpenError(AIGenerationError):
+    """Raised when AI calls are short-circuited while the service is failing"""
+    
+    def __init__(self, message: str = "AI service temporarily unavailable", 
+                 task_type: Optional[str] = None,
+                 match_id: Optional[int] = None):
+        super().__init__(message=message, task_type=task_type, match_id=match_id)
+
+class ServiceBusyError(HTTPException):
+    """Raised when a bounded worker pool's queue is full or the wait timed out"""
+    
+    def __init__(self, detail: str = "Server busy, please retry", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
 class FileUploadError(FrendeException):
     """Raised when file upload operations fail"""
     
@@ -0,0 +1,132 @@
+"""
+Set-based expiry engine for cleanup jobs
+Expires rows with batched UPDATE ... RETURNING statements instead of loading
+every expired row into Python, and records per-job duration and row metrics
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.performance_monitor import performance_monitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+# Per-job run statistics
+expiry_metrics: Dict[str, Dict[str, Any]] = {}
+
+def _record_run(job: str, rows: int, batches: int, duration_ms: float, error: Optional[str] = None) -> None:
+    stats = expiry_metrics.setdefault(job, {
+        "runs": 0,
+        "rows_expired": 0,
+        "batches": 0,
+        "errors": 0,
+        "total_duration_ms": 0.0,
+        "last_duration_ms": 0.0,
+        "last_rows": 0,
+        "last_run_at": None,
+        "last_error": None
+    })
+    stats["runs"] += 1
+    stats["rows_expired"] += rows
+    stats["batches"] += batches
+    stats["total_duration_ms"] += duration_ms
+    stats["last_duration_ms"] = round(duration_ms, 2)
+    stats["last_rows"] = rows
+    stats["last_run_at"] = datetime.utcnow().isoformat()
+    if error:
+        stats["errors"] += 1
+        stats["last_error"] = error
+
+async def expire_rows(
+    session: AsyncSession,
+    job: str,
+    model,
+    condition,
+    values: Dict[str, Any],
+    returning: Sequence = (),
+    on_batch: Optional[Callable[[AsyncSession, List[Row]], Awaitable[None]]] = None,
+    after_commit: Optional[Callable[[List[Row]], Awaitable[None]]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """
+    Apply ``values`` to every row of ``model`` matching ``condition``.
+
+    Each batch is a single ``UPDATE ... WHERE id IN (SELECT id ... LIMIT n)
+    RETURNING id, ...`` committed on its own, so locks and transactions stay
+    short. ``on_batch`` receives the returned rows to apply database side
+    effects in bulk before the batch commits; ``after_commit`` runs once it
+    has committed, for notifications, and its errors are logged rather than
+    ending the sweep. ``values`` must make ``condition`` false,
+    otherwise the same rows would be selected again.
+    """
+    start = time.perf_counter()
+    total = 0
+    batches = 0
+    error = None
+
+    batch_ids = (
+        select(model.id)
+        .where(condition)
+        .order_by(model.id)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(model)
+        .where(model.id.in_(batch_ids))
+        .values(**values)
+        .returning(model.id, *returning)
+        .execution_options(synchronize_session=False)
+    )
+
+    try:
+        with performance_monitor(f"expiry.{job}"):
+            while True:
+                rows = (await session.execute(stmt)).all()
+                if not rows:
+                    break
+
+                if on_batch:
+                    await on_batch(session, rows)
+                await session.commit()
+                if after_commit:
+                    try:
+                        await after_commit(rows)
+                    except Exception as e:
+                        # The batch is committed either way; keep sweeping
+                        logger.error(f"Expiry job {job}: after-commit hook failed: {str(e)}")
+
+                total += len(rows)
+                batches += 1
+                if len(rows) < batch_size:
+                    break
+    except Exception as e:
+        error = str(e)
+        await session.rollback()
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _record_run(job, total, batches, duration_ms, error)
+        if total:
+            logger.info(f"Expiry job {job}: {total} rows in {batches} batch(es), {duration_ms:.0f}ms")
+
+    return total
+
+def get_expiry_stats() -> Dict[str, Dict[str, Any]]:
+    """Get per-job expiry statistics"""
+    return {
+        job: {
+            **stats,
+            "total_duration_ms": round(stats["total_duration_ms"], 2),
+            "avg_duration_ms": round(stats["total_duration_ms"] / stats["runs"], 2) if stats["runs"] else 0.0
+        }
+        for job, stats in expiry_metrics.items()
+    }
@@ -0,0 +1,343 @@
+"""
+Async file I/O for storage services
+Runs blocking filesystem calls on a worker thread, off the event loop
+
+Directory walks are batched: each thread hop scans up to ``batch_size``
+entries with ``os.scandir``, so a large upload tree costs a few hundred
+hops rather than one per file. Writes and removals under the upload
+directory are recorded in ``storage_stats``, which keeps running totals so
+storage statistics never need a full walk; a periodic ``reconcile`` walk
+corrects any drift (e.g. files changed outside this process).
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+# Directory entries scanned per thread hop
+WALK_BATCH_SIZE = 256
+
+file_io_metrics = {"calls": 0, "walk_batches": 0, "walk_entries": 0}
+
+class FileEntry(NamedTuple):
+    path: Path
+    size: int
+    mtime: float
+
+class StorageStats:
+    """Running file counts and sizes for a directory tree"""
+
+    def __init__(self, root: PathLike):
+        self.root = Path(root)
+        self._root_prefix = os.path.abspath(root) + os.sep
+        self._reset()
+        self.metrics = {
+            "writes_recorded": 0,
+            "deletes_recorded": 0,
+            "reconciles": 0,
+            "last_reconciled_at": None,
+            "last_reconcile_ms": 0.0,
+            "last_drift_files": 0,
+            "last_drift_bytes": 0
+        }
+
+    def _reset(self) -> None:
+        self.total_files = 0
+        self.total_size = 0
+        self.files_by_type: Dict[str, Dict[str, int]] = {}
+        self.files_by_area: Dict[str, Dict[str, int]] = {}
+        self.oldest_file: Optional[Dict[str, Any]] = None
+        self.newest_file: Optional[Dict[str, Any]] = None
+        self.largest_file: Optional[Dict[str, Any]] = None
+
+    def _relative(self, path: PathLike) -> Optional[str]:
+        full_path = os.path.abspath(path)
+        if not full_path.startswith(self._root_prefix):
+            return None
+        return full_path[len(self._root_prefix):].replace(os.sep, "/")
+
+    def _apply(self, relative: str, size_delta: int, count_delta: int) -> None:
+        self.total_files += count_delta
+        self.total_size += size_delta
+        extension = os.path.splitext(relative)[1].lower()
+        area = relative.split("/", 1)[0] if "/" in relative else ""
+        for table, key in ((self.files_by_type, extension), (self.files_by_area, area)):
+            bucket = table.setdefault(key, {"count": 0, "size": 0})
+            bucket["count"] += count_delta
+            bucket["size"] += size_delta
+            if bucket["count"] <= 0:
+                del table[key]
+
+    def _track_extremes(self, relative: str, size: int, mtime: float) -> None:
+        if self.newest_file is None or mtime >= self.newest_file["mtime"]:
+            self.newest_file = {"path": relative, "mtime": mtime}
+        if self.oldest_file is None or mtime < self.oldest_file["mtime"]:
+            self.oldest_file = {"path": relative, "mtime": mtime}
+        if self.largest_file is None or size > self.largest_file["size"]:
+            self.largest_file = {"path": relative, "size": size}
+
+    def record_write(self, path: PathLike, size: int, replaced_size: Optional[int] = None, mtime: Optional[float] = None) -> None:
+        """Count a file written at ``path``; ``replaced_size`` is the size of a file it overwrote"""
+        relative = self._relative(path)
+        if relative is None:
+            return
+
+        if replaced_size is None:
+            self._apply(relative, size, 1)
+        else:
+            self._apply(relative, size - replaced_size, 0)
+        self._track_extremes(relative, size, mtime if mtime is not None else time.time())
+        self.metrics["writes_recorded"] += 1
+
+    def record_delete(self, path: PathLike, size: int) -> None:
+        """Count a file removed from ``path``"""
+        relative = self._relative(path)
+        if relative is None:
+            return
+
+        self._apply(relative, -size, -1)
+        # Runners-up aren't tracked; these stay unknown until the next reconcile
+        for name in ("oldest_file", "newest_file", "largest_file"):
+            extreme = getattr(self, name)
+            if extreme is not None and extreme["path"] == relative:
+                setattr(self, name, None)
+        self.metrics["deletes_recorded"] += 1
+
+    async def reconcile(self, batch_size: int = WALK_BATCH_SIZE) -> Dict[str, int]:
+        """Recount the tree with a batched walk and replace the running totals"""
+        started_at = time.perf_counter()
+        previous_files, previous_size = self.total_files, self.total_size
+
+        fresh = StorageStats(self.root)
+        async for batch in walk(self.root, batch_size):
+            for entry in batch:
+                relative = fresh._relative(entry.path)
+                fresh._apply(relative, entry.size, 1)
+                fresh._track_extremes(relative, entry.size, entry.mtime)
+
+        self.total_files, self.total_size = fresh.total_files, fresh.total_size
+        self.files_by_type, self.files_by_area = fresh.files_by_type, fresh.files_by_area
+        self.oldest_file, self.newest_file, self.largest_file = fresh.oldest_file, fresh.newest_file, fresh.largest_file
+
+        drift = {"files": self.total_files - previous_files, "bytes": self.total_size - previous_size}
+        self.metrics["reconciles"] += 1
+        self.metrics["last_reconciled_at"] = datetime.utcnow().isoformat()
+        self.metrics["last_reconcile_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+        self.metrics["last_drift_files"] = drift["files"]
+        self.metrics["last_drift_bytes"] = drift["bytes"]
+        return drift
+
+    def get_stats(self) -> Dict[str, Any]:
+        def file_time(extreme: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+            if extreme is None:
+                return None
+            return {"path": extreme["path"], "modified": datetime.fromtimestamp(extreme["mtime"]).isoformat()}
+
+        return {
+            "total_files": self.total_files,
+            "total_size": self.total_size,
+            "files_by_type": {key: dict(value) for key, value in self.files_by_type.items()},
+            "files_by_area": {key: dict(value) for key, value in self.files_by_area.items()},
+            "oldest_file": file_time(self.oldest_file),
+            "newest_file": file_time(self.newest_file),
+            "largest_file": dict(self.largest_file) if self.largest_file else None,
+            **self.metrics
+        }
+
+# Totals for the upload directory
+storage_stats = StorageStats("uploads")
+
+async def run(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking filesystem call on a worker thread"""
+    file_io_metrics["calls"] += 1
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+def _size_or_none(path: PathLike) -> Optional[int]:
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return None
+
+async def stat(path: PathLike) -> Optional[os.stat_result]:
+    """``os.stat``, or None when the file doesn't exist"""
+    def _stat() -> Optional[os.stat_result]:
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    return await run(_stat)
+
+async def exists(path: PathLike) -> bool:
+    return await run(os.path.exists, path)
+
+async def mkdir(path: PathLike) -> None:
+    await run(os.makedirs, path, exist_ok=True)
+
+async def read_bytes(path: PathLike) -> bytes:
+    return await run(Path(path).read_bytes)
+
+async def write_bytes(path: PathLike, data: bytes) -> int:
+    """Write a file atomically (temp file, then rename), creating its directory"""
+    path = Path(path)
+
+    def _write() -> Optional[int]:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        replaced_size = _size_or_none(path)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        return replaced_size
+
+    replaced_size = await run(_write)
+    storage_stats.record_write(path, len(data), replaced_size)
+    return len(data)
+
+async def write_text(path: PathLike, text: str, encoding: str = "utf-8") -> int:
+    return await write_bytes(path, text.encode(encoding))
+
+async def replace(source: PathLike, destination: PathLike) -> int:
+    """Move a file into place, overwriting; copies when crossing filesystems"""
+    source, destination = Path(source), Path(destination)
+
+    def _replace() -> Tuple[int, Optional[int]]:
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        size = os.stat(source).st_size
+        replaced_size = _size_or_none(destination)
+        try:
+            os.replace(source, destination)
+        except OSError:
+            # Different filesystem: copy beside the destination, then swap it in
+            temp_path = destination.with_name(f"{destination.name}.{uuid.uuid4().hex[:8]}.tmp")
+            try:
+                shutil.copyfile(source, temp_path)
+                os.replace(temp_path, destination)
+            finally:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+            os.unlink(source)
+        return size, replaced_size
+
+    size, replaced_size = await run(_replace)
+    storage_stats.record_delete(source, size)
+    storage_stats.record_write(destination, size, replaced_size)
+    return size
+
+async def copy(source: PathLike, destination: PathLike) -> int:
+    """Copy a file with its metadata, creating the destination directory"""
+    destination = Path(destination)
+
+    def _copy() -> Tuple[int, Optional[int]]:
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        replaced_size = _size_or_none(destination)
+        shutil.copy2(source, destination)
+        return os.stat(destination).st_size, replaced_size
+
+    size, replaced_size = await run(_copy)
+    storage_stats.record_write(destination, size, replaced_size)
+    return size
+
+async def unlink(path: PathLike) -> Optional[int]:
+    """Delete a file; returns the bytes freed, or None if it didn't exist"""
+    def _unlink() -> Optional[int]:
+        try:
+            size = os.stat(path).st_size
+            os.unlink(path)
+            return size
+        except FileNotFoundError:
+            return None
+
+    size = await run(_unlink)
+    if size is not None:
+        storage_stats.record_delete(path, size)
+    return size
+
+async def rmtree(path: PathLike) -> Tuple[int, int]:
+    """Delete a directory tree; returns the files and bytes removed"""
+    def _rmtree() -> List[Tuple[str, int]]:
+        removed = []
+        for directory, _, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = os.path.join(directory, filename)
+                size = _size_or_none(file_path)
+                if size is not None:
+                    removed.append((file_path, size))
+        shutil.rmtree(path, ignore_errors=True)
+        return removed
+
+    removed = await run(_rmtree)
+    for file_path, size in removed:
+        storage_stats.record_delete(file_path, size)
+    return len(removed), sum(size for _, size in removed)
+
+class _Walker:
+    """Depth-first ``os.scandir`` walk that can be advanced a batch at a time"""
+
+    def __init__(self, root: str):
+        self._directories = [root]
+        self._entries = None
+
+    def next_batch(self, batch_size: int) -> List[FileEntry]:
+        batch: List[FileEntry] = []
+        while len(batch) < batch_size:
+            if self._entries is None:
+                if not self._directories:
+                    break
+                try:
+                    self._entries = os.scandir(self._directories.pop())
+                except OSError:
+                    continue
+
+            entry = next(self._entries, None)
+            if entry is None:
+                self.close()
+                continue
+
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    self._directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    batch.append(FileEntry(Path(entry.path), entry_stat.st_size, entry_stat.st_mtime))
+            except OSError:
+                # Removed while walking
+                continue
+        return batch
+
+    def close(self) -> None:
+        if self._entries is not None:
+            self._entries.close()
+            self._entries = None
+
+async def walk(root: PathLike, batch_size: int = WALK_BATCH_SIZE) -> AsyncIterator[List[FileEntry]]:
+    """Yield the files under ``root`` (with size and mtime) in batches"""
+    walker = _Walker(str(root))
+    try:
+        while True:
+            batch = await run(walker.next_batch, batch_size)
+            if not batch:
+                return
+            file_io_metrics["walk_batches"] += 1
+            file_io_metrics["walk_entries"] += len(batch)
+            yield batch
+    finally:
+        walker.close()
+
+def get_file_io_stats() -> Dict[str, Any]:
+    """Get thread-offloaded call counts and upload storage totals"""
+    return {**file_io_metrics, "storage": storage_stats.get_stats()}
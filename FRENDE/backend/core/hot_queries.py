@@ -0,0 +1,157 @@
+"""
+Registry of pre-compiled hot queries
+Builds the most frequently executed statements as SQLAlchemy lambda statements
+so the expression tree and cache key are produced once per call site rather
+than on every call. Parameters are extracted from the closure as bound values.
+"""
+
+import logging
+from collections import defaultdict
+from functools import wraps
+from typing import Callable, Dict, Any
+
+from sqlalchemy import select, func, desc, or_, lambda_stmt
+from sqlalchemy.orm import selectinload
+
+from models.chat import ChatMessage, ChatRoom
+from models.match import Match
+from models.task import Task
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+class HotQueryRegistry:
+    """Named builders for hot statements with per-query usage counts"""
+
+    def __init__(self):
+        self._builders: Dict[str, Callable] = {}
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    def register(self, name: str):
+        """Register a statement builder under a name"""
+        def decorator(builder: Callable) -> Callable:
+            @wraps(builder)
+            def wrapper(*args, **kwargs):
+                self.calls[name] += 1
+                return builder(*args, **kwargs)
+
+            self._builders[name] = wrapper
+            return wrapper
+        return decorator
+
+    def get(self, name: str) -> Callable:
+        return self._builders[name]
+
+    def names(self):
+        return list(self._builders)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: self.calls.get(name, 0) for name in self._builders}
+
+# Global hot query registry
+hot_queries = HotQueryRegistry()
+
+@hot_queries.register("user_by_id")
+def user_by_id(user_id: int):
+    """SELECT a user by primary key"""
+    return lambda_stmt(lambda: select(User).where(User.id == user_id))
+
+@hot_queries.register("user_principal")
+def user_principal(user_id: int):
+    """SELECT only the identity flags of a user (auth principal cache miss)"""
+    return lambda_stmt(
+        lambda: select(User.id, User.is_active, User.is_superuser).where(User.id == user_id)
+    )
+
+@hot_queries.register("match_for_user")
+def match_for_user(match_id: int, user_id: int):
+    """SELECT a match the user belongs to, regardless of status"""
+    return lambda_stmt(
+        lambda: select(Match).where(
+            Match.id == match_id,
+            or_(Match.user1_id == user_id, Match.user2_id == user_id)
+        )
+    )
+
+@hot_queries.register("active_match_for_user")
+def active_match_for_user(match_id: int, user_id: int):
+    """SELECT an active match the user belongs to (socket membership check)"""
+    return lambda_stmt(
+        lambda: select(Match).where(
+            or_(Match.user1_id == user_id, Match.user2_id == user_id),
+            Match.id == match_id,
+            Match.status == "active"
+        )
+    )
+
+@hot_queries.register("chat_history")
+def chat_history(match_id: int, limit: int, offset: int, include_system: bool = False):
+    """SELECT a page of chat messages, newest first, with sender and task loaded"""
+    stmt = lambda_stmt(
+        lambda: select(ChatMessage)
+        .where(ChatMessage.match_id == match_id)
+        .options(selectinload(ChatMessage.sender), selectinload(ChatMessage.task))
+    )
+    if not include_system:
+        stmt += lambda s: s.where(ChatMessage.is_system_message == False)
+    stmt += lambda s: s.order_by(desc(ChatMessage.created_at)).offset(offset).limit(limit)
+    return stmt
+
+@hot_queries.register("chat_message_count")
+def chat_message_count(match_id: int, include_system: bool = True):
+    """SELECT the number of messages in a match"""
+    stmt = lambda_stmt(
+        lambda: select(func.count(ChatMessage.id)).where(ChatMessage.match_id == match_id)
+    )
+    if not include_system:
+        stmt += lambda s: s.where(ChatMessage.is_system_message == False)
+    return stmt
+
+@hot_queries.register("user_match_versions")
+def user_match_versions(user_id: int, limit: int, offset: int, status: str = None):
+    """SELECT the serialised columns of a page of matches, without eager loads (ETag source)"""
+    stmt = lambda_stmt(
+        lambda: select(
+            Match.id, Match.status, Match.compatibility_score,
+            Match.slot_used_by_user1, Match.slot_used_by_user2,
+            Match.coins_earned_user1, Match.coins_earned_user2, Match.chat_room_id,
+            Match.started_at, Match.completed_at, Match.expires_at
+        ).where(or_(Match.user1_id == user_id, Match.user2_id == user_id))
+    )
+    if status:
+        stmt += lambda s: s.where(Match.status == status)
+    stmt += lambda s: s.order_by(desc(Match.created_at)).offset(offset).limit(limit)
+    return stmt
+
+@hot_queries.register("match_task_versions")
+def match_task_versions(match_id: int, user_id: int, now):
+    """
+    SELECT the mutable columns of a match's open tasks the user can see (ETag source)
+
+    ``remaining_time`` isn't stored; clients derive it from ``expires_at``.
+    """
+    return lambda_stmt(
+        lambda: select(
+            Task.id, Task.title, Task.description, Task.is_completed,
+            Task.completed_by_user1, Task.completed_by_user2,
+            Task.completed_at_user1, Task.completed_at_user2, Task.completed_at,
+            Task.progress_percentage, Task.submission_count,
+            Task.validation_submitted, Task.validation_approved,
+            Task.final_coin_reward, Task.expires_at
+        )
+        .join(Match, Match.id == Task.match_id)
+        .where(
+            Task.match_id == match_id,
+            or_(Match.user1_id == user_id, Match.user2_id == user_id),
+            Task.is_completed == False,
+            or_(Task.expires_at > now, Task.expires_at.is_(None))
+        )
+        .order_by(desc(Task.created_at))
+    )
+
+@hot_queries.register("chat_room_version")
+def chat_room_version(match_id: int):
+    """SELECT the activity columns of a match's chat room (ETag source)"""
+    return lambda_stmt(
+        lambda: select(ChatRoom.is_active, ChatRoom.last_activity).where(ChatRoom.match_id == match_id)
+    )
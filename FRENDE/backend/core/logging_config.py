@@ -1,24 +1,46 @@
 """
 Enhanced logging configuration for the Frende backend application.
 Provides structured logging with environment-specific formats and multiple loggers.
+
+Records are handed to a bounded queue on the calling thread and formatted and
+written by a ``QueueListener`` thread, so a slow stdout or disk never blocks
+the event loop. High-volume loggers ("api", "performance") keep only a sample
+of their INFO and DEBUG records; warnings and errors always pass.
 """
 
 import logging
 import logging.handlers
+import queue
 import sys
 import json
+import zlib
 from datetime import datetime
 from typing import Dict, Any, Optional
 from pathlib import Path
 
 from core.config import settings
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Extra record attributes emitted by both formatters
+CONTEXT_FIELDS = ("user_id", "request_id", "client_ip", "response_time", "status_code")
+
+def _dumps(entry: Dict[str, Any]) -> str:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(entry, default=str).decode()
+    return json.dumps(entry, default=str)
+
 class JSONFormatter(logging.Formatter):
     """JSON formatter for structured logging"""
     
     def format(self, record: logging.LogRecord) -> str:
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # The record's creation time, not the time the writer thread got to it
+            "timestamp": datetime.utcfromtimestamp(record.created).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -30,20 +52,15 @@ class JSONFormatter(logging.Formatter):
         # Add exception info if present
         if record.exc_info:
             log_entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_entry["exception"] = record.exc_text
         
         # Add extra fields if present
-        if hasattr(record, "user_id"):
-            log_entry["user_id"] = record.user_id
-        if hasattr(record, "request_id"):
-            log_entry["request_id"] = record.request_id
-        if hasattr(record, "client_ip"):
-            log_entry["client_ip"] = record.client_ip
-        if hasattr(record, "response_time"):
-            log_entry["response_time"] = record.response_time
-        if hasattr(record, "status_code"):
-            log_entry["status_code"] = record.status_code
+        for field in CONTEXT_FIELDS:
+            if hasattr(record, field):
+                log_entry[field] = getattr(record, field)
         
-        return json.dumps(log_entry)
+        return _dumps(log_entry)
 
 class TextFormatter(logging.Formatter):
     """Text formatter for development logging"""
@@ -68,13 +85,98 @@ class TextFormatter(logging.Formatter):
         if hasattr(record, "status_code"):
             extra_info.append(f"status_code={record.status_code}")
         
-        if extra_info:
-            record.msg = f"{record.msg} | {' | '.join(extra_info)}"
+        if not extra_info:
+            return super().format(record)
+        
+        # The same record reaches every handler; don't leave the suffix on it
+        msg = record.msg
+        record.msg = f"{msg} | {' | '.join(extra_info)}"
+        try:
+            return super().format(record)
+        finally:
+            record.msg = msg
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of a logger's INFO and DEBUG records.
+    
+    Records carrying a ``request_id`` are sampled by request, so a request and
+    its response are kept or dropped together; others use a running counter.
+    """
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._threshold = int(rate * 10000)
+        self._counter = 0
+        self.kept = 0
+        self.sampled_out = 0
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Already sampled by log_with_context before the record was built
+        if getattr(record, "sampled", False):
+            return True
+        return self.sample(record.levelno, getattr(record, "request_id", None))
+    
+    def sample(self, level: int, request_id: Optional[Any] = None) -> bool:
+        if level >= logging.WARNING or self.rate >= 1.0:
+            return True
+        
+        if request_id is not None:
+            bucket = zlib.crc32(str(request_id).encode()) % 10000
+        else:
+            self._counter += 1
+            bucket = (self._counter * 7919) % 10000
         
-        return super().format(record)
+        if bucket < self._threshold:
+            self.kept += 1
+            return True
+        self.sampled_out += 1
+        return False
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now (its args may change once we return) but
+        # leave formatting to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """Queue listener whose stop sentinel waits for room rather than raising on a full queue"""
+    
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[DrainingQueueListener] = None
+_sampling_filters: Dict[str, SamplingFilter] = {}
 
 def setup_logging() -> None:
     """Setup comprehensive logging configuration"""
+    global _queue_handler, _listener
+    
+    # Safe to call again: flush and stop the previous writer first
+    shutdown_logging()
     
     # Create logs directory if it doesn't exist
     if settings.LOG_FILE_PATH:
@@ -87,17 +189,10 @@ def setup_logging() -> None:
     else:
         formatter = TextFormatter()
     
-    # Configure root logger
-    root_logger = logging.getLogger()
-    root_logger.setLevel(settings.get_log_level())
-    
-    # Clear existing handlers
-    root_logger.handlers.clear()
-    
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # File handler (if configured)
     if settings.LOG_FILE_PATH:
@@ -107,11 +202,41 @@ def setup_logging() -> None:
             backupCount=settings.LOG_ROTATION_COUNT
         )
         file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # The root logger only enqueues; the listener thread formats and writes
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    _listener = DrainingQueueListener(
+        _queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    
+    # Configure root logger
+    root_logger = logging.getLogger()
+    root_logger.setLevel(settings.get_log_level())
+    
+    # Clear existing handlers
+    root_logger.handlers.clear()
+    root_logger.addHandler(_queue_handler)
+    _listener.start()
     
     # Configure specific loggers
     configure_component_loggers(formatter)
 
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background writer"""
+    global _queue_handler, _listener
+    
+    if _listener is not None:
+        # stop() drains the queue before joining the thread
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
 def configure_component_loggers(formatter: logging.Formatter) -> None:
     """Configure loggers for different components"""
     
@@ -138,6 +263,42 @@ def configure_component_loggers(formatter: logging.Formatter) -> None:
     # Error logger
     error_logger = logging.getLogger("error")
     error_logger.setLevel(settings.get_log_level())
+    
+    configure_sampling(settings.get_log_sample_rates())
+
+def configure_sampling(rates: Dict[str, float]) -> None:
+    """Replace the sampling filters on the named loggers"""
+    for name, sampling_filter in _sampling_filters.items():
+        logging.getLogger(name).removeFilter(sampling_filter)
+    _sampling_filters.clear()
+    
+    for name, rate in rates.items():
+        if rate >= 1.0:
+            continue
+        sampling_filter = SamplingFilter(rate)
+        # A logger-level filter runs once per record, before any handler
+        logging.getLogger(name).addFilter(sampling_filter)
+        _sampling_filters[name] = sampling_filter
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Get queue depth, dropped records and per-logger sampling counts"""
+    log_queue = _queue_handler.queue if _queue_handler is not None else None
+    return {
+        "encoder": "orjson" if ORJSON_AVAILABLE else "json",
+        "writer_running": _listener is not None,
+        "queue_size": log_queue.qsize() if log_queue is not None else 0,
+        "queue_capacity": log_queue.maxsize if log_queue is not None else 0,
+        "enqueued": _queue_handler.enqueued if _queue_handler is not None else 0,
+        "dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+        "sampling": {
+            name: {
+                "rate": sampling_filter.rate,
+                "kept": sampling_filter.kept,
+                "sampled_out": sampling_filter.sampled_out
+            }
+            for name, sampling_filter in _sampling_filters.items()
+        }
+    }
 
 def get_logger(name: str) -> logging.Logger:
     """Get a logger with the specified name"""
@@ -145,7 +306,17 @@ def get_logger(name: str) -> logging.Logger:
 
 def log_with_context(logger: logging.Logger, level: int, message: str, **context: Any) -> None:
     """Log a message with additional context"""
+    # Skip building the record when the level is off or the logger samples it out
+    if not logger.isEnabledFor(level):
+        return
+    
     extra = {}
+    sampling_filter = _sampling_filters.get(logger.name)
+    if sampling_filter is not None:
+        if not sampling_filter.sample(level, context.get("request_id")):
+            return
+        extra["sampled"] = True
+    
     for key, value in context.items():
         if hasattr(logging.LogRecord, key):
             # Use a different attribute name to avoid conflicts
@@ -7,18 +7,40 @@ from starlette.types import ASGIApp
 
 from core.security_middleware import create_security_middleware_stack
 from core.logging_middleware import create_logging_middleware_stack
+from core.compression_middleware import create_compression_middleware
+from core.config import settings
+from core.database_middleware import UnitOfWorkMiddleware, AdmissionControlMiddleware
+from core.rate_limiting import rate_limiter
 
 def create_middleware_stack(app: ASGIApp) -> ASGIApp:
     """
     Create a complete middleware stack with all components.
     
+    Every layer is raw ASGI and shares one RequestContext per request
+    (core.request_context), so no layer spawns tasks or buffers bodies.
+    
     Order of middleware (last applied = first executed):
-    1. Logging middleware (RequestID, UserContext, RequestSize, Performance, Logging)
+    0. Unit of work (one database session per request), behind the optional
+       database admission gate, then compression
+    1. Logging middleware (RequestID, UserContext, Performance, Logging)
     2. Security middleware (SecurityHeaders, RateLimit, RequestSize, SecurityMonitoring, CORSValidation)
     3. CORS middleware (applied separately in main.py)
     """
     
-    # Apply logging middleware first (innermost)
+    # Fold @rate_limit endpoint policies into the rate limiter's route table
+    rate_limiter.bind_routes(getattr(app, "routes", ()))
+    
+    # Share a single database session across the request (innermost)
+    app = UnitOfWorkMiddleware(app)
+    
+    # Queue excess requests before they compete for pool connections
+    if settings.DATABASE_ADMISSION_CONTROL_ENABLED:
+        app = AdmissionControlMiddleware(app)
+    
+    # Compress response bodies
+    app = create_compression_middleware(app)
+    
+    # Apply logging middleware
     app = create_logging_middleware_stack(app)
     
     # Apply security middleware (outermost)
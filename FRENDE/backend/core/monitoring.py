@@ -12,7 +12,7 @@ from fastapi import HTTPException
 from core.config import settings
 from core.logging_config import get_logger
 from core.performance_monitor import get_performance_monitor
-from core.database import get_async_session
+from core.database import session_scope
 from sqlalchemy import text
 
 logger = get_logger("monitoring")
@@ -99,7 +99,7 @@ class SystemMonitor:
             start_time = time.time()
             
             # Test database connection
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 # Simple query to test connectivity
                 result = await session.execute(text("SELECT 1"))
                 result.fetchone()
@@ -0,0 +1,284 @@
+"""
+Database connection pool instrumentation
+Tracks checkout wait, hold time per endpoint, overflow usage and timeouts,
+recommends pool sizes from observed concurrency and provides an optional
+admission gate that queues excess requests instead of timing out in the pool
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request currently using the database, for per-endpoint attribution
+current_request_scope: ContextVar[Optional[dict]] = ContextVar("current_request_scope", default=None)
+
+def _percentile(values, percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(math.ceil(percentile / 100 * len(ordered))) - 1)
+    return ordered[max(index, 0)]
+
+def latency_summary(samples, digits: int = 2) -> Dict[str, float]:
+    """p50, p95 and max of a window of latency samples"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "p50": round(_percentile(ordered, 50), digits),
+        "p95": round(_percentile(ordered, 95), digits),
+        "max": round(ordered[-1], digits)
+    }
+
+def _endpoint_label(scope: Optional[dict]) -> str:
+    """Route name once routing has run, else the raw path"""
+    if not scope:
+        return "background"
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        return getattr(endpoint, "__name__", str(endpoint))
+    return scope.get("path", "unknown")
+
+class PoolStats:
+    """Observed behaviour of a single engine's pool"""
+
+    def __init__(self, name: str, sample_size: int = 2000):
+        self.name = name
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self.wait_ms: deque = deque(maxlen=sample_size)
+        self.hold_ms: deque = deque(maxlen=sample_size)
+        self.concurrency: deque = deque(maxlen=sample_size)
+        self.hold_ms_by_endpoint: Dict[str, deque] = defaultdict(lambda: deque(maxlen=200))
+
+class PoolMonitor:
+    """Collects pool metrics from SQLAlchemy pool events"""
+
+    def __init__(self):
+        self.pools: Dict[str, PoolStats] = {}
+        self.engines: Dict[str, Any] = {}
+
+    def instrument(self, engine, name: str) -> None:
+        """Attach checkout/checkin listeners to an engine's pool"""
+        pool = engine.sync_engine.pool
+        stats = self.pools.setdefault(name, PoolStats(name))
+        self.engines[name] = engine
+        pool._frende_pool_name = name
+
+        @event.listens_for(engine.sync_engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            stats.checkouts += 1
+            stats.checked_out += 1
+            stats.peak_checked_out = max(stats.peak_checked_out, stats.checked_out)
+            stats.concurrency.append(stats.checked_out)
+
+            overflow = getattr(engine.sync_engine.pool, "overflow", None)
+            if callable(overflow) and overflow() > 0:
+                stats.overflow_checkouts += 1
+                stats.peak_overflow = max(stats.peak_overflow, overflow())
+
+            connection_record.info["checkout_at"] = time.perf_counter()
+            connection_record.info["checkout_scope"] = current_request_scope.get()
+
+        @event.listens_for(engine.sync_engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            checkout_at = connection_record.info.pop("checkout_at", None)
+            scope = connection_record.info.pop("checkout_scope", None)
+            if checkout_at is None:
+                return
+
+            stats.checked_out = max(stats.checked_out - 1, 0)
+            hold_ms = (time.perf_counter() - checkout_at) * 1000
+            stats.hold_ms.append(hold_ms)
+            stats.hold_ms_by_endpoint[_endpoint_label(scope)].append(hold_ms)
+
+    def record_wait(self, name: str, wait_ms: float, timed_out: bool = False) -> None:
+        """Record time spent waiting for a pooled connection"""
+        stats = self.pools.setdefault(name, PoolStats(name))
+        stats.wait_ms.append(wait_ms)
+        if timed_out:
+            stats.timeouts += 1
+            logger.warning(f"Database pool '{name}' checkout timed out after {wait_ms:.0f}ms")
+
+    def get_pool_status(self, name: str = "primary") -> Dict[str, int]:
+        """Current pool counters in the shape used by the Prometheus exporter"""
+        engine = self.engines.get(name)
+        if engine is None:
+            return {}
+        pool = engine.sync_engine.pool
+        status = {}
+        for key, method in (("checked_in", "checkedin"), ("checked_out", "checkedout"), ("overflow", "overflow"), ("size", "size")):
+            value = getattr(pool, method, None)
+            if callable(value):
+                status[key] = value()
+        status["timeouts"] = self.pools[name].timeouts if name in self.pools else 0
+        return status
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Summary of wait, hold, overflow and timeout behaviour per pool"""
+        summary = {}
+        for name, stats in self.pools.items():
+            summary[name] = {
+                "checkouts": stats.checkouts,
+                "checked_out": stats.checked_out,
+                "peak_checked_out": stats.peak_checked_out,
+                "overflow_checkouts": stats.overflow_checkouts,
+                "peak_overflow": stats.peak_overflow,
+                "timeouts": stats.timeouts,
+                "wait_ms": latency_summary(stats.wait_ms),
+                "hold_ms": latency_summary(stats.hold_ms),
+                "hold_ms_by_endpoint": {
+                    endpoint: {"count": len(samples), **latency_summary(samples)}
+                    for endpoint, samples in stats.hold_ms_by_endpoint.items()
+                }
+            }
+        return summary
+
+    def recommend_pool_size(self, name: str = "primary") -> Dict[str, Any]:
+        """
+        Recommend pool_size/max_overflow from observed concurrency.
+
+        pool_size covers p95 concurrency with 20% headroom; overflow absorbs
+        the gap up to the observed peak. Timeouts raise pool_size and sustained
+        checkout waits raise max_overflow.
+        """
+        stats = self.pools.get(name)
+        if not stats or len(stats.concurrency) < 50:
+            return {"pool": name, "recommendation": "insufficient_data"}
+
+        p95_concurrency = _percentile(stats.concurrency, 95)
+        pool_size = max(2, math.ceil(p95_concurrency * 1.2))
+        max_overflow = max(2, math.ceil(stats.peak_checked_out * 1.2) - pool_size)
+
+        reasons = []
+        if stats.timeouts:
+            pool_size += math.ceil(pool_size * 0.25)
+            reasons.append(f"{stats.timeouts} checkout timeout(s) observed")
+        if _percentile(stats.wait_ms, 95) > 50:
+            max_overflow += math.ceil(max_overflow * 0.5)
+            reasons.append("p95 checkout wait above 50ms")
+        if not reasons:
+            reasons.append("sized from observed p95/peak concurrency")
+
+        return {
+            "pool": name,
+            "current": {
+                "pool_size": settings.DATABASE_POOL_SIZE,
+                "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+                "pool_timeout": settings.DATABASE_POOL_TIMEOUT
+            },
+            "recommended": {
+                "pool_size": pool_size,
+                "max_overflow": max_overflow
+            },
+            "observed": {
+                "p95_concurrency": p95_concurrency,
+                "peak_concurrency": stats.peak_checked_out,
+                "samples": len(stats.concurrency)
+            },
+            "reasons": reasons
+        }
+
+# Global pool monitor instance
+pool_monitor = PoolMonitor()
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports checkout wait time and timeouts"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        name = getattr(self, "_frende_pool_name", "primary")
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_monitor.record_wait(name, (time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        pool_monitor.record_wait(name, (time.perf_counter() - start) * 1000)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._frende_pool_name = getattr(self, "_frende_pool_name", "primary")
+        return pool
+
+class AdmissionGate:
+    """Bounded concurrency for database-bound work with a wait queue"""
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.active = 0
+        self.metrics = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; False when the queue is full or the wait times out"""
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.metrics["rejected_queue_full"] += 1
+                return False
+            self.metrics["queued"] += 1
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.metrics["rejected_timeout"] += 1
+            return False
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.metrics["admitted"] += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def release_when_done(self, future: Future) -> None:
+        """Release the slot once an executor future finishes, even if its caller was cancelled"""
+        loop = asyncio.get_running_loop()
+
+        def done(_):
+            try:
+                loop.call_soon_threadsafe(self.release)
+            except RuntimeError:
+                pass  # the loop has closed, so has the semaphore
+
+        future.add_done_callback(done)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "active": self.active,
+            "waiting": self.waiting,
+            **self.metrics
+        }
+
+admission_gate = AdmissionGate(
+    limit=settings.DATABASE_ADMISSION_LIMIT or (settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW),
+    max_queue=settings.DATABASE_ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.DATABASE_ADMISSION_QUEUE_TIMEOUT
+)
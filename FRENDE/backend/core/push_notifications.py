@@ -20,7 +20,7 @@ from sqlalchemy.orm import selectinload
 from models.user import User
 from models.push_subscription import PushSubscription
 from core.config import settings
-from core.database import get_async_session
+from core.database import session_scope
 
 logger = logging.getLogger(__name__)
 
@@ -195,7 +195,7 @@ class PushNotificationService:
     ) -> bool:
         """Save push notification subscription for a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._save_subscription_internal(user_id, subscription_data, session)
         
         return await self._save_subscription_internal(user_id, subscription_data, session)
@@ -251,7 +251,7 @@ class PushNotificationService:
     ) -> bool:
         """Remove push notification subscription for a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._remove_subscription_internal(user_id, endpoint, session)
         
         return await self._remove_subscription_internal(user_id, endpoint, session)
@@ -287,7 +287,7 @@ class PushNotificationService:
     ) -> List[PushSubscription]:
         """Get all push notification subscriptions for a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_user_subscriptions_internal(user_id, session)
         
         return await self._get_user_subscriptions_internal(user_id, session)
@@ -317,7 +317,7 @@ class PushNotificationService:
     ) -> bool:
         """Send push notification to a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_notification_internal(user_id, notification_type, custom_data, session)
         
         return await self._send_notification_internal(user_id, notification_type, custom_data, session)
@@ -379,7 +379,7 @@ class PushNotificationService:
     ) -> Dict[str, int]:
         """Send push notification to multiple users"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_bulk_notification_internal(user_ids, notification_type, custom_data, session)
         
         return await self._send_bulk_notification_internal(user_ids, notification_type, custom_data, session)
@@ -503,7 +503,7 @@ class PushNotificationService:
     ) -> int:
         """Clean up expired push notification subscriptions"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._cleanup_expired_subscriptions_internal(session)
         
         return await self._cleanup_expired_subscriptions_internal(session)
@@ -544,7 +544,7 @@ class PushNotificationService:
     ) -> Dict[str, Any]:
         """Get push notification subscription statistics"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_subscription_stats_internal(session)
         
         return await self._get_subscription_stats_internal(session)
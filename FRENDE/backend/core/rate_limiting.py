@@ -6,162 +6,318 @@ Provides distributed rate limiting with Redis, multiple algorithms, and granular
 import time
 import asyncio
 import logging
-from typing import Dict, Any, Optional, Tuple, Union
+import math
+import re
+import uuid
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 import json
 import hashlib
 
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
 
 from core.config import settings
 from core.exceptions import RateLimitError
+from core.pool_monitor import latency_summary
+from core.request_context import resolve_client_ip
 
 logger = logging.getLogger(__name__)
 
+# Lua scripts run atomically on the Redis server, one EVALSHA round-trip per check.
+# Every script reads the clock with TIME so app servers never disagree on windows,
+# and returns {allowed, remaining, reset_ms, retry_after_ms}.
+
+FIXED_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+if count >= limit then
+    local ttl = redis.call('PTTL', KEYS[1])
+    if ttl < 0 then ttl = window_ms end
+    return {0, 0, now + ttl, ttl}
+end
+
+count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], window_ms)
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl < 0 then ttl = window_ms end
+return {1, limit - count, now + ttl, 0}
+"""
+
+SLIDING_WINDOW_COUNTER_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local index = math.floor(now / window_ms)
+
+local state = redis.call('HMGET', KEYS[1], 'window', 'current', 'previous')
+local window = tonumber(state[1])
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if window ~= index then
+    if window == index - 1 then previous = current else previous = 0 end
+    current = 0
+end
+
+local reset = (index + 1) * window_ms
+local elapsed = (now - index * window_ms) / window_ms
+local weighted = previous * (1 - elapsed) + current
+
+if weighted + 1 > limit then
+    local retry = reset - now
+    if previous > 0 and current + 1 <= limit then
+        retry = math.min(retry, math.ceil((weighted + 1 - limit) / previous * window_ms))
+    end
+    redis.call('HSET', KEYS[1], 'window', index, 'current', current, 'previous', previous)
+    redis.call('PEXPIRE', KEYS[1], window_ms * 2)
+    return {0, 0, now + retry, retry}
+end
+
+current = current + 1
+redis.call('HSET', KEYS[1], 'window', index, 'current', current, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], window_ms * 2)
+return {1, math.floor(limit - weighted - 1), reset, 0}
+"""
+
+SLIDING_WINDOW_LOG_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window_ms)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    local reset = now + window_ms
+    if oldest[2] then reset = tonumber(oldest[2]) + window_ms end
+    return {0, 0, reset, reset - now}
+end
+
+redis.call('ZADD', KEYS[1], now, now .. '-' .. member)
+redis.call('PEXPIRE', KEYS[1], window_ms)
+return {1, limit - count - 1, now + window_ms, 0}
+"""
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_per_ms = tonumber(ARGV[2])
+local window_ms = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'last_refill')
+local tokens = tonumber(state[1])
+local last_refill = tonumber(state[2])
+if tokens == nil or last_refill == nil then
+    tokens = capacity
+    last_refill = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - last_refill) * refill_per_ms)
+
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) / refill_per_ms)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'last_refill', now)
+redis.call('PEXPIRE', KEYS[1], window_ms * 2)
+if allowed == 1 then
+    return {1, math.floor(tokens), now + window_ms, 0}
+end
+return {0, 0, now + retry, retry}
+"""
+
+class RateLimitScript:
+    """Lua script executed by SHA; loaded into Redis on first NOSCRIPT"""
+    
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+    
+    async def __call__(self, redis_client: redis.Redis, keys: List[str], args: List[Any]):
+        try:
+            return await redis_client.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await redis_client.script_load(self.source)
+            return await redis_client.evalsha(self.sha, len(keys), *keys, *args)
+
 class RateLimitAlgorithm:
     """Base class for rate limiting algorithms"""
     
+    script: RateLimitScript = None
+    
     def __init__(self, max_requests: int, window_seconds: int):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
     
+    def _script_args(self) -> List[Any]:
+        return [self.max_requests, self.window_seconds * 1000]
+    
     async def is_allowed(self, key: str, redis_client: redis.Redis) -> Tuple[bool, Dict[str, Any]]:
         """Check if request is allowed and return rate limit info"""
-        raise NotImplementedError
+        return self.parse(await self.script(redis_client, [key], self._script_args()))
+    
+    def queue(self, pipe, key: str) -> None:
+        """Queue this check on a pipeline so several policies share one round-trip"""
+        pipe.evalsha(self.script.sha, 1, key, *self._script_args())
+    
+    def parse(self, result) -> Tuple[bool, Dict[str, Any]]:
+        """Convert a script result into ``(is_allowed, rate_info)``"""
+        allowed, remaining, reset_ms, retry_after_ms = result
+        return bool(allowed), {
+            "limit": self.max_requests,
+            "remaining": max(0, int(remaining)),
+            "reset": math.ceil(int(reset_ms) / 1000),
+            "retry_after": math.ceil(int(retry_after_ms) / 1000)
+        }
 
 class FixedWindowRateLimiter(RateLimitAlgorithm):
     """Fixed window rate limiter with Redis"""
     
-    async def is_allowed(self, key: str, redis_client: redis.Redis) -> Tuple[bool, Dict[str, Any]]:
-        current_window = int(time.time() // self.window_seconds)
-        window_key = f"{key}:{current_window}"
-        
-        # Get current count
-        current_count = await redis_client.get(window_key)
-        current_count = int(current_count) if current_count else 0
-        
-        # Check if limit exceeded
-        if current_count >= self.max_requests:
-            reset_time = (current_window + 1) * self.window_seconds
-            return False, {
-                "limit": self.max_requests,
-                "remaining": 0,
-                "reset": reset_time,
-                "retry_after": max(0, reset_time - int(time.time()))
-            }
-        
-        # Increment counter
-        pipe = redis_client.pipeline()
-        pipe.incr(window_key)
-        pipe.expire(window_key, self.window_seconds)
-        await pipe.execute()
-        
-        return True, {
-            "limit": self.max_requests,
-            "remaining": self.max_requests - current_count - 1,
-            "reset": (current_window + 1) * self.window_seconds,
-            "retry_after": 0
-        }
+    script = RateLimitScript(FIXED_WINDOW_SCRIPT)
 
 class SlidingWindowRateLimiter(RateLimitAlgorithm):
-    """Sliding window rate limiter with Redis"""
+    """
+    Sliding window rate limiter with Redis.
     
-    async def is_allowed(self, key: str, redis_client: redis.Redis) -> Tuple[bool, Dict[str, Any]]:
-        now = int(time.time())
-        window_start = now - self.window_seconds
-        
-        # Get all requests in current window
-        pipe = redis_client.pipeline()
-        pipe.zremrangebyscore(key, 0, window_start)
-        pipe.zcard(key)
-        pipe.zadd(key, {str(now): now})
-        pipe.expire(key, self.window_seconds)
-        results = await pipe.execute()
-        
-        current_count = results[1]
-        
-        if current_count >= self.max_requests:
-            # Get oldest request to calculate reset time
-            oldest = await redis_client.zrange(key, 0, 0, withscores=True)
-            if oldest:
-                reset_time = int(oldest[0][1]) + self.window_seconds
-            else:
-                reset_time = now + self.window_seconds
-            
-            return False, {
-                "limit": self.max_requests,
-                "remaining": 0,
-                "reset": reset_time,
-                "retry_after": max(0, reset_time - now)
-            }
-        
-        return True, {
-            "limit": self.max_requests,
-            "remaining": self.max_requests - current_count,
-            "reset": now + self.window_seconds,
-            "retry_after": 0
-        }
+    Approximates the window from the current and previous fixed-window counts,
+    weighting the previous one by how much of it still overlaps the window,
+    so each key needs O(1) memory regardless of the limit.
+    """
+    
+    script = RateLimitScript(SLIDING_WINDOW_COUNTER_SCRIPT)
+
+class SlidingWindowLogRateLimiter(RateLimitAlgorithm):
+    """Exact sliding window rate limiter keeping one sorted-set member per request"""
+    
+    script = RateLimitScript(SLIDING_WINDOW_LOG_SCRIPT)
+    
+    def _script_args(self) -> List[Any]:
+        return [self.max_requests, self.window_seconds * 1000, uuid.uuid4().hex]
 
 class TokenBucketRateLimiter(RateLimitAlgorithm):
     """Token bucket rate limiter with burst protection"""
     
+    script = RateLimitScript(TOKEN_BUCKET_SCRIPT)
+    
     def __init__(self, max_requests: int, window_seconds: int, burst_limit: int = None):
         super().__init__(max_requests, window_seconds)
         self.burst_limit = burst_limit or max_requests
         self.refill_rate = max_requests / window_seconds
     
-    async def is_allowed(self, key: str, redis_client: redis.Redis) -> Tuple[bool, Dict[str, Any]]:
-        now = time.time()
-        
-        # Get current bucket state
-        bucket_data = await redis_client.hgetall(key)
+    def _script_args(self) -> List[Any]:
+        return [self.burst_limit, self.refill_rate / 1000, self.window_seconds * 1000]
+
+class GCRARateLimiter:
+    """
+    In-process rate limiter using the generic cell rate algorithm.
+    
+    Each key stores a single float, its theoretical arrival time (TAT). A
+    request is allowed while TAT - now stays within the burst tolerance, so a
+    check is O(1) regardless of the limit. A key whose TAT has passed carries
+    no state and can be dropped; the sweeper removes those, and the table is
+    additionally capped with LRU eviction.
+    """
+    
+    def __init__(self, max_keys: int = 100000, sweep_interval: float = 60):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.metrics = {"evicted_lru": 0, "evicted_idle": 0, "sweeps": 0}
+    
+    def __len__(self) -> int:
+        return len(self._tat)
+    
+    def check(self, key: str, limit: int, window_seconds: float, burst: int = None) -> Tuple[bool, Dict[str, Any]]:
+        """Check and record one request for ``key``"""
+        self._ensure_sweeper()
         
-        if not bucket_data:
-            # Initialize bucket
-            tokens = self.burst_limit
-            last_refill = now
-        else:
-            tokens = float(bucket_data.get(b'tokens', self.burst_limit))
-            last_refill = float(bucket_data.get(b'last_refill', now))
+        now = time.time()
+        burst = burst or limit
+        interval = window_seconds / limit
+        tolerance = interval * burst
         
-        # Calculate tokens to refill
-        time_passed = now - last_refill
-        tokens_to_add = time_passed * self.refill_rate
-        tokens = min(self.burst_limit, tokens + tokens_to_add)
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + interval
+        allow_at = new_tat - tolerance
         
-        # Check if we have enough tokens
-        if tokens < 1:
-            # Calculate when next token will be available
-            tokens_needed = 1 - tokens
-            time_to_next = tokens_needed / self.refill_rate
-            reset_time = int(now + time_to_next)
-            
+        if now < allow_at:
+            retry_after = allow_at - now
             return False, {
-                "limit": self.max_requests,
+                "limit": limit,
                 "remaining": 0,
-                "reset": reset_time,
-                "retry_after": max(0, int(time_to_next))
+                "reset": math.ceil(tat),
+                "retry_after": math.ceil(retry_after)
             }
         
-        # Consume token
-        tokens -= 1
-        
-        # Update bucket state
-        pipe = redis_client.pipeline()
-        pipe.hset(key, "tokens", tokens)
-        pipe.hset(key, "last_refill", now)
-        pipe.expire(key, self.window_seconds * 2)  # Keep bucket data longer
-        await pipe.execute()
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        if len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+            self.metrics["evicted_lru"] += 1
         
         return True, {
-            "limit": self.max_requests,
-            "remaining": int(tokens),
-            "reset": int(now + self.window_seconds),
+            "limit": limit,
+            "remaining": max(0, int((tolerance - (new_tat - now)) / interval)),
+            "reset": math.ceil(new_tat),
             "retry_after": 0
         }
+    
+    def sweep(self) -> int:
+        """Drop keys whose TAT has passed; they are indistinguishable from new keys"""
+        now = time.time()
+        idle = [key for key, tat in self._tat.items() if tat <= now]
+        for key in idle:
+            del self._tat[key]
+        self.metrics["evicted_idle"] += len(idle)
+        self.metrics["sweeps"] += 1
+        return len(idle)
+    
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping rate limit keys: {e}")
+    
+    def _ensure_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            try:
+                self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+            except RuntimeError:
+                # No running loop (sync caller); sweep on the next async check
+                pass
+    
+    async def close(self):
+        """Stop the background sweeper"""
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._tat), "max_keys": self.max_keys, **self.metrics}
 
 class RateLimitScope:
     """Rate limiting scope definitions"""
@@ -172,8 +328,96 @@ class RateLimitScope:
     RESOURCE = "resource"
     GLOBAL = "global"
 
+class RateLimitPolicy:
+    """A single limit applied to a request, resolved from a rate limit config entry"""
+    
+    __slots__ = ("name", "scope", "limit", "window_seconds", "algorithm", "burst_limit")
+    
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        window_seconds: int = 60,
+        algorithm: str = "sliding_window",
+        scope: str = RateLimitScope.IP,
+        burst_limit: Optional[int] = None
+    ):
+        self.name = name
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.algorithm = algorithm
+        self.scope = scope
+        self.burst_limit = burst_limit
+    
+    @classmethod
+    def from_config(cls, name: str, config: Dict[str, Any]) -> "RateLimitPolicy":
+        """Build a policy from a ``requests_per_minute``/``requests_per_hour`` config entry"""
+        if "requests_per_hour" in config:
+            limit, window_seconds = config["requests_per_hour"], 3600
+        elif "connections_per_minute" in config:
+            limit, window_seconds = config["connections_per_minute"], 60
+        else:
+            limit, window_seconds = config.get("requests_per_minute", 100), 60
+        
+        return cls(
+            name,
+            limit,
+            window_seconds,
+            config.get("algorithm", "sliding_window"),
+            config.get("scope", RateLimitScope.IP),
+            config.get("burst_limit")
+        )
+    
+    def __repr__(self) -> str:
+        return f"RateLimitPolicy({self.name!r}, {self.limit}/{self.window_seconds}s, {self.algorithm}, {self.scope})"
+
+class PolicyStats:
+    """Decision counts and latency samples for one policy"""
+    
+    def __init__(self, sample_size: int = 1000):
+        self.checks = 0
+        self.denied = 0
+        self.latency_ms: deque = deque(maxlen=sample_size)
+    
+    def record(self, is_allowed: bool, latency_ms: float) -> None:
+        self.checks += 1
+        if not is_allowed:
+            self.denied += 1
+        self.latency_ms.append(latency_ms)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "checks": self.checks,
+            "denied": self.denied,
+            "latency_ms": latency_summary(self.latency_ms, digits=3)
+        }
+
+# Path prefixes below the API root, matched under both /api and /api/v1.
+# Earlier entries win, so more specific prefixes come first.
+ROUTE_RULES: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = [
+    ("auth.login", ("/auth/login", "/login"), ("auth", "login")),
+    ("auth.register", ("/auth/register", "/register"), ("auth", "register")),
+    ("auth.password_reset", ("/auth/password-reset", "/password-reset"), ("auth", "password_reset")),
+    ("auth.token_refresh", ("/auth/refresh", "/refresh"), ("auth", "token_refresh")),
+    ("api.matching", ("/matching", "/matches", "/match-requests", "/queue"), ("api", "matching")),
+    ("api.chat", ("/chat", "/task-chat"), ("api", "chat")),
+    ("api.tasks", ("/tasks",), ("api", "tasks")),
+    ("api.profile", ("/users/profile", "/users/me"), ("api", "profile")),
+    ("resources.ai", ("/ai", "/conversation-starter", "/automatic-greeting"), ("resources", "ai")),
+    ("resources.upload", ("/upload",), ("resources", "upload")),
+    ("admin", ("/monitoring", "/rate-limiting"), ("admin",)),
+]
+
 class RateLimiter:
-    """Main rate limiter service"""
+    """
+    Main rate limiter service.
+    
+    Every request is checked against all applicable policies in one pass:
+    the per-IP policy, the policy of the route it hits (resolved with a single
+    precompiled regex over method and path), the policies of any ``@rate_limit``
+    decorated endpoint and the optional service-wide global cap. All of them
+    are evaluated in a single batched backend call.
+    """
     
     def __init__(self, redis_url: str = None):
         self.redis_client = None
@@ -186,21 +430,37 @@ class RateLimiter:
             logger.info("Rate limiter initialized with in-memory storage")
         
         # In-memory fallback
-        self.memory_limits = defaultdict(lambda: deque())
+        self.memory_limiter = GCRARateLimiter(
+            max_keys=settings.RATE_LIMIT_MEMORY_MAX_KEYS,
+            sweep_interval=settings.RATE_LIMIT_MEMORY_SWEEP_INTERVAL
+        )
         
         # Algorithm registry
         self.algorithms = {
             "fixed_window": FixedWindowRateLimiter,
             "sliding_window": SlidingWindowRateLimiter,
+            "sliding_window_log": SlidingWindowLogRateLimiter,
             "token_bucket": TokenBucketRateLimiter
         }
         
         # Rate limit configuration
         self.rate_limits = self._load_rate_limit_config()
+        self.ip_policy = RateLimitPolicy.from_config("ip", self.rate_limits["global"])
+        self.default_policy = RateLimitPolicy.from_config("api.default", self.rate_limits["api"]["default"])
+        self.global_policy = (
+            RateLimitPolicy("global", settings.RATE_LIMIT_GLOBAL, 60, "sliding_window", RateLimitScope.GLOBAL)
+            if settings.RATE_LIMIT_GLOBAL > 0 else None
+        )
+        
+        # Decorated endpoints: (methods, path template, policies)
+        self.endpoint_rules: List[Tuple[Tuple[str, ...], str, Tuple[RateLimitPolicy, ...]]] = []
+        self._compile_routes()
         
         # Analytics
         self.violations = defaultdict(int)
         self.total_requests = 0
+        self.policy_stats: Dict[str, PolicyStats] = defaultdict(PolicyStats)
+        self.backend_calls = 0
     
     def _load_rate_limit_config(self) -> Dict[str, Dict[str, Any]]:
         """Load rate limit configuration from settings"""
@@ -212,7 +472,7 @@ class RateLimiter:
             },
             "auth": {
                 "login": {
-                    "requests_per_minute": 5,
+                    "requests_per_minute": settings.RATE_LIMIT_AUTH,
                     "algorithm": "fixed_window",
                     "scope": RateLimitScope.IP
                 },
@@ -268,12 +528,12 @@ class RateLimiter:
                     "scope": RateLimitScope.USER
                 },
                 "upload": {
-                    "requests_per_hour": 10,
+                    "requests_per_hour": settings.RATE_LIMIT_UPLOAD,
                     "algorithm": "fixed_window",
                     "scope": RateLimitScope.USER
                 },
                 "websocket": {
-                    "connections_per_minute": 10,
+                    "connections_per_minute": settings.RATE_LIMIT_WEBSOCKET,
                     "algorithm": "fixed_window",
                     "scope": RateLimitScope.IP
                 }
@@ -285,20 +545,61 @@ class RateLimiter:
             }
         }
     
+    def _compile_routes(self) -> None:
+        """Compile every route rule into one regex matched against "METHOD /path" """
+        entries: List[Tuple[str, Tuple[RateLimitPolicy, ...]]] = []
+        
+        # Decorated endpoints are exact templates and take precedence over prefixes
+        for methods, path, policies in self.endpoint_rules:
+            template = re.sub(r"\\\{[^}]*\\\}", "[^/]+", re.escape(path.rstrip("/")))
+            method_pattern = "|".join(sorted(methods)) if methods else "[A-Z]+"
+            entries.append((f"(?:{method_pattern}) {template}/?$", policies))
+        
+        for name, prefixes, config_path in ROUTE_RULES:
+            config = self.rate_limits
+            for part in config_path:
+                config = config[part]
+            policy = RateLimitPolicy.from_config(name, config)
+            alternatives = "|".join(re.escape(prefix) for prefix in prefixes)
+            entries.append((f"[A-Z]+ /api(?:/v1)?(?:{alternatives})(?:/|$)", (policy,)))
+        
+        websocket = RateLimitPolicy.from_config("resources.websocket", self.rate_limits["resources"]["websocket"])
+        entries.append(("[A-Z]+ /(?:ws|socket\\.io)(?:/|$)", (websocket,)))
+        
+        self._route_regex = re.compile("|".join(
+            f"(?P<r{index}>{pattern})" for index, (pattern, _) in enumerate(entries)
+        ))
+        self._route_policies = {f"r{index}": policies for index, (_, policies) in enumerate(entries)}
+    
+    def bind_routes(self, routes) -> int:
+        """
+        Register the policies of ``@rate_limit`` decorated endpoints so the
+        middleware enforces them in the same pass as the route policies.
+        """
+        self.endpoint_rules = [
+            (tuple(route.methods or ()), route.path, tuple(route.endpoint.rate_limit_policies))
+            for route in routes
+            if hasattr(getattr(route, "endpoint", None), "rate_limit_policies")
+        ]
+        self._compile_routes()
+        return len(self.endpoint_rules)
+    
+    def _match_route(self, method: str, path: str, is_admin: bool = False) -> Tuple[RateLimitPolicy, ...]:
+        """Resolve the route policies for a request with one regex match"""
+        match = self._route_regex.match(f"{method} {path}")
+        if not match:
+            return (self.default_policy,)
+        policies = self._route_policies[match.lastgroup]
+        if policies[0].name == "admin" and not is_admin:
+            return (self.default_policy,)
+        return policies
+    
     def _get_client_ip(self, request: Request) -> str:
-        """Get client IP address with proxy support"""
-        # Check for forwarded headers first
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        # Check for real IP header
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip:
-            return real_ip
-        
-        # Fallback to client host
-        return request.client.host if request.client else "unknown"
+        """Get client IP address, parsed once per request by the middleware stack"""
+        context = getattr(request.state, "context", None)
+        if context is not None:
+            return context.client_ip
+        return resolve_client_ip(request.headers, request.client.host if request.client else None)
     
     def _get_user_id(self, request: Request) -> Optional[str]:
         """Get user ID from request (if authenticated)"""
@@ -312,148 +613,139 @@ class RateLimiter:
             key_parts.append(endpoint)
         return ":".join(key_parts)
     
-    def _get_rate_limit_config(self, request: Request) -> Dict[str, Any]:
-        """Get rate limit configuration for the request"""
-        
-        # Check for custom rate limit configuration (from decorators)
-        if hasattr(request.state, 'custom_rate_limit'):
-            return request.state.custom_rate_limit
-        
-        path = request.url.path
-        method = request.method
-        
-        # Check specific endpoint patterns
-        if path.startswith("/api/v1/auth/login"):
-            return self.rate_limits["auth"]["login"]
-        elif path.startswith("/api/v1/auth/register"):
-            return self.rate_limits["auth"]["register"]
-        elif path.startswith("/api/v1/auth/password-reset"):
-            return self.rate_limits["auth"]["password_reset"]
-        elif path.startswith("/api/v1/auth/refresh"):
-            return self.rate_limits["auth"]["token_refresh"]
-        elif path.startswith("/api/v1/matching"):
-            return self.rate_limits["api"]["matching"]
-        elif path.startswith("/api/v1/chat"):
-            return self.rate_limits["api"]["chat"]
-        elif path.startswith("/api/v1/tasks"):
-            return self.rate_limits["api"]["tasks"]
-        elif path.startswith("/api/v1/users/profile"):
-            return self.rate_limits["api"]["profile"]
-        elif path.startswith("/api/v1/ai"):
-            return self.rate_limits["resources"]["ai"]
-        elif path.startswith("/api/v1/upload"):
-            return self.rate_limits["resources"]["upload"]
-        elif path.startswith("/ws"):
-            return self.rate_limits["resources"]["websocket"]
-        elif path.startswith("/api/v1/monitoring") and self._is_admin(request):
-            return self.rate_limits["admin"]
-        
-        # Default API rate limit
-        return self.rate_limits["api"]["default"]
-    
     def _is_admin(self, request: Request) -> bool:
         """Check if user is admin"""
         user = getattr(request.state, "user", None)
-        return user and getattr(user, "is_superuser", False)
+        return bool(user and getattr(user, "is_superuser", False))
     
-    async def _check_memory_rate_limit(self, key: str, limit: int, window: int) -> Tuple[bool, Dict[str, Any]]:
-        """Check rate limit using in-memory storage"""
-        now = time.time()
-        window_start = now - window
-        
-        # Clean old entries
-        while self.memory_limits[key] and self.memory_limits[key][0] < window_start:
-            self.memory_limits[key].popleft()
-        
-        # Check if limit exceeded
-        if len(self.memory_limits[key]) >= limit:
-            reset_time = int(self.memory_limits[key][0] + window)
-            return False, {
-                "limit": limit,
-                "remaining": 0,
-                "reset": reset_time,
-                "retry_after": max(0, reset_time - int(now))
-            }
-        
-        # Add current request
-        self.memory_limits[key].append(now)
-        
-        return True, {
-            "limit": limit,
-            "remaining": limit - len(self.memory_limits[key]),
-            "reset": int(now + window),
-            "retry_after": 0
-        }
+    def resolve_policies(self, request: Request) -> List[RateLimitPolicy]:
+        """Resolve every policy that applies to the request"""
+        policies = [self.ip_policy]
+        policies.extend(self._match_route(request.method, request.url.path, self._is_admin(request)))
+        if self.global_policy:
+            policies.append(self.global_policy)
+        return policies
     
-    async def check_rate_limit(self, request: Request) -> Tuple[bool, Dict[str, Any]]:
-        """Check if request is allowed based on rate limits"""
-        self.total_requests += 1
-        
-        # Get rate limit configuration
-        config = self._get_rate_limit_config(request)
-        scope = config.get("scope", RateLimitScope.IP)
-        
-        # Get identifier based on scope
-        if scope == RateLimitScope.IP:
-            identifier = self._get_client_ip(request)
-        elif scope == RateLimitScope.USER:
-            user_id = self._get_user_id(request)
-            if not user_id:
-                # Fallback to IP if user not authenticated
-                identifier = self._get_client_ip(request)
+    def _policy_keys(self, request: Request, policies: List[RateLimitPolicy]) -> List[Tuple[RateLimitPolicy, str]]:
+        """Pair each policy with the storage key of the client it limits"""
+        client_ip = self._get_client_ip(request)
+        user_id = self._get_user_id(request)
+        
+        checks = []
+        for policy in policies:
+            if policy.scope == RateLimitScope.GLOBAL:
+                identifier = "global"
+            elif policy.scope == RateLimitScope.IP or not user_id:
+                # User-scoped policies fall back to IP if the user is not authenticated
+                identifier = client_ip
             else:
                 identifier = f"user:{user_id}"
-        else:
-            identifier = "global"
-        
-        # Generate rate limit key
-        key = self._generate_key(scope, identifier, request.url.path)
-        
-        # Get algorithm and parameters
-        algorithm_name = config.get("algorithm", "sliding_window")
-        max_requests = config.get("requests_per_minute", 100)
-        window_seconds = 60  # Default to 1 minute
-        
-        # Handle different time windows
-        if "per_hour" in config:
-            max_requests = config["requests_per_hour"]
-            window_seconds = 3600
-        elif "per_minute" in config:
-            max_requests = config["requests_per_minute"]
-            window_seconds = 60
-        
-        # Check rate limit
-        if self.use_redis and self.redis_client:
-            # Use Redis-based rate limiting
-            algorithm_class = self.algorithms[algorithm_name]
-            algorithm = algorithm_class(max_requests, window_seconds)
+            checks.append((policy, self._generate_key(policy.scope, identifier, policy.name)))
+        return checks
+    
+    async def _check_memory_rate_limit(self, key: str, limit: int, window: int, burst: int = None) -> Tuple[bool, Dict[str, Any]]:
+        """Check rate limit using in-memory storage"""
+        return self.memory_limiter.check(key, limit, window, burst)
+    
+    def _build_algorithm(self, policy: RateLimitPolicy) -> RateLimitAlgorithm:
+        algorithm = self.algorithms[policy.algorithm](policy.limit, policy.window_seconds)
+        if policy.burst_limit and isinstance(algorithm, TokenBucketRateLimiter):
+            algorithm.burst_limit = policy.burst_limit
+        return algorithm
+    
+    async def _evaluate_redis(self, checks: List[Tuple[RateLimitPolicy, str]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        """Evaluate all checks with one pipelined round-trip of EVALSHA calls"""
+        algorithms = [self._build_algorithm(policy) for policy, _ in checks]
+        pending = list(range(len(checks)))
+        results: List[Any] = [None] * len(checks)
+        
+        for attempt in range(2):
+            pipe = self.redis_client.pipeline(transaction=False)
+            for index in pending:
+                algorithms[index].queue(pipe, checks[index][1])
+            self.backend_calls += 1
+            replies = await pipe.execute(raise_on_error=False)
             
-            # Add burst limit for token bucket
-            if algorithm_name == "token_bucket" and "burst_limit" in config:
-                algorithm.burst_limit = config["burst_limit"]
+            missing = []
+            for index, reply in zip(pending, replies):
+                if isinstance(reply, NoScriptError) and attempt == 0:
+                    missing.append(index)
+                elif isinstance(reply, Exception):
+                    raise reply
+                else:
+                    results[index] = reply
+            if not missing:
+                break
             
-            is_allowed, rate_info = await algorithm.is_allowed(key, self.redis_client)
+            # Scripts not cached yet (e.g. after a Redis restart): load and retry only those
+            for script in {algorithms[index].script for index in missing}:
+                await self.redis_client.script_load(script.source)
+            pending = missing
+        
+        return [algorithm.parse(result) for algorithm, result in zip(algorithms, results)]
+    
+    async def evaluate(self, checks: List[Tuple[RateLimitPolicy, str]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        """Evaluate a batch of policy checks and record per-policy decision latency"""
+        if self.use_redis and self.redis_client:
+            start = time.perf_counter()
+            decisions = await self._evaluate_redis(checks)
+            # Policies share the round-trip, so each decision took the batch latency
+            latencies = [(time.perf_counter() - start) * 1000] * len(checks)
         else:
-            # Use in-memory rate limiting
-            is_allowed, rate_info = await self._check_memory_rate_limit(key, max_requests, window_seconds)
+            decisions, latencies = [], []
+            for policy, key in checks:
+                start = time.perf_counter()
+                decisions.append(await self._check_memory_rate_limit(
+                    key, policy.limit, policy.window_seconds, policy.burst_limit
+                ))
+                latencies.append((time.perf_counter() - start) * 1000)
+        
+        for (policy, _), (is_allowed, rate_info), latency_ms in zip(checks, decisions, latencies):
+            rate_info["policy"] = policy.name
+            self.policy_stats[policy.name].record(is_allowed, latency_ms)
+        return decisions
+    
+    async def check_rate_limit(
+        self,
+        request: Request,
+        policies: Optional[List[RateLimitPolicy]] = None
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Check the request against every applicable policy, or only ``policies``
+        when given, and return the deciding policy's rate info: the denying
+        policy with the longest retry, else the one with the fewest remaining.
+        """
+        self.total_requests += 1
         
-        # Track violations
-        if not is_allowed:
+        if policies is None:
+            policies = self.resolve_policies(request)
+        checks = self._policy_keys(request, policies)
+        
+        decisions = await self.evaluate(checks)
+        request.state.rate_limit_policies = {policy.name for policy, _ in checks}
+        
+        denied = [rate_info for is_allowed, rate_info in decisions if not is_allowed]
+        if denied:
+            rate_info = max(denied, key=lambda info: info["retry_after"])
             self.violations[request.url.path] += 1
             logger.warning(
-                f"Rate limit exceeded: {scope}={identifier}, "
+                f"Rate limit exceeded: policy={rate_info['policy']}, "
                 f"path={request.url.path}, limit={rate_info['limit']}"
             )
+            return False, rate_info
         
-        return is_allowed, rate_info
+        return True, min((rate_info for _, rate_info in decisions), key=lambda info: info["remaining"])
     
     async def get_rate_limit_headers(self, rate_info: Dict[str, Any]) -> Dict[str, str]:
         """Generate rate limit headers for response"""
-        return {
+        headers = {
             "X-RateLimit-Limit": str(rate_info["limit"]),
             "X-RateLimit-Remaining": str(rate_info["remaining"]),
             "X-RateLimit-Reset": str(rate_info["reset"])
         }
+        if "policy" in rate_info:
+            headers["X-RateLimit-Policy"] = rate_info["policy"]
+        return headers
     
     async def get_analytics(self) -> Dict[str, Any]:
         """Get rate limiting analytics"""
@@ -464,17 +756,23 @@ class RateLimiter:
             "total_violations": total_violations,
             "violation_rate": total_violations / max(self.total_requests, 1),
             "violations_by_endpoint": dict(self.violations),
+            "policies": {name: stats.to_dict() for name, stats in self.policy_stats.items()},
+            "backend_calls": self.backend_calls,
             "redis_enabled": self.use_redis,
+            "memory_limiter": self.memory_limiter.get_stats(),
             "timestamp": datetime.utcnow().isoformat()
         }
     
     async def reset_analytics(self):
         """Reset analytics counters"""
         self.violations.clear()
+        self.policy_stats.clear()
         self.total_requests = 0
+        self.backend_calls = 0
     
     async def close(self):
         """Close Redis connection"""
+        await self.memory_limiter.close()
         if self.redis_client:
             await self.redis_client.close()
 
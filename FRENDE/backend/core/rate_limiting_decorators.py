@@ -9,7 +9,7 @@ from typing import Callable, Optional, Dict, Any
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.responses import JSONResponse
 
-from core.rate_limiting import rate_limiter, RateLimitScope
+from core.rate_limiting import rate_limiter, RateLimitPolicy, RateLimitScope
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +23,10 @@ def rate_limit(
     """
     Decorator to apply rate limiting to an endpoint.
     
+    The policy is attached to the endpoint; once routes are bound with
+    ``rate_limiter.bind_routes`` the middleware enforces it in the same pass
+    as the other policies, otherwise the wrapper checks it on its own.
+    
     Args:
         requests_per_minute: Maximum requests per minute
         algorithm: Rate limiting algorithm (fixed_window, sliding_window, token_bucket)
@@ -31,6 +35,16 @@ def rate_limit(
         error_message: Custom error message
     """
     def decorator(func: Callable) -> Callable:
+        stacked = getattr(func, "rate_limit_policies", ())
+        policy = RateLimitPolicy(
+            f"endpoint.{func.__module__}.{func.__qualname__}" + (f".{len(stacked)}" if stacked else ""),
+            requests_per_minute,
+            60,
+            algorithm,
+            scope,
+            burst_limit if algorithm == "token_bucket" else None
+        )
+        
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             # Find request object in args or kwargs
@@ -47,22 +61,11 @@ def rate_limit(
                 logger.warning(f"Rate limiting decorator applied to {func.__name__} but no request found")
                 return await func(*args, **kwargs)
             
-            # Create custom rate limit configuration
-            config = {
-                "requests_per_minute": requests_per_minute,
-                "algorithm": algorithm,
-                "scope": scope
-            }
-            
-            if burst_limit and algorithm == "token_bucket":
-                config["burst_limit"] = burst_limit
-            
-            # Override rate limit configuration for this request
-            original_config = rate_limiter._get_rate_limit_config(request)
-            request.state.custom_rate_limit = config
+            # Bound routes are already enforced by the middleware in its single pass
+            if policy.name in getattr(request.state, "rate_limit_policies", ()):
+                return await func(*args, **kwargs)
             
-            # Check rate limit
-            is_allowed, rate_info = await rate_limiter.check_rate_limit(request)
+            is_allowed, rate_info = await rate_limiter.check_rate_limit(request, [policy])
             
             if not is_allowed:
                 retry_after = rate_info.get("retry_after", 60)
@@ -89,12 +92,10 @@ def rate_limit(
                     }
                 )
             
-            # Clear custom rate limit
-            if hasattr(request.state, 'custom_rate_limit'):
-                delattr(request.state, 'custom_rate_limit')
-            
             return await func(*args, **kwargs)
         
+        # Picked up by rate_limiter.bind_routes() so the middleware enforces it
+        wrapper.rate_limit_policies = (*stacked, policy)
         return wrapper
     return decorator
 
@@ -4,85 +4,97 @@ Provides proper error handling, response headers, and analytics integration.
 """
 
 import logging
-from typing import Callable
-from fastapi import Request, Response, HTTPException, status
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from core.config import settings
 from core.rate_limiting import rate_limiter
-from core.exceptions import RateLimitError
+from core.request_context import get_request_context, on_response_start
 
 logger = logging.getLogger(__name__)
+security_logger = logging.getLogger("security")
+
+class RateLimitMiddleware:
+    """
+    The single rate limiting layer: checks every policy for the request in one
+    batched call and attaches the rate limit headers once.
+    """
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Advanced rate limiting middleware with analytics and proper error handling"""
-    
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
-        self.skip_paths = {
+        self.app = app
+        self.skip_paths = (
             "/health",
             "/docs",
-            "/redoc", 
+            "/redoc",
             "/openapi.json",
             "/favicon.ico",
             "/metrics",
             "/api/v1/health"
-        }
-    
+        )
+
     def _should_skip_rate_limit(self, path: str) -> bool:
         """Check if rate limiting should be skipped for this path"""
-        return any(path.startswith(skip_path) for skip_path in self.skip_paths)
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        return path.startswith(self.skip_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Process request with rate limiting"""
-        
+
         # Skip rate limiting for certain paths
-        if self._should_skip_rate_limit(request.url.path):
-            return await call_next(request)
-        
+        if (
+            scope["type"] != "http"
+            or not settings.RATE_LIMITING_ENABLED
+            or self._should_skip_rate_limit(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        context = get_request_context(scope)
+        request = Request(scope, receive)
+
         try:
-            # Check rate limit
+            # One pass over every applicable policy
             is_allowed, rate_info = await rate_limiter.check_rate_limit(request)
-            
-            if not is_allowed:
-                # Rate limit exceeded
-                retry_after = rate_info.get("retry_after", 60)
-                
-                return JSONResponse(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    content={
-                        "error": "Rate limit exceeded",
-                        "message": "Too many requests. Please try again later.",
-                        "details": {
-                            "limit": rate_info["limit"],
-                            "remaining": rate_info["remaining"],
-                            "reset": rate_info["reset"],
-                            "retry_after": retry_after
-                        }
-                    },
-                    headers={
-                        "Retry-After": str(retry_after),
-                        "X-RateLimit-Limit": str(rate_info["limit"]),
-                        "X-RateLimit-Remaining": str(rate_info["remaining"]),
-                        "X-RateLimit-Reset": str(rate_info["reset"])
-                    }
-                )
-            
-            # Process request
-            response = await call_next(request)
-            
-            # Add rate limit headers to response
-            rate_headers = await rate_limiter.get_rate_limit_headers(rate_info)
-            for header, value in rate_headers.items():
-                response.headers[header] = value
-            
-            return response
-            
         except Exception as e:
             logger.error(f"Rate limiting error: {str(e)}")
             # Allow request to proceed if rate limiting fails
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+
+        rate_headers = await rate_limiter.get_rate_limit_headers(rate_info)
+
+        if not is_allowed:
+            # Rate limit exceeded
+            retry_after = rate_info.get("retry_after", 60)
+            security_logger.warning(
+                f"Rate limit exceeded for IP: {context.client_ip}, "
+                f"Path: {context.path}, Policy: {rate_info.get('policy')}"
+            )
+
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={
+                    "error": "Rate limit exceeded",
+                    "message": "Too many requests. Please try again later.",
+                    "details": {
+                        "limit": rate_info["limit"],
+                        "remaining": rate_info["remaining"],
+                        "reset": rate_info["reset"],
+                        "retry_after": retry_after,
+                        "policy": rate_info.get("policy")
+                    }
+                },
+                headers={"Retry-After": str(retry_after), **rate_headers}
+            )
+            await response(scope, receive, send)
+            return
+
+        # Add rate limit headers to response
+        def add_rate_limit_headers(message: Message, headers: MutableHeaders):
+            headers.update(rate_headers)
+
+        await self.app(scope, receive, on_response_start(send, add_rate_limit_headers))
 
 def create_rate_limit_middleware(app: ASGIApp) -> ASGIApp:
     """Create and apply rate limiting middleware"""
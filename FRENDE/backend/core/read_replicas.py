@@ -0,0 +1,215 @@
+"""
+Read replica routing for async database sessions
+Routes read-only work to healthy replicas with a lag-aware fallback to the primary
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+def is_replica_failure(error: BaseException) -> bool:
+    """Whether an error raised during a read says something about the replica itself"""
+    if isinstance(error, (OperationalError, InterfaceError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+# Replication lag in seconds; reports 0 on a primary or a fully caught-up standby
+POSTGRES_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+def get_pool_stats(engine: AsyncEngine) -> Dict[str, Any]:
+    """Get connection pool statistics for an engine"""
+    pool = engine.sync_engine.pool
+    stats = {"pool_class": type(pool).__name__}
+
+    # StaticPool/NullPool don't implement the QueuePool counters
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            try:
+                stats[name] = method()
+            except Exception:
+                pass
+
+    return stats
+
+class ReplicaState:
+    """Health and routing state for a single read replica"""
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag_seconds = 0.0
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.reads_routed = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": round(self.lag_seconds, 3),
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+            "reads_routed": self.reads_routed,
+            "pool": get_pool_stats(self.engine)
+        }
+
+class ReplicaRouter:
+    """Chooses the engine that should serve read-only sessions"""
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: List[AsyncEngine],
+        max_lag_seconds: float = 5.0,
+        check_interval: int = 15,
+        failure_threshold: int = 2
+    ):
+        self.primary = primary
+        self.replicas = [
+            ReplicaState(f"replica_{index}", replica_engine)
+            for index, replica_engine in enumerate(replicas)
+        ]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.failure_threshold = failure_threshold
+
+        self._round_robin = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._health_task: Optional[asyncio.Task] = None
+
+        self.metrics = {
+            "primary_reads": 0,
+            "replica_reads": 0,
+            "fallbacks": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def _is_usable(self, replica: ReplicaState) -> bool:
+        return replica.healthy and replica.lag_seconds <= self.max_lag_seconds
+
+    def get_read_engine(self) -> AsyncEngine:
+        """Return the next usable replica engine, or the primary if none qualifies"""
+        if not self.replicas:
+            self.metrics["primary_reads"] += 1
+            return self.primary
+
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._round_robin)]
+            if self._is_usable(replica):
+                replica.reads_routed += 1
+                self.metrics["replica_reads"] += 1
+                return replica.engine
+
+        self.metrics["fallbacks"] += 1
+        self.metrics["primary_reads"] += 1
+        return self.primary
+
+    def mark_failed(self, engine: AsyncEngine, error: Exception) -> None:
+        """Record a failed read so the replica is skipped until the next health check"""
+        for replica in self.replicas:
+            if replica.engine is engine:
+                replica.consecutive_failures += 1
+                replica.last_error = str(error)
+                if replica.consecutive_failures >= self.failure_threshold:
+                    replica.healthy = False
+                    logger.warning(f"Read replica {replica.name} marked unhealthy: {error}")
+                return
+
+    def mark_succeeded(self, engine: AsyncEngine) -> None:
+        """Record a successful read, clearing the replica's failure streak"""
+        for replica in self.replicas:
+            if replica.engine is engine:
+                replica.consecutive_failures = 0
+                return
+
+    async def check_replica(self, replica: ReplicaState) -> None:
+        """Probe a replica for liveness and replication lag"""
+        try:
+            async with replica.engine.connect() as conn:
+                if replica.engine.dialect.name == "postgresql":
+                    result = await conn.execute(POSTGRES_LAG_QUERY)
+                    replica.lag_seconds = float(result.scalar() or 0)
+                else:
+                    # SQLite and other local engines have no replication stream
+                    await conn.execute(text("SELECT 1"))
+                    replica.lag_seconds = 0.0
+
+            if not replica.healthy:
+                logger.info(f"Read replica {replica.name} is healthy again")
+            replica.healthy = True
+            replica.consecutive_failures = 0
+            replica.last_error = None
+
+            if replica.lag_seconds > self.max_lag_seconds:
+                logger.warning(
+                    f"Read replica {replica.name} lag {replica.lag_seconds:.2f}s exceeds "
+                    f"{self.max_lag_seconds}s; routing reads to primary"
+                )
+        except Exception as e:
+            replica.healthy = False
+            replica.consecutive_failures += 1
+            replica.last_error = str(e)
+            logger.warning(f"Read replica {replica.name} health check failed: {e}")
+        finally:
+            replica.last_checked = time.time()
+
+    async def check_all(self) -> None:
+        """Probe every replica concurrently"""
+        await asyncio.gather(*(self.check_replica(replica) for replica in self.replicas))
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error(f"Error in read replica health loop: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        """Start the background health/lag checker"""
+        if self.replicas and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+            logger.info(f"Read replica routing enabled with {len(self.replicas)} replica(s)")
+
+    async def stop(self) -> None:
+        """Stop the health checker and dispose replica engines"""
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get routing metrics and per-engine pool statistics"""
+        return {
+            "enabled": self.enabled,
+            "max_lag_seconds": self.max_lag_seconds,
+            "metrics": dict(self.metrics),
+            "primary": {"name": "primary", "pool": get_pool_stats(self.primary)},
+            "replicas": [replica.to_dict() for replica in self.replicas]
+        }
@@ -0,0 +1,82 @@
+"""
+Per-request context shared by the ASGI middleware stack.
+Request details (ID, client IP, size, timing) are parsed once and stored in
+the ASGI scope so every middleware layer reads them instead of re-parsing.
+"""
+
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import Message, Scope, Send
+
+# Context of the request being handled, for code without access to the scope
+current_request_context: ContextVar[Optional["RequestContext"]] = ContextVar(
+    "current_request_context", default=None
+)
+
+def resolve_client_ip(headers: Any, client_host: Optional[str]) -> str:
+    """Get client IP address with proxy support"""
+    # Check for forwarded headers first
+    forwarded_for = headers.get("x-forwarded-for")
+    if forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+
+    # Check for real IP header
+    real_ip = headers.get("x-real-ip")
+    if real_ip:
+        return real_ip
+
+    # Fallback to client host
+    return client_host or "unknown"
+
+class RequestContext:
+    """Details of one HTTP request, computed once for the whole middleware stack"""
+
+    __slots__ = (
+        "request_id", "method", "path", "headers", "client_ip",
+        "content_length", "user_id", "start_time", "status_code"
+    )
+
+    def __init__(self, scope: Scope):
+        self.request_id = str(uuid.uuid4())
+        self.method = scope.get("method", "")
+        self.path = scope["path"]
+        self.headers = Headers(scope=scope)
+        client = scope.get("client")
+        self.client_ip = resolve_client_ip(self.headers, client[0] if client else None)
+        self.user_id: Optional[int] = None
+        self.start_time = time.perf_counter()
+        self.status_code: Optional[int] = None
+
+        try:
+            self.content_length = int(self.headers.get("content-length", ""))
+        except ValueError:
+            self.content_length = None
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start_time) * 1000
+
+def get_request_context(scope: Scope) -> RequestContext:
+    """Get the request's context, creating it on first use"""
+    state = scope.setdefault("state", {})
+    context = state.get("context")
+    if context is None:
+        context = RequestContext(scope)
+        state["context"] = context
+        # Exposed to handlers as request.state.request_id
+        state["request_id"] = context.request_id
+        current_request_context.set(context)
+    return context
+
+def on_response_start(send: Send, callback: Callable[[Message, MutableHeaders], None]) -> Send:
+    """Wrap ``send`` to run ``callback`` with the response start message and its headers"""
+    async def wrapped_send(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            callback(message, MutableHeaders(scope=message))
+        await send(message)
+
+    return wrapped_send
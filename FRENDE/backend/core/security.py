@@ -1,13 +1,37 @@
+import asyncio
 import hashlib
+import logging
 import secrets
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from core.config import settings
+from core.exceptions import ServiceBusyError
+from core.pool_monitor import AdmissionGate, latency_summary
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+try:
+    import argon2  # passlib's argon2 backend
+    ARGON2_AVAILABLE = True
+except ImportError:
+    ARGON2_AVAILABLE = False
+
+def _password_schemes() -> list:
+    """Schemes for the password context; the first hashes, the rest only verify"""
+    if settings.PASSWORD_HASH_SCHEME == "argon2":
+        if ARGON2_AVAILABLE:
+            return ["argon2", "bcrypt"]
+        logger.warning("PASSWORD_HASH_SCHEME=argon2 but argon2-cffi is not installed; using bcrypt")
+    return ["bcrypt"]
+
+# Password hashing context; hashes in a non-default scheme are deprecated and
+# replaced on the next successful login
+pwd_context = CryptContext(schemes=_password_schemes(), deprecated="auto")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -17,6 +41,90 @@ def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """
+    Runs password hashing on a dedicated bounded thread pool.
+
+    bcrypt and argon2 release the GIL, so hashing in threads keeps the event
+    loop (and every socket on the worker) responsive during login spikes. An
+    admission gate bounds the queue in front of the pool so a spike is shed
+    with a fast 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int, queue_timeout: float, sample_size: int = 1000):
+        self.workers = max(workers, 1)
+        self.gate = AdmissionGate(limit=self.workers, max_queue=max_queue, queue_timeout=queue_timeout)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.latency_ms = {"hash": deque(maxlen=sample_size), "verify": deque(maxlen=sample_size)}
+        self.wait_ms: deque = deque(maxlen=sample_size)
+        self.metrics = {"hashes": 0, "verifications": 0, "rehashes": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, operation: str, func, *args):
+        queued_at = time.perf_counter()
+        if not await self.gate.acquire():
+            raise ServiceBusyError()
+
+        started_at = time.perf_counter()
+        self.wait_ms.append((started_at - queued_at) * 1000)
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self.gate.release()
+            raise
+        # A cancelled caller doesn't stop a running hash, so the slot is
+        # held until the thread is done
+        self.gate.release_when_done(future)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            self.latency_ms[operation].append((time.perf_counter() - started_at) * 1000)
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        self.metrics["hashes"] += 1
+        return await self._run("hash", pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password off the event loop.
+
+        Returns ``(valid, new_hash)``; ``new_hash`` is set when the stored hash
+        uses a deprecated scheme or settings and should be replaced.
+        """
+        self.metrics["verifications"] += 1
+        valid, new_hash = await self._run("verify", pwd_context.verify_and_update, password, hashed_password)
+        if new_hash:
+            self.metrics["rehashes"] += 1
+        return valid, new_hash
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "scheme": pwd_context.default_scheme(),
+            "workers": self.workers,
+            **self.metrics,
+            "queue": self.gate.get_stats(),
+            "queue_wait_ms": latency_summary(self.wait_ms),
+            "hash_ms": latency_summary(self.latency_ms["hash"]),
+            "verify_ms": latency_summary(self.latency_ms["verify"])
+        }
+
+# Global password hasher
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token."""
     to_encode = data.copy()
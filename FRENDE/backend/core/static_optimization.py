@@ -143,6 +143,51 @@ class OptimizedStaticFiles(StaticFiles):
             logger.error(f"Error getting file size for {file_path}: {str(e)}")
         return None
 
+# How file bodies were handed to the client
+sendfile_metrics = {"accel_redirect": 0, "pathsend": 0, "zerocopysend": 0, "streamed": 0}
+
+class SendfileResponse(FileResponse):
+    """
+    File response that lets the server send the file (sendfile) when it can
+    
+    Behind nginx, ``accel_redirect`` hands the request to an internal
+    location with ``X-Accel-Redirect``. Otherwise the ASGI ``pathsend`` or
+    ``zerocopysend`` extensions are used when the server offers them, and the
+    file is streamed in chunks as a last resort.
+    """
+    
+    chunk_size = 256 * 1024
+    
+    def __init__(self, path: str, accel_redirect: Optional[str] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.accel_redirect = accel_redirect
+    
+    async def __call__(self, scope, receive, send) -> None:
+        extensions = scope.get("extensions") or {}
+        
+        if self.accel_redirect:
+            sendfile_metrics["accel_redirect"] += 1
+            self.headers["X-Accel-Redirect"] = self.accel_redirect
+            self.headers["content-length"] = "0"
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.pathsend" in extensions and not self.send_header_only:
+            sendfile_metrics["pathsend"] += 1
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        elif "http.response.zerocopysend" in extensions and not self.send_header_only:
+            sendfile_metrics["zerocopysend"] += 1
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+                await send({"type": "http.response.zerocopysend", "file": file, "more_body": False})
+        else:
+            sendfile_metrics["streamed"] += 1
+            await super().__call__(scope, receive, send)
+            return
+        
+        if self.background is not None:
+            await self.background()
+
 class StaticAssetOptimizer:
     """Utility class for static asset optimization"""
     
@@ -0,0 +1,303 @@
+"""
+In-memory token blacklist.
+
+Blacklisted token hashes are kept in an exact map (hash -> expiry) fronted by
+a bloom filter. The map is loaded from ``blacklisted_tokens`` at startup and
+updated on every ``blacklist``, so the common "not blacklisted" answer costs a
+few bit probes and never touches the database. Additions are published over
+Redis pub/sub so every worker converges (without Redis, each worker re-reads
+new rows on an interval instead); expired entries are pruned and the filter
+rebuilt, since a bloom filter can't forget.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.blacklisted_token import BlacklistedToken
+
+logger = logging.getLogger(__name__)
+
+# Rows are re-read from a little before the last sync, in case workers' clocks differ
+SYNC_OVERLAP = timedelta(minutes=1)
+
+class BloomFilter:
+    """Fixed-size bloom filter sized for a capacity and false positive rate"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class TokenBlacklist:
+    """Exact set of blacklisted token hashes behind a bloom filter"""
+
+    def __init__(self, capacity: int, error_rate: float, channel: str):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.channel = channel
+        self.loaded = False
+        self.sync_mode: Optional[str] = None
+        self._synced_at: Optional[datetime] = None
+        self._entries: Dict[str, datetime] = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._redis: Optional[redis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+        self.metrics = {
+            "checks": 0,
+            "bloom_negatives": 0,
+            "false_positives": 0,
+            "hits": 0,
+            "additions": 0,
+            "pruned": 0,
+            "rebuilds": 0,
+            "remote_updates": 0,
+            "reloads": 0,
+            "reload_failures": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def load(self, session: AsyncSession) -> int:
+        """Replace the in-memory state with the unexpired rows of ``blacklisted_tokens``"""
+        now = datetime.utcnow()
+        self._synced_at = now
+        result = await session.execute(
+            select(BlacklistedToken.token_hash, BlacklistedToken.expires_at)
+            .where(BlacklistedToken.expires_at > now)
+        )
+        entries = {token_hash: expires_at for token_hash, expires_at in result.all()}
+        # Keep anything added while the query was in flight
+        for token_hash, expires_at in self._entries.items():
+            if expires_at > now:
+                entries.setdefault(token_hash, expires_at)
+        self._entries = entries
+        self._rebuild()
+        self.loaded = True
+        logger.info(f"Token blacklist loaded {len(self._entries)} entries")
+        return len(self._entries)
+
+    async def reload(self, session: AsyncSession) -> int:
+        """Add rows created since the last load or reload; returns how many were new"""
+        if self._synced_at is None:
+            return await self.load(session)
+
+        now = datetime.utcnow()
+        result = await session.execute(
+            select(BlacklistedToken.token_hash, BlacklistedToken.expires_at)
+            .where(
+                BlacklistedToken.created_at >= self._synced_at - SYNC_OVERLAP,
+                BlacklistedToken.expires_at > now
+            )
+        )
+        added = 0
+        for token_hash, expires_at in result.all():
+            if token_hash not in self._entries:
+                added += 1
+            self.add(token_hash, expires_at)
+        self._synced_at = now
+        self.metrics["reloads"] += 1
+        return added
+
+    def add(self, token_hash: str, expires_at: datetime) -> None:
+        """Record a blacklisted token locally"""
+        if token_hash in self._entries:
+            self._entries[token_hash] = max(self._entries[token_hash], expires_at)
+            return
+
+        self._entries[token_hash] = expires_at
+        self.metrics["additions"] += 1
+        if len(self._entries) > self._bloom.capacity:
+            # Past capacity the false positive rate climbs; resize
+            self._rebuild()
+        else:
+            self._bloom.add(token_hash)
+
+    async def blacklist(self, token_hash: str, expires_at: datetime) -> None:
+        """Record a blacklisted token and publish it to the other workers"""
+        self.add(token_hash, expires_at)
+        if self._redis is None:
+            return
+
+        message = json.dumps({"token_hash": token_hash, "expires_at": expires_at.isoformat()})
+        try:
+            await self._redis.publish(self.channel, message)
+        except Exception as e:
+            # Other workers pick the row up on their next reload
+            logger.warning(f"Failed to publish token blacklist update: {e}")
+
+    def contains(self, token_hash: str) -> bool:
+        """Check whether a token hash is blacklisted and not yet expired"""
+        self.metrics["checks"] += 1
+        if token_hash not in self._bloom:
+            self.metrics["bloom_negatives"] += 1
+            return False
+
+        expires_at = self._entries.get(token_hash)
+        if expires_at is None or expires_at <= datetime.utcnow():
+            self.metrics["false_positives"] += 1
+            return False
+
+        self.metrics["hits"] += 1
+        return True
+
+    def prune(self) -> int:
+        """Drop expired entries and rebuild the filter without them"""
+        now = datetime.utcnow()
+        expired = [token_hash for token_hash, expires_at in self._entries.items() if expires_at <= now]
+        for token_hash in expired:
+            del self._entries[token_hash]
+
+        if expired:
+            self._rebuild()
+            self.metrics["pruned"] += len(expired)
+        return len(expired)
+
+    def _rebuild(self) -> None:
+        capacity = max(self.capacity, len(self._entries) * 2)
+        bloom = BloomFilter(capacity, self.error_rate)
+        for token_hash in self._entries:
+            bloom.add(token_hash)
+        self._bloom = bloom
+        self.metrics["rebuilds"] += 1
+
+    async def start(
+        self,
+        redis_url: Optional[str],
+        session_factory=None,
+        reload_interval: float = 30.0,
+        subscribe_timeout: float = 5.0
+    ) -> None:
+        """
+        Load the blacklist and follow other workers' additions.
+
+        With Redis the subscription is made first and the table loaded once it
+        is live, so nothing published in between is lost. Without Redis new
+        rows are re-read every ``reload_interval`` seconds.
+        """
+        if self._listener is not None:
+            return
+
+        if redis_url:
+            self._redis = redis.from_url(redis_url)
+            subscribed = asyncio.Event()
+            self._listener = asyncio.create_task(self._listen(session_factory, subscribed))
+            self.sync_mode = "pubsub"
+            try:
+                await asyncio.wait_for(subscribed.wait(), timeout=subscribe_timeout)
+                return
+            except asyncio.TimeoutError:
+                # The subscriber keeps retrying and loads again once it's in
+                logger.warning("Token blacklist subscription not ready, loading without it")
+
+        if session_factory is None:
+            return
+        async with session_factory() as session:
+            await self.load(session)
+
+        if not redis_url and reload_interval > 0:
+            self._listener = asyncio.create_task(self._poll(session_factory, reload_interval))
+            self.sync_mode = "polling"
+
+    async def stop(self) -> None:
+        """Stop the subscriber and close the Redis connection"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+            self.sync_mode = None
+
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def _apply_message(self, data: Any) -> None:
+        try:
+            update = json.loads(data)
+            self.add(update["token_hash"], datetime.fromisoformat(update["expires_at"]))
+            self.metrics["remote_updates"] += 1
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring malformed token blacklist update: {e}")
+
+    async def _listen(self, session_factory, subscribed: asyncio.Event) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+
+                if session_factory is not None:
+                    # Anything published from here on is queued on the subscription;
+                    # the table covers what came before (or while disconnected)
+                    async with session_factory() as session:
+                        await self.load(session)
+                subscribed.set()
+
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_message(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Token blacklist subscriber error, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def _poll(self, session_factory, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as session:
+                    await self.reload(session)
+            except Exception as e:
+                self.metrics["reload_failures"] += 1
+                logger.warning(f"Token blacklist reload failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "loaded": self.loaded,
+            "entries": len(self._entries),
+            "bloom_capacity": self._bloom.capacity,
+            "bloom_bits": self._bloom.size,
+            "bloom_hashes": self._bloom.hash_count,
+            "sync_mode": self.sync_mode
+        }
+
+# Global token blacklist instance
+token_blacklist = TokenBlacklist(
+    settings.TOKEN_BLACKLIST_BLOOM_CAPACITY,
+    settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE,
+    settings.TOKEN_BLACKLIST_CHANNEL
+)
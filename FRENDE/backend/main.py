@@ -8,15 +8,20 @@ from typing import Optional
 import socketio
 
 # Import core modules
-from core.config import configure_logging, settings
-from core.database import get_async_session, engine, Base
+from core.config import settings
+from core.logging_config import setup_logging, shutdown_logging
+from core.database import get_async_session, engine, Base, replica_router, session_scope
+from core.token_blacklist import token_blacklist
+from core.security import password_hasher
+from services.image_pipeline import image_pipeline
+from services.ai import ai_service
 from core.auth import current_active_user
 from core.middleware import create_middleware_stack
 
 # Import API routers
 from api import auth, users, matches, tasks, chat
 from api import conversation_starter, automatic_greeting, coin_rewards
-from api import monitoring, health, rate_limiting, asset_performance, task_chat, analytics
+from api import monitoring, health, rate_limiting, asset_performance, task_chat, analytics, uploads
 
 # Import Socket.IO server
 from api.socketio_server import sio
@@ -27,8 +32,8 @@ from models.match import Match
 from models.task import Task
 from models.chat import ChatMessage
 
-# Configure logging
-configure_logging()
+# Configure logging (queued, with a background writer)
+setup_logging()
 
 # Create FastAPI app
 app = FastAPI(
@@ -62,6 +67,9 @@ app.include_router(asset_performance.router, prefix="/api", tags=["Asset Perform
 app.include_router(task_chat.router, prefix="/api", tags=["Task Chat"])
 app.include_router(analytics.router, prefix="/api", tags=["Analytics"])
 
+# Stored images by content hash, resized and converted on request
+app.include_router(uploads.router, tags=["Uploads"])
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -101,6 +109,19 @@ async def startup_event():
         # Create tables
         await conn.run_sync(Base.metadata.create_all)
     
+    # Start read replica health/lag checks
+    replica_router.start()
+    
+    # Load the token blacklist and follow other workers' additions
+    await token_blacklist.start(
+        settings.REDIS_URL if settings.REDIS_ENABLED else None,
+        session_scope,
+        reload_interval=settings.TOKEN_BLACKLIST_RELOAD_INTERVAL
+    )
+    
+    # Reuse AI responses saved by earlier runs or other workers
+    await ai_service.cache.load()
+    
     print("🚀 Frende Backend API started successfully!")
     print(f"📚 API Documentation: http://localhost:8000/docs")
     print(f"🔧 Environment: {settings.ENVIRONMENT}")
@@ -109,6 +130,12 @@ async def startup_event():
 async def shutdown_event():
     """Shutdown event handler"""
     print("🛑 Frende Backend API shutting down...")
+    await replica_router.stop()
+    await token_blacklist.stop()
+    password_hasher.shutdown()
+    await image_pipeline.shutdown()
+    await ai_service.shutdown()
+    shutdown_logging()
 
 # Add CORS middleware
 app.add_middleware(
@@ -10,6 +10,8 @@ from .push_subscription import PushSubscription
 from .task_submission import TaskSubmission
 from .match_request import MatchRequest
 from .queue_entry import QueueEntry
+from .blob import Blob
+from .task_pool import PooledTask
 
 __all__ = [
     "User",
@@ -22,5 +24,7 @@ __all__ = [
     "PushSubscription",
     "TaskSubmission",
     "MatchRequest",
-    "QueueEntry"
+    "QueueEntry",
+    "Blob",
+    "PooledTask"
 ] 
\ No newline at end of file
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+
+from core.database import Base
+
+class Blob(Base):
+    """A stored file, addressed by the SHA-256 of its content"""
+    __tablename__ = "blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    key = Column(String(128), nullable=False)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    # Profile pictures and submission evidence pointing at this blob
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # When ref_count last dropped to zero; garbage collected after a grace period
+    released_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_blobs_gc", "ref_count", "released_at"),
+    )
@@ -13,7 +13,7 @@ class ChatMessage(Base):
     match_id = Column(Integer, ForeignKey("matches.id"), nullable=False, index=True)
     
     # Message content
-    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    sender_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)  # None for system messages
     message_text = Column(Text, nullable=False)
     message_type = Column(String(20), default="text", index=True)  # text, task_submission, system
     
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from datetime import datetime
+
+from core.database import Base
+
+class PooledTask(Base):
+    """A pre-generated task waiting to be personalized and assigned to a match"""
+    __tablename__ = "task_pool"
+    
+    id = Column(Integer, primary_key=True)
+    
+    # Bucket the task was generated for
+    task_type = Column(String(50), nullable=False)
+    difficulty = Column(String(20), nullable=False)
+    interest_category = Column(String(50), nullable=False)
+    
+    # Content with {user1}, {user2} and {interest} placeholders
+    title = Column(String(200), nullable=False)
+    description = Column(Text, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Draws take the oldest task in a bucket
+        Index("ix_task_pool_bucket", "task_type", "difficulty", "interest_category", "id"),
+    )
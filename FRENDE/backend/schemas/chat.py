@@ -11,7 +11,7 @@ class ChatMessageResponse(BaseModel):
     """Schema for chat message response"""
     id: int
     match_id: int
-    sender_id: int
+    sender_id: Optional[int] = None  # None for system messages
     message_text: str
     message_type: str
     created_at: str  # ISO format datetime
@@ -1,7 +1,9 @@
 import logging
 import asyncio
+import json
+import re
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Awaitable, List, Dict, Any, Optional, Set, Tuple, TypeVar
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,13 +12,57 @@ from sqlalchemy import select
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
+from core.ai_health_check import ai_health_checker
 from core.config import settings
-from core.exceptions import AIGenerationError, RateLimitError
+from core.exceptions import AICircuitOpenError, AIGenerationError, RateLimitError
 from models.user import User
 from models.match import Match
+from services.ai_circuit_breaker import CLOSED, CircuitBreaker
+from services.ai_cache import DiskCachePersistence, RedisCachePersistence, TaskCache, age_band, context_signature
+from services.ai_scheduler import AIRequestScheduler
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Interest keywords grouped into the categories pre-generated tasks are bucketed by
+INTEREST_CATEGORIES = {
+    "creative": ["music", "art", "photography", "dancing", "writing", "fashion"],
+    "outdoors": ["travel", "hiking", "gardening"],
+    "fitness": ["sports", "fitness", "yoga", "meditation"],
+    "food": ["cooking", "food"],
+    "entertainment": ["reading", "gaming", "movies"],
+    "learning": ["technology", "learning"],
+    "community": ["volunteering", "pets"],
+}
+
+# Pre-generated tasks not tied to an interest
+GENERAL_INTEREST_CATEGORY = "general"
+
+DIFFICULTY_GUIDANCE = {
+    "easy": "Easy tasks take a few minutes and need no preparation",
+    "medium": "Medium tasks take up to half an hour and invite some back-and-forth",
+    "hard": "Hard tasks take some effort or planning, like a small project together",
+}
+
+def extract_interests(profile_text: str) -> List[str]:
+    """Extract interests from profile text"""
+    if not profile_text:
+        return []
+    
+    # Simple keyword extraction (can be enhanced with NLP)
+    interest_keywords = [
+        "music", "reading", "travel", "cooking", "sports", "gaming",
+        "art", "photography", "dancing", "hiking", "movies", "writing",
+        "technology", "fitness", "yoga", "meditation", "gardening",
+        "pets", "volunteering", "learning", "fashion", "food"
+    ]
+    
+    text_lower = profile_text.lower()
+    found_interests = [interest for interest in interest_keywords if interest in text_lower]
+    
+    return found_interests[:5]  # Limit to top 5 interests
+
 @dataclass
 class TaskContext:
     """Context for AI task generation"""
@@ -27,6 +73,7 @@ class TaskContext:
     previous_tasks: List[str] = None
     compatibility_score: int = 0
     common_interests: List[str] = None
+    difficulty: str = "medium"
 
 class RateLimiter:
     """Token bucket rate limiter for AI API calls"""
@@ -38,51 +85,44 @@ class RateLimiter:
         self.last_refill = time.time()
         self._lock = asyncio.Lock()
     
+    def _refill(self) -> None:
+        now = time.time()
+        
+        # Refill tokens based on time passed
+        time_passed = now - self.last_refill
+        tokens_to_add = int(time_passed * self.max_requests / self.window)
+        
+        if tokens_to_add > 0:
+            self.tokens = min(self.max_requests, self.tokens + tokens_to_add)
+            self.last_refill = now
+    
     async def acquire(self) -> bool:
         """Acquire a token for API call"""
         async with self._lock:
-            now = time.time()
-            
-            # Refill tokens based on time passed
-            time_passed = now - self.last_refill
-            tokens_to_add = int(time_passed * self.max_requests / self.window)
-            
-            if tokens_to_add > 0:
-                self.tokens = min(self.max_requests, self.tokens + tokens_to_add)
-                self.last_refill = now
+            self._refill()
             
             if self.tokens >= 1:
                 self.tokens -= 1
                 return True
             
             return False
-
-class TaskCache:
-    """Simple cache for AI-generated tasks"""
-    
-    def __init__(self, max_size: int = 100, ttl: int = 3600):
-        self.max_size = max_size
-        self.ttl = ttl
-        self.cache: Dict[str, Tuple[str, float]] = {}
-    
-    def get(self, key: str) -> Optional[str]:
-        """Get cached task"""
-        if key in self.cache:
-            task, timestamp = self.cache[key]
-            if time.time() - timestamp < self.ttl:
-                return task
-            else:
-                del self.cache[key]
-        return None
-    
-    def set(self, key: str, task: str):
-        """Cache a task"""
-        if len(self.cache) >= self.max_size:
-            # Remove oldest entry
-            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k][1])
-            del self.cache[oldest_key]
-        
-        self.cache[key] = (task, time.time())
+    
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a token; False if none would be available within ``timeout`` seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            async with self._lock:
+                self._refill()
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                
+                delay = self.last_refill + self.window / self.max_requests - time.time()
+            
+            if time.monotonic() + delay > deadline:
+                return False
+            await asyncio.sleep(max(delay, 0.001))
 
 class PromptBuilder:
     """Builds context-aware prompts for AI task generation"""
@@ -141,39 +181,60 @@ class PromptBuilder:
         user1 = context.user1
         user2 = context.user2
         
-        # Get user interests and details
-        user1_interests = self._extract_interests(user1.profile_text or "")
-        user2_interests = self._extract_interests(user2.profile_text or "")
-        
         # Find common interests
-        common_interests = list(set(user1_interests) & set(user2_interests))
+        common_interests = self.common_interests(context)
         
-        # Build context string
+        # Build context string; only what the cache key covers, since the
+        # response is shared with every pair of the same signature. Names
+        # are swapped for placeholders before caching.
         context_str = f"""
-        User 1: {user1.name} ({user1.age} years old, {user1.profession or 'Not specified'})
-        User 2: {user2.name} ({user2.age} years old, {user2.profession or 'Not specified'})
+        User 1: {user1.name} (aged {age_band(user1.age)})
+        User 2: {user2.name} (aged {age_band(user2.age)})
         
-        User 1 interests: {', '.join(user1_interests) if user1_interests else 'Not specified'}
-        User 2 interests: {', '.join(user2_interests) if user2_interests else 'Not specified'}
         Common interests: {', '.join(common_interests) if common_interests else 'None identified'}
-        Compatibility score: {context.compatibility_score}/100
-        
-        Previous tasks completed: {len(context.previous_tasks or [])}
         """
         
         # Select appropriate prompt template
+        base_prompt = self.base_prompts["bonding"][self.select_prompt_type(context)]
+        
+        return f"{base_prompt}\n\nContext:{context_str}"
+    
+    def common_interests(self, context: TaskContext) -> List[str]:
+        """Interests both users' profiles mention"""
+        user1_interests = self._extract_interests(context.user1.profile_text or "")
+        user2_interests = self._extract_interests(context.user2.profile_text or "")
+        return sorted(set(user1_interests) & set(user2_interests))
+    
+    def select_prompt_type(self, context: TaskContext) -> str:
+        """Bonding prompt template for a context"""
         if context.compatibility_score >= 80:
-            prompt_type = "deep_conversation"
+            return "deep_conversation"
         elif context.compatibility_score >= 60:
-            prompt_type = "shared_experience"
-        elif common_interests:
-            prompt_type = "ice_breaker"
+            return "shared_experience"
+        elif self.common_interests(context):
+            return "ice_breaker"
+        return "personal_growth"
+    
+    def build_pool_prompt(self, task_type: str, difficulty: str, interest_category: str, count: int) -> str:
+        """Build a prompt for pre-generated tasks with name and interest placeholders"""
+        if interest_category == GENERAL_INTEREST_CATEGORY:
+            focus = ""
+            interest_line = ""
         else:
-            prompt_type = "personal_growth"
+            examples = ", ".join(INTEREST_CATEGORIES[interest_category])
+            focus = f" who share an interest in {interest_category} things ({examples})"
+            interest_line = f"\n        - Write {{interest}} where their shared interest goes (one of: {examples})"
         
-        base_prompt = self.base_prompts["bonding"][prompt_type]
+        return f"""Create {count} different {difficulty} {task_type} tasks for two friends who just matched{focus}.
+        Each task should help them get to know each other and be doable remotely or in person.
         
-        return f"{base_prompt}\n\nContext:{context_str}"
+        Requirements:
+        - Keep each description under 100 words
+        - Write {{user1}} and {{user2}} where the friends' names go{interest_line}
+        - {DIFFICULTY_GUIDANCE.get(difficulty, DIFFICULTY_GUIDANCE["medium"])}
+        - Avoid controversial topics
+        
+        Format: Return only a JSON array of {count} objects with "title" (under 60 characters) and "description" strings, no additional text."""
     
     def build_conversation_starter_prompt(self, context: TaskContext) -> str:
         """Build prompt for conversation starters"""
@@ -192,21 +253,7 @@ class PromptBuilder:
     
     def _extract_interests(self, profile_text: str) -> List[str]:
         """Extract interests from profile text"""
-        if not profile_text:
-            return []
-        
-        # Simple keyword extraction (can be enhanced with NLP)
-        interest_keywords = [
-            "music", "reading", "travel", "cooking", "sports", "gaming",
-            "art", "photography", "dancing", "hiking", "movies", "writing",
-            "technology", "fitness", "yoga", "meditation", "gardening",
-            "pets", "volunteering", "learning", "fashion", "food"
-        ]
-        
-        text_lower = profile_text.lower()
-        found_interests = [interest for interest in interest_keywords if interest in text_lower]
-        
-        return found_interests[:5]  # Limit to top 5 interests
+        return extract_interests(profile_text)
 
 class GeminiService:
     """Service for Gemini AI integration"""
@@ -218,8 +265,13 @@ class GeminiService:
             max_requests=settings.AI_RATE_LIMIT_PER_MINUTE,
             window=60
         )
-        self.cache = TaskCache()
+        self._cache: Optional[TaskCache] = None
+        self._circuit_breaker: Optional[CircuitBreaker] = None
+        # AI calls still running after their caller fell back
+        self._late_calls: Set[asyncio.Task] = set()
+        self.hedge_metrics = {"within_budget": 0, "over_budget": 0, "finished_late": 0, "failed_late": 0}
         self.prompt_builder = PromptBuilder()
+        self.scheduler: Optional[AIRequestScheduler] = None
         
         # Configure Gemini
         if self.api_key:
@@ -242,81 +294,203 @@ class GeminiService:
         if not self.model:
             raise AIGenerationError("Gemini AI not configured")
         
-        # Check rate limit
-        if not await self.rate_limiter.acquire():
-            raise RateLimitError("AI API rate limit exceeded")
-        
-        # Check cache first
+        # Check cache first, skipping tasks this pair has already had
         cache_key = self._generate_cache_key(context)
-        cached_task = self.cache.get(cache_key)
+        prompt_type = self.prompt_builder.select_prompt_type(context)
+        previous = {self._anonymize(task, context) for task in context.previous_tasks or []}
+        cached_task = self.cache.get(cache_key, prompt_type=prompt_type, exclude=previous)
         if cached_task:
             logger.info(f"Using cached task for match {context.match.id}")
-            return "AI-Generated Task", cached_task
+            return "AI-Generated Task", self._personalize(cached_task, context)
         
         try:
             # Build prompt
             prompt = self.prompt_builder.build_bonding_prompt(context)
             
-            # Generate response
-            response = await self._generate_response(prompt)
+            # Generate response; may share a model call with other task requests
+            response = await self._generate_response(prompt, key=context.match.id, batchable=True)
             
             # Validate and clean response
             task_content = self._clean_response(response)
             
-            # Cache the result
-            self.cache.set(cache_key, task_content)
+            # Cache the result for any pair with the same signature
+            self.cache.set(cache_key, self._anonymize(task_content, context), prompt_type=prompt_type)
             
             logger.info(f"Generated AI task for match {context.match.id}")
             return "AI-Generated Task", task_content
             
+        except (RateLimitError, AICircuitOpenError):
+            raise
         except Exception as e:
             logger.error(f"AI task generation failed: {str(e)}")
             raise AIGenerationError(f"Failed to generate AI task: {str(e)}")
     
+    async def generate_tasks(self, contexts: List[TaskContext]) -> List[Optional[Tuple[str, str]]]:
+        """
+        Generate tasks for several contexts at once.
+        
+        The requests are queued together so the scheduler can pack them into
+        shared model calls. Failed generations come back as None.
+        """
+        results = await asyncio.gather(
+            *(self.generate_task(context) for context in contexts),
+            return_exceptions=True
+        )
+        
+        tasks = []
+        for context, result in zip(contexts, results):
+            if isinstance(result, Exception):
+                logger.warning(f"AI task generation failed for match {context.match.id}: {str(result)}")
+                tasks.append(None)
+            else:
+                tasks.append(result)
+        return tasks
+    
     async def generate_conversation_starter(self, context: TaskContext) -> str:
         """Generate a conversation starter for matched users"""
         if not self.model:
             raise AIGenerationError("Gemini AI not configured")
         
-        # Check rate limit
-        if not await self.rate_limiter.acquire():
-            raise RateLimitError("AI API rate limit exceeded")
+        # Starters only depend on the users' ages
+        cache_key = context_signature(
+            "conversation_starter", "starter", "-", [], [context.user1.age, context.user2.age]
+        )
+        cached_starter = self.cache.get(cache_key, prompt_type="conversation_starter")
+        if cached_starter:
+            return self._personalize(cached_starter, context)
         
         try:
             # Build prompt
             prompt = self.prompt_builder.build_conversation_starter_prompt(context)
             
             # Generate response
-            response = await self._generate_response(prompt)
+            response = await self._generate_response(prompt, key=context.match.id, batchable=True)
             
             # Validate and clean response
             starter = self._clean_response(response)
+            self.cache.set(cache_key, self._anonymize(starter, context), prompt_type="conversation_starter")
             
             logger.info(f"Generated conversation starter for match {context.match.id}")
             return starter
             
+        except (RateLimitError, AICircuitOpenError):
+            raise
         except Exception as e:
             logger.error(f"Conversation starter generation failed: {str(e)}")
             raise AIGenerationError(f"Failed to generate conversation starter: {str(e)}")
     
-    async def _generate_response(self, prompt: str) -> str:
-        """Generate response from Gemini API"""
+    async def generate_pool_tasks(
+        self,
+        task_type: str,
+        difficulty: str,
+        interest_category: str,
+        count: int
+    ) -> List[Tuple[str, str]]:
+        """
+        Generate task templates for the pre-generated task pool in one model call.
+        
+        Returns ``(title, description)`` pairs whose text uses ``{user1}``,
+        ``{user2}`` and ``{interest}`` placeholders.
+        """
+        if not self.model:
+            raise AIGenerationError("Gemini AI not configured")
+        
+        prompt = self.prompt_builder.build_pool_prompt(task_type, difficulty, interest_category, count)
+        # Already a batch of tasks, so not packed with other requests
+        response = await self._generate_response(prompt, key="task_pool")
+        
+        start, end = response.find("["), response.rfind("]")
         try:
-            # Use asyncio to run the synchronous Gemini call
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: self.model.generate_content(prompt)
+            items = json.loads(response[start:end + 1]) if start != -1 and end > start else None
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            raise AIGenerationError("Task pool response is not a JSON array", task_type=task_type)
+        
+        tasks = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            title, description = item.get("title"), item.get("description")
+            if isinstance(title, str) and isinstance(description, str) and title.strip() and description.strip():
+                tasks.append((" ".join(title.split())[:200], " ".join(description.split())))
+        return tasks
+    
+    def _get_scheduler(self) -> AIRequestScheduler:
+        if self.scheduler is None:
+            self.scheduler = AIRequestScheduler(
+                self._call_model,
+                self.rate_limiter,
+                workers=settings.AI_SCHEDULER_WORKERS,
+                max_queue=settings.AI_SCHEDULER_MAX_QUEUE,
+                deadline=settings.AI_REQUEST_DEADLINE,
+                batch_size=settings.AI_BATCH_SIZE,
+                batch_window=settings.AI_BATCH_WINDOW_MS / 1000,
+                call_timeout=settings.AI_CALL_TIMEOUT
             )
-            
-            if response.text:
-                return response.text.strip()
-            else:
-                raise AIGenerationError("Empty response from Gemini API")
-                
+        return self.scheduler
+    
+    def _call_model(self, prompt: str) -> str:
+        """Blocking Gemini call, run on the scheduler's thread pool"""
+        response = self.model.generate_content(prompt)
+        if response.text:
+            return response.text.strip()
+        raise AIGenerationError("Empty response from Gemini API")
+    
+    async def _generate_response(self, prompt: str, key: Any = None, batchable: bool = False) -> str:
+        """Generate response from Gemini API through the request scheduler and circuit breaker"""
+        breaker = self.circuit_breaker
+        if not breaker.allow():
+            raise AICircuitOpenError()
+        
+        try:
+            response = await self._get_scheduler().submit(prompt, key=key, batchable=batchable)
+        except RateLimitError:
+            # Turned away locally, so says nothing about Gemini
+            breaker.release()
+            raise
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            logger.error("Gemini API call timed out")
+            raise AIGenerationError("Gemini API call timed out")
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
         except Exception as e:
+            breaker.record_failure()
             logger.error(f"Gemini API error: {str(e)}")
             raise AIGenerationError(f"Gemini API error: {str(e)}")
+        
+        breaker.record_success()
+        return response
+    
+    async def within_budget(self, call: Awaitable[T], budget: Optional[float] = None) -> Optional[T]:
+        """
+        Await an AI call for at most the latency budget (``AI_LATENCY_BUDGET_MS``).
+        
+        Returns None once the budget is spent so the caller can serve built-in
+        content; the call carries on in the background and a late answer still
+        lands in the response cache for the next request.
+        """
+        if budget is None:
+            budget = settings.AI_LATENCY_BUDGET_MS / 1000
+        task = asyncio.ensure_future(call)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), budget)
+        except asyncio.TimeoutError:
+            self.hedge_metrics["over_budget"] += 1
+            self._late_calls.add(task)
+            task.add_done_callback(self._late_call_done)
+            return None
+        self.hedge_metrics["within_budget"] += 1
+        return result
+    
+    def _late_call_done(self, task: asyncio.Task) -> None:
+        self._late_calls.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            self.hedge_metrics["failed_late"] += 1
+        else:
+            self.hedge_metrics["finished_late"] += 1
     
     def _clean_response(self, response: str) -> str:
         """Clean and validate AI response"""
@@ -338,12 +512,87 @@ class GeminiService:
     
     def _generate_cache_key(self, context: TaskContext) -> str:
         """Generate cache key for task context"""
-        # Create a unique key based on user IDs and task type
-        return f"task_{context.user1.id}_{context.user2.id}_{context.task_type}"
+        # Shared by every pair the same prompt would be built for, minus names
+        return context_signature(
+            self.prompt_builder.select_prompt_type(context),
+            context.task_type,
+            context.difficulty,
+            self.prompt_builder.common_interests(context),
+            [context.user1.age, context.user2.age]
+        )
+    
+    def _anonymize(self, text: str, context: TaskContext) -> str:
+        """Replace the users' names with placeholders before caching"""
+        for placeholder, user in (("{user1}", context.user1), ("{user2}", context.user2)):
+            if user.name:
+                text = re.sub(rf"\b{re.escape(user.name)}\b", placeholder, text)
+        return text
+    
+    def _personalize(self, text: str, context: TaskContext) -> str:
+        """Fill a cached response's placeholders with this pair's names"""
+        return text.replace("{user1}", context.user1.name or "you").replace("{user2}", context.user2.name or "your match")
+    
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        if self._circuit_breaker is None:
+            self._circuit_breaker = CircuitBreaker(
+                "gemini",
+                failure_rate=settings.AI_CIRCUIT_FAILURE_RATE,
+                min_calls=settings.AI_CIRCUIT_MIN_CALLS,
+                window=settings.AI_CIRCUIT_WINDOW,
+                cooldown=settings.AI_CIRCUIT_COOLDOWN
+            )
+        return self._circuit_breaker
+    
+    def record_health_check(self, result: Dict[str, Any]) -> None:
+        """Let health check results open or half-open the circuit"""
+        self.circuit_breaker.record_health_check(result)
+    
+    @property
+    def cache(self) -> TaskCache:
+        if self._cache is None:
+            persistence = None
+            if settings.AI_CACHE_BACKEND == "disk":
+                persistence = DiskCachePersistence(settings.AI_CACHE_PATH)
+            elif settings.AI_CACHE_BACKEND == "redis" and settings.REDIS_ENABLED:
+                persistence = RedisCachePersistence(settings.REDIS_URL, ttl=settings.AI_CACHE_TTL)
+            self._cache = TaskCache(
+                max_size=settings.AI_CACHE_MAX_ENTRIES,
+                ttl=settings.AI_CACHE_TTL,
+                variety=settings.AI_CACHE_VARIETY,
+                persistence=persistence
+            )
+        return self._cache
     
     def is_available(self) -> bool:
         """Check if AI service is available"""
         return self.model is not None and self.api_key is not None
+    
+    def is_healthy(self) -> bool:
+        """Whether calls are going through normally (the circuit is closed)"""
+        return self._circuit_breaker is None or self._circuit_breaker.state == CLOSED
+    
+    async def shutdown(self) -> None:
+        for task in list(self._late_calls):
+            task.cancel()
+        if self.scheduler is not None:
+            await self.scheduler.shutdown()
+        if self._cache is not None:
+            await self._cache.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduler queue, batching, latency and response cache statistics"""
+        return {
+            "available": self.is_available(),
+            "rate_limit_per_minute": self.rate_limiter.max_requests,
+            "cache": self._cache.get_stats() if self._cache is not None else None,
+            "circuit_breaker": self._circuit_breaker.get_stats() if self._circuit_breaker is not None else None,
+            "hedging": {**self.hedge_metrics, "running_late": len(self._late_calls)},
+            "scheduler": self.scheduler.get_stats() if self.scheduler is not None else None
+        }
 
 # Global AI service instance
-ai_service = GeminiService() 
\ No newline at end of file
+ai_service = GeminiService()
+
+# Failed health checks open the circuit before live calls have to fail
+ai_health_checker.add_listener(ai_service.record_health_check) 
\ No newline at end of file
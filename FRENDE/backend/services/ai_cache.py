@@ -0,0 +1,247 @@
+"""
+AI Response Cache for Frende App
+Reuses generated tasks across matches with the same normalized context
+
+Responses are keyed by a context signature rather than by user pair: the
+prompt type, task type, difficulty, sorted shared interests and the two
+users' age bands. Any pair with the same signature can be served from the
+cache, so names are swapped for ``{user1}``/``{user2}`` before a response is
+stored. Each signature holds up to ``variety`` different responses and only
+serves from the cache once it has that many, picking one at random (and
+skipping ones the pair has already had), so users still see diverse tasks.
+Entries are kept in an LRU with O(1) eviction, and can be saved to a JSON
+file or Redis so they survive restarts.
+"""
+
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+
+from core import file_io
+
+logger = logging.getLogger(__name__)
+
+AGE_BANDS = ((24, "18-24"), (34, "25-34"), (44, "35-44"), (54, "45-54"))
+
+def age_band(age: Optional[int]) -> str:
+    """Coarse age range used in cache signatures"""
+    if not age:
+        return "unknown"
+    for upper, label in AGE_BANDS:
+        if age <= upper:
+            return label
+    return "55+"
+
+def context_signature(
+    prompt_type: str,
+    task_type: str,
+    difficulty: str,
+    common_interests: Iterable[str],
+    ages: Iterable[Optional[int]]
+) -> str:
+    """Cache key shared by every pair whose prompt would be equivalent"""
+    interests = ",".join(sorted(set(common_interests))) or "-"
+    bands = ",".join(sorted(age_band(age) for age in ages))
+    return f"{prompt_type}|{task_type}|{difficulty}|{interests}|{bands}"
+
+class DiskCachePersistence:
+    """Saves the whole cache as one JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def load(self) -> Dict[str, Dict[str, Any]]:
+        if not await file_io.exists(self.path):
+            return {}
+        return json.loads(await file_io.read_bytes(self.path))
+
+    async def save(self, entries: Dict[str, Dict[str, Any]], changed: Set[str], removed: Set[str]) -> None:
+        await file_io.write_text(self.path, json.dumps(entries))
+
+class RedisCachePersistence:
+    """Keeps one Redis key per signature, shared by every worker"""
+
+    def __init__(self, redis_url: str, ttl: int, prefix: str = "ai_cache:"):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis: Optional[redis.Redis] = None
+
+    def _client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.from_url(self.redis_url)
+        return self._redis
+
+    async def load(self) -> Dict[str, Dict[str, Any]]:
+        client = self._client()
+        keys = [key async for key in client.scan_iter(match=f"{self.prefix}*", count=500)]
+        entries = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            for key, value in zip(chunk, await client.mget(chunk)):
+                if value is not None:
+                    key = key.decode() if isinstance(key, bytes) else key
+                    entries[key[len(self.prefix):]] = json.loads(value)
+        return entries
+
+    async def save(self, entries: Dict[str, Dict[str, Any]], changed: Set[str], removed: Set[str]) -> None:
+        async with self._client().pipeline(transaction=False) as pipe:
+            for key in changed:
+                if key in entries:
+                    pipe.set(f"{self.prefix}{key}", json.dumps(entries[key]), ex=self.ttl)
+            for key in removed:
+                pipe.delete(f"{self.prefix}{key}")
+            await pipe.execute()
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+class TaskCache:
+    """LRU cache of AI responses with several variants per key"""
+
+    def __init__(self, max_size: int = 100, ttl: int = 3600, variety: int = 1, persistence: Any = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.variety = max(variety, 1)
+        self.persistence = persistence
+        # key -> (prompt type, [(response, stored at)])
+        self.cache: "OrderedDict[str, Tuple[str, List[Tuple[str, float]]]]" = OrderedDict()
+        self._changed: Set[str] = set()
+        self._removed: Set[str] = set()
+        self.metrics: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+
+    def _count(self, prompt_type: str, outcome: str) -> None:
+        counts = self.metrics.setdefault(prompt_type, {"hits": 0, "misses": 0, "filling": 0, "stores": 0})
+        counts[outcome] += 1
+
+    def _fresh_variants(self, key: str) -> List[Tuple[str, float]]:
+        prompt_type, variants = self.cache[key]
+        cutoff = time.time() - self.ttl
+        fresh = [variant for variant in variants if variant[1] > cutoff]
+        if len(fresh) != len(variants):
+            if fresh:
+                self.cache[key] = (prompt_type, fresh)
+                self._changed.add(key)
+            else:
+                del self.cache[key]
+                self._removed.add(key)
+        return fresh
+
+    def get(self, key: str, prompt_type: str = "default", exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        Get a cached response.
+
+        Misses until the key holds ``variety`` responses, so new ones keep
+        being generated; then returns one at random, leaving out ``exclude``.
+        """
+        if key not in self.cache:
+            self._count(prompt_type, "misses")
+            return None
+
+        variants = self._fresh_variants(key)
+        if len(variants) < self.variety:
+            self._count(prompt_type, "filling" if variants else "misses")
+            return None
+
+        excluded = set(exclude)
+        candidates = [response for response, _ in variants if response not in excluded]
+        if not candidates:
+            self._count(prompt_type, "misses")
+            return None
+
+        self.cache.move_to_end(key)
+        self._count(prompt_type, "hits")
+        return random.choice(candidates)
+
+    def set(self, key: str, task: str, prompt_type: str = "default"):
+        """Add a response to a key's variants, evicting the least recently used key when full"""
+        now = time.time()
+        if key in self.cache:
+            _, variants = self.cache[key]
+            variants = [variant for variant in variants if variant[0] != task]
+            # The oldest variant makes way for the new one
+            variants = (variants + [(task, now)])[-self.variety:]
+            self.cache[key] = (prompt_type, variants)
+            self.cache.move_to_end(key)
+        else:
+            self.cache[key] = (prompt_type, [(task, now)])
+            while len(self.cache) > self.max_size:
+                evicted, _ = self.cache.popitem(last=False)
+                self._changed.discard(evicted)
+                self._removed.add(evicted)
+                self.evictions += 1
+
+        self._changed.add(key)
+        self._removed.discard(key)
+        self._count(prompt_type, "stores")
+
+    def _serialize(self, key: str) -> Dict[str, Any]:
+        prompt_type, variants = self.cache[key]
+        return {"prompt_type": prompt_type, "variants": variants}
+
+    async def load(self) -> int:
+        """Load saved entries that are still fresh; returns how many were loaded"""
+        if self.persistence is None:
+            return 0
+        try:
+            saved = await self.persistence.load()
+        except Exception as e:
+            logger.warning(f"Could not load AI response cache: {str(e)}")
+            return 0
+
+        cutoff = time.time() - self.ttl
+        loaded = 0
+        # Oldest first, so the most recently stored end up most recently used
+        for key, entry in sorted(saved.items(), key=lambda item: max((v[1] for v in item[1]["variants"]), default=0)):
+            variants = [(response, stored_at) for response, stored_at in entry["variants"] if stored_at > cutoff]
+            if variants and key not in self.cache:
+                self.cache[key] = (entry.get("prompt_type", "default"), variants[-self.variety:])
+                loaded += 1
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return loaded
+
+    async def save(self) -> None:
+        """Write changed entries to the persistence backend"""
+        if self.persistence is None or not (self._changed or self._removed):
+            return
+        changed, removed = self._changed, self._removed
+        self._changed, self._removed = set(), set()
+        entries = {key: self._serialize(key) for key in self.cache}
+        try:
+            await self.persistence.save(entries, changed, removed)
+        except Exception as e:
+            # Try again next time
+            self._changed |= changed
+            self._removed |= removed
+            logger.warning(f"Could not save AI response cache: {str(e)}")
+
+    async def close(self) -> None:
+        await self.save()
+        if self.persistence is not None and hasattr(self.persistence, "close"):
+            await self.persistence.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        by_prompt_type = {}
+        for prompt_type, counts in sorted(self.metrics.items()):
+            lookups = counts["hits"] + counts["misses"] + counts["filling"]
+            by_prompt_type[prompt_type] = {
+                **counts,
+                "hit_rate": round(counts["hits"] / lookups, 3) if lookups else 0.0
+            }
+        return {
+            "entries": len(self.cache),
+            "max_size": self.max_size,
+            "variety": self.variety,
+            "evictions": self.evictions,
+            "persistence": type(self.persistence).__name__ if self.persistence is not None else None,
+            "by_prompt_type": by_prompt_type
+        }
@@ -0,0 +1,156 @@
+"""
+AI Circuit Breaker for Frende App
+Stops calling Gemini while it is failing, and probes it before resuming
+
+Closed, every call goes through and its outcome is recorded. When enough
+calls in the rolling window have failed (errors and timeouts alike, and
+health checks from ``AIHealthChecker`` that report Gemini unhealthy), the
+circuit opens and calls are refused straight away so callers fall back
+instead of waiting. After the cooldown (or as soon as a health check comes back
+healthy) it goes half-open and lets a few probe calls through: a success
+closes it again, a failure reopens it.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from api.metrics import record_ai_circuit_state
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Error-rate circuit breaker with half-open probing"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window: float = 60.0,
+        cooldown: float = 30.0,
+        half_open_calls: int = 1
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = max(min_calls, 1)
+        self.window = window
+        self.cooldown = cooldown
+        self.half_open_calls = max(half_open_calls, 1)
+        self.state = CLOSED
+        self.state_since = time.monotonic()
+        self.open_reason: Optional[str] = None
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._probes = 0
+        self.metrics = {
+            "opened": 0,
+            "half_opened": 0,
+            "closed": 0,
+            "short_circuited": 0,
+            "successes": 0,
+            "failures": 0
+        }
+        record_ai_circuit_state(self.name, self.state)
+
+    def _transition(self, state: str, reason: Optional[str] = None) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"AI circuit '{self.name}' {self.state} -> {state}" + (f" ({reason})" if reason else ""))
+        self.state = state
+        self.state_since = time.monotonic()
+        self._probes = 0
+        if state == OPEN:
+            self.open_reason = reason
+            self.metrics["opened"] += 1
+        elif state == HALF_OPEN:
+            self.metrics["half_opened"] += 1
+        else:
+            self.open_reason = None
+            self._outcomes.clear()
+            self._failures = 0
+            self.metrics["closed"] += 1
+        record_ai_circuit_state(self.name, state)
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; callers must then record its outcome"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.state_since < self.cooldown:
+                self.metrics["short_circuited"] += 1
+                return False
+            self._transition(HALF_OPEN, "cooldown elapsed")
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self.metrics["short_circuited"] += 1
+                return False
+            self._probes += 1
+        return True
+
+    def _record_failure_in_window(self, reason: str) -> None:
+        now = time.monotonic()
+        self._outcomes.append((now, False))
+        self._failures += 1
+        self._trim(now)
+        if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.failure_rate:
+            self._transition(OPEN, f"{self._failures}/{len(self._outcomes)} calls failed, last: {reason}")
+
+    def record_success(self) -> None:
+        self.metrics["successes"] += 1
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED)
+        elif self.state == CLOSED:
+            now = time.monotonic()
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self) -> None:
+        self.metrics["failures"] += 1
+        if self.state == HALF_OPEN:
+            self._transition(OPEN, "probe failed")
+        elif self.state == CLOSED:
+            self._record_failure_in_window("call failed")
+
+    def release(self) -> None:
+        """A call ended without saying anything about the service (e.g. rejected locally)"""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_health_check(self, result: Dict[str, Any]) -> None:
+        """
+        Take an ``AIHealthChecker`` result into account
+
+        A failed check counts as a failed call in the window, so one slow
+        probe can't open the circuit on its own.
+        """
+        if result.get("service") != self.name:
+            return
+        if result.get("status") == "healthy":
+            if self.state == OPEN:
+                self._transition(HALF_OPEN, "health check passed")
+        elif self.state == CLOSED:
+            self._record_failure_in_window(f"health check failed: {result.get('error', 'unhealthy')}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "state_seconds": round(time.monotonic() - self.state_since, 1),
+            "open_reason": self.open_reason,
+            "window_calls": calls,
+            "window_error_rate": round(self._failures / calls, 3) if calls else 0.0,
+            **self.metrics
+        }
@@ -0,0 +1,380 @@
+"""
+AI Request Scheduler for Frende App
+Queues, paces and batches Gemini calls on a dedicated thread pool
+
+The Gemini SDK is blocking, so calls run on their own bounded thread pool
+instead of the event loop's default executor. Requests wait in a fair queue,
+round-robin across keys (e.g. matches) so one match asking for ten tasks
+doesn't hold up everyone else, and each carries a deadline. Before a model
+call the scheduler waits for a rate limiter token rather than failing, and
+gives up only when the token wouldn't come before the deadline. Batchable
+requests that pile up while the workers are busy are packed into a single
+prompt asking for a JSON array of answers, which is split back per request.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+from core.exceptions import RateLimitError
+from core.pool_monitor import latency_summary
+
+logger = logging.getLogger(__name__)
+
+BATCH_PROMPT = """Answer each of the {count} numbered requests below on its own. Where requests repeat, give each a different answer.
+
+Return only a JSON array of {count} strings, where item N is the answer to request N, with no additional text.
+
+{requests}"""
+
+def build_batch_prompt(prompts: List[str]) -> str:
+    """Pack several prompts into one that asks for a JSON array of answers"""
+    requests = "\n\n".join(f"Request {number}:\n{prompt}" for number, prompt in enumerate(prompts, 1))
+    return BATCH_PROMPT.format(count=len(prompts), requests=requests)
+
+def split_batch_response(text: str, count: int) -> Optional[List[str]]:
+    """Split a batched answer into ``count`` answers; None if it isn't one"""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        answers = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    if not all(isinstance(answer, str) and answer.strip() for answer in answers):
+        return None
+    return [answer.strip() for answer in answers]
+
+class AIRequest:
+    """A prompt waiting for the model"""
+
+    def __init__(self, prompt: str, key: Hashable, deadline: float, batchable: bool, future: asyncio.Future):
+        self.prompt = prompt
+        self.key = key
+        self.deadline = deadline
+        self.batchable = batchable
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.dispatched = False
+
+class AIRequestScheduler:
+    """Fair, deadline-aware queue in front of a bounded pool of model calls"""
+
+    def __init__(
+        self,
+        call: Callable[[str], str],
+        limiter: Any,
+        workers: int,
+        max_queue: int,
+        deadline: float,
+        batch_size: int = 1,
+        batch_window: float = 0.0,
+        call_timeout: Optional[float] = None,
+        sample_size: int = 1000
+    ):
+        """
+        ``call`` is the blocking model call (prompt in, text out) and
+        ``limiter`` paces it: ``await limiter.wait(timeout)`` returns whether
+        a token was granted within ``timeout`` seconds. A call taking longer
+        than ``call_timeout`` fails its requests with ``asyncio.TimeoutError``;
+        its thread can't be interrupted, so it keeps its worker slot until it
+        finishes and the pool never runs more than ``workers`` calls.
+        """
+        self.call = call
+        self.limiter = limiter
+        self.workers = max(workers, 1)
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.batch_size = max(batch_size, 1)
+        self.batch_window = batch_window
+        self.call_timeout = call_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._queues: "OrderedDict[Hashable, Deque[AIRequest]]" = OrderedDict()
+        self._depth = 0
+        self._running = 0
+        self._overrunning = 0
+        self._sample_size = sample_size
+        self.latency_ms: Dict[str, deque] = {}
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "expired": 0,
+            "model_calls": 0,
+            "batches": 0,
+            "batched_requests": 0,
+            "batch_split_failures": 0,
+            "rate_waits": 0,
+            "peak_queue_depth": 0
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gemini")
+        return self._executor
+
+    def _record(self, name: str, ms: float) -> None:
+        samples = self.latency_ms.get(name)
+        if samples is None:
+            samples = self.latency_ms[name] = deque(maxlen=self._sample_size)
+        samples.append(ms)
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queue primitives belong to one event loop
+            self._loop = loop
+            self._queues = OrderedDict()
+            self._depth = 0
+            self._running = 0
+            self._has_work = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._dispatcher = None
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def submit(
+        self,
+        prompt: str,
+        key: Hashable = None,
+        batchable: bool = False,
+        deadline: Optional[float] = None
+    ) -> str:
+        """
+        Queue a prompt and wait for the model's answer.
+
+        ``key`` groups requests for fair scheduling and ``batchable`` allows
+        the prompt to share a model call with others. Raises
+        ``RateLimitError`` when the queue is full or the deadline passes
+        before the request reaches the model; errors from the model call
+        itself are raised as they are.
+        """
+        self._ensure_started()
+        if self._depth >= self.max_queue:
+            self.metrics["rejected"] += 1
+            raise RateLimitError("AI request queue is full", limit=self.max_queue)
+
+        request = AIRequest(
+            prompt, key, time.monotonic() + (deadline if deadline is not None else self.deadline),
+            batchable, self._loop.create_future()
+        )
+        self._enqueue(request)
+        self.metrics["submitted"] += 1
+
+        # Fail it at the deadline even while every worker is busy
+        timer = self._loop.call_later(max(request.deadline - time.monotonic(), 0), self._expire, request)
+        try:
+            result = await request.future
+        finally:
+            timer.cancel()
+        self._record("total", (time.monotonic() - request.enqueued_at) * 1000)
+        return result
+
+    def _expire(self, request: AIRequest) -> None:
+        if not request.dispatched and not request.future.done():
+            # Dropped from its queue when it comes up
+            self.metrics["expired"] += 1
+            request.future.set_exception(RateLimitError("AI request timed out waiting in queue"))
+
+    def _enqueue(self, request: AIRequest, front: bool = False) -> None:
+        queue = self._queues.get(request.key)
+        if queue is None:
+            queue = self._queues[request.key] = deque()
+        if front:
+            queue.appendleft(request)
+            self._queues.move_to_end(request.key, last=False)
+        else:
+            queue.append(request)
+        self._depth += 1
+        self.metrics["peak_queue_depth"] = max(self.metrics["peak_queue_depth"], self._depth)
+        self._has_work.set()
+
+    def _live(self, request: AIRequest, now: float) -> bool:
+        """Whether a request still wants an answer; fails it once its deadline has passed"""
+        if request.future.done():
+            # The caller went away
+            return False
+        if now >= request.deadline:
+            self.metrics["expired"] += 1
+            request.future.set_exception(RateLimitError("AI request timed out waiting in queue"))
+            return False
+        return True
+
+    def _pop(self, batchable_only: bool = False) -> Optional[AIRequest]:
+        """Take the head of the next key's queue in round-robin order"""
+        now = time.monotonic()
+        for key in list(self._queues):
+            queue = self._queues[key]
+            while queue and not self._live(queue[0], now):
+                queue.popleft()
+                self._depth -= 1
+            if not queue:
+                del self._queues[key]
+                continue
+            if batchable_only and not queue[0].batchable:
+                continue
+
+            request = queue.popleft()
+            self._depth -= 1
+            request.dispatched = True
+            # This key goes to the back of the line
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            return request
+        return None
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._slots.acquire()
+            batch: List[AIRequest] = []
+            try:
+                request = self._pop()
+                while request is None:
+                    self._has_work.clear()
+                    await self._has_work.wait()
+                    request = self._pop()
+                batch.append(request)
+
+                if request.batchable and self.batch_size > 1:
+                    # Give a burst a moment to arrive before calling with a short batch
+                    if self._depth < self.batch_size - 1 and self.batch_window > 0:
+                        await asyncio.sleep(self.batch_window)
+                    while len(batch) < self.batch_size:
+                        more = self._pop(batchable_only=True)
+                        if more is None:
+                            break
+                        batch.append(more)
+
+                batch = await self._pace(batch)
+            except BaseException:
+                self._slots.release()
+                for request in batch:
+                    if not request.future.done():
+                        request.future.cancel()
+                raise
+
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._execute(batch))
+            task.add_done_callback(lambda _: self._slots.release())
+
+    async def _pace(self, batch: List[AIRequest]) -> List[AIRequest]:
+        """Wait for a rate limiter token for one model call"""
+        started_at = time.monotonic()
+        timeout = max(request.deadline for request in batch) - started_at
+        granted = await self.limiter.wait(timeout)
+        waited = time.monotonic() - started_at
+        self._record("rate_wait", waited * 1000)
+        if waited >= 0.001:
+            self.metrics["rate_waits"] += 1
+
+        if not granted:
+            for request in batch:
+                if not request.future.done():
+                    self.metrics["expired"] += 1
+                    request.future.set_exception(RateLimitError("AI API rate limit exceeded"))
+            return []
+
+        now = time.monotonic()
+        return [request for request in batch if self._live(request, now)]
+
+    async def _execute(self, batch: List[AIRequest]) -> None:
+        started_at = time.monotonic()
+        for request in batch:
+            self._record("queue_wait", (started_at - request.enqueued_at) * 1000)
+        prompt = batch[0].prompt if len(batch) == 1 else build_batch_prompt([request.prompt for request in batch])
+
+        self._running += 1
+        self.metrics["model_calls"] += 1
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(self._get_executor(), self.call, prompt)
+        try:
+            text = await asyncio.wait_for(asyncio.shield(call), self.call_timeout)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.metrics["timeouts"] += 1
+            self.metrics["failed"] += len(batch)
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            if not call.done():
+                # Callers have their answer; the slot stays taken until the thread is free
+                self._overrunning += 1
+                try:
+                    await asyncio.gather(call, return_exceptions=True)
+                finally:
+                    self._overrunning -= 1
+            return
+        finally:
+            self._running -= 1
+            self._record("model_call", (time.monotonic() - started_at) * 1000)
+
+        if len(batch) == 1:
+            answers = [text]
+        else:
+            self.metrics["batches"] += 1
+            self.metrics["batched_requests"] += len(batch)
+            answers = split_batch_response(text, len(batch))
+            if answers is None:
+                # Ask again one at a time, ahead of newer requests
+                self.metrics["batch_split_failures"] += 1
+                logger.warning(f"Could not split a batched AI response of {len(batch)} requests; retrying singly")
+                for request in reversed(batch):
+                    request.batchable = False
+                    request.dispatched = False
+                    self._enqueue(request, front=True)
+                return
+
+        for request, answer in zip(batch, answers):
+            if not request.future.done():
+                request.future.set_result(answer)
+                self.metrics["completed"] += 1
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for a model call"""
+        return self._depth
+
+    async def shutdown(self) -> None:
+        """Stop dispatching, cancel queued requests and stop the pool"""
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+
+        for queue in self._queues.values():
+            for request in queue:
+                if not request.future.done():
+                    request.future.cancel()
+        self._queues.clear()
+        self._depth = 0
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "overrunning": self._overrunning,
+            "queue_depth": self._depth,
+            "queued_keys": len(self._queues),
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            **self.metrics,
+            "latency_ms": {name: latency_summary(samples) for name, samples in sorted(self.latency_ms.items())}
+        }
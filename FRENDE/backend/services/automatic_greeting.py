@@ -8,7 +8,7 @@ import random
 from models.match import Match
 from models.user import User
 from models.chat import ChatMessage
-from core.database import get_async_session
+from core.database import session_scope
 from services.chat import chat_service
 from services.conversation_starter import conversation_starter_service
 
@@ -30,7 +30,7 @@ class AutomaticGreetingService:
     async def check_and_handle_timeouts(self, session: AsyncSession = None) -> List[Dict]:
         """Check for timed out conversation starters and handle automatic greetings"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._check_and_handle_timeouts_internal(session)
         
         return await self._check_and_handle_timeouts_internal(session)
@@ -125,7 +125,7 @@ class AutomaticGreetingService:
     async def get_greeting_status(self, match_id: int, session: AsyncSession = None) -> Dict:
         """Get greeting status for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_greeting_status_internal(match_id, session)
         
         return await self._get_greeting_status_internal(match_id, session)
@@ -160,7 +160,7 @@ class AutomaticGreetingService:
     async def mark_greeting_sent(self, match_id: int, session: AsyncSession = None) -> bool:
         """Mark that a greeting has been sent for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._mark_greeting_sent_internal(match_id, session)
         
         return await self._mark_greeting_sent_internal(match_id, session)
@@ -186,7 +186,7 @@ class AutomaticGreetingService:
     async def get_pending_timeouts(self, session: AsyncSession = None) -> List[Dict]:
         """Get list of matches with pending timeouts"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_pending_timeouts_internal(session)
         
         return await self._get_pending_timeouts_internal(session)
@@ -4,10 +4,20 @@ from datetime import datetime, timedelta
 from typing import Dict, List
 import time
 
-from core.database import get_async_session
+from core.config import settings
+from core.database import session_scope
+from core.token_blacklist import token_blacklist
 from services.tasks import task_service
 from services.automatic_greeting import automatic_greeting_service
 from services.conversation_starter import conversation_starter_service
+from services.chat import chat_service
+from services.match_request import match_request_service
+from services.queue_manager import queue_manager
+from services.users import user_service
+from services.blob_store import blob_store
+from services.file_management import file_management_service
+from services.task_pool import task_pool
+from services.ai import ai_service
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +29,10 @@ class BackgroundTaskProcessor:
         self.task_replacement_interval = 300  # 5 minutes for task replacement
         self.greeting_timeout_interval = 30   # 30 seconds for greeting timeout check
         self.conversation_starter_interval = 60  # 1 minute for conversation starter checks
+        self.expiry_interval = 60  # 1 minute for set-based expiry jobs
+        self.storage_reconcile_interval = settings.STORAGE_STATS_RECONCILE_HOURS * 3600
+        self.task_pool_interval = settings.TASK_POOL_REFILL_INTERVAL
+        self.ai_cache_save_interval = settings.AI_CACHE_SAVE_INTERVAL
         
     def start_background_tasks(self):
         """Start all background tasks"""
@@ -38,6 +52,20 @@ class BackgroundTaskProcessor:
         # Start conversation starter maintenance
         asyncio.create_task(self._conversation_starter_maintenance())
         
+        # Start expiry jobs
+        asyncio.create_task(self._expiry_maintenance())
+        
+        # Start storage statistics reconciliation (the first run sets the baseline)
+        asyncio.create_task(self._storage_statistics_maintenance())
+        
+        # Start the pre-generated task pool producer
+        if settings.TASK_POOL_ENABLED:
+            asyncio.create_task(self._task_pool_maintenance())
+        
+        # Start saving the AI response cache
+        if settings.AI_CACHE_BACKEND != "memory":
+            asyncio.create_task(self._ai_cache_maintenance())
+        
         logger.info("Background tasks started successfully")
     
     def stop_background_tasks(self):
@@ -51,7 +79,7 @@ class BackgroundTaskProcessor:
             try:
                 logger.debug("Running task replacement maintenance...")
                 
-                async with get_async_session() as session:
+                async with session_scope() as session:
                     # Replace expired tasks
                     await task_service.replace_expired_tasks(session)
                 
@@ -69,7 +97,7 @@ class BackgroundTaskProcessor:
             try:
                 logger.debug("Running automatic greeting maintenance...")
                 
-                async with get_async_session() as session:
+                async with session_scope() as session:
                     # Check for timed out conversation starters and send automatic greetings
                     handled_greetings = await automatic_greeting_service.check_and_handle_timeouts(session)
                     
@@ -92,7 +120,7 @@ class BackgroundTaskProcessor:
             try:
                 logger.debug("Running conversation starter maintenance...")
                 
-                async with get_async_session() as session:
+                async with session_scope() as session:
                     # Check for pending timeouts
                     pending_timeouts = await automatic_greeting_service.get_pending_timeouts(session)
                     
@@ -109,6 +137,93 @@ class BackgroundTaskProcessor:
             # Wait for next interval
             await asyncio.sleep(self.conversation_starter_interval)
     
+    async def run_expiry_jobs(self) -> Dict[str, int]:
+        """Run every expiry job once, each in its own session"""
+        jobs = {
+            "match_requests": match_request_service.cleanup_expired_requests,
+            "queue_entries": queue_manager.cleanup_expired_entries,
+            "tasks": task_service.cleanup_expired_tasks,
+            "slots": user_service.reset_expired_slots,
+            "blobs": blob_store.collect_garbage,
+        }
+        
+        results = {}
+        for name, job in jobs.items():
+            try:
+                results[name] = await job()
+            except Exception as e:
+                logger.error(f"Error in {name} expiry job: {str(e)}")
+        
+        try:
+            async with session_scope() as session:
+                results["matches"] = await chat_service.cleanup_expired_matches(session)
+        except Exception as e:
+            logger.error(f"Error in matches expiry job: {str(e)}")
+        
+        # In memory only: drop expired blacklist entries and rebuild the bloom filter
+        results["token_blacklist"] = token_blacklist.prune()
+        
+        return results
+    
+    async def _expiry_maintenance(self):
+        """Maintenance task for expiring matches, requests, queue entries, tasks, slots and unreferenced blobs"""
+        while self.is_running:
+            try:
+                logger.debug("Running expiry maintenance...")
+                await self.run_expiry_jobs()
+                logger.debug("Expiry maintenance completed")
+                
+            except Exception as e:
+                logger.error(f"Error in expiry maintenance: {str(e)}")
+            
+            # Wait for next interval
+            await asyncio.sleep(self.expiry_interval)
+    
+    async def _storage_statistics_maintenance(self):
+        """Maintenance task that corrects the running upload storage statistics and sweeps untracked blobs"""
+        while self.is_running:
+            try:
+                logger.debug("Reconciling storage statistics...")
+                await file_management_service.reconcile_storage_statistics()
+                logger.debug("Storage statistics reconciled")
+                
+            except Exception as e:
+                logger.error(f"Error reconciling storage statistics: {str(e)}")
+            
+            try:
+                # Objects left behind by uploads that rolled back
+                await blob_store.sweep_untracked()
+            except Exception as e:
+                logger.error(f"Error sweeping untracked blobs: {str(e)}")
+            
+            # Wait for next interval
+            await asyncio.sleep(self.storage_reconcile_interval)
+    
+    async def _task_pool_maintenance(self):
+        """Maintenance task that keeps the pre-generated task pool stocked"""
+        while self.is_running:
+            try:
+                logger.debug("Checking task pool stock...")
+                await task_pool.refill()
+                logger.debug("Task pool check completed")
+                
+            except Exception as e:
+                logger.error(f"Error refilling task pool: {str(e)}")
+            
+            # Wait for next interval, or until a draw finds a bucket empty
+            await task_pool.wait_for_refill(self.task_pool_interval)
+    
+    async def _ai_cache_maintenance(self):
+        """Maintenance task that saves the AI response cache"""
+        while self.is_running:
+            # Wait for next interval
+            await asyncio.sleep(self.ai_cache_save_interval)
+            
+            try:
+                await ai_service.cache.save()
+            except Exception as e:
+                logger.error(f"Error saving AI response cache: {str(e)}")
+    
     async def run_manual_maintenance(self) -> Dict:
         """Run maintenance tasks manually and return results"""
         results = {
@@ -118,7 +233,7 @@ class BackgroundTaskProcessor:
         }
         
         try:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 # Task replacement
                 try:
                     await task_service.replace_expired_tasks(session)
@@ -0,0 +1,476 @@
+"""
+Blob Store for Frende App
+Content-addressed upload storage with reference counting
+
+Every stored file is named by the SHA-256 of its content and sharded into
+``blobs/ab/cd/<sha256><ext>``, so identical uploads are stored once. The
+``blobs`` table counts the profile pictures and submission evidence that
+point at each blob; when the count drops to zero the blob is stamped with a
+release time and garbage collection removes it after a grace period with an
+indexed query, instead of walking the upload directories.
+
+An object is stored before the upload's transaction commits, so a rolled
+back upload leaves an object with no row; an occasional sweep of the stored
+keys removes those once they are older than the grace period. Release
+listeners run only after the releasing transaction commits.
+
+Objects live behind a small backend interface: local disk under
+``uploads/`` by default, or an S3-compatible bucket.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import case, delete, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import file_io
+from core.config import settings
+from core.database import session_scope
+from models.blob import Blob
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Matches a blob key inside a stored path or URL and captures its hash
+_BLOB_KEY_RE = re.compile(r"blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(?:\.[a-z0-9]+)?$")
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+# Session info keys for blobs released in the session's open transaction
+_PENDING_RELEASES = "blob_store.pending_releases"
+_LISTENING = "blob_store.listening"
+
+def blob_key(sha256: str, extension: str = "") -> str:
+    """Sharded storage key for a blob"""
+    extension = extension.lower()
+    if not _EXTENSION_RE.match(extension):
+        extension = ""
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+def sha256_from_ref(ref: Optional[str]) -> Optional[str]:
+    """Get the content hash from a blob key, URL or bare hash; None for anything else"""
+    if not ref:
+        return None
+    ref = ref.split("?", 1)[0].lower()
+    if _SHA256_RE.match(ref):
+        return ref
+    match = _BLOB_KEY_RE.search(ref)
+    return match.group(1) if match else None
+
+class BlobBackend:
+    """Where blob objects are kept"""
+
+    name = "base"
+
+    async def put(self, key: str, source: Path, content_type: Optional[str]) -> None:
+        """Store the file at ``source`` under ``key``; the source may be consumed"""
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path of the object on local disk, if the backend keeps it there"""
+        return None
+
+    async def download(self, key: str, destination: Path) -> None:
+        """Copy the object to a local file"""
+        raise NotImplementedError
+
+    def list_keys(self) -> AsyncIterator[List[Tuple[str, int, float]]]:
+        """Yield stored blob keys with their size and modification time, in batches"""
+        raise NotImplementedError
+
+class LocalBlobBackend(BlobBackend):
+    """Blobs on local disk, under the upload directory"""
+
+    name = "local"
+
+    def __init__(self, root: str = "uploads"):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    async def put(self, key: str, source: Path, content_type: Optional[str]) -> None:
+        await file_io.replace(source, self.path(key))
+
+    async def exists(self, key: str) -> bool:
+        return await file_io.exists(self.path(key))
+
+    async def delete(self, key: str) -> bool:
+        return await file_io.unlink(self.path(key)) is not None
+
+    def url(self, key: str) -> str:
+        return f"/uploads/{key}"
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.path(key)
+
+    async def download(self, key: str, destination: Path) -> None:
+        await file_io.copy(self.path(key), destination)
+
+    async def list_keys(self) -> AsyncIterator[List[Tuple[str, int, float]]]:
+        async for batch in file_io.walk(self.root / "blobs"):
+            yield [
+                (entry.path.relative_to(self.root).as_posix(), entry.size, entry.mtime)
+                for entry in batch if not entry.path.name.endswith(".tmp")
+            ]
+
+class S3BlobBackend(BlobBackend):
+    """Blobs in an S3-compatible bucket; boto3 calls run in threads"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, region: str, public_domain: Optional[str] = None):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("boto3 is required for the s3 blob store backend")
+        self.bucket = bucket
+        self.region = region
+        self.public_domain = public_domain
+        self._client = boto3.client("s3", region_name=region)
+
+    async def put(self, key: str, source: Path, content_type: Optional[str]) -> None:
+        # Content never changes under a key, so it can be cached forever
+        extra_args = {"CacheControl": "public, max-age=31536000, immutable"}
+        if content_type:
+            extra_args["ContentType"] = content_type
+        await asyncio.to_thread(self._client.upload_file, str(source), self.bucket, key, ExtraArgs=extra_args)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self._client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def delete(self, key: str) -> bool:
+        await asyncio.to_thread(self._client.delete_object, Bucket=self.bucket, Key=key)
+        return True
+
+    async def download(self, key: str, destination: Path) -> None:
+        await asyncio.to_thread(self._client.download_file, self.bucket, key, str(destination))
+
+    async def list_keys(self) -> AsyncIterator[List[Tuple[str, int, float]]]:
+        pages = iter(self._client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix="blobs/"))
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                return
+            yield [(item["Key"], item["Size"], item["LastModified"].timestamp()) for item in page.get("Contents", [])]
+
+    def url(self, key: str) -> str:
+        if self.public_domain:
+            return f"https://{self.public_domain}/{key}"
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+class BlobStore:
+    """Reference-counted, deduplicated file storage"""
+
+    def __init__(self, backend: BlobBackend, gc_grace: timedelta, gc_batch_size: int = 500):
+        self.backend = backend
+        self.gc_grace = gc_grace
+        self.gc_batch_size = gc_batch_size
+        self._release_listeners: List[Callable[[str], Awaitable[None]]] = []
+        self._notifications: Set[asyncio.Task] = set()
+        self.metrics = {
+            "stored": 0,
+            "deduplicated": 0,
+            "restored": 0,
+            "released": 0,
+            "collected": 0,
+            "swept": 0,
+            "bytes_stored": 0,
+            "bytes_deduplicated": 0,
+            "bytes_collected": 0,
+            "last_gc_at": None
+        }
+
+    def url(self, key: str) -> str:
+        """Public URL of a stored blob"""
+        return self.backend.url(key)
+
+    async def _add_reference(self, session: AsyncSession, sha256: str) -> Optional[str]:
+        result = await session.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256)
+            .values(ref_count=Blob.ref_count + 1, released_at=None)
+            .returning(Blob.key)
+        )
+        return result.scalar_one_or_none()
+
+    async def put_file(
+        self,
+        session: AsyncSession,
+        source: Path,
+        sha256: str,
+        content_type: Optional[str] = None,
+        extension: str = ""
+    ) -> str:
+        """
+        Store a file by content hash and take a reference to it.
+
+        ``source`` is consumed: moved into storage, or deleted when the same
+        content is already stored. The reference is part of the caller's
+        transaction, which the caller commits; if it rolls back instead, the
+        object is left for ``sweep_untracked``.
+
+        Returns:
+            The blob's storage key
+        """
+        sha256 = sha256.lower()
+        size = (await file_io.stat(source)).st_size
+        try:
+            key = await self._add_reference(session, sha256)
+            if key is None:
+                key = blob_key(sha256, extension)
+                try:
+                    async with session.begin_nested():
+                        await session.execute(
+                            insert(Blob).values(
+                                sha256=sha256, key=key, size=size,
+                                content_type=content_type, ref_count=1
+                            )
+                        )
+                except IntegrityError:
+                    # A concurrent upload of the same content inserted it first
+                    key = await self._add_reference(session, sha256)
+                else:
+                    await self.backend.put(key, source, content_type)
+                    self.metrics["stored"] += 1
+                    self.metrics["bytes_stored"] += size
+                    return key
+
+            # Already stored; the object can be missing if garbage collection raced this upload
+            if not await self.backend.exists(key):
+                await self.backend.put(key, source, content_type)
+                self.metrics["restored"] += 1
+            self.metrics["deduplicated"] += 1
+            self.metrics["bytes_deduplicated"] += size
+            return key
+        finally:
+            await file_io.unlink(source)
+
+    async def release(self, session: AsyncSession, ref: Optional[str]) -> bool:
+        """
+        Drop a reference to a blob, given its key, URL or hash.
+
+        Returns False when ``ref`` isn't a blob (e.g. a file stored before the
+        blob store), so callers can clean those up themselves. Release
+        listeners are called once the session's transaction commits.
+        """
+        sha256 = sha256_from_ref(ref)
+        if sha256 is None:
+            return False
+
+        result = await session.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256, Blob.ref_count > 0)
+            .values(
+                ref_count=Blob.ref_count - 1,
+                released_at=case((Blob.ref_count == 1, datetime.utcnow()), else_=Blob.released_at)
+            )
+            .returning(Blob.ref_count)
+        )
+        ref_count = result.scalar_one_or_none()
+        if ref_count is not None:
+            self.metrics["released"] += 1
+        if ref_count == 0 and self._release_listeners:
+            self._notify_after_commit(session, sha256)
+        return True
+
+    def on_release(self, listener: Callable[[str], Awaitable[None]]) -> None:
+        """Call ``listener`` with a blob's hash once its last reference is released and committed"""
+        self._release_listeners.append(listener)
+
+    def _notify_after_commit(self, session: AsyncSession, sha256: str) -> None:
+        info = session.info
+        if not info.get(_LISTENING):
+            info[_LISTENING] = True
+            event.listen(session.sync_session, "after_commit", self._on_commit)
+            event.listen(session.sync_session, "after_soft_rollback", self._on_rollback)
+        info.setdefault(_PENDING_RELEASES, set()).add(sha256)
+
+    def _on_commit(self, sync_session) -> None:
+        released = sync_session.info.pop(_PENDING_RELEASES, None)
+        if released:
+            task = asyncio.get_running_loop().create_task(self._notify_released(released))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    def _on_rollback(self, sync_session, previous_transaction) -> None:
+        if previous_transaction.parent is None:
+            sync_session.info.pop(_PENDING_RELEASES, None)
+
+    async def _notify_released(self, released: Set[str]) -> None:
+        for sha256 in released:
+            for listener in self._release_listeners:
+                try:
+                    await listener(sha256)
+                except Exception as e:
+                    logger.warning(f"Blob release listener failed for {sha256}: {e}")
+
+    async def flush_releases(self) -> None:
+        """Wait for release listeners scheduled by earlier commits"""
+        if self._notifications:
+            await asyncio.gather(*self._notifications, return_exceptions=True)
+
+    async def get_blob(self, session: AsyncSession, sha256: str) -> Optional[Blob]:
+        """A blob that is still referenced, by hash"""
+        result = await session.execute(
+            select(Blob).where(Blob.sha256 == sha256, Blob.ref_count > 0)
+        )
+        return result.scalar_one_or_none()
+
+    async def collect_garbage(self, session: AsyncSession = None) -> Dict[str, Any]:
+        """
+        Delete blobs unreferenced for longer than the grace period, one batch per call.
+
+        Rows are deleted first and objects removed before the commit, so an
+        upload that re-references a blob mid-collection waits on the row and
+        then stores the object again.
+        """
+        if not session:
+            async with session_scope() as session:
+                return await self.collect_garbage(session)
+
+        cutoff = datetime.utcnow() - self.gc_grace
+        candidates = (
+            select(Blob.sha256)
+            .where(Blob.ref_count == 0, Blob.released_at < cutoff)
+            .limit(self.gc_batch_size)
+            .scalar_subquery()
+        )
+        result = await session.execute(
+            delete(Blob)
+            .where(Blob.sha256.in_(candidates), Blob.ref_count == 0)
+            .returning(Blob.key, Blob.size)
+            .execution_options(synchronize_session=False)
+        )
+        collected = result.all()
+
+        size_freed = 0
+        for key, size in collected:
+            try:
+                await self.backend.delete(key)
+            except Exception as e:
+                logger.warning(f"Could not delete blob {key}: {e}")
+            size_freed += size
+        await session.commit()
+
+        self.metrics["collected"] += len(collected)
+        self.metrics["bytes_collected"] += size_freed
+        self.metrics["last_gc_at"] = datetime.utcnow().isoformat()
+        if collected:
+            logger.info(f"Collected {len(collected)} unreferenced blobs, freed {size_freed} bytes")
+        return {
+            "collected": len(collected),
+            "size_freed": size_freed,
+            "keys": [key for key, _ in collected[:10]]
+        }
+
+    async def sweep_untracked(self, session: AsyncSession = None) -> Dict[str, Any]:
+        """
+        Delete stored objects that have no blob row and are older than the grace period.
+
+        These come from uploads whose transaction rolled back after the object
+        was stored. This lists every key, so it runs occasionally, not with
+        each garbage collection.
+        """
+        if not session:
+            async with session_scope() as session:
+                return await self.sweep_untracked(session)
+
+        cutoff = time.time() - self.gc_grace.total_seconds()
+        swept, checked, size_freed = [], 0, 0
+        async for batch in self.backend.list_keys():
+            old = {}
+            for key, size, modified in batch:
+                sha256 = sha256_from_ref(key)
+                if sha256 is not None and modified < cutoff:
+                    old[sha256] = (key, size)
+            if not old:
+                continue
+            checked += len(old)
+            result = await session.execute(select(Blob.sha256).where(Blob.sha256.in_(list(old))))
+            for sha256 in set(old) - set(result.scalars()):
+                key, size = old[sha256]
+                try:
+                    await self.backend.delete(key)
+                except Exception as e:
+                    logger.warning(f"Could not delete untracked blob {key}: {e}")
+                    continue
+                swept.append(key)
+                size_freed += size
+
+        self.metrics["swept"] += len(swept)
+        self.metrics["bytes_collected"] += size_freed
+        if swept:
+            logger.info(f"Swept {len(swept)} stored objects with no blob row, freed {size_freed} bytes")
+        return {"checked": checked, "swept": len(swept), "size_freed": size_freed, "keys": swept[:10]}
+
+    async def get_usage(self, session: AsyncSession) -> Dict[str, Any]:
+        """Blob counts and sizes, split by referenced and unreferenced"""
+        unreferenced = Blob.ref_count == 0
+        result = await session.execute(
+            select(
+                func.count(Blob.sha256),
+                func.coalesce(func.sum(Blob.size), 0),
+                func.coalesce(func.sum(Blob.ref_count), 0),
+                func.coalesce(func.sum(case((unreferenced, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((unreferenced, Blob.size), else_=0)), 0)
+            )
+        )
+        blobs, size, references, unreferenced_blobs, unreferenced_size = result.one()
+        return {
+            "blobs": blobs,
+            "size": size,
+            "references": references,
+            "unreferenced_blobs": unreferenced_blobs,
+            "unreferenced_size": unreferenced_size
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "gc_grace_hours": self.gc_grace.total_seconds() / 3600,
+            **self.metrics
+        }
+
+def create_blob_backend() -> BlobBackend:
+    """Build the backend selected by BLOB_STORE_BACKEND"""
+    if settings.BLOB_STORE_BACKEND == "s3":
+        return S3BlobBackend(
+            bucket=settings.BLOB_STORE_BUCKET or settings.CDN_BUCKET_NAME,
+            region=settings.BLOB_STORE_REGION,
+            public_domain=settings.CDN_DOMAIN if settings.CDN_ENABLED else None
+        )
+    return LocalBlobBackend("uploads")
+
+# Global blob store
+blob_store = BlobStore(
+    create_blob_backend(),
+    gc_grace=timedelta(hours=settings.BLOB_GC_GRACE_HOURS),
+    gc_batch_size=settings.BLOB_GC_BATCH_SIZE
+)
@@ -3,7 +3,7 @@ import asyncio
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, update, desc
+from sqlalchemy import select, func, and_, update, insert
 from sqlalchemy.orm import selectinload, joinedload
 from uuid import uuid4
 from models.chat import ChatMessage, ChatRoom
@@ -11,7 +11,9 @@ from models.match import Match
 from models.user import User
 from models.task import Task
 from core.socketio_manager import manager
-from core.database import get_async_session, async_session
+from core.database import session_scope, read_only
+from core.hot_queries import match_for_user, chat_history, chat_message_count, chat_room_version
+from core.expiry import expire_rows
 from core.config import settings
 from core.performance_monitor import performance_monitor
 from services.task_submission import task_submission_service
@@ -34,7 +36,7 @@ class ChatService:
     ) -> ChatRoom:
         """Create a chat room for a match"""
         if not session:
-            async with async_session() as session:
+            async with session_scope() as session:
                 return await self._create_chat_room_internal(match, session)
         
         return await self._create_chat_room_internal(match, session)
@@ -66,6 +68,7 @@ class ChatService:
         )
         return result.scalar_one_or_none()
     
+    @read_only
     async def get_chat_messages(
         self, 
         match_id: int, 
@@ -75,10 +78,6 @@ class ChatService:
         session: AsyncSession = None
     ) -> Dict:
         """Get chat messages for a match with pagination"""
-        if not session:
-            async with async_session() as db_session:
-                session = db_session
-        
         offset = (page - 1) * size
         
         # Get total count
@@ -156,6 +155,15 @@ class ChatService:
             "typing_users": typing_users
         }
     
+    async def get_chat_room_status_version(self, match_id: int, session: AsyncSession) -> tuple:
+        """Get the room activity and online users, used as the chat status ETag version"""
+        result = await session.execute(chat_room_version(match_id))
+        row = result.first()
+        return (
+            tuple(row) if row else None,
+            tuple(manager.get_online_users(str(match_id)))
+        )
+    
     async def set_typing_status(self, match_id: int, user_id: int, is_typing: bool):
         """Set typing status for a user in a chat room"""
         manager.set_typing(user_id, str(match_id), is_typing)
@@ -175,7 +183,7 @@ class ChatService:
     ) -> ChatMessage:
         """Send a message in a chat room"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_message_internal(match_id, sender_id, message_text, message_type, task_id, session)
         
         return await self._send_message_internal(match_id, sender_id, message_text, message_type, task_id, session)
@@ -252,7 +260,7 @@ class ChatService:
         """Send a system message (auto-generated)"""
         return await self.send_message(
             match_id=match_id,
-            sender_id=0,  # System user ID
+            sender_id=None,  # System messages have no sender
             message_text=message_text,
             message_type="system",
             is_system_message=True,
@@ -382,7 +390,7 @@ class ChatService:
     ) -> int:
         """Get count of unread messages for a user in a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_unread_count_internal(match_id, user_id, session)
         
         return await self._get_unread_count_internal(match_id, user_id, session)
@@ -400,7 +408,8 @@ class ChatService:
                 .where(
                     and_(
                         ChatMessage.match_id == match_id,
-                        ChatMessage.sender_id != user_id,
+                        # System messages have no sender and still count
+                        ChatMessage.sender_id.is_distinct_from(user_id),
                         ChatMessage.is_read == False
                     )
                 )
@@ -460,32 +469,51 @@ class ChatService:
     
     async def cleanup_expired_matches(self, session: AsyncSession):
         """Clean up expired matches and their chat rooms"""
-        # Find expired matches
-        result = await session.execute(
-            select(Match).where(
-                and_(
-                    Match.status == "active",
-                    Match.created_at < datetime.utcnow() - timedelta(days=2)
-                )
-            )
+        now = datetime.utcnow()
+        notices: List[ChatMessage] = []
+        
+        async def add_notices(session: AsyncSession, expired_rows):
+            notices[:] = await self._add_expiration_notices(session, [row.id for row in expired_rows])
+        
+        async def emit_notices(expired_rows):
+            for message in notices:
+                await self._emit_message_to_room(message.match_id, message)
+            logger.info(f"Marked {len(expired_rows)} matches as expired")
+        
+        return await expire_rows(
+            session,
+            "cleanup_expired_matches",
+            Match,
+            and_(
+                Match.status == "active",
+                Match.created_at < now - timedelta(days=2)
+            ),
+            {"status": "expired", "completed_at": now},
+            on_batch=add_notices,
+            after_commit=emit_notices
         )
-        expired_matches = result.scalars().all()
-        
-        for match in expired_matches:
-            # Mark match as expired
-            match.status = "expired"
-            match.completed_at = datetime.utcnow()
-            
-            # Cancel auto-greeting timer
-            await self.cancel_auto_greeting_timer(match.id)
-            
-            # Send expiration notification
-            expiration_text = "This match has expired. You can start a new match!"
-            await self.send_system_message(match.id, expiration_text, session)
-            
-            logger.info(f"Marked match {match.id} as expired")
+    
+    async def _add_expiration_notices(self, session: AsyncSession, match_ids: List[int]) -> List[ChatMessage]:
+        """Cancel timers and insert one expiration notice per expired match"""
+        for match_id in match_ids:
+            await self.cancel_auto_greeting_timer(match_id)
         
-        await session.commit()
+        expiration_text = "This match has expired. You can start a new match!"
+        result = await session.execute(
+            insert(ChatMessage).returning(ChatMessage),
+            [
+                {
+                    "match_id": match_id,
+                    "sender_id": None,  # System messages have no sender
+                    "message_text": expiration_text,
+                    "message_type": "system",
+                    "is_read": False,
+                    "is_system_message": True
+                }
+                for match_id in match_ids
+            ]
+        )
+        return list(result.scalars().all())
 
     async def send_message_to_match(
         self, 
@@ -497,7 +525,7 @@ class ChatService:
     ) -> ChatMessage:
         """Send a message to a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_message_to_match_internal(match_id, user_id, message_text, message_type, session)
         
         return await self._send_message_to_match_internal(match_id, user_id, message_text, message_type, session)
@@ -517,12 +545,7 @@ class ChatService:
                 raise ValueError(f"Message too long. Maximum length is {self.max_message_length} characters")
             
             # Validate user is in match
-            result = await session.execute(
-                select(Match).where(
-                    Match.id == match_id,
-                    (Match.user1_id == user_id) | (Match.user2_id == user_id)
-                )
-            )
+            result = await session.execute(match_for_user(match_id, user_id))
             match = result.scalar_one_or_none()
             
             if not match:
@@ -548,6 +571,7 @@ class ChatService:
             logger.error(f"Error sending message: {str(e)}")
             raise
     
+    @read_only
     async def get_chat_history(
         self,
         match_id: int,
@@ -558,7 +582,7 @@ class ChatService:
     ) -> List[ChatMessage]:
         """Get chat history with optimized query and eager loading"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_chat_history_internal(match_id, session, limit, offset, include_system)
         
         return await self._get_chat_history_internal(match_id, session, limit, offset, include_system)
@@ -572,28 +596,14 @@ class ChatService:
         include_system: bool = False
     ) -> List[ChatMessage]:
         """Internal method to get chat history with optimized query"""
-        # Build optimized query using indexes
-        query = (
-            select(ChatMessage)
-            .where(ChatMessage.match_id == match_id)
-            .options(
-                selectinload(ChatMessage.sender),
-                selectinload(ChatMessage.task)
-            )
-            .order_by(desc(ChatMessage.created_at))
-            .offset(offset)
-            .limit(limit)
-        )
-        
-        if not include_system:
-            query = query.where(ChatMessage.is_system_message == False)
-        
-        result = await session.execute(query)
+        # Pre-compiled hot query using indexes
+        result = await session.execute(chat_history(match_id, limit, offset, include_system))
         messages = result.scalars().all()
         
         # Reverse to get chronological order
         return list(reversed(messages))
     
+    @read_only
     async def get_chat_history_paginated(
         self,
         match_id: int,
@@ -605,7 +615,7 @@ class ChatService:
     ) -> Dict[str, Any]:
         """Get paginated chat history with optimized query"""
         if not session:
-            async with async_session() as session:
+            async with session_scope() as session:
                 return await self._get_chat_history_paginated_internal(match_id, user_id, page, size, include_system, session)
         
         return await self._get_chat_history_paginated_internal(match_id, user_id, page, size, include_system, session)
@@ -622,12 +632,7 @@ class ChatService:
         """Internal method to get paginated chat history with optimized query"""
         try:
             # Validate user
-            result = await session.execute(
-                select(Match).where(
-                    Match.id == match_id,
-                    (Match.user1_id == user_id) | (Match.user2_id == user_id)
-                )
-            )
+            result = await session.execute(match_for_user(match_id, user_id))
             match = result.scalar_one_or_none()
             if not match:
                 raise ValueError("User not authorized for this match")
@@ -635,11 +640,7 @@ class ChatService:
             offset = (page - 1) * size
             
             # Get total count with optimized query
-            count_query = select(func.count(ChatMessage.id)).where(ChatMessage.match_id == match_id)
-            if not include_system:
-                count_query = count_query.where(ChatMessage.is_system_message == False)
-            
-            result = await session.execute(count_query)
+            result = await session.execute(chat_message_count(match_id, include_system))
             total = result.scalar()
             
             # Get messages with eager loading
@@ -658,6 +659,7 @@ class ChatService:
             logger.error(f"Error getting chat history: {str(e)}")
             raise
     
+    @read_only
     async def get_chat_history_cursor(
         self,
         match_id: int,
@@ -670,19 +672,14 @@ class ChatService:
     ) -> Dict[str, Any]:
         """Get chat history using cursor pagination (by created_at)"""
         if not session:
-            async with async_session() as session:
+            async with session_scope() as session:
                 return await self._get_chat_history_cursor_internal(match_id, user_id, cursor, size, direction, include_system, session)
         return await self._get_chat_history_cursor_internal(match_id, user_id, cursor, size, direction, include_system, session)
 
     async def _get_chat_history_cursor_internal(self, match_id: int, user_id: int, cursor: Optional[datetime], size: int, direction: str, include_system: bool, session: AsyncSession) -> Dict[str, Any]:
         try:
             # Validate user
-            result = await session.execute(
-                select(Match).where(
-                    Match.id == match_id,
-                    (Match.user1_id == user_id) | (Match.user2_id == user_id)
-                )
-            )
+            result = await session.execute(match_for_user(match_id, user_id))
             match = result.scalar_one_or_none()
             if not match:
                 raise ValueError("User not authorized for this match")
@@ -737,7 +734,7 @@ class ChatService:
     ) -> int:
         """Mark messages as read with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._mark_messages_as_read_internal(match_id, user_id, message_ids, session)
         
         return await self._mark_messages_as_read_internal(match_id, user_id, message_ids, session)
@@ -757,7 +754,8 @@ class ChatService:
                 .where(
                     and_(
                         ChatMessage.match_id == match_id,
-                        ChatMessage.sender_id != user_id,
+                        # System messages have no sender and still count
+                        ChatMessage.sender_id.is_distinct_from(user_id),
                         ChatMessage.is_read == False
                     )
                 )
@@ -778,7 +776,7 @@ class ChatService:
     async def get_typing_status(self, match_id: int, user_id: int, session: AsyncSession = None) -> List[int]:
         """Get typing status for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_typing_status_internal(match_id, user_id, session)
         
         return await self._get_typing_status_internal(match_id, user_id, session)
@@ -787,12 +785,7 @@ class ChatService:
         """Internal method to get typing status"""
         try:
             # Validate user is in match
-            result = await session.execute(
-                select(Match).where(
-                    Match.id == match_id,
-                    (Match.user1_id == user_id) | (Match.user2_id == user_id)
-                )
-            )
+            result = await session.execute(match_for_user(match_id, user_id))
             match = result.scalar_one_or_none()
             
             if not match:
@@ -814,7 +807,7 @@ class ChatService:
     ) -> bool:
         """Validate user is in match with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._validate_user_in_match_internal(match_id, user_id, session)
         
         return await self._validate_user_in_match_internal(match_id, user_id, session)
@@ -827,15 +820,7 @@ class ChatService:
     ) -> bool:
         """Internal method to validate user in match with optimized query"""
         async with performance_monitor("validate_user_in_match", user_id=user_id):
-            result = await session.execute(
-                select(Match)
-                .where(
-                    and_(
-                        Match.id == match_id,
-                        or_(Match.user1_id == user_id, Match.user2_id == user_id)
-                    )
-                )
-            )
+            result = await session.execute(match_for_user(match_id, user_id))
             return result.scalar_one_or_none() is not None
     
     async def submit_task_completion(
@@ -847,7 +832,7 @@ class ChatService:
     ) -> Any:
         """Submit task completion via chat with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._submit_task_completion_internal(task_id, user_id, submission_data, session)
         
         return await self._submit_task_completion_internal(task_id, user_id, submission_data, session)
@@ -7,7 +7,7 @@ import random
 
 from models.match import Match
 from models.user import User
-from core.database import get_async_session
+from core.database import session_scope
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +20,7 @@ class ConversationStarterService:
     async def assign_conversation_starter(self, match_id: int, session: AsyncSession = None) -> Dict[str, any]:
         """Assign a random conversation starter to a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._assign_conversation_starter_internal(match_id, session)
         
         return await self._assign_conversation_starter_internal(match_id, session)
@@ -71,7 +71,7 @@ class ConversationStarterService:
     async def get_conversation_starter(self, match_id: int, session: AsyncSession = None) -> Optional[Dict[str, any]]:
         """Get current conversation starter for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_conversation_starter_internal(match_id, session)
         
         return await self._get_conversation_starter_internal(match_id, session)
@@ -108,7 +108,7 @@ class ConversationStarterService:
     async def reset_conversation_starter(self, match_id: int, session: AsyncSession = None) -> Dict[str, any]:
         """Reset conversation starter for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._reset_conversation_starter_internal(match_id, session)
         
         return await self._reset_conversation_starter_internal(match_id, session)
@@ -145,7 +145,7 @@ class ConversationStarterService:
     async def check_starter_timeout(self, match_id: int, session: AsyncSession = None) -> Optional[Dict[str, any]]:
         """Check if conversation starter has timed out and handle accordingly"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._check_starter_timeout_internal(match_id, session)
         
         return await self._check_starter_timeout_internal(match_id, session)
@@ -194,7 +194,7 @@ class ConversationStarterService:
     async def mark_greeting_sent(self, match_id: int, session: AsyncSession = None) -> bool:
         """Mark that a greeting has been sent for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._mark_greeting_sent_internal(match_id, session)
         
         return await self._mark_greeting_sent_internal(match_id, session)
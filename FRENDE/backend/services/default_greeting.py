@@ -6,7 +6,7 @@ import logging
 import random
 
 from models.user import User
-from core.database import get_async_session
+from core.database import session_scope
 
 logger = logging.getLogger(__name__)
 
@@ -179,7 +179,7 @@ class DefaultGreetingService:
     async def get_user_greeting_preference(self, user_id: int, session: AsyncSession = None) -> Optional[str]:
         """Get user's preferred greeting template"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_user_greeting_preference_internal(user_id, session)
         
         return await self._get_user_greeting_preference_internal(user_id, session)
@@ -198,7 +198,7 @@ class DefaultGreetingService:
     async def save_user_greeting_preference(self, user_id: int, template_id: str, session: AsyncSession = None) -> bool:
         """Save user's preferred greeting template"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._save_user_greeting_preference_internal(user_id, template_id, session)
         
         return await self._save_user_greeting_preference_internal(user_id, template_id, session)
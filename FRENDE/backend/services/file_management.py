@@ -10,14 +10,14 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-import aiofiles
-import shutil
+from sqlalchemy import func
 
+from core import file_io
 from core.config import settings
-from models.user import User
+from core.file_io import storage_stats
 from models.chat import ChatMessage
 from services.file_storage import file_storage_service
+from services.blob_store import blob_store
 
 logger = logging.getLogger(__name__)
 
@@ -38,45 +38,23 @@ class FileManagementService:
     
     async def cleanup_orphaned_files(self, session: AsyncSession) -> Dict[str, Any]:
         """
-        Find and delete files not referenced in database
+        Delete stored files no profile picture or submission references
+        
+        Uploads are reference counted in the blob store, so this is an indexed
+        query for blobs unreferenced past the grace period, plus a sweep of
+        stored objects left without a blob row by uploads that rolled back.
         
         Returns:
             Dictionary with cleanup statistics
         """
         try:
-            # Get all profile pictures referenced in database
-            result = await session.execute(
-                select(User.profile_picture_url).where(User.profile_picture_url.isnot(None))
-            )
-            referenced_files = {row[0] for row in result.fetchall()}
-            
-            # Scan upload directory for orphaned files
-            orphaned_files = []
-            total_size_freed = 0
-            
-            for file_path in self.upload_dir.rglob("*"):
-                if file_path.is_file():
-                    relative_path = str(file_path.relative_to(self.upload_dir))
-                    
-                    # Check if file is referenced in database
-                    if relative_path not in referenced_files:
-                        file_size = file_path.stat().st_size
-                        orphaned_files.append({
-                            "path": relative_path,
-                            "size": file_size,
-                            "modified": datetime.fromtimestamp(file_path.stat().st_mtime)
-                        })
-                        
-                        # Delete orphaned file
-                        file_path.unlink()
-                        total_size_freed += file_size
-            
-            logger.info(f"Cleaned up {len(orphaned_files)} orphaned files, freed {total_size_freed} bytes")
+            result = await blob_store.collect_garbage(session)
+            swept = await blob_store.sweep_untracked(session)
             
             return {
-                "orphaned_files_count": len(orphaned_files),
-                "total_size_freed": total_size_freed,
-                "orphaned_files": orphaned_files[:10]  # Return first 10 for logging
+                "orphaned_files_count": result["collected"] + swept["swept"],
+                "total_size_freed": result["size_freed"] + swept["size_freed"],
+                "orphaned_files": result["keys"] + swept["keys"]
             }
             
         except Exception as e:
@@ -103,30 +81,31 @@ class FileManagementService:
             
             # Compress old profile pictures
             profile_dir = self.upload_dir / "profiles"
-            if profile_dir.exists():
-                for file_path in profile_dir.rglob("*.jpg"):
-                    file_age = datetime.now() - datetime.fromtimestamp(file_path.stat().st_mtime)
+            async for batch in file_io.walk(profile_dir):
+                for entry in batch:
+                    if entry.path.suffix != ".jpg":
+                        continue
+                    file_age = datetime.now() - datetime.fromtimestamp(entry.mtime)
                     
                     # Compress files older than 30 days
                     if file_age.days > 30:
-                        original_size = file_path.stat().st_size
+                        original_size = entry.size
                         
                         # Create compressed version
-                        compressed_path = file_path.with_suffix('.jpg.compressed')
+                        compressed_path = entry.path.with_suffix('.jpg.compressed')
                         
                         # For now, just copy the file (actual compression would be implemented)
-                        shutil.copy2(file_path, compressed_path)
-                        
-                        compressed_size = compressed_path.stat().st_size
+                        compressed_size = await file_io.copy(entry.path, compressed_path)
                         size_saved = original_size - compressed_size
                         
                         if size_saved > 0:
                             # Replace original with compressed version
-                            file_path.unlink()
-                            compressed_path.rename(file_path)
+                            await file_io.replace(compressed_path, entry.path)
                             
                             optimization_stats["files_compressed"] += 1
                             optimization_stats["size_saved"] += size_saved
+                        else:
+                            await file_io.unlink(compressed_path)
             
             logger.info(f"Storage optimization completed: {optimization_stats}")
             return optimization_stats
@@ -157,23 +136,18 @@ class FileManagementService:
             # Create backup timestamp
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_path = self.backup_dir / f"critical_files_{timestamp}"
-            backup_path.mkdir(exist_ok=True)
+            await file_io.mkdir(backup_path)
             
-            # Backup profile pictures
-            profile_dir = self.upload_dir / "profiles"
-            if profile_dir.exists():
-                profile_backup = backup_path / "profiles"
-                profile_backup.mkdir(exist_ok=True)
+            # Backup profile pictures and content-addressed uploads
+            for area in ("profiles", "blobs"):
+                area_dir = self.upload_dir / area
+                area_backup = backup_path / area
                 
-                for file_path in profile_dir.rglob("*"):
-                    if file_path.is_file():
-                        relative_path = file_path.relative_to(profile_dir)
-                        backup_file = profile_backup / relative_path
-                        backup_file.parent.mkdir(parents=True, exist_ok=True)
-                        
-                        shutil.copy2(file_path, backup_file)
+                async for batch in file_io.walk(area_dir):
+                    for entry in batch:
+                        backup_file = area_backup / entry.path.relative_to(area_dir)
+                        backup_stats["backup_size"] += await file_io.copy(entry.path, backup_file)
                         backup_stats["files_backed_up"] += 1
-                        backup_stats["backup_size"] += file_path.stat().st_size
             
             # Create backup manifest
             manifest_path = backup_path / "manifest.json"
@@ -184,8 +158,7 @@ class FileManagementService:
                 "backup_type": "critical_files"
             }
             
-            async with aiofiles.open(manifest_path, 'w') as f:
-                await f.write(str(manifest))
+            await file_io.write_text(manifest_path, str(manifest))
             
             backup_stats["backup_path"] = str(backup_path)
             
@@ -205,74 +178,25 @@ class FileManagementService:
         """
         Get comprehensive storage statistics
         
+        Totals are kept up to date as files are written and removed (and
+        reconciled periodically), so this never walks the upload tree.
+        
         Returns:
             Dictionary with storage statistics
         """
-        try:
-            stats = {
-                "total_files": 0,
-                "total_size": 0,
-                "files_by_type": {},
-                "oldest_file": None,
-                "newest_file": None,
-                "largest_file": None
-            }
-            
-            oldest_time = datetime.now()
-            newest_time = datetime.fromtimestamp(0)
-            largest_size = 0
-            largest_file = None
-            
-            for file_path in self.upload_dir.rglob("*"):
-                if file_path.is_file():
-                    file_stat = file_path.stat()
-                    file_size = file_stat.st_size
-                    file_time = datetime.fromtimestamp(file_stat.st_mtime)
-                    file_ext = file_path.suffix.lower()
-                    
-                    stats["total_files"] += 1
-                    stats["total_size"] += file_size
-                    
-                    # Track file types
-                    if file_ext not in stats["files_by_type"]:
-                        stats["files_by_type"][file_ext] = {"count": 0, "size": 0}
-                    stats["files_by_type"][file_ext]["count"] += 1
-                    stats["files_by_type"][file_ext]["size"] += file_size
-                    
-                    # Track oldest and newest files
-                    if file_time < oldest_time:
-                        oldest_time = file_time
-                        stats["oldest_file"] = {
-                            "path": str(file_path.relative_to(self.upload_dir)),
-                            "modified": file_time.isoformat()
-                        }
-                    
-                    if file_time > newest_time:
-                        newest_time = file_time
-                        stats["newest_file"] = {
-                            "path": str(file_path.relative_to(self.upload_dir)),
-                            "modified": file_time.isoformat()
-                        }
-                    
-                    # Track largest file
-                    if file_size > largest_size:
-                        largest_size = file_size
-                        largest_file = {
-                            "path": str(file_path.relative_to(self.upload_dir)),
-                            "size": file_size
-                        }
-            
-            stats["largest_file"] = largest_file
-            
-            return stats
-            
-        except Exception as e:
-            logger.error(f"Error getting storage statistics: {str(e)}")
-            return {
-                "error": str(e),
-                "total_files": 0,
-                "total_size": 0
-            }
+        return storage_stats.get_stats()
+    
+    async def reconcile_storage_statistics(self) -> Dict[str, int]:
+        """
+        Recount the upload tree with a batched walk, correcting any drift
+        
+        Returns:
+            The change in file count and bytes from the running totals
+        """
+        drift = await storage_stats.reconcile()
+        if drift["files"] or drift["bytes"]:
+            logger.info(f"Storage statistics reconciled, drift: {drift}")
+        return drift
     
     async def cleanup_old_backups(self, days_to_keep: int = 30) -> Dict[str, Any]:
         """
@@ -289,26 +213,24 @@ class FileManagementService:
             deleted_backups = []
             freed_space = 0
             
-            for backup_dir in self.backup_dir.iterdir():
-                if backup_dir.is_dir():
-                    backup_time = datetime.fromtimestamp(backup_dir.stat().st_mtime)
+            def list_backups() -> List[tuple]:
+                return [
+                    (path, datetime.fromtimestamp(path.stat().st_mtime))
+                    for path in self.backup_dir.iterdir() if path.is_dir()
+                ]
+            
+            for backup_dir, backup_time in await file_io.run(list_backups):
+                if backup_time < cutoff_date:
+                    # Delete backup directory, counting what it held
+                    _, backup_size = await file_io.rmtree(backup_dir)
                     
-                    if backup_time < cutoff_date:
-                        # Calculate size before deletion
-                        backup_size = sum(
-                            f.stat().st_size for f in backup_dir.rglob("*") if f.is_file()
-                        )
-                        
-                        # Delete backup directory
-                        shutil.rmtree(backup_dir)
-                        
-                        deleted_backups.append({
-                            "path": str(backup_dir),
-                            "size": backup_size,
-                            "created": backup_time.isoformat()
-                        })
-                        
-                        freed_space += backup_size
+                    deleted_backups.append({
+                        "path": str(backup_dir),
+                        "size": backup_size,
+                        "created": backup_time.isoformat()
+                    })
+                    
+                    freed_space += backup_size
             
             logger.info(f"Cleaned up {len(deleted_backups)} old backups, freed {freed_space} bytes")
             
@@ -1,9 +1,9 @@
 import os
-import aiofiles
 import logging
 from pathlib import Path
 from typing import Optional
 from fastapi import HTTPException, status
+from core import file_io
 from core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -38,16 +38,11 @@ class FileStorageService:
             File path relative to upload directory
         """
         try:
-            # Create user-specific directory
-            user_dir = self.profile_dir / str(user_id)
-            user_dir.mkdir(exist_ok=True)
-            
-            # Full file path
-            file_path = user_dir / filename
+            # Full file path, in a user-specific directory
+            file_path = self.profile_dir / str(user_id) / filename
             
-            # Save file
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(file_content)
+            # Save file (the directory is created off the event loop)
+            await file_io.write_bytes(file_path, file_content)
             
             # Return relative path for database storage
             relative_path = str(file_path.relative_to(self.upload_dir))
@@ -75,8 +70,7 @@ class FileStorageService:
         try:
             full_path = self.upload_dir / file_path
             
-            if full_path.exists():
-                full_path.unlink()
+            if await file_io.unlink(full_path) is not None:
                 logger.info(f"Deleted profile picture: {file_path}")
                 return True
             else:
@@ -156,14 +150,12 @@ class FileStorageService:
         try:
             user_dir = self.profile_dir / str(user_id)
             
-            if not user_dir.exists():
-                return
-            
             # Delete all profile pictures except the current one
-            for file_path in user_dir.iterdir():
-                if file_path.is_file() and file_path.name != keep_filename:
-                    file_path.unlink()
-                    logger.info(f"Cleaned up old profile picture: {file_path.name}")
+            async for batch in file_io.walk(user_dir):
+                for entry in batch:
+                    if entry.path.name != keep_filename:
+                        await file_io.unlink(entry.path)
+                        logger.info(f"Cleaned up old profile picture: {entry.path.name}")
                     
         except Exception as e:
             logger.error(f"Error cleaning up old profile pictures for user {user_id}: {str(e)}")
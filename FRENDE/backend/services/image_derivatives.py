@@ -0,0 +1,298 @@
+"""
+Image Derivative Service for Frende App
+Generates image sizes and formats on first request, cached in a disk LRU
+
+Uploads are stored once (the blob store's primary rendition). A request for
+``/uploads/{hash}?w=&fmt=`` is resolved to a derivative: the width snaps up
+to one of a fixed set of sizes, the format comes from ``fmt`` or the
+``Accept`` header (AVIF, then WebP, then JPEG), and the file is generated by
+the image pipeline's worker processes the first time it is asked for.
+Generated files live in a size-bounded cache directory, evicting the least
+recently served; concurrent requests for the same derivative share a single
+generation.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import file_io
+from core.config import settings
+from services.blob_store import blob_store
+from services.image_pipeline import image_pipeline
+from services.image_renditions import AVIF_AVAILABLE, render_derivative
+
+logger = logging.getLogger(__name__)
+
+# Requested format: (Pillow format, extension, content type)
+DERIVATIVE_FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "avif": ("AVIF", "avif", "image/avif"),
+    "png": ("PNG", "png", "image/png"),
+}
+
+class DerivativeNotFound(Exception):
+    """The hash isn't a stored, referenced image"""
+
+class UndecodableImage(Exception):
+    """The stored image can't be decoded"""
+
+def _is_decode_error(error: Exception) -> bool:
+    # Pillow's decode failures carry no errno, unlike disk errors writing the derivative
+    if isinstance(error, (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError)):
+        return True
+    return isinstance(error, OSError) and error.errno is None
+
+class DerivativeCache:
+    """Disk LRU of generated images with a byte budget"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._names_by_hash: Dict[str, Set[str]] = {}
+        self.total_bytes = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0, "purged": 0}
+
+    @staticmethod
+    def name(sha256: str, width: Optional[int], image_format: str) -> str:
+        """Cache-relative file name of a derivative"""
+        return f"{sha256[:2]}/{sha256}_w{width or 0}.{DERIVATIVE_FORMATS[image_format][1]}"
+
+    def path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _register(self, name: str, size: int) -> None:
+        previous = self._entries.pop(name, None)
+        if previous is not None:
+            self.total_bytes -= previous
+        self._entries[name] = size
+        self.total_bytes += size
+        self._names_by_hash.setdefault(name.split("/", 1)[-1].split("_", 1)[0], set()).add(name)
+
+    def _forget(self, name: str) -> Optional[int]:
+        size = self._entries.pop(name, None)
+        if size is None:
+            return None
+        self.total_bytes -= size
+        sha256 = name.split("/", 1)[-1].split("_", 1)[0]
+        names = self._names_by_hash.get(sha256)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self._names_by_hash[sha256]
+        return size
+
+    async def load(self) -> None:
+        """Index what's already on disk, oldest first, with a batched walk"""
+        async with self._load_lock:
+            if self._loaded:
+                return
+            found: List[file_io.FileEntry] = []
+            async for batch in file_io.walk(self.directory):
+                found.extend(entry for entry in batch if not entry.path.name.endswith(".tmp"))
+            for entry in sorted(found, key=lambda entry: entry.mtime):
+                self._register(entry.path.relative_to(self.directory).as_posix(), entry.size)
+            self._loaded = True
+            await self._evict()
+
+    def get(self, name: str) -> Optional[Path]:
+        """Path of a cached derivative, marking it recently used"""
+        if name not in self._entries:
+            self.metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(name)
+        self.metrics["hits"] += 1
+        return self.path(name)
+
+    def discard(self, name: str) -> None:
+        """Forget a derivative whose file has gone"""
+        self._forget(name)
+
+    async def add(self, name: str, size: int) -> None:
+        """Record a newly written derivative and evict down to the budget"""
+        self._register(name, size)
+        await self._evict(keep=name)
+
+    async def _evict(self, keep: Optional[str] = None) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            name = next(iter(self._entries))
+            if name == keep:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(name)
+                continue
+            size = self._forget(name)
+            await file_io.unlink(self.path(name))
+            self.metrics["evictions"] += 1
+            self.metrics["evicted_bytes"] += size
+
+    async def purge(self, sha256: str) -> int:
+        """Delete every derivative of an image"""
+        names = list(self._names_by_hash.get(sha256, ()))
+        for name in names:
+            self._forget(name)
+            await file_io.unlink(self.path(name))
+        self.metrics["purged"] += len(names)
+        return len(names)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(self.metrics["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+class ImageDerivativeService:
+    """Resolves, generates and caches image derivatives"""
+
+    def __init__(self, cache: DerivativeCache, widths: List[int], quality: int):
+        self.cache = cache
+        self.widths = widths
+        self.quality = quality
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.metrics = {"generated": 0, "coalesced": 0, "failed": 0, "bytes_generated": 0}
+
+    def available_formats(self) -> List[str]:
+        """Formats that can be negotiated, most preferred first"""
+        formats = []
+        if settings.AVIF_ENABLED and AVIF_AVAILABLE:
+            formats.append("avif")
+        if settings.WEBP_ENABLED:
+            formats.append("webp")
+        return formats
+
+    def negotiate(self, fmt: Optional[str], accept: Optional[str]) -> Tuple[str, bool]:
+        """
+        Pick the output format.
+
+        Returns the format and whether it depended on ``Accept`` (so the
+        response must vary on it).
+        """
+        if fmt and fmt != "auto":
+            if fmt == "avif" and "avif" not in self.available_formats():
+                return "webp" if "webp" in self.available_formats() else "jpeg", False
+            return fmt, False
+
+        accept = (accept or "").lower()
+        for candidate in self.available_formats():
+            if f"image/{candidate}" in accept:
+                return candidate, True
+        return "jpeg", True
+
+    def snap_width(self, width: Optional[int]) -> Optional[int]:
+        """Round a requested width up to the next generated width"""
+        if width is None or not self.widths:
+            return width
+        for candidate in self.widths:
+            if candidate >= width:
+                return candidate
+        return self.widths[-1]
+
+    async def get(
+        self,
+        session: AsyncSession,
+        sha256: str,
+        width: Optional[int],
+        image_format: str
+    ) -> Tuple[Path, os.stat_result, str]:
+        """
+        Get a derivative, generating it on a cache miss.
+
+        Returns its path, stat result and content type. Raises
+        ``DerivativeNotFound`` when the hash isn't a referenced image,
+        ``UndecodableImage`` when it can't be decoded and ``ServiceBusyError``
+        when no worker frees up in time.
+        """
+        await self.cache.load()
+        name = DerivativeCache.name(sha256, width, image_format)
+        content_type = DERIVATIVE_FORMATS[image_format][2]
+
+        path = self.cache.get(name)
+        if path is not None:
+            stat_result = await file_io.stat(path)
+            if stat_result is not None:
+                return path, stat_result, content_type
+            self.cache.discard(name)
+
+        task = self._inflight.get(name)
+        if task is None:
+            # Resolved in the request's own session, before the shared task starts
+            blob = await blob_store.get_blob(session, sha256)
+            if blob is None or not (blob.content_type or "").startswith("image/"):
+                raise DerivativeNotFound(sha256)
+            # Another request may have started it during the lookup
+            task = self._inflight.get(name)
+
+        if task is None:
+            task = asyncio.create_task(self._generate(blob.key, name, width, image_format))
+            self._inflight[name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        else:
+            self.metrics["coalesced"] += 1
+
+        # A client going away doesn't cancel a generation others may be waiting on
+        path = await asyncio.shield(task)
+        return path, await file_io.stat(path), content_type
+
+    async def _generate(self, key: str, name: str, width: Optional[int], image_format: str) -> Path:
+        path = self.cache.path(name)
+        await file_io.mkdir(path.parent)
+
+        source = blob_store.backend.local_path(key)
+        downloaded = None
+        if source is None:
+            downloaded = source = self.cache.directory / f"{uuid.uuid4().hex}.source.tmp"
+            await blob_store.backend.download(key, source)
+
+        try:
+            result = await image_pipeline.run(
+                "derivative", render_derivative,
+                str(source), str(path), width or 1_000_000, DERIVATIVE_FORMATS[image_format][0], self.quality
+            )
+        except Exception as e:
+            self.metrics["failed"] += 1
+            if _is_decode_error(e):
+                logger.warning(f"Could not decode image {key}: {e}")
+                raise UndecodableImage(key) from e
+            raise
+        finally:
+            if downloaded is not None:
+                await file_io.unlink(downloaded)
+
+        await self.cache.add(name, result["size"])
+        self.metrics["generated"] += 1
+        self.metrics["bytes_generated"] += result["size"]
+        return path
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "inflight": len(self._inflight),
+            "widths": self.widths,
+            "formats": ["jpeg", "png", *self.available_formats()],
+            "cache": self.cache.get_stats()
+        }
+
+# Global derivative service
+image_derivatives = ImageDerivativeService(
+    DerivativeCache(settings.IMAGE_DERIVATIVE_CACHE_DIR, settings.IMAGE_DERIVATIVE_CACHE_MB * 1024 * 1024),
+    widths=settings.get_image_derivative_widths(),
+    quality=settings.IMAGE_DERIVATIVE_QUALITY
+)
+
+# A released image's derivatives go with its last reference
+blob_store.on_release(image_derivatives.cache.purge)
@@ -0,0 +1,214 @@
+"""
+Image Processing Pipeline for Frende App
+Runs decode/resize/encode work in a bounded process pool, off the event loop
+
+Pillow holds the GIL for most of a decode or LANCZOS resize, so threads
+would still stall every socket on the worker. Work goes to a
+``ProcessPoolExecutor`` behind an admission gate: when the pool and its wait
+queue are full, uploads are shed with a fast 503 instead of piling up.
+Renditions that the response doesn't need run as background jobs which can
+be cancelled, e.g. when the same user uploads a newer picture.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from core.config import settings
+from core.exceptions import ServiceBusyError
+from core.pool_monitor import AdmissionGate, latency_summary
+
+logger = logging.getLogger(__name__)
+
+class ImageJob:
+    """A background rendition job"""
+
+    def __init__(self, key: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.created_at = datetime.utcnow()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+class ImagePipeline:
+    """Bounded process pool for image work with background jobs"""
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        queue_timeout: float,
+        max_jobs: int = 1000,
+        sample_size: int = 1000
+    ):
+        self.workers = max(workers, 1)
+        self.gate = AdmissionGate(limit=self.workers, max_queue=max_queue, queue_timeout=queue_timeout)
+        self.max_jobs = max_jobs
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, ImageJob]" = OrderedDict()
+        self._active_by_key: Dict[str, ImageJob] = {}
+        self._sample_size = sample_size
+        self.stage_ms: Dict[str, deque] = {}
+        self.metrics = {"tasks": 0, "jobs": 0, "completed": 0, "failed": 0, "cancelled": 0, "superseded": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: the parent has live threads (log writer, DB pool)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _record(self, stage: str, ms: float) -> None:
+        samples = self.stage_ms.get(stage)
+        if samples is None:
+            samples = self.stage_ms[stage] = deque(maxlen=self._sample_size)
+        samples.append(ms)
+
+    async def run(self, name: str, func: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+        """
+        Run a worker function in the pool and wait for it.
+
+        Raises ``ServiceBusyError`` when no worker frees up within the queue
+        timeout. Cancelling the caller drops the call if it hasn't started.
+        """
+        queued_at = time.perf_counter()
+        if not await self.gate.acquire():
+            raise ServiceBusyError("Image processing is busy, please retry", retry_after=2)
+
+        started_at = time.perf_counter()
+        self._record("queue_wait", (started_at - queued_at) * 1000)
+        self.metrics["tasks"] += 1
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self.gate.release()
+            raise
+        # Cancelling the caller leaves a running worker busy, so the slot
+        # stays taken until the worker is done; a queued one is cancelled
+        self.gate.release_when_done(future)
+        result = await asyncio.wrap_future(future)
+
+        self._record(name, (time.perf_counter() - started_at) * 1000)
+        for stage, ms in result.get("timings", {}).items():
+            self._record(f"{name}.{stage}", ms)
+        return result
+
+    def submit(
+        self,
+        name: str,
+        func: Callable[..., Dict[str, Any]],
+        *args,
+        key: Optional[str] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> ImageJob:
+        """
+        Run a worker function as a background job.
+
+        A job submitted with the ``key`` of a still-running job supersedes
+        and cancels it. ``on_result`` is called with the result of a job
+        that completes.
+        """
+        if key is not None:
+            previous = self._active_by_key.get(key)
+            if previous is not None and self.cancel(previous.id):
+                self.metrics["superseded"] += 1
+
+        job = ImageJob(key)
+        job.task = asyncio.create_task(self._run_job(job, name, func, on_result, *args))
+        job.task.add_done_callback(lambda task: self._finish_job(job, task))
+        self._jobs[job.id] = job
+        if key is not None:
+            self._active_by_key[key] = job
+        self.metrics["jobs"] += 1
+
+        # Forget the oldest finished jobs
+        while len(self._jobs) > self.max_jobs:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.task is not None and not oldest.task.done():
+                break
+            del self._jobs[oldest_id]
+        return job
+
+    async def _run_job(
+        self,
+        job: ImageJob,
+        name: str,
+        func: Callable[..., Dict[str, Any]],
+        on_result: Optional[Callable[[Dict[str, Any]], None]],
+        *args
+    ) -> None:
+        job.status = "running"
+        try:
+            job.result = await self.run(name, func, *args)
+            job.status = "completed"
+            self.metrics["completed"] += 1
+            if on_result is not None:
+                on_result(job.result)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            self.metrics["failed"] += 1
+            logger.warning(f"Image job {name} failed: {e}")
+
+    def _finish_job(self, job: ImageJob, task: asyncio.Task) -> None:
+        # Also covers jobs cancelled before their coroutine ever started
+        if task.cancelled():
+            job.status = "cancelled"
+            self.metrics["cancelled"] += 1
+        if job.key is not None and self._active_by_key.get(job.key) is job:
+            del self._active_by_key[job.key]
+
+    def get_job(self, job_id: str) -> Optional[ImageJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job; work already running in a worker finishes, keeping its slot, but is discarded"""
+        job = self._jobs.get(job_id)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    async def wait(self, job_id: str) -> Optional[ImageJob]:
+        """Wait for a job to finish"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.task is not None:
+            await asyncio.gather(job.task, return_exceptions=True)
+        return job
+
+    async def shutdown(self) -> None:
+        """Cancel pending jobs and stop the worker processes"""
+        pending = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            **self.metrics,
+            "running_jobs": sum(1 for job in self._jobs.values() if job.status in ("queued", "running")),
+            "queue": self.gate.get_stats(),
+            "stage_ms": {stage: latency_summary(samples) for stage, samples in sorted(self.stage_ms.items())}
+        }
+
+# Global image pipeline
+image_pipeline = ImagePipeline(
+    workers=settings.IMAGE_PIPELINE_WORKERS,
+    max_queue=settings.IMAGE_PIPELINE_MAX_QUEUE,
+    queue_timeout=settings.IMAGE_PIPELINE_QUEUE_TIMEOUT
+)
@@ -4,9 +4,8 @@ Handles image optimization, resizing, compression, and format conversion
 """
 
 import os
-import io
 import uuid
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
 from pathlib import Path
 import logging
 from PIL import Image, ImageOps, ImageFilter
@@ -15,6 +14,13 @@ from fastapi import UploadFile, HTTPException
 import aiofiles
 from datetime import datetime
 
+from core import file_io
+from core.exceptions import FileUploadError
+from core.file_io import storage_stats
+from services.image_pipeline import image_pipeline
+from services.image_renditions import RenditionSpec, render_primary, render_renditions
+from services.upload_spool import SpooledUpload, upload_spool
+
 logger = logging.getLogger(__name__)
 
 class ImageProcessingService:
@@ -22,11 +28,21 @@ class ImageProcessingService:
         self.upload_dir = Path(upload_dir)
         self.max_file_size = max_file_size
         self.supported_formats = {'JPEG', 'PNG', 'WEBP', 'AVIF'}
+        # Formats accepted as uploads (GIFs are converted)
+        self.upload_formats = self.supported_formats | {'GIF'}
         self.quality_settings = {
             'high': 95,
             'medium': 85,
             'low': 75
         }
+        self.metrics = {"reused_primaries": 0, "reused_renditions": 0}
+        self.thumbnail_sizes = {
+            'xs': (40, 40),
+            'sm': (80, 80),
+            'md': (120, 120),
+            'lg': (160, 160),
+            'xl': (240, 240)
+        }
         
         # Ensure upload directory exists
         self.upload_dir.mkdir(parents=True, exist_ok=True)
@@ -49,66 +65,72 @@ class ImageProcessingService:
     ) -> Dict[str, Any]:
         """
         Process uploaded image with optimization and resizing
+        
+        Renditions are named after a hash of the upload's content and the
+        resize settings, so re-uploading an image reuses its files. Returns
+        once the primary JPEG is written; the remaining renditions are
+        produced by a background job whose ID is returned under ``renditions``.
         """
         try:
             # Validate file
             await self._validate_file(file)
             
-            # Read image data
-            image_data = await file.read()
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if necessary
-            if image.mode in ('RGBA', 'LA', 'P'):
-                image = image.convert('RGB')
-            
-            # Get original dimensions
-            original_width, original_height = image.size
-            original_size = len(image_data)
-            
-            # Resize image if needed
-            resized_image = self._resize_image(image, max_width, max_height)
-            
-            # Generate optimized versions
-            optimized_versions = await self._generate_optimized_versions(
-                resized_image, user_id, image_type, quality
+            # Stream the upload to a spool file, hashing it on the way
+            async with await upload_spool.spool(file, self.max_file_size) as upload:
+                # Reject non-images and oversized bitmaps from the header alone
+                _, (original_width, original_height) = upload_spool.sniff_image(upload, self.upload_formats)
+                original_size = upload.size
+                original_dimensions = {"width": original_width, "height": original_height}
+                
+                rendition_key = self._rendition_key(upload.sha256, max_width, max_height, quality)
+                filename = f"{rendition_key}.jpg"
+                filepath = self.upload_dir / "profiles" / filename
+                
+                # Decode (from the spool file), resize and save the primary
+                # version in a worker process
+                decoded_bytes = 0
+                existing = await file_io.run(self._read_existing, filepath)
+                if existing is not None:
+                    self.metrics["reused_primaries"] += 1
+                    dimensions, optimized_size = existing
+                else:
+                    primary = await image_pipeline.run(
+                        "primary", render_primary,
+                        str(upload.path), str(filepath), max_width, max_height, self.quality_settings[quality]
+                    )
+                    upload_spool.record_decode(primary)
+                    storage_stats.record_write(filepath, primary["size"])
+                    dimensions = primary["dimensions"]
+                    optimized_size = primary["size"]
+                    decoded_bytes = primary["decoded_bytes"]
+            
+            specs, optimized_versions, thumbnails, modern_formats = self._plan_renditions(
+                rendition_key, quality, generate_thumbnails, generate_modern_formats
             )
-            
-            # Generate thumbnails if requested
-            thumbnails = {}
-            if generate_thumbnails:
-                thumbnails = await self._generate_thumbnails(
-                    resized_image, user_id, image_type
+            optimized_versions['jpeg'] = f"/uploads/profiles/{filename}"
+            
+            # Everything else is produced in the background from the primary;
+            # a newer upload of the same image type supersedes it
+            missing = await file_io.run(lambda: [spec for spec in specs if not os.path.exists(spec[2])])
+            self.metrics["reused_renditions"] += len(specs) - len(missing)
+            renditions = {"job_id": None, "status": "completed"}
+            if missing:
+                job = image_pipeline.submit(
+                    "renditions", render_renditions, str(filepath), missing,
+                    key=f"{user_id}:{image_type}", on_result=self._record_renditions
                 )
-            
-            # Generate modern formats if requested
-            modern_formats = {}
-            if generate_modern_formats:
-                modern_formats = await self._generate_modern_formats(
-                    resized_image, user_id, image_type, quality
-                )
-            
-            # Save original optimized version
-            filename = f"{user_id}_{image_type}_{uuid.uuid4().hex[:8]}.jpg"
-            filepath = self.upload_dir / "profiles" / filename
-            
-            resized_image.save(
-                filepath,
-                'JPEG',
-                quality=self.quality_settings[quality],
-                optimize=True
-            )
+                renditions = {"job_id": job.id, "status": job.status}
             
             # Calculate savings
-            optimized_size = filepath.stat().st_size
             size_reduction = ((original_size - optimized_size) / original_size) * 100
             
             return {
                 "filename": filename,
                 "filepath": str(filepath),
                 "url": f"/uploads/profiles/{filename}",
-                "original_dimensions": {"width": original_width, "height": original_height},
-                "optimized_dimensions": {"width": resized_image.width, "height": resized_image.height},
+                "content_hash": upload.sha256,
+                "original_dimensions": original_dimensions,
+                "optimized_dimensions": dimensions,
                 "original_size": original_size,
                 "optimized_size": optimized_size,
                 "size_reduction_percent": round(size_reduction, 2),
@@ -116,121 +138,83 @@ class ImageProcessingService:
                 "quality": quality,
                 "thumbnails": thumbnails,
                 "modern_formats": modern_formats,
-                "optimized_versions": optimized_versions
+                "optimized_versions": optimized_versions,
+                "renditions": renditions,
+                # Largest buffers this upload held: one read chunk in this
+                # process, one decoded bitmap in the worker
+                "memory": {"buffered_bytes": upload_spool.chunk_size, "decoded_bytes": decoded_bytes}
             }
             
+        except HTTPException:
+            raise
+        except FileUploadError as e:
+            raise HTTPException(status_code=400, detail=e.message)
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
 
-    def _resize_image(self, image: Image.Image, max_width: int, max_height: int) -> Image.Image:
+    def _read_existing(self, filepath: Path) -> Optional[Tuple[Dict[str, int], int]]:
+        """Dimensions and size of an already written primary, or None (blocking)"""
+        try:
+            with Image.open(filepath) as existing:
+                dimensions = {"width": existing.width, "height": existing.height}
+            return dimensions, filepath.stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def _record_renditions(self, result: Dict[str, Any]) -> None:
+        """Count the files a rendition job wrote in the storage statistics"""
+        for path, size in result.get("files", {}).items():
+            storage_stats.record_write(path, size)
+
+    def _rendition_key(self, digest: str, max_width: int, max_height: int, quality: str) -> str:
         """
-        Resize image while maintaining aspect ratio
+        Name the renditions of some content under some resize settings
         """
-        width, height = image.size
-        
-        # Calculate new dimensions
-        if width > max_width or height > max_height:
-            ratio = min(max_width / width, max_height / height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            
-            # Use high-quality resampling
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        return image
+        settings_tag = f"{max_width}x{max_height}q{self.quality_settings[quality]}"
+        return f"{digest[:32]}_{settings_tag}"
 
-    async def _generate_optimized_versions(
+    def _plan_renditions(
         self,
-        image: Image.Image,
-        user_id: str,
-        image_type: str,
-        quality: str
-    ) -> Dict[str, str]:
-        """
-        Generate multiple optimized versions in different formats
+        rendition_key: str,
+        quality: str,
+        generate_thumbnails: bool,
+        generate_modern_formats: bool
+    ) -> Tuple[List[RenditionSpec], Dict[str, str], Dict[str, str], Dict[str, str]]:
         """
-        versions = {}
-        base_filename = f"{user_id}_{image_type}_{uuid.uuid4().hex[:8]}"
-        
-        # JPEG version
-        jpeg_filename = f"{base_filename}.jpg"
-        jpeg_path = self.upload_dir / "optimized" / jpeg_filename
-        image.save(
-            jpeg_path,
-            'JPEG',
-            quality=self.quality_settings[quality],
-            optimize=True
-        )
-        versions['jpeg'] = f"/uploads/optimized/{jpeg_filename}"
+        Plan the background renditions of an upload
         
-        # WebP version
-        try:
-            webp_filename = f"{base_filename}.webp"
-            webp_path = self.upload_dir / "optimized" / webp_filename
-            image.save(
-                webp_path,
-                'WEBP',
-                quality=self.quality_settings[quality],
-                method=6  # Best compression
-            )
-            versions['webp'] = f"/uploads/optimized/{webp_filename}"
-        except Exception as e:
-            logger.warning(f"Failed to generate WebP version: {e}")
+        Each (format, size) is produced once: the optimized JPEG is the
+        primary itself and modern formats share the optimized WebP. No
+        lossless PNG is made: renditions are cut from the JPEG primary, so
+        it would only be a larger copy of a lossy image.
         
-        # PNG version (for transparency if needed)
-        try:
-            png_filename = f"{base_filename}.png"
-            png_path = self.upload_dir / "optimized" / png_filename
-            image.save(
-                png_path,
-                'PNG',
-                optimize=True
-            )
-            versions['png'] = f"/uploads/optimized/{png_filename}"
-        except Exception as e:
-            logger.warning(f"Failed to generate PNG version: {e}")
-        
-        return versions
-
-    async def _generate_modern_formats(
-        self,
-        image: Image.Image,
-        user_id: str,
-        image_type: str,
-        quality: str
-    ) -> Dict[str, str]:
+        Returns the worker specs and the URLs each rendition will have.
         """
-        Generate modern image formats (WebP, AVIF) for better compression
-        """
-        formats = {}
-        base_filename = f"{user_id}_{image_type}_{uuid.uuid4().hex[:8]}"
+        specs: List[RenditionSpec] = []
+        optimized_versions = {}
+        thumbnails = {}
+        modern_formats = {}
+        optimized_dir = self.upload_dir / "optimized"
         
-        # WebP version
-        try:
-            webp_filename = f"{base_filename}.webp"
-            webp_path = self.upload_dir / "optimized" / webp_filename
-            image.save(
-                webp_path,
-                'WEBP',
-                quality=self.quality_settings[quality],
-                method=6  # Best compression
-            )
-            formats['webp'] = f"/uploads/optimized/{webp_filename}"
-        except Exception as e:
-            logger.warning(f"Failed to generate WebP version: {e}")
+        webp_filename = f"{rendition_key}.webp"
+        specs.append(("webp", 'WEBP', str(optimized_dir / webp_filename), None,
+                      {"quality": self.quality_settings[quality], "method": 6}))
+        optimized_versions['webp'] = f"/uploads/optimized/{webp_filename}"
         
-        # AVIF version (if supported)
-        try:
-            avif_filename = f"{base_filename}.avif"
-            avif_path = self.upload_dir / "optimized" / avif_filename
-            # Note: AVIF support requires pillow-avif-plugin
-            # For now, we'll skip AVIF generation
-            logger.info("AVIF generation skipped - requires additional plugin")
-        except Exception as e:
-            logger.warning(f"Failed to generate AVIF version: {e}")
+        # Modern formats (AVIF requires pillow-avif-plugin, so WebP only for now)
+        if generate_modern_formats:
+            modern_formats['webp'] = optimized_versions['webp']
+        
+        if generate_thumbnails:
+            for size_name, size in self.thumbnail_sizes.items():
+                thumbnail_filename = f"{rendition_key}_{size_name}.jpg"
+                specs.append((f"thumbnail_{size_name}", 'JPEG',
+                              str(self.upload_dir / "thumbnails" / thumbnail_filename), size,
+                              {"quality": 85, "optimize": True}))
+                thumbnails[size_name] = f"/uploads/thumbnails/{thumbnail_filename}"
         
-        return formats
+        return specs, optimized_versions, thumbnails, modern_formats
 
     async def generate_responsive_images(
         self,
@@ -249,21 +233,25 @@ class ImageProcessingService:
         
         responsive_images = {}
         
+        def save(resized: Image.Image, filepath: Path) -> int:
+            # Ensure directory exists
+            filepath.parent.mkdir(exist_ok=True)
+            
+            resized.save(
+                filepath,
+                'JPEG',
+                quality=self.quality_settings['medium'],
+                optimize=True
+            )
+            return filepath.stat().st_size
+        
         for size_name, (width, height) in sizes.items():
             try:
                 resized = self._resize_image(image, width, height)
                 filename = f"{user_id}_{image_type}_{size_name}_{uuid.uuid4().hex[:8]}.jpg"
                 filepath = self.upload_dir / "responsive" / filename
                 
-                # Ensure directory exists
-                filepath.parent.mkdir(exist_ok=True)
-                
-                resized.save(
-                    filepath,
-                    'JPEG',
-                    quality=self.quality_settings['medium'],
-                    optimize=True
-                )
+                storage_stats.record_write(filepath, await file_io.run(save, resized, filepath))
                 
                 responsive_images[size_name] = f"/uploads/responsive/{filename}"
                 
@@ -272,49 +260,42 @@ class ImageProcessingService:
         
         return responsive_images
 
-    async def _generate_thumbnails(
-        self,
-        image: Image.Image,
-        user_id: str,
-        image_type: str
-    ) -> Dict[str, str]:
+    def validate_image(self, upload: SpooledUpload) -> Tuple[bool, Optional[str]]:
         """
-        Generate thumbnail versions in different sizes
+        Validate a spooled image upload
+        
+        Only the header is parsed; the full decode happens in a worker.
         """
-        thumbnails = {}
-        base_filename = f"{user_id}_{image_type}_{uuid.uuid4().hex[:8]}"
+        allowed_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+        if Path(upload.filename or "").suffix.lower() not in allowed_extensions:
+            return False, f"File type not supported. Allowed: {', '.join(allowed_extensions)}"
         
-        # Define thumbnail sizes
-        sizes = {
-            'xs': (40, 40),
-            'sm': (80, 80),
-            'md': (120, 120),
-            'lg': (160, 160),
-            'xl': (240, 240)
-        }
+        try:
+            upload_spool.sniff_image(upload, self.upload_formats)
+        except FileUploadError as e:
+            return False, e.message
         
-        for size_name, (width, height) in sizes.items():
-            try:
-                # Create thumbnail
-                thumbnail = image.copy()
-                thumbnail.thumbnail((width, height), Image.Resampling.LANCZOS)
-                
-                # Save thumbnail
-                thumbnail_filename = f"{base_filename}_{size_name}.jpg"
-                thumbnail_path = self.upload_dir / "thumbnails" / thumbnail_filename
-                thumbnail.save(
-                    thumbnail_path,
-                    'JPEG',
-                    quality=85,
-                    optimize=True
-                )
-                
-                thumbnails[size_name] = f"/uploads/thumbnails/{thumbnail_filename}"
-                
-            except Exception as e:
-                logger.warning(f"Failed to generate {size_name} thumbnail: {e}")
+        return True, None
+
+    async def process_profile_picture(
+        self,
+        upload: SpooledUpload,
+        destination: Path,
+        max_width: int = 1200,
+        max_height: int = 1200,
+        quality: str = "medium"
+    ) -> Dict[str, Any]:
+        """
+        Resize and re-encode a profile picture as JPEG straight into ``destination``
         
-        return thumbnails
+        Runs in a worker process, which decodes from the spool file.
+        """
+        result = await image_pipeline.run(
+            "profile_picture", render_primary,
+            str(upload.path), str(destination), max_width, max_height, self.quality_settings[quality]
+        )
+        upload_spool.record_decode(result)
+        return result
 
     async def _validate_file(self, file: UploadFile) -> None:
         """
@@ -355,28 +336,34 @@ class ImageProcessingService:
         """
         try:
             image_path = Path(image_path)
-            if not image_path.exists():
+            if not await file_io.exists(image_path):
                 raise HTTPException(status_code=404, detail="Image file not found")
             
-            # Open image
-            image = Image.open(image_path)
-            
-            # Resize if needed
-            if max_width or max_height:
-                image = self._resize_image(image, max_width or image.width, max_height or image.height)
-            
-            # Create backup
-            backup_path = image_path.with_suffix(f'.backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}{image_path.suffix}')
-            image.save(backup_path)
+            def optimize() -> Tuple[Path, int, int, int]:
+                # Open image
+                image = Image.open(image_path)
+                
+                # Resize if needed
+                if max_width or max_height:
+                    image = self._resize_image(image, max_width or image.width, max_height or image.height)
+                
+                # Create backup
+                backup_path = image_path.with_suffix(f'.backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}{image_path.suffix}')
+                image.save(backup_path)
+                
+                # Optimize and save
+                original_size = image_path.stat().st_size
+                image.save(
+                    image_path,
+                    quality=self.quality_settings[quality],
+                    optimize=True
+                )
+                return backup_path, backup_path.stat().st_size, original_size, image_path.stat().st_size
             
-            # Optimize and save
-            original_size = image_path.stat().st_size
-            image.save(
-                image_path,
-                quality=self.quality_settings[quality],
-                optimize=True
-            )
-            optimized_size = image_path.stat().st_size
+            # Decode and encode on a worker thread, off the event loop
+            backup_path, backup_size, original_size, optimized_size = await file_io.run(optimize)
+            storage_stats.record_write(backup_path, backup_size)
+            storage_stats.record_write(image_path, optimized_size, original_size)
             
             return {
                 "original_size": original_size,
@@ -395,26 +382,30 @@ class ImageProcessingService:
         """
         try:
             image_path = Path(image_path)
-            if not image_path.exists():
+            if not await file_io.exists(image_path):
                 raise HTTPException(status_code=404, detail="Image file not found")
             
-            # Open and resize image
-            image = Image.open(image_path)
-            image.thumbnail((size, size), Image.Resampling.LANCZOS)
-            
-            # Apply blur
-            blurred_image = image.filter(ImageFilter.GaussianBlur(radius=2))
-            
-            # Save placeholder
             placeholder_filename = f"placeholder_{uuid.uuid4().hex[:8]}.jpg"
             placeholder_path = self.upload_dir / "thumbnails" / placeholder_filename
             
-            blurred_image.save(
-                placeholder_path,
-                'JPEG',
-                quality=30,
-                optimize=True
-            )
+            def render() -> int:
+                # Open and resize image
+                image = Image.open(image_path)
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                
+                # Apply blur
+                blurred_image = image.filter(ImageFilter.GaussianBlur(radius=2))
+                
+                # Save placeholder
+                blurred_image.save(
+                    placeholder_path,
+                    'JPEG',
+                    quality=30,
+                    optimize=True
+                )
+                return placeholder_path.stat().st_size
+            
+            storage_stats.record_write(placeholder_path, await file_io.run(render))
             
             return f"/uploads/thumbnails/{placeholder_filename}"
             
@@ -428,8 +419,7 @@ class ImageProcessingService:
         """
         try:
             import time
-            current_time = time.time()
-            cutoff_time = current_time - (days_old * 24 * 60 * 60)
+            cutoff_time = time.time() - (days_old * 24 * 60 * 60)
             
             deleted_files = {
                 'profiles': 0,
@@ -437,16 +427,12 @@ class ImageProcessingService:
                 'optimized': 0
             }
             
-            # Clean up old files in each directory
+            # Clean up old files in each directory, scanned in batches off the event loop
             for subdir in ['profiles', 'thumbnails', 'optimized']:
-                subdir_path = self.upload_dir / subdir
-                if subdir_path.exists():
-                    for file_path in subdir_path.iterdir():
-                        if file_path.is_file():
-                            file_age = current_time - file_path.stat().st_mtime
-                            if file_age > cutoff_time:
-                                file_path.unlink()
-                                deleted_files[subdir] += 1
+                async for batch in file_io.walk(self.upload_dir / subdir):
+                    for entry in batch:
+                        if entry.mtime < cutoff_time and await file_io.unlink(entry.path) is not None:
+                            deleted_files[subdir] += 1
             
             logger.info(f"Cleaned up {sum(deleted_files.values())} old image files")
             return deleted_files
@@ -455,24 +441,28 @@ class ImageProcessingService:
             logger.error(f"Error cleaning up old files: {str(e)}")
             return {'profiles': 0, 'thumbnails': 0, 'optimized': 0}
 
-    def get_image_info(self, image_path: str) -> Dict[str, Any]:
+    async def get_image_info(self, image_path: str) -> Dict[str, Any]:
         """
         Get information about an image file
         """
         try:
             image_path = Path(image_path)
-            if not image_path.exists():
+            file_stats = await file_io.stat(image_path)
+            if file_stats is None:
                 raise HTTPException(status_code=404, detail="Image file not found")
             
-            image = Image.open(image_path)
-            file_stats = image_path.stat()
+            def read_header() -> Tuple[Tuple[int, int], Optional[str], str]:
+                with Image.open(image_path) as image:
+                    return image.size, image.format, image.mode
+            
+            dimensions, image_format, mode = await file_io.run(read_header)
             
             return {
                 "filename": image_path.name,
                 "file_size": file_stats.st_size,
-                "dimensions": image.size,
-                "format": image.format,
-                "mode": image.mode,
+                "dimensions": dimensions,
+                "format": image_format,
+                "mode": mode,
                 "created": datetime.fromtimestamp(file_stats.st_ctime).isoformat(),
                 "modified": datetime.fromtimestamp(file_stats.st_mtime).isoformat()
             }
@@ -0,0 +1,208 @@
+"""
+Image rendition workers for Frende App.
+
+Everything here runs inside the image pipeline's worker processes, so it
+only depends on Pillow and takes plain, picklable arguments. Each function
+returns the wall time of its stages (decode, resize, encode) so the pipeline
+can report where the CPU goes.
+
+An upload is decoded once, for the primary JPEG. Background renditions are
+cut from that primary rather than from the original, largest first, each
+smaller size from the one before it (a resize pyramid).
+"""
+
+import hashlib
+import io
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+
+try:
+    # Registers an AVIF codec with Pillow when the plugin is installed
+    import pillow_avif  # noqa: F401
+    AVIF_AVAILABLE = True
+except ImportError:
+    AVIF_AVAILABLE = False
+
+# A rendition to produce: (key, format, path, size or None, save options).
+# ``size`` bounds the rendition with ``Image.thumbnail``; None keeps the
+# source dimensions.
+RenditionSpec = Tuple[str, str, str, Optional[Tuple[int, int]], Dict[str, Any]]
+
+def _elapsed_ms(started_at: float) -> float:
+    return (time.perf_counter() - started_at) * 1000
+
+def fit_within(size: Tuple[int, int], max_width: int, max_height: int) -> Tuple[int, int]:
+    """Dimensions of ``size`` scaled down (never up) to fit the bounding box"""
+    width, height = size
+    if width <= max_width and height <= max_height:
+        return width, height
+    ratio = min(max_width / width, max_height / height)
+    return int(width * ratio), int(height * ratio)
+
+def _save_atomic(image: Image.Image, path: str, image_format: str, **options: Any) -> int:
+    # Renditions are content addressed, so two uploads may write the same
+    # path; readers must only ever see a complete file
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        image.save(temp_path, image_format, **options)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    return os.path.getsize(path)
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(64 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _decode(
+    source: Union[bytes, str],
+    max_width: int,
+    max_height: int,
+    timings: Dict[str, float]
+) -> Tuple[Image.Image, Tuple[int, int], int]:
+    started_at = time.perf_counter()
+    # A path is read straight from the spooled upload
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    original = image.size
+    target = fit_within(original, max_width, max_height)
+
+    # JPEG: let libjpeg scale by 1/2, 1/4 or 1/8 while decoding, never below the target
+    if image.format == 'JPEG' and target != original:
+        image.draft('RGB', target)
+    image.load()
+    decoded_bytes = image.width * image.height * len(image.getbands())
+
+    # Convert to RGB if necessary
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGB')
+    timings["decode"] = _elapsed_ms(started_at)
+
+    started_at = time.perf_counter()
+    if image.size != target:
+        image = image.resize(target, Image.Resampling.LANCZOS)
+    timings["resize"] = _elapsed_ms(started_at)
+
+    return image, original, decoded_bytes
+
+def render_primary(
+    source: Union[bytes, str],
+    path: Optional[str],
+    max_width: int,
+    max_height: int,
+    quality: int
+) -> Dict[str, Any]:
+    """
+    Decode, resize and encode the primary JPEG rendition.
+
+    ``source`` is the upload's bytes or the path of its spool file. Written
+    to ``path`` when given, otherwise returned as ``content``. The result's
+    ``sha256`` is the hash of the encoded JPEG, for content-addressed storage.
+    """
+    timings: Dict[str, float] = {}
+    image, original, decoded_bytes = _decode(source, max_width, max_height, timings)
+
+    started_at = time.perf_counter()
+    content = None
+    if path:
+        size = _save_atomic(image, path, 'JPEG', quality=quality, optimize=True)
+        sha256 = _sha256_file(path)
+    else:
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=quality, optimize=True)
+        content = output.getvalue()
+        size = len(content)
+        sha256 = hashlib.sha256(content).hexdigest()
+    timings["encode"] = _elapsed_ms(started_at)
+
+    return {
+        "original_dimensions": {"width": original[0], "height": original[1]},
+        "dimensions": {"width": image.width, "height": image.height},
+        "size": size,
+        "sha256": sha256,
+        "decoded_bytes": decoded_bytes,
+        "content": content,
+        "timings": timings
+    }
+
+def render_renditions(source_path: str, specs: List[RenditionSpec]) -> Dict[str, Any]:
+    """
+    Write every rendition in ``specs`` from the primary rendition at ``source_path``
+
+    Failures are reported per key; ``files`` maps each written path to its size.
+    """
+    timings: Dict[str, float] = {}
+    started_at = time.perf_counter()
+    with Image.open(source_path) as source:
+        image = source.convert('RGB')
+    timings["decode"] = _elapsed_ms(started_at)
+
+    # Full-size renditions first, then sized ones from largest to smallest
+    ordered = sorted(specs, key=lambda spec: -(spec[3][0] * spec[3][1]) if spec[3] else float("-inf"))
+
+    resize_ms = 0.0
+    encode_ms = 0.0
+    level = image
+    written: List[str] = []
+    failed: Dict[str, str] = {}
+    files: Dict[str, int] = {}
+    for key, image_format, path, size, options in ordered:
+        try:
+            rendition = image
+            if size is not None:
+                resize_started_at = time.perf_counter()
+                rendition = level.copy()
+                rendition.thumbnail(size, Image.Resampling.LANCZOS)
+                # The next, smaller size is cut from this one
+                level = rendition
+                resize_ms += _elapsed_ms(resize_started_at)
+
+            encode_started_at = time.perf_counter()
+            files[path] = _save_atomic(rendition, path, image_format, **options)
+            encode_ms += _elapsed_ms(encode_started_at)
+            written.append(key)
+        except Exception as e:
+            failed[key] = str(e)
+    timings["resize"] = resize_ms
+    timings["encode"] = encode_ms
+
+    return {
+        "written": written,
+        "failed": failed,
+        "files": files,
+        "bytes_written": sum(files.values()),
+        "timings": timings
+    }
+
+# Encoder options for on-demand derivatives: fast enough to run on a request
+DERIVATIVE_SAVE_OPTIONS = {
+    'JPEG': lambda quality: {"quality": quality, "optimize": True, "progressive": True},
+    'WEBP': lambda quality: {"quality": quality, "method": 4},
+    'AVIF': lambda quality: {"quality": quality, "speed": 8},
+    'PNG': lambda quality: {"optimize": True},
+}
+
+def render_derivative(source_path: str, path: str, width: int, image_format: str, quality: int) -> Dict[str, Any]:
+    """
+    Write ``source_path`` scaled down to ``width`` (never up) in ``image_format``
+    """
+    timings: Dict[str, float] = {}
+    image, _, decoded_bytes = _decode(source_path, width, 1_000_000, timings)
+
+    started_at = time.perf_counter()
+    size = _save_atomic(image, path, image_format, **DERIVATIVE_SAVE_OPTIONS[image_format](quality))
+    timings["encode"] = _elapsed_ms(started_at)
+
+    return {
+        "dimensions": {"width": image.width, "height": image.height},
+        "size": size,
+        "decoded_bytes": decoded_bytes,
+        "timings": timings
+    }
@@ -1,12 +1,14 @@
 import logging
+from collections import Counter
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, update
 from models.user import User
 from models.match import Match
 from models.match_request import MatchRequest
-from core.database import get_async_session
+from core.database import session_scope
+from core.expiry import expire_rows
 from core.exceptions import UserNotFoundError, MatchRequestNotFoundError, NoAvailableSlotsError, DuplicateRequestError
 from services.matching import matching_service
 
@@ -27,7 +29,7 @@ class MatchRequestService:
     ) -> MatchRequest:
         """Create a new match request"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._create_match_request_internal(sender_id, receiver_id, message, session)
         
         return await self._create_match_request_internal(sender_id, receiver_id, message, session)
@@ -117,7 +119,7 @@ class MatchRequestService:
     ) -> Match:
         """Accept a match request and create a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._accept_match_request_internal(request_id, user_id, response_message, session)
         
         return await self._accept_match_request_internal(request_id, user_id, response_message, session)
@@ -198,7 +200,7 @@ class MatchRequestService:
     ) -> MatchRequest:
         """Decline a match request"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._decline_match_request_internal(request_id, user_id, response_message, session)
         
         return await self._decline_match_request_internal(request_id, user_id, response_message, session)
@@ -252,7 +254,7 @@ class MatchRequestService:
     ) -> List[MatchRequest]:
         """Get match requests for a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_user_match_requests_internal(user_id, status, session)
         
         return await self._get_user_match_requests_internal(user_id, status, session)
@@ -286,7 +288,7 @@ class MatchRequestService:
     ) -> List[MatchRequest]:
         """Get requests received by a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_received_requests_internal(user_id, session)
         
         return await self._get_received_requests_internal(user_id, session)
@@ -314,7 +316,7 @@ class MatchRequestService:
     ) -> List[MatchRequest]:
         """Get requests sent by a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_sent_requests_internal(user_id, session)
         
         return await self._get_sent_requests_internal(user_id, session)
@@ -338,37 +340,47 @@ class MatchRequestService:
     async def cleanup_expired_requests(self, session: AsyncSession = None):
         """Clean up expired match requests"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._cleanup_expired_requests_internal(session)
         
         return await self._cleanup_expired_requests_internal(session)
     
     async def _cleanup_expired_requests_internal(self, session: AsyncSession):
         """Internal method to cleanup expired requests"""
-        # Find expired requests
-        result = await session.execute(
-            select(MatchRequest).where(
-                and_(
-                    MatchRequest.status == "pending",
-                    MatchRequest.expires_at < datetime.utcnow()
-                )
-            )
+        expired_count = await expire_rows(
+            session,
+            "cleanup_expired_match_requests",
+            MatchRequest,
+            and_(
+                MatchRequest.status == "pending",
+                MatchRequest.expires_at < datetime.utcnow()
+            ),
+            {"status": "expired"},
+            returning=(MatchRequest.sender_id,),
+            on_batch=self._refund_expired_request_slots
         )
-        expired_requests = result.scalars().all()
         
-        for request in expired_requests:
-            request.status = "expired"
-            # Return slot to sender
-            result = await session.execute(
-                select(User).where(User.id == request.sender_id)
+        logger.info(f"Cleaned up {expired_count} expired match requests")
+        return expired_count
+    
+    async def _refund_expired_request_slots(self, session: AsyncSession, expired_rows):
+        """Return slots to the senders of expired requests, one UPDATE per refund amount"""
+        refunds = Counter(row.sender_id for row in expired_rows)
+        
+        senders_by_amount: Dict[int, List[int]] = {}
+        for sender_id, amount in refunds.items():
+            senders_by_amount.setdefault(amount, []).append(sender_id)
+        
+        for amount, sender_ids in senders_by_amount.items():
+            await session.execute(
+                update(User)
+                .where(User.id.in_(sender_ids))
+                .values(
+                    available_slots=User.available_slots + amount,
+                    total_slots_used=User.total_slots_used - amount
+                )
+                .execution_options(synchronize_session=False)
             )
-            sender = result.scalar_one_or_none()
-            if sender:
-                sender.available_slots += 1
-                sender.total_slots_used -= 1
-        
-        await session.commit()
-        logger.info(f"Cleaned up {len(expired_requests)} expired match requests")
 
 # Create service instance
 match_request_service = MatchRequestService() 
\ No newline at end of file
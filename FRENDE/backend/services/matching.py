@@ -7,10 +7,11 @@ from sqlalchemy import select, func, and_, or_, desc
 from sqlalchemy.orm import selectinload, joinedload
 from models.user import User
 from models.match import Match
-from core.database import get_async_session
+from core.database import session_scope
 from core.config import settings
 from core.exceptions import UserNotFoundError, MatchNotFoundError, NoAvailableSlotsError, MatchNotPendingError
 from core.performance_monitor import performance_monitor
+from core.hot_queries import user_match_versions
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +34,7 @@ class MatchingService:
     ) -> Match:
         """Create a new match request"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._create_match_request_internal(user_id, target_user_id, session)
         
         return await self._create_match_request_internal(user_id, target_user_id, session)
@@ -196,7 +197,7 @@ class MatchingService:
     ) -> List[Match]:
         """Get user's matches with optimized query and eager loading"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_user_matches_internal(user_id, status, limit, offset, session)
         
         return await self._get_user_matches_internal(user_id, status, limit, offset, session)
@@ -234,6 +235,18 @@ class MatchingService:
             result = await session.execute(query)
             return result.scalars().all()
     
+    async def get_user_matches_version(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        status: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> List[tuple]:
+        """Get the serialised columns of a page of matches, used as its ETag version"""
+        result = await session.execute(user_match_versions(user_id, limit, offset, status))
+        return [tuple(row) for row in result.all()]
+    
     async def get_match_details(
         self,
         match_id: int,
@@ -242,7 +255,7 @@ class MatchingService:
     ) -> Optional[Match]:
         """Get match details with optimized query and eager loading"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_match_details_internal(match_id, user_id, session)
         
         return await self._get_match_details_internal(match_id, user_id, session)
@@ -6,7 +6,8 @@ from sqlalchemy import select, and_, or_, desc, func
 from models.queue_entry import QueueEntry
 from models.user import User
 from models.match import Match
-from core.database import get_async_session
+from core.database import session_scope
+from core.expiry import expire_rows
 from core.exceptions import UserNotFoundError, QueueEntryNotFoundError
 
 logger = logging.getLogger(__name__)
@@ -32,7 +33,7 @@ class QueueManager:
     ) -> QueueEntry:
         """Add a user to the matching queue"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._add_to_queue_internal(user_id, preferences, session)
         
         return await self._add_to_queue_internal(user_id, preferences, session)
@@ -93,7 +94,7 @@ class QueueManager:
     ) -> bool:
         """Remove a user from the matching queue"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._remove_from_queue_internal(user_id, session)
         
         return await self._remove_from_queue_internal(user_id, session)
@@ -121,7 +122,7 @@ class QueueManager:
     ) -> Optional[int]:
         """Get user's position in the queue"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_queue_position_internal(user_id, session)
         
         return await self._get_queue_position_internal(user_id, session)
@@ -157,7 +158,7 @@ class QueueManager:
     ) -> Optional[Dict[str, Any]]:
         """Get comprehensive queue status for a user"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_queue_status_internal(user_id, session)
         
         return await self._get_queue_status_internal(user_id, session)
@@ -192,7 +193,7 @@ class QueueManager:
     ) -> List[Match]:
         """Process a batch of queue entries and create matches"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._process_queue_batch_internal(session)
         
         return await self._process_queue_batch_internal(session)
@@ -377,7 +378,7 @@ class QueueManager:
     ) -> int:
         """Clean up expired queue entries"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._cleanup_expired_entries_internal(session)
         
         return await self._cleanup_expired_entries_internal(session)
@@ -387,25 +388,19 @@ class QueueManager:
         session: AsyncSession
     ) -> int:
         """Internal method to cleanup expired entries"""
-        # Find expired entries
-        result = await session.execute(
-            select(QueueEntry).where(
-                and_(
-                    QueueEntry.status.in_(["waiting", "processing"]),
-                    QueueEntry.created_at < datetime.utcnow() - timedelta(hours=1)
-                )
-            )
+        expired_count = await expire_rows(
+            session,
+            "cleanup_expired_queue_entries",
+            QueueEntry,
+            and_(
+                QueueEntry.status.in_(["waiting", "processing"]),
+                QueueEntry.created_at < datetime.utcnow() - timedelta(hours=1)
+            ),
+            {"status": "expired"}
         )
-        expired_entries = result.scalars().all()
-        
-        # Mark as expired
-        for entry in expired_entries:
-            entry.status = "expired"
-        
-        await session.commit()
         
-        logger.info(f"Cleaned up {len(expired_entries)} expired queue entries")
-        return len(expired_entries)
+        logger.info(f"Cleaned up {expired_count} expired queue entries")
+        return expired_count
     
     async def _get_queue_entry(
         self,
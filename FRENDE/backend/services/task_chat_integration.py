@@ -10,7 +10,7 @@ from models.user import User
 from models.task import Task
 from models.chat import ChatMessage
 from models.task_submission import TaskSubmission
-from core.database import get_async_session
+from core.database import session_scope
 from services.chat import chat_service
 from services.tasks import task_service
 from services.task_submission import task_submission_service
@@ -42,7 +42,7 @@ class TaskChatIntegrationService:
     ) -> Dict:
         """Submit task completion via chat interface"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._submit_task_via_chat_internal(
                     match_id, task_id, user_id, submission_text, evidence_url, session
                 )
@@ -257,7 +257,7 @@ class TaskChatIntegrationService:
     ) -> List[Dict]:
         """Get task notifications for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_task_notifications_internal(match_id, user_id, session)
         
         return await self._get_task_notifications_internal(match_id, user_id, session)
@@ -327,7 +327,7 @@ class TaskChatIntegrationService:
     ) -> bool:
         """Mark a task notification as read"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._mark_notification_read_internal(notification_id, user_id, session)
         
         return await self._mark_notification_read_internal(notification_id, user_id, session)
@@ -356,7 +356,7 @@ class TaskChatIntegrationService:
     ) -> Dict:
         """Get current task status for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_task_status_internal(match_id, session)
         
         return await self._get_task_status_internal(match_id, session)
@@ -420,7 +420,7 @@ class TaskChatIntegrationService:
     ) -> bool:
         """Send a task notification via chat"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_task_notification_internal(
                     match_id, notification_type, task_id, message, session
                 )
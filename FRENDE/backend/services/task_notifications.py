@@ -9,7 +9,7 @@ from models.match import Match
 from models.user import User
 from models.task import Task
 from models.chat import ChatMessage
-from core.database import get_async_session
+from core.database import session_scope
 from services.chat import chat_service
 from services.tasks import task_service
 
@@ -36,7 +36,7 @@ class TaskNotificationService:
     ) -> bool:
         """Send notification when a task is assigned"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_task_assignment_notification_internal(match_id, task_id, session)
         
         return await self._send_task_assignment_notification_internal(match_id, task_id, session)
@@ -103,7 +103,7 @@ class TaskNotificationService:
     ) -> bool:
         """Send notification when a task is completed"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_task_completion_notification_internal(
                     match_id, task_id, completed_by_user_id, session
                 )
@@ -184,7 +184,7 @@ class TaskNotificationService:
     ) -> bool:
         """Send warning when a task is about to expire"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_task_expiration_warning_internal(
                     match_id, task_id, hours_remaining, session
                 )
@@ -245,7 +245,7 @@ class TaskNotificationService:
     ) -> bool:
         """Send notification when a task is replaced"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_task_replacement_notification_internal(
                     match_id, old_task_id, new_task_id, reason, session
                 )
@@ -316,7 +316,7 @@ class TaskNotificationService:
     ) -> bool:
         """Send notification when task rewards are earned"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._send_task_reward_notification_internal(
                     match_id, task_id, user_id, coins_earned, session
                 )
@@ -386,7 +386,7 @@ class TaskNotificationService:
     ) -> List[Dict]:
         """Get pending notifications for a match"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_pending_notifications_internal(match_id, session)
         
         return await self._get_pending_notifications_internal(match_id, session)
@@ -435,7 +435,7 @@ class TaskNotificationService:
     ) -> List[Dict]:
         """Check for and send pending notifications"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._check_and_send_notifications_internal(session)
         
         return await self._check_and_send_notifications_internal(session)
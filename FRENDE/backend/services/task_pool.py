@@ -0,0 +1,253 @@
+"""
+Pre-generated Task Pool for Frende App
+Keeps a stock of AI-generated tasks so assigning one never waits on Gemini
+
+Tasks are generated ahead of time as templates with ``{user1}``, ``{user2}``
+and ``{interest}`` placeholders, bucketed by task type, difficulty and
+interest category, and kept in the ``task_pool`` table so every worker draws
+from the same stock. Drawing deletes a task from its bucket, in the caller's
+transaction, and the template is filled in with the match's names and shared
+interest. A background producer tops up buckets that run low, several
+templates per model call, spending at most a share of the AI rate limit and
+only while no live requests are waiting for the model. Buckets found empty
+by a draw are refilled first.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from string import Formatter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import session_scope
+from models.task import TaskDifficulty
+from models.task_pool import PooledTask
+from services.ai import GENERAL_INTEREST_CATEGORY, INTEREST_CATEGORIES, ai_service
+
+logger = logging.getLogger(__name__)
+
+# Task types kept in stock; others are always generated live
+POOLED_TASK_TYPES = ("bonding",)
+
+TEMPLATE_FIELDS = ("user1", "user2", "interest")
+
+# Stands in for {interest} when a match has no shared interest
+GENERIC_INTEREST = "something you both enjoy"
+
+Bucket = Tuple[str, str, str]
+
+def is_valid_template(template: str) -> bool:
+    """Whether a template only uses the known placeholders, without format specs"""
+    try:
+        fields = [
+            (field, spec, conversion)
+            for _, field, spec, conversion in Formatter().parse(template)
+            if field is not None
+        ]
+    except ValueError:
+        return False
+    return all(field in TEMPLATE_FIELDS and not spec and conversion is None for field, spec, conversion in fields)
+
+def render_template(template: str, values: Dict[str, str]) -> str:
+    """Fill in a task template's placeholders"""
+    if not is_valid_template(template):
+        return template
+    return template.format_map({field: values.get(field, "") for field in TEMPLATE_FIELDS})
+
+def interest_category(interests: List[str]) -> Tuple[str, Optional[str]]:
+    """Pick the bucket category for a match's shared interests, with the interest it came from"""
+    for interest in interests:
+        for category, keywords in INTEREST_CATEGORIES.items():
+            if interest in keywords:
+                return category, interest
+    return GENERAL_INTEREST_CATEGORY, None
+
+class TaskPool:
+    """Stock of pre-generated task templates with a rate-limited background producer"""
+
+    def __init__(self, target_per_bucket: int, batch_size: int, calls_per_minute: int):
+        self.target_per_bucket = max(target_per_bucket, 1)
+        # Buckets at or below this are topped up back to the target
+        self.low_water = self.target_per_bucket // 2
+        self.batch_size = max(batch_size, 1)
+        self.calls_per_minute = max(calls_per_minute, 1)
+        self._call_times: deque = deque()
+        self._wanted: Set[Bucket] = set()
+        self._refill_event: Optional[asyncio.Event] = None
+        self.metrics = {
+            "draws": 0,
+            "hits": 0,
+            "misses": 0,
+            "generated": 0,
+            "rejected_templates": 0,
+            "refill_calls": 0,
+            "refill_failures": 0,
+            "refills_deferred": 0
+        }
+
+    @staticmethod
+    def buckets() -> List[Bucket]:
+        categories = [*INTEREST_CATEGORIES, GENERAL_INTEREST_CATEGORY]
+        return [
+            (task_type, difficulty.value, category)
+            for task_type in POOLED_TASK_TYPES
+            for difficulty in TaskDifficulty
+            for category in categories
+        ]
+
+    async def draw(self, session: AsyncSession, task_type: str, difficulty: str, category: str) -> Optional[Tuple[str, str]]:
+        """
+        Take the oldest task template from a bucket.
+
+        The removal is part of the caller's transaction, so the template is
+        only used up if the task made from it is committed. Returns the
+        title and description templates, or None when the bucket is empty.
+        """
+        self.metrics["draws"] += 1
+        in_bucket = and_(
+            PooledTask.task_type == task_type,
+            PooledTask.difficulty == difficulty,
+            PooledTask.interest_category == category
+        )
+
+        # Retried when a concurrent draw claims the same row
+        for _ in range(3):
+            task_id = await session.scalar(select(PooledTask.id).where(in_bucket).order_by(PooledTask.id).limit(1))
+            if task_id is None:
+                break
+            result = await session.execute(
+                delete(PooledTask)
+                .where(PooledTask.id == task_id)
+                .returning(PooledTask.title, PooledTask.description)
+            )
+            row = result.first()
+            if row is not None:
+                self.metrics["hits"] += 1
+                return row.title, row.description
+
+        self.metrics["misses"] += 1
+        self.request_refill((task_type, difficulty, category))
+        return None
+
+    def request_refill(self, bucket: Bucket) -> None:
+        """Ask the producer to refill a bucket ahead of the others"""
+        self._wanted.add(bucket)
+        if self._refill_event is not None:
+            self._refill_event.set()
+
+    async def wait_for_refill(self, timeout: float) -> None:
+        """Sleep until the next stock check, or until a draw finds a bucket empty"""
+        if self._refill_event is None:
+            self._refill_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._refill_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._refill_event.clear()
+
+    async def get_stock(self, session: AsyncSession) -> Dict[Bucket, int]:
+        result = await session.execute(
+            select(PooledTask.task_type, PooledTask.difficulty, PooledTask.interest_category, func.count())
+            .group_by(PooledTask.task_type, PooledTask.difficulty, PooledTask.interest_category)
+        )
+        return {(task_type, difficulty, category): count for task_type, difficulty, category, count in result.all()}
+
+    def _budget_available(self) -> bool:
+        now = time.monotonic()
+        while self._call_times and now - self._call_times[0] >= 60:
+            self._call_times.popleft()
+        return len(self._call_times) < self.calls_per_minute
+
+    def _model_busy(self) -> bool:
+        # Live requests waiting for the model come first
+        scheduler = ai_service.scheduler
+        return scheduler is not None and scheduler.queue_depth > 0
+
+    async def refill(self, session: AsyncSession = None) -> int:
+        """Top up low buckets; returns the number of tasks added"""
+        if not session:
+            async with session_scope() as session:
+                return await self.refill(session)
+
+        # Refills don't probe a failing service; live requests do that
+        if not ai_service.is_available() or not ai_service.is_healthy():
+            return 0
+
+        stock = await self.get_stock(session)
+        low = []
+        for bucket in self.buckets():
+            count = stock.get(bucket, 0)
+            if count < self.target_per_bucket and (count <= self.low_water or bucket in self._wanted):
+                # Buckets a draw found empty first, then the emptiest
+                low.append((bucket not in self._wanted, count, bucket))
+        low.sort()
+
+        added = 0
+        for _, count, bucket in low:
+            needed = self.target_per_bucket - count
+            while needed > 0:
+                if not self._budget_available() or self._model_busy():
+                    self.metrics["refills_deferred"] += 1
+                    return added
+
+                self._call_times.append(time.monotonic())
+                self.metrics["refill_calls"] += 1
+                try:
+                    templates = await ai_service.generate_pool_tasks(*bucket, count=min(self.batch_size, needed))
+                except Exception as e:
+                    self.metrics["refill_failures"] += 1
+                    logger.warning(f"Task pool refill for {bucket} failed: {str(e)}")
+                    return added
+
+                valid = [
+                    (title, description) for title, description in templates
+                    if is_valid_template(title) and is_valid_template(description)
+                ]
+                self.metrics["rejected_templates"] += len(templates) - len(valid)
+                if not valid:
+                    break
+
+                task_type, difficulty, category = bucket
+                stored = valid[:needed]
+                session.add_all(
+                    PooledTask(
+                        task_type=task_type, difficulty=difficulty, interest_category=category,
+                        title=title, description=description
+                    )
+                    for title, description in stored
+                )
+                await session.commit()
+                added += len(stored)
+                needed -= len(stored)
+                self.metrics["generated"] += len(stored)
+
+            self._wanted.discard(bucket)
+
+        if added:
+            logger.info(f"Added {added} tasks to the task pool")
+        return added
+
+    def get_stats(self) -> Dict[str, Any]:
+        draws = self.metrics["draws"]
+        self._budget_available()
+        return {
+            **self.metrics,
+            "hit_rate": round(self.metrics["hits"] / draws, 3) if draws else 0.0,
+            "buckets": len(self.buckets()),
+            "target_per_bucket": self.target_per_bucket,
+            "wanted_buckets": len(self._wanted),
+            "calls_last_minute": len(self._call_times),
+            "calls_per_minute": self.calls_per_minute
+        }
+
+# Global task pool
+task_pool = TaskPool(
+    target_per_bucket=settings.TASK_POOL_TARGET_PER_BUCKET,
+    batch_size=settings.TASK_POOL_BATCH_SIZE,
+    calls_per_minute=int(settings.AI_RATE_LIMIT_PER_MINUTE * settings.TASK_POOL_RATE_SHARE)
+)
@@ -3,14 +3,16 @@ from sqlalchemy import select, update
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import logging
-import uuid
 import os
+from fastapi import UploadFile
 
 from models.task import Task
 from models.task_submission import TaskSubmission, SubmissionStatus
 from models.user import User
 from models.match import Match
-from core.exceptions import TaskNotFoundError, UserNotInMatchError, ValidationError
+from core.exceptions import TaskNotFoundError, UserNotInMatchError, ValidationError, FileUploadError
+from services.upload_spool import upload_spool
+from services.blob_store import blob_store
 
 logger = logging.getLogger(__name__)
 
@@ -150,40 +152,42 @@ class TaskSubmissionService:
     async def upload_submission_evidence(
         self, 
         submission_id: int, 
-        file_data: bytes,
-        file_name: str,
-        file_type: str,
+        file: UploadFile,
         session: AsyncSession
     ) -> str:
-        """Upload evidence file for a submission"""
+        """Upload evidence file for a submission, streaming it to storage"""
         
         # Validate file type
-        if file_type not in self.allowed_file_types:
-            raise ValidationError(f"File type {file_type} not allowed")
-        
-        # Validate file size
-        if len(file_data) > self.max_file_size:
-            raise ValidationError(f"File size exceeds maximum of {self.max_file_size} bytes")
-        
-        # Generate unique filename
-        file_extension = os.path.splitext(file_name)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        
-        # Ensure upload directory exists
-        os.makedirs(self.upload_dir, exist_ok=True)
+        file_extension = os.path.splitext(file.filename or "")[1].lower()
+        if not any(file_extension in extensions for extensions in self.allowed_file_types.values()):
+            raise ValidationError(f"File type {file_extension or file.content_type} not allowed")
+        
+        # Spool in chunks, enforcing the size limit as bytes arrive
+        try:
+            upload = await upload_spool.spool(file, self.max_file_size)
+        except FileUploadError as e:
+            raise ValidationError(e.message)
+        
+        async with upload:
+            # Store by the hash computed while spooling; identical evidence is stored once
+            key = await blob_store.put_file(
+                session, upload.path, upload.sha256,
+                content_type=file.content_type, extension=file_extension
+            )
         
-        # Save file
-        file_path = os.path.join(self.upload_dir, unique_filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_data)
+        # Drop the reference to evidence this upload replaces
+        previous = await session.execute(
+            select(TaskSubmission.submission_evidence_url).where(TaskSubmission.id == submission_id)
+        )
+        await blob_store.release(session, previous.scalar_one_or_none())
         
         # Update submission with file URL
         result = await session.execute(
             update(TaskSubmission)
             .where(TaskSubmission.id == submission_id)
             .values(
-                submission_evidence_url=f"/uploads/submissions/{unique_filename}",
-                submission_evidence_type=file_type
+                submission_evidence_url=blob_store.url(key),
+                submission_evidence_type=file.content_type
             )
             .returning(TaskSubmission.submission_evidence_url)
         )
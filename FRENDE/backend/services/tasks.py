@@ -1,6 +1,7 @@
 import logging
 import asyncio
-from typing import List, Optional, Dict, Any
+import random
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, or_, desc
@@ -8,18 +9,42 @@ from sqlalchemy.orm import selectinload, joinedload
 from models.task import Task, TaskDifficulty, TaskCategory
 from models.match import Match
 from models.user import User
-from core.database import get_async_session
-from core.exceptions import UserNotInMatchError, TaskNotFoundError
+from core.database import session_scope
+from core.config import settings
+from core.exceptions import AICircuitOpenError, UserNotInMatchError, TaskNotFoundError, MatchNotFoundError
 from core.performance_monitor import performance_monitor
+from core.expiry import expire_rows
+from core.hot_queries import match_task_versions
+from api.metrics import record_ai_fallback
+from services.ai import ai_service, TaskContext, extract_interests
+from services.default_greeting import default_greeting_service
+from services.task_pool import task_pool, POOLED_TASK_TYPES, GENERIC_INTEREST, interest_category, render_template
 
 logger = logging.getLogger(__name__)
 
+# Used when the pool bucket is empty and live generation fails
+FALLBACK_TASKS = [
+    "{user1} and {user2}: each share three things you're looking forward to this month, then pick one you could do together.",
+    "Swap the last song you each had on repeat and tell each other what you think the other's pick says about them.",
+    "Each describe your ideal weekend in five sentences, then plan one part of it you could enjoy together.",
+    "Take turns asking each other three questions you've never been asked before, and answer honestly.",
+]
+
+DIFFICULTY_MULTIPLIERS = {
+    TaskDifficulty.EASY: 1,
+    TaskDifficulty.MEDIUM: 2,
+    TaskDifficulty.HARD: 3,
+}
+
+TASK_LIFETIME = timedelta(days=1)
+
 class TaskService:
     """Service for managing tasks and task generation"""
     
     def __init__(self):
         self.task_cache: Dict[str, Task] = {}
         self.max_cache_size = 100
+        self.generation_sources = {"pool": 0, "live": 0, "fallback": 0}
     
     async def get_match_tasks(
         self,
@@ -29,7 +54,7 @@ class TaskService:
     ) -> List[Task]:
         """Get tasks for a match with optimized query and eager loading"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_match_tasks_internal(match_id, user_id, session)
         
         return await self._get_match_tasks_internal(match_id, user_id, session)
@@ -41,7 +66,7 @@ class TaskService:
         session: AsyncSession
     ) -> List[Task]:
         """Internal method to get tasks for a match with optimized query"""
-        async with performance_monitor("get_match_tasks", user_id=user_id):
+        with performance_monitor("get_match_tasks", user_id=user_id):
             # Verify user is part of the match with optimized query
             result = await session.execute(
                 select(Match)
@@ -78,6 +103,18 @@ class TaskService:
             )
             return result.scalars().all()
     
+    async def get_match_tasks_version(
+        self,
+        match_id: int,
+        user_id: int,
+        session: AsyncSession
+    ) -> Optional[List[tuple]]:
+        """Get the mutable columns of a match's open tasks, used as the task list ETag version"""
+        result = await session.execute(match_task_versions(match_id, user_id, datetime.utcnow()))
+        rows = [tuple(row) for row in result.all()]
+        # An empty list can't be told apart from "not in this match"; let the endpoint decide
+        return rows or None
+    
     async def get_task_details(
         self,
         task_id: int,
@@ -86,7 +123,7 @@ class TaskService:
     ) -> Optional[Task]:
         """Get detailed information about a specific task with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_task_details_internal(task_id, user_id, session)
         
         return await self._get_task_details_internal(task_id, user_id, session)
@@ -98,7 +135,7 @@ class TaskService:
         session: AsyncSession
     ) -> Optional[Task]:
         """Internal method to get task details with optimized query"""
-        async with performance_monitor("get_task_details", user_id=user_id):
+        with performance_monitor("get_task_details", user_id=user_id):
             # Get task with eager loading
             result = await session.execute(
                 select(Task)
@@ -127,7 +164,7 @@ class TaskService:
     ) -> Dict[str, Any]:
         """Get task progress with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_task_progress_internal(task_id, user_id, session)
         
         return await self._get_task_progress_internal(task_id, user_id, session)
@@ -139,7 +176,7 @@ class TaskService:
         session: AsyncSession
     ) -> Dict[str, Any]:
         """Internal method to get task progress with optimized query"""
-        async with performance_monitor("get_task_progress", user_id=user_id):
+        with performance_monitor("get_task_progress", user_id=user_id):
             # Get task with submissions using eager loading
             result = await session.execute(
                 select(Task)
@@ -183,7 +220,7 @@ class TaskService:
     ) -> List[Task]:
         """Get all active tasks for a user with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_active_tasks_for_user_internal(user_id, session)
         
         return await self._get_active_tasks_for_user_internal(user_id, session)
@@ -194,7 +231,7 @@ class TaskService:
         session: AsyncSession
     ) -> List[Task]:
         """Internal method to get active tasks for user with optimized query"""
-        async with performance_monitor("get_active_tasks_for_user", user_id=user_id):
+        with performance_monitor("get_active_tasks_for_user", user_id=user_id):
             # Get user's matches with tasks using optimized query
             result = await session.execute(
                 select(Task)
@@ -217,13 +254,239 @@ class TaskService:
             )
             return result.scalars().all()
     
+    async def generate_task(
+        self,
+        match_id: int,
+        task_type: str = "bonding",
+        difficulty: TaskDifficulty = TaskDifficulty.MEDIUM,
+        category: TaskCategory = TaskCategory.BONDING,
+        session: AsyncSession = None
+    ) -> Task:
+        """Create a task for a match, drawing it from the pre-generated pool when possible"""
+        if not session:
+            async with session_scope() as session:
+                return await self._generate_task_internal(match_id, task_type, difficulty, category, session)
+        
+        return await self._generate_task_internal(match_id, task_type, difficulty, category, session)
+    
+    async def _generate_task_internal(
+        self,
+        match_id: int,
+        task_type: str,
+        difficulty: TaskDifficulty,
+        category: TaskCategory,
+        session: AsyncSession
+    ) -> Task:
+        """Internal method to create a task: pool first, then Gemini, then a built-in task"""
+        with performance_monitor("generate_task", user_id=None):
+            tasks = await self._create_tasks([(match_id, task_type, difficulty, category)], session)
+            return tasks[0]
+    
+    async def generate_tasks(
+        self,
+        match_id: int,
+        count: int,
+        task_type: str = "bonding",
+        difficulty: TaskDifficulty = TaskDifficulty.MEDIUM,
+        category: TaskCategory = TaskCategory.BONDING,
+        session: AsyncSession = None
+    ) -> List[Task]:
+        """Create several tasks for a match; those not drawn from the pool share AI calls"""
+        specs = [(match_id, task_type, difficulty, category)] * count
+        if not session:
+            async with session_scope() as session:
+                return await self._generate_tasks_internal(specs, session)
+        
+        return await self._generate_tasks_internal(specs, session)
+    
+    async def _generate_tasks_internal(
+        self,
+        specs: List[Tuple[int, str, TaskDifficulty, TaskCategory]],
+        session: AsyncSession
+    ) -> List[Task]:
+        """Internal method to create several tasks in one commit"""
+        with performance_monitor("generate_tasks", user_id=None):
+            return await self._create_tasks(specs, session)
+    
+    async def _create_tasks(
+        self,
+        specs: List[Tuple[int, str, TaskDifficulty, TaskCategory]],
+        session: AsyncSession
+    ) -> List[Task]:
+        """
+        Create a task for each (match_id, task_type, difficulty, category).
+        
+        Each is drawn from the pre-generated pool when possible; the rest go to
+        Gemini in one ``generate_tasks`` call so the scheduler can batch them,
+        and any it can't answer within the latency budget get a built-in task.
+        """
+        match_ids = {spec[0] for spec in specs}
+        result = await session.execute(
+            select(Match)
+            .where(Match.id.in_(match_ids))
+            .options(selectinload(Match.user1), selectinload(Match.user2))
+        )
+        matches = {match.id: match for match in result.scalars().all()}
+        
+        planned = []
+        live = []
+        for match_id, task_type, difficulty, category in specs:
+            match = matches.get(match_id)
+            if not match:
+                raise MatchNotFoundError(f"Match {match_id} not found", match_id=match_id)
+            
+            task_type = getattr(task_type, "value", task_type)
+            difficulty = TaskDifficulty(difficulty)
+            category = TaskCategory(category)
+            
+            common_interests = [
+                interest for interest in extract_interests(match.user1.profile_text or "")
+                if interest in extract_interests(match.user2.profile_text or "")
+            ]
+            interest_bucket, interest = interest_category(common_interests)
+            values = {
+                "user1": match.user1.name or "you",
+                "user2": match.user2.name or "your match",
+                "interest": interest or GENERIC_INTEREST
+            }
+            
+            # A pre-generated task, from the interest bucket or else a general one
+            drawn = None
+            if settings.TASK_POOL_ENABLED and task_type in POOLED_TASK_TYPES:
+                drawn = await task_pool.draw(session, task_type, difficulty.value, interest_bucket)
+                if drawn is None and interest is not None:
+                    drawn = await task_pool.draw(session, task_type, difficulty.value, "general")
+            
+            plan = {
+                "match_id": match_id, "task_type": task_type, "difficulty": difficulty,
+                "category": category, "values": values, "content": None
+            }
+            if drawn is not None:
+                plan["content"] = tuple(render_template(text, values) for text in drawn)
+                self.generation_sources["pool"] += 1
+            else:
+                live.append((plan, TaskContext(
+                    user1=match.user1,
+                    user2=match.user2,
+                    match=match,
+                    task_type=task_type,
+                    compatibility_score=match.compatibility_score or 0,
+                    common_interests=common_interests,
+                    difficulty=difficulty.value
+                )))
+            planned.append(plan)
+        
+        if live:
+            generated, fallback_reason = None, "over_budget"
+            try:
+                # Past the latency budget built-in tasks are served; late answers warm the cache
+                generated = await ai_service.within_budget(
+                    ai_service.generate_tasks([context for _, context in live])
+                )
+            except Exception as e:
+                logger.warning(f"Live task generation failed, using built-in tasks: {str(e)}")
+                fallback_reason = "error"
+            
+            for index, (plan, context) in enumerate(live):
+                content = generated[index] if generated is not None else None
+                if content is not None:
+                    plan["content"] = content
+                    self.generation_sources["live"] += 1
+                    continue
+                
+                if generated is not None:
+                    # generate_tasks logged the error; the circuit tells us if Gemini is down
+                    fallback_reason = "error" if ai_service.is_healthy() else "circuit_open"
+                plan["content"] = (
+                    f"{plan['task_type'].replace('-', ' ').title()} Task",
+                    render_template(random.choice(FALLBACK_TASKS), plan["values"])
+                )
+                plan["ai_generated"] = False
+                self.generation_sources["fallback"] += 1
+                record_ai_fallback("task", fallback_reason)
+        
+        tasks = []
+        for plan in planned:
+            title, description = plan["content"]
+            task = Task(
+                title=title[:200],
+                description=description,
+                task_type=plan["task_type"],
+                difficulty=plan["difficulty"],
+                category=plan["category"],
+                match_id=plan["match_id"],
+                ai_generated=plan.get("ai_generated", True),
+                base_coin_reward=10,
+                difficulty_multiplier=DIFFICULTY_MULTIPLIERS[plan["difficulty"]],
+                expires_at=datetime.utcnow() + TASK_LIFETIME
+            )
+            task.calculate_reward()
+            tasks.append(task)
+        
+        session.add_all(tasks)
+        await session.commit()
+        for task in tasks:
+            await session.refresh(task)
+        return tasks
+    
+    async def generate_conversation_starter(
+        self,
+        match_id: int,
+        session: AsyncSession = None,
+        user_id: Optional[int] = None
+    ) -> str:
+        """Generate a conversation starter for a match, or a default greeting from ``user_id`` when Gemini is down or slow"""
+        if not session:
+            async with session_scope() as session:
+                return await self._generate_conversation_starter_internal(match_id, user_id, session)
+        
+        return await self._generate_conversation_starter_internal(match_id, user_id, session)
+    
+    async def _generate_conversation_starter_internal(
+        self,
+        match_id: int,
+        user_id: Optional[int],
+        session: AsyncSession
+    ) -> str:
+        """Internal method to generate a conversation starter"""
+        with performance_monitor("generate_conversation_starter", user_id=user_id):
+            result = await session.execute(
+                select(Match)
+                .where(Match.id == match_id)
+                .options(selectinload(Match.user1), selectinload(Match.user2))
+            )
+            match = result.scalar_one_or_none()
+            
+            if not match:
+                raise MatchNotFoundError(f"Match {match_id} not found", match_id=match_id)
+            
+            context = TaskContext(
+                user1=match.user1,
+                user2=match.user2,
+                match=match,
+                compatibility_score=match.compatibility_score or 0
+            )
+            starter, fallback_reason = None, "over_budget"
+            try:
+                starter = await ai_service.within_budget(ai_service.generate_conversation_starter(context))
+            except Exception as e:
+                logger.warning(f"Conversation starter generation failed for match {match_id}, using a default greeting: {str(e)}")
+                fallback_reason = "circuit_open" if isinstance(e, AICircuitOpenError) else "error"
+            
+            if starter is not None:
+                return starter
+            
+            record_ai_fallback("conversation_starter", fallback_reason)
+            sender = match.user2 if user_id == match.user2_id else match.user1
+            return default_greeting_service.get_random_greeting(sender.name or "your new friend")
+    
     async def get_expired_tasks(
         self,
         session: AsyncSession = None
     ) -> List[Task]:
         """Get expired tasks with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._get_expired_tasks_internal(session)
         
         return await self._get_expired_tasks_internal(session)
@@ -233,7 +496,7 @@ class TaskService:
         session: AsyncSession
     ) -> List[Task]:
         """Internal method to get expired tasks with optimized query"""
-        async with performance_monitor("get_expired_tasks", user_id=None):
+        with performance_monitor("get_expired_tasks", user_id=None):
             result = await session.execute(
                 select(Task)
                 .where(
@@ -246,13 +509,62 @@ class TaskService:
             )
             return result.scalars().all()
     
+    async def replace_expired_tasks(
+        self,
+        session: AsyncSession = None,
+        match_id: Optional[int] = None
+    ) -> List[Task]:
+        """Replace expired, uncompleted tasks of active matches with new ones"""
+        if not session:
+            async with session_scope() as session:
+                return await self._replace_expired_tasks_internal(session, match_id)
+        
+        return await self._replace_expired_tasks_internal(session, match_id)
+    
+    async def replace_expired_tasks_for_match(
+        self,
+        match_id: int,
+        session: AsyncSession = None
+    ) -> List[Task]:
+        """Replace a single match's expired tasks"""
+        return await self.replace_expired_tasks(session, match_id=match_id)
+    
+    async def _replace_expired_tasks_internal(
+        self,
+        session: AsyncSession,
+        match_id: Optional[int]
+    ) -> List[Task]:
+        """Internal method to replace expired tasks; replacements come from the task pool"""
+        expired_tasks = await self._get_expired_tasks_internal(session)
+        now = datetime.utcnow()
+        
+        specs = []
+        for task in expired_tasks:
+            if match_id is not None and task.match_id != match_id:
+                continue
+            if task.match is None or task.match.status != "active":
+                continue
+            
+            # Closed in the same commit that creates the replacement so it's never replaced twice
+            task.is_completed = True
+            task.completed_at = now
+            specs.append((task.match_id, task.task_type, task.difficulty, task.category))
+        
+        if not specs:
+            return []
+        replacements = await self._generate_tasks_internal(specs, session)
+        
+        if replacements:
+            logger.info(f"Replaced {len(replacements)} expired tasks")
+        return replacements
+    
     async def cleanup_expired_tasks(
         self,
         session: AsyncSession = None
     ) -> int:
         """Clean up expired tasks with optimized query"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._cleanup_expired_tasks_internal(session)
         
         return await self._cleanup_expired_tasks_internal(session)
@@ -261,20 +573,21 @@ class TaskService:
         self,
         session: AsyncSession
     ) -> int:
-        """Internal method to cleanup expired tasks with optimized query"""
-        async with performance_monitor("cleanup_expired_tasks", user_id=None):
-            # Get expired tasks
-            expired_tasks = await self._get_expired_tasks_internal(session)
-            
-            # Mark as completed
-            for task in expired_tasks:
-                task.is_completed = True
-                task.completed_at = datetime.utcnow()
-            
-            await session.commit()
-            
-            logger.info(f"Cleaned up {len(expired_tasks)} expired tasks")
-            return len(expired_tasks)
+        """Internal method to cleanup expired tasks with a set-based update"""
+        now = datetime.utcnow()
+        expired_count = await expire_rows(
+            session,
+            "cleanup_expired_tasks",
+            Task,
+            and_(
+                Task.is_completed == False,
+                Task.expires_at < now
+            ),
+            {"is_completed": True, "completed_at": now}
+        )
+        
+        logger.info(f"Cleaned up {expired_count} expired tasks")
+        return expired_count
 
 # Global task service instance
 task_service = TaskService() 
\ No newline at end of file
@@ -6,6 +6,7 @@ from sqlalchemy import select, delete
 from sqlalchemy.orm import selectinload
 
 from core.config import settings
+from core.token_blacklist import token_blacklist
 from core.security import (
     create_access_token, create_refresh_token, verify_refresh_token,
     blacklist_token, rotate_tokens
@@ -72,19 +73,22 @@ class TokenService:
             
             user_id = int(payload.get("sub"))
             
-            # Check if refresh token exists and is not revoked
+            # Check if refresh token exists and is not revoked, loading its session in the same query
             token_hash = blacklist_token(refresh_token)
             result = await self.session.execute(
-                select(RefreshToken).where(
+                select(RefreshToken, UserSession)
+                .outerjoin(UserSession, UserSession.refresh_token_id == RefreshToken.id)
+                .where(
                     RefreshToken.token_hash == token_hash,
                     RefreshToken.is_revoked == False,
                     RefreshToken.expires_at > datetime.utcnow()
                 )
             )
-            stored_token = result.scalar_one_or_none()
+            row = result.first()
             
-            if not stored_token:
+            if not row:
                 raise ValueError("Refresh token not found or revoked")
+            stored_token, session = row
             
             # Check if token rotation is enabled
             if settings.TOKEN_ROTATION_ENABLED:
@@ -104,10 +108,6 @@ class TokenService:
                 self.session.add(new_refresh_token_model)
                 
                 # Update session
-                session_result = await self.session.execute(
-                    select(UserSession).where(UserSession.refresh_token_id == stored_token.id)
-                )
-                session = session_result.scalar_one_or_none()
                 if session:
                     session.refresh_token_id = new_refresh_token_model.id
                     session.last_activity = datetime.utcnow()
@@ -123,10 +123,6 @@ class TokenService:
                 new_access_token = create_access_token(data={"sub": str(user_id)})
                 
                 # Update session activity
-                session_result = await self.session.execute(
-                    select(UserSession).where(UserSession.refresh_token_id == stored_token.id)
-                )
-                session = session_result.scalar_one_or_none()
                 if session:
                     session.last_activity = datetime.utcnow()
                 
@@ -147,20 +143,19 @@ class TokenService:
         try:
             token_hash = blacklist_token(refresh_token)
             
-            # Find and revoke refresh token
+            # Find and revoke refresh token along with its session
             result = await self.session.execute(
-                select(RefreshToken).where(RefreshToken.token_hash == token_hash)
+                select(RefreshToken, UserSession)
+                .outerjoin(UserSession, UserSession.refresh_token_id == RefreshToken.id)
+                .where(RefreshToken.token_hash == token_hash)
             )
-            stored_token = result.scalar_one_or_none()
+            row = result.first()
             
-            if stored_token:
+            if row:
+                stored_token, session = row
                 stored_token.is_revoked = True
                 
                 # Deactivate associated session
-                session_result = await self.session.execute(
-                    select(UserSession).where(UserSession.refresh_token_id == stored_token.id)
-                )
-                session = session_result.scalar_one_or_none()
                 if session:
                     session.is_active = False
                 
@@ -187,6 +182,9 @@ class TokenService:
             self.session.add(blacklisted_token)
             await self.session.commit()
             
+            # Only once committed, so a reload on another worker agrees
+            await token_blacklist.blacklist(token_hash, expires_at)
+            
         except Exception as e:
             await self.session.rollback()
             logger.error(f"Error blacklisting token: {e}")
@@ -197,6 +195,10 @@ class TokenService:
         try:
             token_hash = blacklist_token(token)
             
+            # In memory once loaded; the table is only read before startup finishes
+            if token_blacklist.loaded:
+                return token_blacklist.contains(token_hash)
+            
             result = await self.session.execute(
                 select(BlacklistedToken).where(
                     BlacklistedToken.token_hash == token_hash,
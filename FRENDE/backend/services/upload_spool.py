@@ -0,0 +1,155 @@
+"""
+Upload Spooling Service for Frende App
+Streams uploads to a temp file in fixed-size chunks
+
+An upload is never held in memory whole: it is copied chunk by chunk into a
+spool file, with the size limit enforced as bytes arrive and a SHA-256
+computed on the way. Images are then sniffed from the spooled header (format
+and dimensions) before anything is decoded, and workers decode straight from
+the spool file.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import aiofiles
+from fastapi import UploadFile
+from PIL import Image
+
+from core.config import settings
+from core.exceptions import FileUploadError
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request and written to the spool per step
+SPOOL_CHUNK_SIZE = 64 * 1024
+
+class SpooledUpload:
+    """An upload copied to a spool file; delete it with ``cleanup``"""
+
+    def __init__(self, path: Path, filename: Optional[str], content_type: Optional[str], size: int, sha256: str):
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+        self._moved = False
+
+    async def move_to(self, destination: Path) -> Path:
+        """Move the spooled file into storage (a rename on the same filesystem)"""
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(shutil.move, str(self.path), str(destination))
+        self.path = destination
+        self._moved = True
+        return destination
+
+    async def cleanup(self) -> None:
+        """Delete the spool file if it hasn't been moved into storage"""
+        if not self._moved:
+            await asyncio.to_thread(self.path.unlink, True)
+
+    async def __aenter__(self) -> "SpooledUpload":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.cleanup()
+
+class UploadSpool:
+    """Chunked upload ingestion with per-upload memory accounting"""
+
+    def __init__(self, spool_dir: str, chunk_size: int = SPOOL_CHUNK_SIZE, max_image_pixels: int = 40_000_000):
+        self.spool_dir = Path(spool_dir)
+        self.chunk_size = chunk_size
+        self.max_image_pixels = max_image_pixels
+        self.metrics = {
+            "uploads": 0,
+            "bytes": 0,
+            "rejected_too_large": 0,
+            "rejected_not_image": 0,
+            "peak_buffered_bytes": 0,
+            "peak_decoded_bytes": 0
+        }
+
+    async def spool(self, file: UploadFile, max_size: int) -> SpooledUpload:
+        """
+        Copy an upload to a spool file, rejecting it once it passes ``max_size``
+        """
+        # A declared size lets an oversized upload fail before any copying
+        if file.size is not None and file.size > max_size:
+            self.metrics["rejected_too_large"] += 1
+            raise FileUploadError(
+                f"File size exceeds maximum limit of {max_size // (1024*1024)}MB",
+                file_name=file.filename, file_size=file.size, max_size=max_size
+            )
+
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=self.spool_dir, suffix=".upload")
+        os.close(fd)
+        path = Path(name)
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(path, "wb") as spool_file:
+                while chunk := await file.read(self.chunk_size):
+                    size += len(chunk)
+                    if size > max_size:
+                        self.metrics["rejected_too_large"] += 1
+                        raise FileUploadError(
+                            f"File size exceeds maximum limit of {max_size // (1024*1024)}MB",
+                            file_name=file.filename, max_size=max_size
+                        )
+                    self.metrics["peak_buffered_bytes"] = max(self.metrics["peak_buffered_bytes"], len(chunk))
+                    digest.update(chunk)
+                    await spool_file.write(chunk)
+        except BaseException:
+            await asyncio.to_thread(path.unlink, True)
+            raise
+
+        self.metrics["uploads"] += 1
+        self.metrics["bytes"] += size
+        return SpooledUpload(path, file.filename, file.content_type, size, digest.hexdigest())
+
+    def sniff_image(self, upload: SpooledUpload, allowed_formats) -> Tuple[str, Tuple[int, int]]:
+        """
+        Read an image's format and dimensions from its header, without decoding it
+
+        Raises ``FileUploadError`` for non-images, disallowed formats and
+        images whose decoded bitmap would be too large.
+        """
+        try:
+            with Image.open(upload.path) as image:
+                image_format, dimensions = image.format, image.size
+        except Exception:
+            self.metrics["rejected_not_image"] += 1
+            raise FileUploadError("File must be an image", file_name=upload.filename)
+
+        if image_format not in allowed_formats:
+            self.metrics["rejected_not_image"] += 1
+            raise FileUploadError(f"Image format {image_format} not supported", file_name=upload.filename)
+
+        if dimensions[0] * dimensions[1] > self.max_image_pixels:
+            self.metrics["rejected_too_large"] += 1
+            raise FileUploadError(
+                f"Image dimensions {dimensions[0]}x{dimensions[1]} exceed the maximum of "
+                f"{self.max_image_pixels // 1_000_000} megapixels",
+                file_name=upload.filename
+            )
+
+        return image_format, dimensions
+
+    def record_decode(self, result: Dict[str, Any]) -> None:
+        """Track the largest bitmap a worker decoded for an upload"""
+        self.metrics["peak_decoded_bytes"] = max(self.metrics["peak_decoded_bytes"], result.get("decoded_bytes", 0))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.metrics, "chunk_size": self.chunk_size, "max_image_pixels": self.max_image_pixels}
+
+# Global upload spool
+upload_spool = UploadSpool(settings.UPLOAD_SPOOL_DIR, max_image_pixels=settings.IMAGE_MAX_PIXELS)
@@ -1,5 +1,6 @@
 import re
 from typing import List, Optional, Dict, Any, Set
+from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func
 from datetime import datetime, timedelta
@@ -9,11 +10,15 @@ from models.user import User
 from models.match import Match
 from models.task import Task
 from schemas.user import UserUpdate
-from core.database import get_async_session
+from core.database import session_scope, read_only
+from core.hot_queries import user_by_id
+from core.expiry import expire_rows
 from core.config import settings
-from core.exceptions import UserNotFoundError, InsufficientCoinsError
+from core.exceptions import UserNotFoundError, InsufficientCoinsError, FileUploadError
 from services.image_processing import image_processor
 from services.file_storage import file_storage_service
+from services.blob_store import blob_store
+from services.upload_spool import upload_spool
 
 logger = logging.getLogger(__name__)
 
@@ -60,14 +65,14 @@ class UserService:
     ) -> Optional[User]:
         """Get user profile by ID"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 result = await session.execute(
-                    select(User).where(User.id == user_id)
+                    user_by_id(user_id)
                 )
                 return result.scalar_one_or_none()
         
         result = await session.execute(
-            select(User).where(User.id == user_id)
+            user_by_id(user_id)
         )
         return result.scalar_one_or_none()
     
@@ -79,7 +84,7 @@ class UserService:
     ) -> User:
         """Update user profile"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._update_user_profile_internal(user_id, profile_update, session)
         
         return await self._update_user_profile_internal(user_id, profile_update, session)
@@ -93,7 +98,7 @@ class UserService:
         """Internal method to update user profile"""
         # Get user
         result = await session.execute(
-            select(User).where(User.id == user_id)
+            user_by_id(user_id)
         )
         user = result.scalar_one_or_none()
         
@@ -115,8 +120,7 @@ class UserService:
     async def update_profile_picture(
         self,
         user_id: int,
-        file_content: bytes,
-        filename: str,
+        file: UploadFile,
         session: AsyncSession = None
     ) -> User:
         """
@@ -124,56 +128,57 @@ class UserService:
         
         Args:
             user_id: User ID
-            file_content: Raw image file content
-            filename: Original filename
+            file: Uploaded image file, streamed to a spool file rather than read into memory
             session: Database session
             
         Returns:
             Updated user object
         """
         if not session:
-            async with get_async_session() as session:
-                return await self._update_profile_picture_internal(user_id, file_content, filename, session)
+            async with session_scope() as session:
+                return await self._update_profile_picture_internal(user_id, file, session)
         
-        return await self._update_profile_picture_internal(user_id, file_content, filename, session)
+        return await self._update_profile_picture_internal(user_id, file, session)
     
     async def _update_profile_picture_internal(
         self,
         user_id: int,
-        file_content: bytes,
-        filename: str,
+        file: UploadFile,
         session: AsyncSession
     ) -> User:
         """Internal method to update profile picture"""
         # Get user
         result = await session.execute(
-            select(User).where(User.id == user_id)
+            user_by_id(user_id)
         )
         user = result.scalar_one_or_none()
         
         if not user:
             raise UserNotFoundError(f"User with ID {user_id} not found")
         
-        # Validate image
-        is_valid, error_message = image_processor.validate_image(file_content, filename)
-        if not is_valid:
-            raise ValueError(error_message)
+        try:
+            upload = await upload_spool.spool(file, image_processor.max_file_size)
+        except FileUploadError as e:
+            raise ValueError(e.message)
         
-        # Process image
-        processed_image = image_processor.process_profile_picture(file_content)
-        
-        # Generate filename
-        new_filename = image_processor.generate_filename(user_id, filename)
-        
-        # Save to storage
-        file_path = await file_storage_service.save_profile_picture(
-            user_id, new_filename, processed_image
-        )
+        async with upload:
+            # Validate image from its header
+            is_valid, error_message = image_processor.validate_image(upload)
+            if not is_valid:
+                raise ValueError(error_message)
+            
+            # Resize and encode next to the spool file (in a worker process, off the event loop)
+            rendered_path = upload.path.with_suffix(".jpg")
+            result = await image_processor.process_profile_picture(upload, rendered_path)
+            
+            # Store by content hash; an identical picture is stored once
+            file_path = await blob_store.put_file(
+                session, rendered_path, result["sha256"], content_type="image/jpeg", extension=".jpg"
+            )
         
-        # Clean up old profile picture
-        if user.profile_picture_url:
-            old_filename = user.profile_picture_url.split('/')[-1]
-            await file_storage_service.cleanup_old_profile_pictures(user_id, old_filename)
+        # Drop the reference to the previous picture
+        previous_path = user.profile_picture_url
+        is_legacy_file = previous_path is not None and not await blob_store.release(session, previous_path)
         
         # Update database
         user.profile_picture_url = file_path
@@ -182,6 +187,10 @@ class UserService:
         await session.commit()
         await session.refresh(user)
         
+        # Pictures stored before the blob store are plain files
+        if is_legacy_file:
+            await file_storage_service.delete_profile_picture(previous_path)
+        
         logger.info(f"Updated profile picture for user {user_id}: {file_path}")
         return user
     
@@ -201,7 +210,7 @@ class UserService:
             Updated user object
         """
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._delete_profile_picture_internal(user_id, session)
         
         return await self._delete_profile_picture_internal(user_id, session)
@@ -214,16 +223,16 @@ class UserService:
         """Internal method to delete profile picture"""
         # Get user
         result = await session.execute(
-            select(User).where(User.id == user_id)
+            user_by_id(user_id)
         )
         user = result.scalar_one_or_none()
         
         if not user:
             raise UserNotFoundError(f"User with ID {user_id} not found")
         
-        # Delete from storage
-        if user.profile_picture_url:
-            await file_storage_service.delete_profile_picture(user.profile_picture_url)
+        # Drop the blob reference; garbage collection deletes it once unreferenced
+        previous_path = user.profile_picture_url
+        is_legacy_file = previous_path is not None and not await blob_store.release(session, previous_path)
         
         # Update database
         user.profile_picture_url = None
@@ -232,20 +241,20 @@ class UserService:
         await session.commit()
         await session.refresh(user)
         
+        # Pictures stored before the blob store are plain files
+        if is_legacy_file:
+            await file_storage_service.delete_profile_picture(previous_path)
+        
         logger.info(f"Deleted profile picture for user {user_id}")
         return user
     
+    @read_only
     async def get_user_stats(
         self,
         user_id: int,
         session: AsyncSession = None
     ) -> Dict[str, Any]:
         """Get user statistics"""
-        if not session:
-            async for db_session in get_async_session():
-                session = db_session
-                break
-        
         # Get user
         user = await self.get_user_profile(user_id, session)
         if not user:
@@ -300,7 +309,7 @@ class UserService:
     ) -> User:
         """Purchase an additional slot using coins"""
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._purchase_slot_internal(user_id, session)
         
         return await self._purchase_slot_internal(user_id, session)
@@ -313,7 +322,7 @@ class UserService:
         """Internal method to purchase slot"""
         # Get user
         result = await session.execute(
-            select(User).where(User.id == user_id)
+            user_by_id(user_id)
         )
         user = result.scalar_one_or_none()
         
@@ -341,35 +350,30 @@ class UserService:
     async def reset_expired_slots(self, session: AsyncSession = None):
         """Reset expired slots for all users"""
         if not session:
-            async for db_session in get_async_session():
-                session = db_session
-                break
-        
-        # Find users with expired slots
-        cutoff_date = datetime.utcnow() - self.slot_reset_interval
-        
-        result = await session.execute(
-            select(User).where(
-                and_(
-                    User.available_slots < 2,
-                    or_(
-                        User.slot_reset_time == None,
-                        User.slot_reset_time < cutoff_date
-                    )
+            async with session_scope() as session:
+                return await self.reset_expired_slots(session)
+        
+        # Reset users with expired slots in set-based batches
+        now = datetime.utcnow()
+        cutoff_date = now - self.slot_reset_interval
+        
+        reset_count = await expire_rows(
+            session,
+            "reset_expired_slots",
+            User,
+            and_(
+                User.available_slots < 2,
+                or_(
+                    User.slot_reset_time == None,
+                    User.slot_reset_time < cutoff_date
                 )
-            )
+            ),
+            {"available_slots": 2, "slot_reset_time": now, "updated_at": now}
         )
         
-        users_to_reset = result.scalars().all()
-        
-        for user in users_to_reset:
-            user.available_slots = 2
-            user.slot_reset_time = datetime.utcnow()
-            user.updated_at = datetime.utcnow()
-        
-        if users_to_reset:
-            await session.commit()
-            logger.info(f"Reset slots for {len(users_to_reset)} users")
+        if reset_count:
+            logger.info(f"Reset slots for {reset_count} users")
+        return reset_count
     
     async def use_slot(
         self,
@@ -378,13 +382,12 @@ class UserService:
     ) -> bool:
         """Use a slot for matching"""
         if not session:
-            async for db_session in get_async_session():
-                session = db_session
-                break
+            async with session_scope() as session:
+                return await self.use_slot(user_id, session)
         
         # Get user
         result = await session.execute(
-            select(User).where(User.id == user_id)
+            user_by_id(user_id)
         )
         user = result.scalar_one_or_none()
         
@@ -417,9 +420,8 @@ class UserService:
     ) -> List[Match]:
         """Get user's matches"""
         if not session:
-            async for db_session in get_async_session():
-                session = db_session
-                break
+            async with session_scope() as session:
+                return await self.get_user_matches(user_id, status, session)
         
         query = select(Match).where(
             or_(Match.user1_id == user_id, Match.user2_id == user_id)
@@ -438,9 +440,8 @@ class UserService:
     ) -> List[Task]:
         """Get user's active tasks"""
         if not session:
-            async for db_session in get_async_session():
-                session = db_session
-                break
+            async with session_scope() as session:
+                return await self.get_user_tasks(user_id, session)
         
         result = await session.execute(
             select(Task).join(Match).where(
@@ -452,6 +453,7 @@ class UserService:
         )
         return result.scalars().all()
     
+    @read_only
     async def search_users(
         self,
         query: str,
@@ -459,11 +461,6 @@ class UserService:
         session: AsyncSession = None
     ) -> List[User]:
         """Search for users by name, username, or profile text"""
-        if not session:
-            async for db_session in get_async_session():
-                session = db_session
-                break
-        
         search_term = f"%{query}%"
         
         result = await session.execute(
@@ -489,9 +486,8 @@ class UserService:
     ) -> List[Dict[str, Any]]:
         """Get compatible users for matching"""
         if not session:
-            async for db_session in get_async_session():
-                session = db_session
-                break
+            async with session_scope() as session:
+                return await self.get_compatible_users(user_id, limit, session)
         
         # Get current user
         current_user = await self.get_user_profile(user_id, session)
@@ -717,7 +713,7 @@ class UserService:
             Dictionary with updated profile analysis
         """
         if not session:
-            async with get_async_session() as session:
+            async with session_scope() as session:
                 return await self._update_profile_with_parsed_data_internal(user_id, session)
         
         return await self._update_profile_with_parsed_data_internal(user_id, session)
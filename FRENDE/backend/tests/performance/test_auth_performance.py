@@ -0,0 +1,53 @@
+import time
+import pytest
+import pytest_asyncio
+from fastapi.security import HTTPAuthorizationCredentials
+
+from core import auth
+from core.security import create_access_token
+from models.user import User
+from tests.sqlite_db import sqlite_session
+
+ITERATIONS = 2000
+
+@pytest_asyncio.fixture
+async def session():
+    async with sqlite_session(("users",), [
+        User(id=1, email="a@example.com", hashed_password="x", name="A")
+    ]) as session:
+        yield session
+
+async def _us_per_call(call, iterations: int = ITERATIONS) -> float:
+    for _ in range(20):  # warm up
+        await call()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await call()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+class TestAuthPerformance:
+    """Per-request cost of resolving the authenticated user"""
+
+    @pytest.mark.asyncio
+    async def test_cached_principal_vs_user_fetch(self, session):
+        credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=create_access_token({"sub": "1"})
+        )
+        auth.claims_cache.clear()
+        auth.principal_cache.clear()
+
+        async def uncached():
+            auth.claims_cache.clear()
+            session.expunge_all()
+            return await auth.current_active_user(await auth.get_current_user(credentials, session))
+
+        async def cached():
+            return await auth.current_user_id(await auth.get_current_principal(credentials, session))
+
+        legacy_us = await _us_per_call(uncached)
+        fast_us = await _us_per_call(cached)
+
+        print(f"Auth per request: decode + user row {legacy_us:.1f}us, "
+              f"cached claims + principal {fast_us:.1f}us")
+        assert fast_us < legacy_us
+        assert auth.principal_cache.get_stats()["hit_rate"] > 0.9
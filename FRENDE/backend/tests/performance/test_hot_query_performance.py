@@ -0,0 +1,56 @@
+import time
+from sqlalchemy import select, desc
+from sqlalchemy.orm import selectinload
+
+from core.hot_queries import active_match_for_user, chat_history
+from models.match import Match
+from models.chat import ChatMessage
+
+ITERATIONS = 5000
+
+def _cpu_us_per_call(build) -> float:
+    """CPU time to build a statement and derive its compiled-cache key"""
+    build(0)._generate_cache_key()  # warm the lambda and compiled caches
+    start = time.process_time()
+    for i in range(ITERATIONS):
+        build(i)._generate_cache_key()
+    return (time.process_time() - start) / ITERATIONS * 1_000_000
+
+class TestHotQueryPerformance:
+    """Micro-benchmarks for pre-compiled hot queries on the socket message path"""
+
+    def test_membership_check_cpu_per_call(self):
+        """Socket send_message/join_chat_room membership check"""
+        def legacy(i):
+            return select(Match).where(
+                (Match.user1_id == i) | (Match.user2_id == i),
+                Match.id == i + 1,
+                Match.status == "active"
+            )
+
+        legacy_us = _cpu_us_per_call(legacy)
+        hot_us = _cpu_us_per_call(lambda i: active_match_for_user(i + 1, i))
+
+        print(f"Membership check: legacy {legacy_us:.1f}us, hot {hot_us:.1f}us, "
+              f"saved {legacy_us - hot_us:.1f}us per call")
+        assert hot_us < legacy_us
+
+    def test_chat_history_cpu_per_call(self):
+        """Chat history page load"""
+        def legacy(i):
+            return (
+                select(ChatMessage)
+                .where(ChatMessage.match_id == i)
+                .options(selectinload(ChatMessage.sender), selectinload(ChatMessage.task))
+                .order_by(desc(ChatMessage.created_at))
+                .offset(0)
+                .limit(50)
+                .where(ChatMessage.is_system_message == False)
+            )
+
+        legacy_us = _cpu_us_per_call(legacy)
+        hot_us = _cpu_us_per_call(lambda i: chat_history(i, 50, 0))
+
+        print(f"Chat history: legacy {legacy_us:.1f}us, hot {hot_us:.1f}us, "
+              f"saved {legacy_us - hot_us:.1f}us per call")
+        assert hot_us < legacy_us
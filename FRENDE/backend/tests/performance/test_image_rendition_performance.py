@@ -0,0 +1,65 @@
+import io
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from services.image_processing import ImageProcessingService
+from services.image_renditions import render_primary, render_renditions
+
+def _photo(width: int = 3000, height: int = 2000) -> bytes:
+    # Noise over a gradient compresses roughly like a photo
+    noise = Image.effect_noise((width, height), 24)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.5)))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=92)
+    return output.getvalue()
+
+def _legacy_renditions(data: bytes, out: Path) -> None:
+    """What process_uploaded_image did before the rendition planner"""
+    image = Image.open(io.BytesIO(data))
+    image = image.resize((1200, 800), Image.Resampling.LANCZOS)
+    image.save(out / "optimized.jpg", "JPEG", quality=85, optimize=True)
+    image.save(out / "optimized.webp", "WEBP", quality=85, method=6)
+    image.save(out / "optimized.png", "PNG", optimize=True)
+    image.save(out / "modern.webp", "WEBP", quality=85, method=6)
+    for name, edge in (("xs", 40), ("sm", 80), ("md", 120), ("lg", 160), ("xl", 240)):
+        thumbnail = image.copy()
+        thumbnail.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        thumbnail.save(out / f"thumb_{name}.jpg", "JPEG", quality=85, optimize=True)
+    image.save(out / "profile.jpg", "JPEG", quality=85, optimize=True)
+
+def _planned_renditions(data: bytes, service: ImageProcessingService) -> None:
+    primary = service.upload_dir / "profiles" / "key.jpg"
+    render_primary(data, str(primary), 1200, 1200, 85)
+    specs = service._plan_renditions("key", "medium", True, True)[0]
+    render_renditions(str(primary), specs)
+
+def _disk_bytes(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob("*") if path.is_file())
+
+class TestRenditionPerformance:
+    """CPU time and disk use of producing an upload's renditions"""
+
+    def test_planner_vs_legacy(self, tmp_path):
+        data = _photo()
+        legacy_dir = tmp_path / "legacy"
+        legacy_dir.mkdir()
+        service = ImageProcessingService(upload_dir=str(tmp_path / "planned"))
+
+        started_at = time.process_time()
+        _legacy_renditions(data, legacy_dir)
+        legacy_cpu = time.process_time() - started_at
+
+        started_at = time.process_time()
+        _planned_renditions(data, service)
+        planned_cpu = time.process_time() - started_at
+
+        legacy_disk = _disk_bytes(legacy_dir)
+        planned_disk = _disk_bytes(service.upload_dir)
+
+        print(f"Renditions per upload: legacy {legacy_cpu * 1000:.0f}ms CPU / {legacy_disk // 1024}KB, "
+              f"planned {planned_cpu * 1000:.0f}ms CPU / {planned_disk // 1024}KB")
+        assert planned_cpu < legacy_cpu * 0.7
+        assert planned_disk < legacy_disk * 0.5
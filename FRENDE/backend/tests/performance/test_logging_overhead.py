@@ -0,0 +1,71 @@
+import io
+import logging
+import queue
+import time
+
+from core.logging_config import (
+    DrainingQueueListener, JSONFormatter, NonBlockingQueueHandler,
+    configure_sampling, log_request, log_response
+)
+
+ITERATIONS = 5000
+
+# Per-request budget for request + response logging on the calling thread
+MAX_US_PER_REQUEST = 100
+
+class SlowStream(io.StringIO):
+    """A stream whose writes stall, like a congested stdout pipe"""
+
+    def write(self, s):
+        time.sleep(0.0001)
+        return super().write(s)
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.filters.clear()
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+def _us_per_request(logger: logging.Logger, iterations: int = ITERATIONS) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        request_id = f"req-{i}"
+        log_request(logger, request_id, "GET", "/api/matches", user_id=1, client_ip="127.0.0.1")
+        log_response(logger, request_id, 200, 12.5, user_id=1)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+class TestLoggingOverhead:
+    """Per-request cost of request/response logging on the event loop thread"""
+
+    def test_queued_and_sampled_vs_synchronous(self):
+        sync_handler = logging.StreamHandler(SlowStream())
+        sync_handler.setFormatter(JSONFormatter())
+        sync_us = _us_per_request(_logger("perf.sync", sync_handler), iterations=500)
+
+        stream_handler = logging.StreamHandler(SlowStream())
+        stream_handler.setFormatter(JSONFormatter())
+        queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=ITERATIONS * 2))
+        listener = DrainingQueueListener(queue_handler.queue, stream_handler)
+        listener.start()
+        try:
+            queued = _logger("perf.queued", queue_handler)
+            queued_us = _us_per_request(queued)
+
+            handled = queue_handler.enqueued + queue_handler.dropped
+            configure_sampling({"perf.queued": 0.1})
+            sampled_us = _us_per_request(queued)
+            sampled = queue_handler.enqueued + queue_handler.dropped - handled
+        finally:
+            configure_sampling({})
+            listener.stop()
+
+        print(f"Logging per request: synchronous {sync_us:.1f}us, "
+              f"queued {queued_us:.1f}us, queued + 10% sampling {sampled_us:.1f}us")
+        assert queued_us < sync_us
+        assert sampled_us < queued_us
+        assert sampled_us < MAX_US_PER_REQUEST
+        # Request and response are sampled together, about one request in ten
+        assert sampled % 2 == 0
+        assert 0.05 < sampled / (ITERATIONS * 2) < 0.15
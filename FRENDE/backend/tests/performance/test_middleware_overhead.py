@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from core.logging_middleware import create_logging_middleware_stack
+from core.rate_limiting import RateLimiter, RateLimitPolicy
+from core.security_middleware import create_security_middleware_stack
+
+ITERATIONS = 2000
+
+def _trivial_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+async def _us_per_request(app, iterations: int = ITERATIONS) -> float:
+    """Wall time per request driving the ASGI app directly, without a client"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/ping",
+        "raw_path": b"/api/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+    def make_receive():
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Nothing more arrives; BaseHTTPMiddleware waits here for a disconnect
+            await asyncio.Event().wait()
+
+        return receive
+
+    async def send(message):
+        pass
+
+    for _ in range(50):  # warm up
+        await app(dict(scope), make_receive(), send)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), make_receive(), send)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+class _NoopHTTPMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+class TestMiddlewareOverhead:
+    """Per-request overhead of the middleware stack on a trivial endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_stack_overhead_per_request(self):
+        limiter = RateLimiter()
+        limiter.use_redis = False
+        limiter.ip_policy = RateLimitPolicy("ip", 10 ** 9)
+        limiter.default_policy = RateLimitPolicy("api.default", 10 ** 9)
+
+        with patch("core.rate_limiting_middleware.rate_limiter", limiter):
+            bare_us = await _us_per_request(_trivial_app())
+            stack_us = await _us_per_request(
+                create_security_middleware_stack(create_logging_middleware_stack(_trivial_app()))
+            )
+
+        # Reference: the same number of layers as do-nothing BaseHTTPMiddleware
+        legacy = _trivial_app()
+        for _ in range(9):
+            legacy = _NoopHTTPMiddleware(legacy)
+        legacy_us = await _us_per_request(legacy, ITERATIONS // 10)
+
+        print(f"Middleware overhead: bare {bare_us:.1f}us, ASGI stack +{stack_us - bare_us:.1f}us, "
+              f"9 no-op BaseHTTPMiddleware +{legacy_us - bare_us:.1f}us per request")
+        assert stack_us - bare_us < legacy_us - bare_us
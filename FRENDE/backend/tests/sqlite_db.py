@@ -0,0 +1,51 @@
+"""
+In-memory SQLite sessions for tests that only need a few tables.
+Creates just the named tables, with foreign keys enforced by default.
+"""
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from core.database import Base
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+@asynccontextmanager
+async def sqlite_session(
+    tables: Iterable[str],
+    rows: Iterable = (),
+    indexes: Iterable[str] = (),
+    foreign_keys: bool = True
+) -> AsyncIterator[AsyncSession]:
+    """
+    Yield a session on a fresh database holding ``tables``, seeded with ``rows``.
+
+    Only the indexes of the tables named in ``indexes`` are created; some
+    models declare clashing index names that would fail ``create_all``.
+    """
+    engine = create_async_engine("sqlite+aiosqlite://")
+    if foreign_keys:
+        event.listen(engine.sync_engine, "connect", _enable_foreign_keys)
+    async with engine.begin() as conn:
+        for name in tables:
+            await conn.execute(CreateTable(Base.metadata.tables[name]))
+        for name in indexes:
+            for index in Base.metadata.tables[name].indexes:
+                await conn.execute(CreateIndex(index))
+
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            rows = list(rows)
+            if rows:
+                session.add_all(rows)
+                await session.commit()
+            yield session
+    finally:
+        await engine.dispose()
@@ -68,6 +68,17 @@ class TestRateLimiter:
         # Should be rate limited after using all tokens
         assert await limiter.acquire() is False
     
+    @pytest.mark.asyncio
+    async def test_rate_limiter_wait(self):
+        """Test waiting for a token succeeds only within the timeout"""
+        limiter = RateLimiter(max_requests=20, window=1)
+        for _ in range(20):
+            await limiter.acquire()
+        
+        # The next token is 50ms away
+        assert await limiter.wait(0.01) is False
+        assert await limiter.wait(1.0) is True
+    
     @pytest.mark.asyncio
     async def test_rate_limiter_token_refill(self):
         """Test rate limiter token refill over time"""
@@ -150,11 +161,11 @@ class TestPromptBuilder:
         # Should contain user information
         assert "Alice" in prompt
         assert "Bob" in prompt
-        assert "Software Engineer" in prompt
-        assert "Data Scientist" in prompt
+        assert "25-34" in prompt
         
-        # Should contain compatibility score
-        assert "85/100" in prompt
+        # Nothing the cache key leaves out
+        assert "Software Engineer" not in prompt
+        assert "85/100" not in prompt
         
         # Should contain common interests
         assert "music" in prompt.lower()
@@ -242,13 +253,26 @@ class TestGeminiService:
     
     @pytest.mark.asyncio
     async def test_generate_task_rate_limit(self, gemini_service, task_context):
-        """Test task generation with rate limiting"""
+        """Test task generation fails when no token comes before the deadline"""
         # Exhaust rate limit
         for _ in range(60):
             await gemini_service.rate_limiter.acquire()
         
-        with pytest.raises(RateLimitError, match="AI API rate limit exceeded"):
-            await gemini_service.generate_task(task_context)
+        with patch('services.ai.settings.AI_REQUEST_DEADLINE', 0.2):
+            with pytest.raises(RateLimitError, match="AI API rate limit exceeded"):
+                await gemini_service.generate_task(task_context)
+    
+    @pytest.mark.asyncio
+    async def test_generate_task_waits_for_rate_limit(self, gemini_service, task_context):
+        """Test task generation waits for a token instead of failing"""
+        gemini_service.rate_limiter = RateLimiter(max_requests=10, window=1)
+        for _ in range(10):
+            await gemini_service.rate_limiter.acquire()
+        
+        title, description = await gemini_service.generate_task(task_context)
+        
+        assert "childhood memory" in description.lower()
+        assert gemini_service.scheduler.get_stats()["rate_waits"] == 1
     
     @pytest.mark.asyncio
     async def test_generate_task_api_error(self, gemini_service, task_context):
@@ -300,7 +324,7 @@ class TestGeminiService:
     def test_generate_cache_key(self, gemini_service, task_context):
         """Test cache key generation"""
         key = gemini_service._generate_cache_key(task_context)
-        assert key == "task_1_2_bonding"
+        assert key == "deep_conversation|bonding|medium|hiking,music|25-34,25-34"
     
     def test_is_available(self):
         """Test service availability check"""
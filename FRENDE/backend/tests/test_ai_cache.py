@@ -0,0 +1,163 @@
+"""
+Tests for the AI response cache.
+Covers signatures, LRU eviction, the variety factor, per prompt type hit
+rates, name placeholders and disk/Redis persistence.
+"""
+
+from unittest.mock import Mock, patch
+
+import fakeredis.aioredis
+import pytest
+
+from models.match import Match
+from models.user import User
+from services.ai import GeminiService, TaskContext
+from services.ai_cache import (
+    DiskCachePersistence, RedisCachePersistence, TaskCache, age_band, context_signature
+)
+
+def make_user(user_id, name, age, profile_text):
+    user = Mock(spec=User)
+    user.id = user_id
+    user.name = name
+    user.age = age
+    user.profession = None
+    user.profile_text = profile_text
+    return user
+
+def make_context(user1, user2, match_id=1, previous_tasks=None):
+    match = Mock(spec=Match)
+    match.id = match_id
+    return TaskContext(
+        user1=user1, user2=user2, match=match,
+        compatibility_score=85, previous_tasks=previous_tasks, difficulty="easy"
+    )
+
+@pytest.fixture
+def gemini_service():
+    with patch('services.ai.genai'):
+        with patch('services.ai.settings') as mock_settings:
+            mock_settings.GEMINI_API_KEY = "test_key"
+            mock_settings.AI_RATE_LIMIT_PER_MINUTE = 60
+            service = GeminiService()
+    service._cache = TaskCache(max_size=10, ttl=3600, variety=2)
+    return service
+
+def test_age_band():
+    assert age_band(None) == "unknown"
+    assert age_band(18) == "18-24"
+    assert age_band(25) == "25-34"
+    assert age_band(54) == "45-54"
+    assert age_band(70) == "55+"
+
+def test_signature_is_order_independent():
+    first = context_signature("ice_breaker", "bonding", "easy", ["music", "hiking"], [30, 22])
+    second = context_signature("ice_breaker", "bonding", "easy", ["hiking", "music", "music"], [21, 33])
+    assert first == second == "ice_breaker|bonding|easy|hiking,music|18-24,25-34"
+    assert context_signature("ice_breaker", "bonding", "hard", [], [30, 22]).endswith("|-|18-24,25-34")
+
+def test_lru_evicts_least_recently_used():
+    cache = TaskCache(max_size=2, ttl=3600)
+    cache.set("a", "task a")
+    cache.set("b", "task b")
+    assert cache.get("a") == "task a"
+    cache.set("c", "task c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "task a"
+    assert cache.evictions == 1
+
+def test_variety_fills_before_serving():
+    cache = TaskCache(max_size=10, ttl=3600, variety=3)
+    cache.set("key", "one", prompt_type="ice_breaker")
+    cache.set("key", "two", prompt_type="ice_breaker")
+    assert cache.get("key", prompt_type="ice_breaker") is None
+
+    cache.set("key", "three", prompt_type="ice_breaker")
+    seen = {cache.get("key", prompt_type="ice_breaker") for _ in range(50)}
+    assert seen == {"one", "two", "three"}
+    assert cache.get("key", prompt_type="ice_breaker", exclude=["one", "two"]) == "three"
+    assert cache.get("key", prompt_type="ice_breaker", exclude=["one", "two", "three"]) is None
+
+    # The oldest variant makes way for a new one
+    cache.set("key", "four", prompt_type="ice_breaker")
+    assert {response for response, _ in cache.cache["key"][1]} == {"two", "three", "four"}
+
+def test_hit_rates_per_prompt_type():
+    cache = TaskCache(max_size=10, ttl=3600)
+    cache.get("a", prompt_type="ice_breaker")
+    cache.set("a", "task", prompt_type="ice_breaker")
+    cache.get("a", prompt_type="ice_breaker")
+    cache.get("a", prompt_type="ice_breaker")
+    cache.get("b", prompt_type="deep_conversation")
+
+    stats = cache.get_stats()["by_prompt_type"]
+    assert stats["ice_breaker"]["hits"] == 2
+    assert stats["ice_breaker"]["hit_rate"] == 0.667
+    assert stats["deep_conversation"]["hit_rate"] == 0.0
+
+@pytest.mark.asyncio
+async def test_responses_are_shared_without_names(gemini_service):
+    alice = make_user(1, "Alice", 25, "music and hiking")
+    bob = make_user(2, "Bob", 28, "hiking, music")
+    carol = make_user(3, "Carol", 27, "I like music. Hiking too")
+    dan = make_user(4, "Dan", 31, "music, hiking")
+
+    responses = iter(["Alice, ask Bob about his favourite hike", "Bob and Alice swap playlists"])
+    with patch.object(gemini_service, "_generate_response", side_effect=lambda *a, **k: next(responses)):
+        await gemini_service.generate_task(make_context(alice, bob))
+        await gemini_service.generate_task(make_context(alice, bob))
+        _, task = await gemini_service.generate_task(make_context(carol, dan, match_id=2))
+
+    assert task in {"Carol, ask Dan about his favourite hike", "Dan and Carol swap playlists"}
+    assert gemini_service.cache.get_stats()["by_prompt_type"]["deep_conversation"]["hits"] == 1
+
+    # A pair isn't served a task it has already had
+    previous = ["Alice, ask Bob about his favourite hike"]
+    with patch.object(gemini_service, "_generate_response", side_effect=AssertionError):
+        _, task = await gemini_service.generate_task(make_context(alice, bob, previous_tasks=previous))
+    assert task == "Bob and Alice swap playlists"
+
+def test_prompt_depends_only_on_signature(gemini_service):
+    alice = make_user(1, "Alice", 25, "music and hiking")
+    bob = make_user(2, "Bob", 28, "hiking, music, chess")
+    carol = make_user(3, "Carol", 27, "music and hiking, travel")
+    dan = make_user(4, "Dan", 31, "music, hiking")
+    alice.profession, bob.profession = "Nurse", "Pilot"
+    carol.profession, dan.profession = "Chef", "Teacher"
+    first, second = make_context(alice, bob), make_context(carol, dan, match_id=2)
+
+    assert gemini_service._generate_cache_key(first) == gemini_service._generate_cache_key(second)
+    builder = gemini_service.prompt_builder
+    assert builder.build_bonding_prompt(first).replace("Alice", "{user1}").replace("Bob", "{user2}") == \
+        builder.build_bonding_prompt(second).replace("Carol", "{user1}").replace("Dan", "{user2}")
+
+@pytest.mark.asyncio
+async def test_disk_persistence(tmp_path):
+    path = tmp_path / "cache" / "ai.json"
+    cache = TaskCache(max_size=10, ttl=3600, variety=2, persistence=DiskCachePersistence(str(path)))
+    cache.set("a", "first", prompt_type="ice_breaker")
+    cache.set("a", "second", prompt_type="ice_breaker")
+    await cache.save()
+
+    restored = TaskCache(max_size=10, ttl=3600, variety=2, persistence=DiskCachePersistence(str(path)))
+    assert await restored.load() == 1
+    assert restored.get("a", exclude=["first"]) == "second"
+
+@pytest.mark.asyncio
+async def test_redis_persistence():
+    persistence = RedisCachePersistence("redis://localhost", ttl=3600)
+    persistence._redis = fakeredis.aioredis.FakeRedis()
+    cache = TaskCache(max_size=1, ttl=3600, persistence=persistence)
+    cache.set("a", "first")
+    await cache.save()
+    cache.set("b", "second")
+    await cache.save()
+
+    assert await persistence._redis.exists("ai_cache:a") == 0
+    assert await persistence._redis.ttl("ai_cache:b") > 0
+
+    restored = TaskCache(max_size=10, ttl=3600, persistence=persistence)
+    assert await restored.load() == 1
+    assert restored.get("b") == "second"
+    await persistence.close()
@@ -0,0 +1,211 @@
+"""
+Tests for the AI circuit breaker.
+Covers state changes from call outcomes and health checks, short-circuiting
+Gemini calls, per-call timeouts, and default greetings served in place of
+slow or unavailable conversation starters.
+"""
+
+import asyncio
+import threading
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+import pytest_asyncio
+
+from core.exceptions import AICircuitOpenError, AIGenerationError, RateLimitError
+from models.match import Match
+from models.user import User
+from services.ai import GeminiService, TaskContext
+from services.ai_circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from services.ai_scheduler import AIRequestScheduler
+from services.tasks import TaskService
+from tests.sqlite_db import sqlite_session
+
+class Limiter:
+    async def wait(self, timeout):
+        return True
+
+@pytest.fixture
+def gemini_service():
+    model = Mock()
+    model.generate_content.return_value = Mock(text="Share a favourite song with each other")
+    with patch("services.ai.genai") as genai, patch("services.ai.settings") as settings:
+        settings.GEMINI_API_KEY = "test_key"
+        settings.AI_RATE_LIMIT_PER_MINUTE = 60
+        genai.GenerativeModel.return_value = model
+        service = GeminiService()
+    service.model = model
+    service._circuit_breaker = CircuitBreaker("gemini", failure_rate=0.5, min_calls=2, window=60, cooldown=0.1)
+    return service
+
+@pytest.fixture
+def task_context():
+    users = []
+    for user_id, name in ((1, "Alice"), (2, "Bob")):
+        user = Mock(spec=User)
+        user.id, user.name, user.age, user.profession, user.profile_text = user_id, name, 30, None, ""
+        users.append(user)
+    match = Mock(spec=Match)
+    match.id = 1
+    return TaskContext(user1=users[0], user2=users[1], match=match)
+
+@pytest_asyncio.fixture
+async def session():
+    async with sqlite_session(("users", "matches"), [
+        User(id=1, email="a@example.com", hashed_password="x", name="Alice"),
+        User(id=2, email="b@example.com", hashed_password="x", name="Bob"),
+        Match(id=1, user1_id=1, user2_id=2, status="active", compatibility_score=70),
+    ]) as session:
+        yield session
+
+class TestCircuitBreaker:
+    """Test state changes"""
+
+    def test_opens_on_failure_rate(self):
+        breaker = CircuitBreaker("gemini", failure_rate=0.5, min_calls=4, window=60, cooldown=30)
+        for _ in range(2):
+            breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.allow() is False
+        assert breaker.get_stats()["short_circuited"] == 1
+
+    def test_successes_leave_the_window(self):
+        breaker = CircuitBreaker("gemini", window=60)
+        with patch("services.ai_circuit_breaker.time.monotonic", side_effect=[0.0, 30.0, 100.0]):
+            for _ in range(3):
+                breaker.record_success()
+
+        assert len(breaker._outcomes) == 1
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker("gemini", min_calls=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+        # One probe at a time
+        assert breaker.allow() is True
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow() is False
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+        assert breaker.allow() is True
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        assert breaker.get_stats()["window_calls"] == 0
+
+    def test_released_probe_frees_the_slot(self):
+        breaker = CircuitBreaker("gemini", min_calls=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.allow() is True
+        breaker.release()
+        assert breaker.allow() is True
+
+    def test_health_checks(self):
+        breaker = CircuitBreaker("gemini", min_calls=3, cooldown=30)
+        unhealthy = {"service": "gemini", "status": "unhealthy", "error": "Request timeout"}
+        breaker.record_health_check(unhealthy)
+        assert breaker.state == CLOSED
+        assert breaker.get_stats()["window_calls"] == 1
+
+        # Failed checks count towards the error rate like failed calls
+        breaker.record_failure()
+        breaker.record_health_check(unhealthy)
+        assert breaker.state == OPEN
+        assert "Request timeout" in breaker.get_stats()["open_reason"]
+
+        breaker.record_health_check({"service": "other", "status": "healthy"})
+        assert breaker.state == OPEN
+        breaker.record_health_check({"service": "gemini", "status": "healthy"})
+        assert breaker.state == HALF_OPEN
+
+class TestGeminiCalls:
+    """Test calls through the breaker"""
+
+    @pytest.mark.asyncio
+    async def test_failures_short_circuit_calls(self, gemini_service, task_context):
+        gemini_service.model.generate_content.side_effect = RuntimeError("503")
+        try:
+            for _ in range(2):
+                with pytest.raises(AIGenerationError):
+                    await gemini_service.generate_conversation_starter(task_context)
+            assert gemini_service.circuit_breaker.state == OPEN
+
+            with pytest.raises(AICircuitOpenError):
+                await gemini_service.generate_conversation_starter(task_context)
+            assert gemini_service.model.generate_content.call_count == 2
+
+            # After the cooldown a successful probe closes it again
+            await asyncio.sleep(0.15)
+            gemini_service.model.generate_content.side_effect = None
+            assert await gemini_service.generate_conversation_starter(task_context)
+            assert gemini_service.circuit_breaker.state == CLOSED
+            assert gemini_service.is_healthy()
+        finally:
+            await gemini_service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_scheduler_call_timeout(self):
+        release = threading.Event()
+        calls = []
+
+        def hanging(prompt):
+            calls.append(prompt)
+            release.wait(5)
+            return "too late"
+
+        scheduler = AIRequestScheduler(hanging, Limiter(), workers=1, max_queue=4, deadline=5, call_timeout=0.05)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await scheduler.submit("first")
+            assert scheduler.get_stats()["timeouts"] == 1
+            assert scheduler.get_stats()["overrunning"] == 1
+
+            # The hung thread still holds the only worker slot
+            with pytest.raises(RateLimitError):
+                await scheduler.submit("second", deadline=0.1)
+            assert calls == ["first"]
+
+            release.set()
+            assert await scheduler.submit("third") == "too late"
+            assert calls == ["first", "third"]
+            assert scheduler.get_stats()["overrunning"] == 0
+        finally:
+            release.set()
+            await scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_within_budget(self, gemini_service):
+        async def answer(delay):
+            await asyncio.sleep(delay)
+            return "answer"
+
+        assert await gemini_service.within_budget(answer(0), budget=0.5) == "answer"
+        assert await gemini_service.within_budget(answer(0.1), budget=0.01) is None
+        await asyncio.sleep(0.15)
+
+        assert gemini_service.hedge_metrics == {
+            "within_budget": 1, "over_budget": 1, "finished_late": 1, "failed_late": 0
+        }
+
+class TestConversationStarterFallback:
+    """Test default greetings in place of AI starters"""
+
+    @pytest.mark.asyncio
+    async def test_default_greeting_when_circuit_open(self, session):
+        with patch("services.tasks.ai_service.generate_conversation_starter", new=AsyncMock(side_effect=AICircuitOpenError())):
+            starter = await TaskService().generate_conversation_starter(1, session, user_id=2)
+
+        assert "Bob" in starter
+
+    @pytest.mark.asyncio
+    async def test_ai_starter_within_budget(self, session):
+        with patch("services.tasks.ai_service.generate_conversation_starter", new=AsyncMock(return_value="What's your go-to karaoke song?")):
+            starter = await TaskService().generate_conversation_starter(1, session)
+
+        assert starter == "What's your go-to karaoke song?"
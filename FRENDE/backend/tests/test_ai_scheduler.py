@@ -0,0 +1,199 @@
+"""
+Tests for the AI request scheduler.
+Runs against a local fake model: fair queueing, deadlines, rate limit
+pacing, and packing task requests into one prompt.
+"""
+
+import asyncio
+import json
+import re
+import threading
+
+import pytest
+import pytest_asyncio
+
+from core.exceptions import RateLimitError
+from services.ai import RateLimiter
+from services.ai_scheduler import AIRequestScheduler, build_batch_prompt, split_batch_response
+
+class FakeModel:
+    """Answers prompts in order; batched prompts get a JSON array"""
+
+    def __init__(self, delay: float = 0.0, split: bool = True):
+        self.delay = delay
+        self.split = split
+        self.prompts = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, prompt: str) -> str:
+        self.release.wait(5)
+        self.prompts.append(prompt)
+        if self.delay:
+            threading.Event().wait(self.delay)
+
+        requests = re.findall(r"^Request \d+:\n(.*)$", prompt, re.MULTILINE)
+        if not requests:
+            return f"answer to {prompt}"
+        if not self.split:
+            return "Here are some ideas for you both!"
+        return "```json\n" + json.dumps([f"answer to {request}" for request in requests]) + "\n```"
+
+def make_scheduler(model, limiter=None, **options) -> AIRequestScheduler:
+    config = {"workers": 1, "max_queue": 20, "deadline": 5.0, "batch_size": 1, "batch_window": 0.0}
+    config.update(options)
+    return AIRequestScheduler(model, limiter or RateLimiter(max_requests=1000, window=1), **config)
+
+@pytest_asyncio.fixture
+async def shutdown_list():
+    schedulers = []
+    yield schedulers
+    for scheduler in schedulers:
+        await scheduler.shutdown()
+
+class TestBatchPrompts:
+    """Test packing and splitting batched prompts"""
+
+    def test_round_trip(self):
+        prompt = build_batch_prompt(["first", "second"])
+
+        assert "JSON array of 2 strings" in prompt
+        assert "Request 1:\nfirst" in prompt
+        assert "Request 2:\nsecond" in prompt
+
+    def test_split(self):
+        assert split_batch_response('```json\n["a", " b "]\n```', 2) == ["a", "b"]
+        assert split_batch_response('["a"]', 2) is None
+        assert split_batch_response('["a", ""]', 2) is None
+        assert split_batch_response("no list here", 1) is None
+        assert split_batch_response("[not json]", 1) is None
+
+class TestAIRequestScheduler:
+    """Test queueing, pacing and batching"""
+
+    @pytest.mark.asyncio
+    async def test_single_request(self, shutdown_list):
+        model = FakeModel()
+        scheduler = make_scheduler(model)
+        shutdown_list.append(scheduler)
+
+        assert await scheduler.submit("hello", key=1) == "answer to hello"
+        stats = scheduler.get_stats()
+        assert stats["completed"] == 1
+        assert stats["model_calls"] == 1
+        assert stats["queue_depth"] == 0
+        assert stats["latency_ms"]["model_call"]["max"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_fair_across_keys(self, shutdown_list):
+        model = FakeModel()
+        model.release.clear()
+        scheduler = make_scheduler(model)
+        shutdown_list.append(scheduler)
+
+        # The first request occupies the only worker while the rest queue up
+        requests = [asyncio.create_task(scheduler.submit("a0", key="a"))]
+        await asyncio.sleep(0.05)
+        requests += [asyncio.create_task(scheduler.submit(f"a{i}", key="a")) for i in range(1, 4)]
+        requests += [asyncio.create_task(scheduler.submit(f"b{i}", key="b")) for i in range(2)]
+        await asyncio.sleep(0.05)
+        model.release.set()
+        await asyncio.gather(*requests)
+
+        assert model.prompts == ["a0", "a1", "b0", "a2", "b1", "a3"]
+        assert scheduler.get_stats()["peak_queue_depth"] == 5
+
+    @pytest.mark.asyncio
+    async def test_batches_queued_requests(self, shutdown_list):
+        model = FakeModel()
+        scheduler = make_scheduler(model, batch_size=3, batch_window=0.05)
+        shutdown_list.append(scheduler)
+
+        answers = await asyncio.gather(*(scheduler.submit(f"task {i}", key=1, batchable=True) for i in range(5)))
+
+        assert answers == [f"answer to task {i}" for i in range(5)]
+        stats = scheduler.get_stats()
+        assert stats["model_calls"] == 2
+        assert stats["batches"] == 2
+        assert stats["batched_requests"] == 5
+
+    @pytest.mark.asyncio
+    async def test_unsplittable_batch_retried_singly(self, shutdown_list):
+        model = FakeModel(split=False)
+        scheduler = make_scheduler(model, batch_size=2, batch_window=0.05)
+        shutdown_list.append(scheduler)
+
+        answers = await asyncio.gather(*(scheduler.submit(f"task {i}", batchable=True) for i in range(2)))
+
+        assert answers == ["answer to task 0", "answer to task 1"]
+        stats = scheduler.get_stats()
+        assert stats["batch_split_failures"] == 1
+        assert stats["model_calls"] == 3
+
+    @pytest.mark.asyncio
+    async def test_waits_for_rate_limit(self, shutdown_list):
+        limiter = RateLimiter(max_requests=20, window=1)
+        for _ in range(20):
+            await limiter.acquire()
+        scheduler = make_scheduler(FakeModel(), limiter)
+        shutdown_list.append(scheduler)
+
+        assert await scheduler.submit("paced") == "answer to paced"
+        stats = scheduler.get_stats()
+        assert stats["rate_waits"] == 1
+        assert stats["latency_ms"]["rate_wait"]["max"] >= 20
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_past_deadline(self, shutdown_list):
+        limiter = RateLimiter(max_requests=1, window=60)
+        await limiter.acquire()
+        scheduler = make_scheduler(FakeModel(), limiter)
+        shutdown_list.append(scheduler)
+
+        with pytest.raises(RateLimitError, match="rate limit exceeded"):
+            await scheduler.submit("too late", deadline=0.5)
+        assert scheduler.get_stats()["expired"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deadline_passes_in_queue(self, shutdown_list):
+        model = FakeModel(delay=0.3)
+        scheduler = make_scheduler(model)
+        shutdown_list.append(scheduler)
+
+        first = asyncio.create_task(scheduler.submit("slow"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(RateLimitError, match="timed out"):
+            await scheduler.submit("impatient", deadline=0.1)
+        assert await first == "answer to slow"
+        assert model.prompts == ["slow"]
+
+    @pytest.mark.asyncio
+    async def test_queue_full(self, shutdown_list):
+        model = FakeModel()
+        model.release.clear()
+        scheduler = make_scheduler(model, max_queue=2)
+        shutdown_list.append(scheduler)
+
+        running = asyncio.create_task(scheduler.submit("running"))
+        await asyncio.sleep(0.05)
+        queued = [asyncio.create_task(scheduler.submit(f"queued {i}")) for i in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(RateLimitError, match="queue is full"):
+            await scheduler.submit("rejected")
+        assert scheduler.get_stats()["rejected"] == 1
+
+        model.release.set()
+        await asyncio.gather(running, *queued)
+
+    @pytest.mark.asyncio
+    async def test_model_error_raised(self, shutdown_list):
+        def failing(prompt: str) -> str:
+            raise ValueError("model unavailable")
+
+        scheduler = make_scheduler(failing)
+        shutdown_list.append(scheduler)
+
+        with pytest.raises(ValueError, match="model unavailable"):
+            await scheduler.submit("anything")
+        assert scheduler.get_stats()["failed"] == 1
@@ -0,0 +1,117 @@
+"""
+Tests for the auth fast path.
+Covers the verified-claims cache, the user principal cache and its
+invalidation on user writes.
+"""
+
+import time
+import pytest
+import pytest_asyncio
+from datetime import timedelta
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from core import auth
+from core.security import create_access_token
+from models.user import User
+from tests.sqlite_db import sqlite_session
+
+def _credentials(user_id: int, expires_delta: timedelta = None) -> HTTPAuthorizationCredentials:
+    token = create_access_token({"sub": str(user_id)}, expires_delta)
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+@pytest_asyncio.fixture
+async def session():
+    auth.claims_cache.clear()
+    auth.principal_cache.clear()
+    async with sqlite_session(("users",), [
+        User(id=1, email="a@example.com", hashed_password="x", name="A"),
+        User(id=2, email="b@example.com", hashed_password="x", name="B", is_active=False),
+    ]) as session:
+        yield session
+
+class TestExpiringLRUCache:
+    """Test the TTL + LRU cache"""
+
+    def test_expiry_and_eviction(self):
+        cache = auth.ExpiringLRUCache(max_entries=2)
+        cache.put("a", 1, ttl=60)
+        cache.put("b", 2, ttl=0.01)
+        cache.put("c", 3, ttl=60)
+
+        assert cache.get("a") is None  # evicted as least recently used
+        assert cache.get("c") == 3
+        time.sleep(0.02)
+        assert cache.get("b") is None  # expired
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_non_positive_ttl_not_stored(self):
+        cache = auth.ExpiringLRUCache(max_entries=2)
+        cache.put("a", 1, ttl=0)
+        assert len(cache) == 0
+
+class TestClaimsCache:
+    """Test verified-claims reuse"""
+
+    def test_repeat_token_skips_decode(self, monkeypatch):
+        auth.claims_cache.clear()
+        token = _credentials(1).credentials
+        claims = auth.decode_token_claims(token)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("token decoded twice")
+
+        monkeypatch.setattr(auth.jwt, "decode", fail)
+        assert auth.decode_token_claims(token) is claims
+
+    def test_ttl_capped_by_token_expiry(self):
+        auth.claims_cache.clear()
+        token = _credentials(1, timedelta(seconds=-1)).credentials
+
+        with pytest.raises(auth.JWTError):
+            auth.decode_token_claims(token)
+        assert len(auth.claims_cache) == 0
+
+    def test_invalid_token_rejected(self):
+        with pytest.raises(HTTPException) as exc_info:
+            auth._user_id_from_credentials(
+                HTTPAuthorizationCredentials(scheme="Bearer", credentials="not-a-jwt")
+            )
+        assert exc_info.value.status_code == 401
+
+class TestPrincipalCache:
+    """Test the user principal fast path"""
+
+    @pytest.mark.asyncio
+    async def test_principal_served_from_cache(self, session):
+        credentials = _credentials(1)
+
+        assert await auth.current_user_id(await auth.get_current_principal(credentials, session)) == 1
+        # A hit never touches the session
+        assert await auth.current_user_id(await auth.get_current_principal(credentials, None)) == 1
+        assert auth.principal_cache.get_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_inactive_user_rejected(self, session):
+        with pytest.raises(HTTPException) as exc_info:
+            await auth.current_user_id(await auth.get_current_principal(_credentials(2), session))
+        assert exc_info.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_unknown_user_rejected(self, session):
+        with pytest.raises(HTTPException) as exc_info:
+            await auth.get_current_principal(_credentials(99), session)
+        assert exc_info.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_user_update_invalidates_principal(self, session):
+        credentials = _credentials(1)
+        user = await auth.get_current_user(credentials, session)
+        assert auth.principal_cache.get(1).is_active
+
+        user.is_active = False
+        await session.commit()
+
+        assert auth.principal_cache.get(1) is None
+        with pytest.raises(HTTPException):
+            await auth.current_user_id(await auth.get_current_principal(credentials, session))
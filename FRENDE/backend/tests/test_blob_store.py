@@ -0,0 +1,237 @@
+"""
+Tests for the content-addressed blob store.
+Covers sharded keys, deduplication, reference counting, garbage collection
+and the profile picture flow.
+"""
+
+import hashlib
+import io
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from fastapi import UploadFile
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers
+
+from models.blob import Blob
+from models.user import User
+from services import users
+from services.blob_store import BlobStore, LocalBlobBackend, blob_key, sha256_from_ref
+from services.upload_spool import UploadSpool
+from tests.sqlite_db import sqlite_session
+
+@pytest_asyncio.fixture
+async def session():
+    async with sqlite_session(("users", "blobs"), [
+        User(id=1, email="a@example.com", hashed_password="x", name="A")
+    ], indexes=("blobs",)) as session:
+        yield session
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(LocalBlobBackend(str(tmp_path / "uploads")), gc_grace=timedelta(hours=1))
+
+def _staged(tmp_path: Path, data: bytes, name: str) -> tuple:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path, hashlib.sha256(data).hexdigest()
+
+async def _blob(session: AsyncSession, sha256: str) -> Blob:
+    return (await session.execute(select(Blob).where(Blob.sha256 == sha256))).scalar_one_or_none()
+
+class TestBlobKeys:
+    """Test key layout and parsing"""
+
+    def test_sharded_key(self):
+        sha256 = hashlib.sha256(b"x").hexdigest()
+
+        assert blob_key(sha256, ".JPG") == f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.jpg"
+        assert blob_key(sha256, "../x") == f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def test_sha256_from_ref(self):
+        sha256 = hashlib.sha256(b"x").hexdigest()
+        key = blob_key(sha256, ".png")
+
+        assert sha256_from_ref(key) == sha256
+        assert sha256_from_ref(f"/uploads/{key}") == sha256
+        assert sha256_from_ref(f"https://cdn.example.com/{key}?v=1") == sha256
+        assert sha256_from_ref(sha256) == sha256
+        assert sha256_from_ref("profiles/1/1_profile_abcd1234.jpg") is None
+        assert sha256_from_ref(None) is None
+
+class TestBlobStore:
+    """Test dedup, reference counting and garbage collection"""
+
+    @pytest.mark.asyncio
+    async def test_identical_files_stored_once(self, session, store, tmp_path):
+        first, sha256 = _staged(tmp_path, b"same bytes", "a.tmp")
+        second, _ = _staged(tmp_path, b"same bytes", "b.tmp")
+
+        key = await store.put_file(session, first, sha256, "text/plain", ".txt")
+        assert await store.put_file(session, second, sha256, "text/plain", ".txt") == key
+        await session.commit()
+
+        assert (await _blob(session, sha256)).ref_count == 2
+        assert store.backend.path(key).read_bytes() == b"same bytes"
+        assert not first.exists() and not second.exists()
+        assert store.metrics["stored"] == 1
+        assert store.metrics["deduplicated"] == 1
+        assert len([p for p in (tmp_path / "uploads").rglob("*") if p.is_file()]) == 1
+
+    @pytest.mark.asyncio
+    async def test_release_and_collect(self, session, store, tmp_path):
+        path, sha256 = _staged(tmp_path, b"picture", "a.tmp")
+        key = await store.put_file(session, path, sha256, extension=".jpg")
+        await session.commit()
+
+        assert await store.release(session, store.url(key)) is True
+        await session.commit()
+        blob = await _blob(session, sha256)
+        assert blob.ref_count == 0 and blob.released_at is not None
+
+        # Still inside the grace period
+        assert (await store.collect_garbage(session))["collected"] == 0
+        assert store.backend.path(key).exists()
+
+        blob.released_at = datetime.utcnow() - timedelta(hours=2)
+        await session.commit()
+        result = await store.collect_garbage(session)
+
+        assert result == {"collected": 1, "size_freed": len(b"picture"), "keys": [key]}
+        assert await _blob(session, sha256) is None
+        assert not store.backend.path(key).exists()
+
+    @pytest.mark.asyncio
+    async def test_referenced_again_before_collection(self, session, store, tmp_path):
+        path, sha256 = _staged(tmp_path, b"picture", "a.tmp")
+        key = await store.put_file(session, path, sha256)
+        await store.release(session, key)
+        await session.commit()
+
+        path, _ = _staged(tmp_path, b"picture", "b.tmp")
+        await store.put_file(session, path, sha256)
+        blob = await _blob(session, sha256)
+        blob.released_at = datetime.utcnow() - timedelta(hours=2)
+        await session.commit()
+
+        assert (await store.collect_garbage(session))["collected"] == 0
+        assert (await _blob(session, sha256)).ref_count == 1
+        assert store.backend.path(key).exists()
+
+    @pytest.mark.asyncio
+    async def test_missing_object_restored(self, session, store, tmp_path):
+        path, sha256 = _staged(tmp_path, b"picture", "a.tmp")
+        key = await store.put_file(session, path, sha256)
+        store.backend.path(key).unlink()
+
+        path, _ = _staged(tmp_path, b"picture", "b.tmp")
+        await store.put_file(session, path, sha256)
+
+        assert store.backend.path(key).read_bytes() == b"picture"
+        assert store.metrics["restored"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_upload_swept(self, session, store, tmp_path):
+        path, kept = _staged(tmp_path, b"kept", "a.tmp")
+        kept_key = await store.put_file(session, path, kept)
+        await session.commit()
+
+        path, sha256 = _staged(tmp_path, b"rolled back", "b.tmp")
+        key = await store.put_file(session, path, sha256)
+        await session.rollback()
+        assert await _blob(session, sha256) is None
+
+        # Too recent: its upload could still be committing
+        assert (await store.sweep_untracked(session))["swept"] == 0
+
+        old = time.time() - 7200
+        for stored in (key, kept_key):
+            os.utime(store.backend.path(stored), (old, old))
+        result = await store.sweep_untracked(session)
+
+        assert result["swept"] == 1 and result["keys"] == [key]
+        assert result["size_freed"] == len(b"rolled back")
+        assert not store.backend.path(key).exists()
+        assert store.backend.path(kept_key).exists()
+
+    @pytest.mark.asyncio
+    async def test_release_listeners_run_after_commit(self, session, store, tmp_path):
+        released = []
+
+        async def listener(sha256):
+            released.append(sha256)
+
+        store.on_release(listener)
+        path, sha256 = _staged(tmp_path, b"picture", "a.tmp")
+        key = await store.put_file(session, path, sha256)
+        await session.commit()
+
+        await store.release(session, key)
+        await session.rollback()
+        await store.flush_releases()
+        assert released == []
+
+        await store.release(session, key)
+        assert released == []
+        await session.commit()
+        await store.flush_releases()
+        assert released == [sha256]
+
+    @pytest.mark.asyncio
+    async def test_release_ignores_legacy_paths(self, session, store):
+        assert await store.release(session, "profiles/1/1_profile_abcd1234.jpg") is False
+        assert await store.release(session, None) is False
+
+    @pytest.mark.asyncio
+    async def test_usage(self, session, store, tmp_path):
+        for name, data in (("a.tmp", b"aaaa"), ("b.tmp", b"bb")):
+            path, sha256 = _staged(tmp_path, data, name)
+            key = await store.put_file(session, path, sha256)
+        await store.release(session, key)
+        await session.commit()
+
+        assert await store.get_usage(session) == {
+            "blobs": 2, "size": 6, "references": 1, "unreferenced_blobs": 1, "unreferenced_size": 2
+        }
+
+class TestProfilePictureBlobs:
+    """Test the profile picture flow against the blob store"""
+
+    @pytest.mark.asyncio
+    async def test_same_picture_shared_and_released(self, session, store, tmp_path):
+        output = io.BytesIO()
+        Image.new("RGB", (64, 48), "red").save(output, "JPEG")
+        data = output.getvalue()
+        service = users.UserService()
+
+        def upload() -> UploadFile:
+            return UploadFile(
+                file=io.BytesIO(data), size=len(data), filename="me.jpg",
+                headers=Headers({"content-type": "image/jpeg"})
+            )
+
+        async def render(spooled, destination):
+            Image.open(spooled.path).save(destination, "JPEG")
+            return {"sha256": hashlib.sha256(destination.read_bytes()).hexdigest()}
+
+        with patch.object(users, "blob_store", store), \
+             patch.object(users, "upload_spool", UploadSpool(str(tmp_path / "spool"))), \
+             patch.object(users.image_processor, "process_profile_picture", render):
+            user = await service.update_profile_picture(1, upload(), session)
+            first_url = user.profile_picture_url
+            user = await service.update_profile_picture(1, upload(), session)
+
+            assert user.profile_picture_url == first_url
+            assert first_url.startswith("blobs/")
+            assert (await _blob(session, sha256_from_ref(first_url))).ref_count == 1
+
+            await service.delete_profile_picture(1, session)
+            assert (await _blob(session, sha256_from_ref(first_url))).ref_count == 0
+            assert not list((tmp_path / "spool").iterdir())
@@ -61,7 +61,7 @@ class TestCompressionMiddleware:
         response.headers['content-type'] = 'text/plain'
         response.headers['content-length'] = str(len(response.body))
         
-        should_compress = middleware._should_compress(response, 'text/plain')
+        should_compress = middleware._should_compress(response.headers, 'text/plain')
         assert should_compress is True
     
     def test_should_not_compress_small_response(self):
@@ -73,7 +73,7 @@ class TestCompressionMiddleware:
         response.headers['content-type'] = 'text/plain'
         response.headers['content-length'] = str(len(response.body))
         
-        should_compress = middleware._should_compress(response, 'text/plain')
+        should_compress = middleware._should_compress(response.headers, 'text/plain')
         assert should_compress is False
     
     def test_should_not_compress_binary_response(self):
@@ -84,7 +84,7 @@ class TestCompressionMiddleware:
         response = Response(content=b"\x00\x01\x02\x03")
         response.headers['content-type'] = 'application/octet-stream'
         
-        should_compress = middleware._should_compress(response, 'application/octet-stream')
+        should_compress = middleware._should_compress(response.headers, 'application/octet-stream')
         assert should_compress is False
     
     def test_gzip_compression(self):
@@ -125,7 +125,7 @@ class TestCompressionMiddleware:
         request = Mock()
         request.headers = {'accept-encoding': 'gzip, deflate'}
         
-        compression_type = middleware._get_compression_type(request)
+        compression_type = middleware._get_compression_type(request.headers)
         assert compression_type == 'gzip'
     
     def test_get_compression_type_brotli(self):
@@ -136,7 +136,7 @@ class TestCompressionMiddleware:
         request = Mock()
         request.headers = {'accept-encoding': 'br, gzip, deflate'}
         
-        compression_type = middleware._get_compression_type(request)
+        compression_type = middleware._get_compression_type(request.headers)
         assert compression_type == 'br'
     
     def test_get_compression_type_none(self):
@@ -147,7 +147,7 @@ class TestCompressionMiddleware:
         request = Mock()
         request.headers = {'accept-encoding': 'deflate'}
         
-        compression_type = middleware._get_compression_type(request)
+        compression_type = middleware._get_compression_type(request.headers)
         assert compression_type is None
     
     @patch('core.compression_middleware.settings.COMPRESSION_ENABLED', True)
@@ -404,3 +404,160 @@ class TestCompressionIntegration:
         # Should not be compressed when gzip/brotli not supported
         content_encoding = response.headers.get('content-encoding')
         assert content_encoding is None
+
+
+def _collect(app, path, accept_encoding):
+    """Drive an ASGI app directly and return the raw messages it sends"""
+    import asyncio
+    
+    messages = []
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "http_version": "1.1", "scheme": "http",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+        "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+    }
+    
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # StreamingResponse listens for a disconnect until the body is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+class TestStreamingCompression:
+    """Test incremental, size-aware and cached compression"""
+    
+    @pytest.fixture
+    def app(self):
+        from fastapi.responses import StreamingResponse
+        
+        app = FastAPI()
+        
+        @app.get("/stream")
+        async def stream():
+            async def chunks():
+                for index in range(20):
+                    yield f"line {index} ".encode() * 100
+            return StreamingResponse(chunks(), media_type="text/plain")
+        
+        @app.get("/events")
+        async def events():
+            async def chunks():
+                for index in range(3):
+                    yield f"data: {index}\n\n".encode()
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+        
+        @app.get("/cached")
+        async def cached():
+            return PlainTextResponse("cached body " * 500, headers={"ETag": '"v1"'})
+        
+        @app.get("/other")
+        async def other():
+            # Same ETag as /cached, as two files with equal mtime and size would get
+            return PlainTextResponse("other body " * 500, headers={"ETag": '"v1"'})
+        
+        @app.get("/partial")
+        async def partial():
+            return PlainTextResponse(
+                "partial body " * 500, status_code=206,
+                headers={"Content-Range": "bytes 0-6499/10000"}
+            )
+        
+        return app
+    
+    def test_streaming_body_is_compressed_incrementally(self, app):
+        messages = _collect(CompressionMiddleware(app), "/stream", "gzip")
+        
+        start = messages[0]
+        headers = dict(start["headers"])
+        assert headers[b"content-encoding"] == b"gzip"
+        assert b"content-length" not in headers
+        
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        expected = b"".join(f"line {index} ".encode() * 100 for index in range(20))
+        assert gzip.decompress(body) == expected
+        assert len(body) < len(expected)
+    
+    def test_event_stream_flushes_each_chunk(self, app):
+        messages = _collect(CompressionMiddleware(app), "/events", "br")
+        
+        bodies = [m["body"] for m in messages[1:] if m.get("more_body")]
+        assert len(bodies) == 3 and all(bodies)
+        
+        decompressor = brotli.Decompressor()
+        assert decompressor.process(bodies[0]) == b"data: 0\n\n"
+    
+    def test_etag_responses_served_from_cache(self, app):
+        from core.compression_middleware import CompressionCache
+        
+        cache = CompressionCache(1024 * 1024)
+        middleware = CompressionMiddleware(app, cache=cache)
+        
+        first = _collect(middleware, "/cached", "gzip")
+        second = _collect(middleware, "/cached", "gzip")
+        
+        assert first[1]["body"] == second[1]["body"]
+        assert gzip.decompress(second[1]["body"]) == b"cached body " * 500
+        assert dict(second[0]["headers"])[b"etag"] == b'W/"v1"'
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 1
+    
+    def test_cache_keyed_by_resource(self, app):
+        from core.compression_middleware import CompressionCache
+        
+        middleware = CompressionMiddleware(app, cache=CompressionCache(1024 * 1024))
+        _collect(middleware, "/cached", "gzip")
+        other = _collect(middleware, "/other", "gzip")
+        
+        assert gzip.decompress(other[1]["body"]) == b"other body " * 500
+    
+    def test_partial_responses_not_compressed(self, app):
+        messages = _collect(CompressionMiddleware(app), "/partial", "gzip")
+        
+        assert b"content-encoding" not in dict(messages[0]["headers"])
+        assert messages[1]["body"] == b"partial body " * 500
+    
+    def test_large_bodies_offloaded_to_thread(self, app):
+        from core.compression_middleware import compression_stats
+        
+        middleware = CompressionMiddleware(app)
+        middleware.offload_threshold = 1024
+        before = compression_stats["offloaded"]
+        
+        messages = _collect(middleware, "/cached", "br")
+        
+        assert compression_stats["offloaded"] == before + 1
+        assert brotli.decompress(messages[1]["body"]) == b"cached body " * 500
+    
+    def test_levels_adapt_to_size_and_type(self):
+        middleware = CompressionMiddleware(FastAPI())
+        
+        assert middleware._select_level("gzip", 2 * 1024, "application/json") == 6
+        assert middleware._select_level("br", 512 * 1024, "application/json") == 4
+        assert middleware._select_level("br", 4 * 1024 * 1024, "application/json") == 1
+        assert middleware._select_level("br", 2 * 1024, "text/css") == middleware.brotli_quality
+        assert middleware._select_level("gzip", 2 * 1024, "application/json", cacheable=True) == middleware.compression_level
+    
+    def test_accept_encoding_quality_values(self):
+        middleware = CompressionMiddleware(FastAPI())
+        
+        assert middleware._get_compression_type({'accept-encoding': 'br;q=0, gzip'}) == 'gzip'
+        assert middleware._get_compression_type({'accept-encoding': 'gzip;q=0.5, br;q=1.0'}) == 'br'
+        assert middleware._get_compression_type({'accept-encoding': 'gzip;q=0'}) is None
+    
+    def test_zstd_preferred_when_available(self):
+        zstandard = pytest.importorskip("zstandard")
+        middleware = CompressionMiddleware(FastAPI())
+        
+        assert middleware._get_compression_type({'accept-encoding': 'gzip, br, zstd'}) == 'zstd'
+        compressed = middleware._compress_zstd(b"payload " * 200, 3)
+        assert zstandard.ZstdDecompressor().decompress(compressed) == b"payload " * 200
@@ -0,0 +1,126 @@
+"""
+Tests for conditional GET support.
+Covers ETag derivation and comparison, 304 short-circuiting before the
+endpoint runs, and the per-route hit rate counters.
+"""
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from core.compression_middleware import CompressionMiddleware
+from core.conditional_requests import (
+    conditional_get,
+    etag_matches,
+    get_conditional_stats,
+    make_etag,
+    reset_conditional_stats
+)
+
+@pytest.fixture
+def conditional_app():
+    reset_conditional_stats()
+    state = {"version": 1, "calls": 0}
+
+    def item_version():
+        return state["version"]
+
+    app = FastAPI()
+
+    @app.get("/api/item", dependencies=[Depends(conditional_get("item", item_version))])
+    async def get_item():
+        state["calls"] += 1
+        return {"version": state["version"], "payload": "x" * 2048}
+
+    @app.get("/api/unversioned", dependencies=[Depends(conditional_get("unversioned", lambda: None))])
+    async def get_unversioned():
+        return {"ok": True}
+
+    yield app, state
+    reset_conditional_stats()
+
+class TestEtagHelpers:
+    """Test ETag derivation and weak comparison"""
+
+    def test_make_etag_is_weak_and_route_scoped(self):
+        etag = make_etag("item", 1)
+        assert etag.startswith('W/"')
+        assert etag == make_etag("item", 1)
+        assert etag != make_etag("item", 2)
+        assert etag != make_etag("other", 1)
+
+    def test_etag_matches(self):
+        etag = make_etag("item", 1)
+        opaque = etag[2:]
+
+        assert etag_matches(etag, etag)
+        assert etag_matches(opaque, etag)
+        assert etag_matches(f'"other", {etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"other"', etag)
+
+class TestConditionalGet:
+    """Test the conditional GET dependency"""
+
+    def test_not_modified_skips_endpoint(self, conditional_app):
+        app, state = conditional_app
+        client = TestClient(app)
+
+        first = client.get("/api/item")
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == "private, no-cache"
+
+        second = client.get("/api/item", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["ETag"] == etag
+        assert state["calls"] == 1
+
+    def test_version_change_serves_new_representation(self, conditional_app):
+        app, state = conditional_app
+        client = TestClient(app)
+
+        etag = client.get("/api/item").headers["ETag"]
+        state["version"] = 2
+
+        response = client.get("/api/item", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["version"] == 2
+        assert response.headers["ETag"] != etag
+
+    def test_unversioned_requests_skip_validation(self, conditional_app):
+        app, _ = conditional_app
+        client = TestClient(app)
+
+        response = client.get("/api/unversioned", headers={"If-None-Match": "*"})
+        assert response.status_code == 200
+        assert "ETag" not in response.headers
+        assert get_conditional_stats()["unversioned"]["unversioned"] == 1
+
+    def test_hit_rate_per_route(self, conditional_app):
+        app, _ = conditional_app
+        client = TestClient(app)
+
+        etag = client.get("/api/item").headers["ETag"]
+        for _ in range(3):
+            client.get("/api/item", headers={"If-None-Match": etag})
+
+        stats = get_conditional_stats()["item"]
+        assert stats["checks"] == 4
+        assert stats["not_modified"] == 3
+        assert stats["hit_rate"] == 0.75
+
+    def test_etag_survives_compression(self, conditional_app):
+        app, state = conditional_app
+        client = TestClient(CompressionMiddleware(app))
+
+        first = client.get("/api/item", headers={"Accept-Encoding": "gzip"})
+        assert first.headers["Content-Encoding"] == "gzip"
+        etag = first.headers["ETag"]
+        assert etag == make_etag("item", 1)
+
+        second = client.get("/api/item", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert second.status_code == 304
+        assert state["calls"] == 1
@@ -0,0 +1,157 @@
+"""
+Tests for the set-based expiry engine.
+Runs the cleanup jobs against an in-memory SQLite database.
+"""
+
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import select
+
+from core.expiry import expire_rows, expiry_metrics, get_expiry_stats
+from models.user import User
+from models.match import Match
+from models.match_request import MatchRequest
+from models.queue_entry import QueueEntry
+from models.task import Task
+from models.chat import ChatMessage
+from services.chat import chat_service
+from services.match_request import match_request_service
+from services.queue_manager import queue_manager
+from services.tasks import task_service
+from services.users import user_service
+from tests.sqlite_db import sqlite_session
+
+TABLES = ("users", "matches", "tasks", "chat_messages", "match_requests", "queue_entries")
+
+@pytest_asyncio.fixture
+async def session():
+    async with sqlite_session(TABLES, [
+        User(id=index, email=f"user{index}@example.com", hashed_password="x",
+             available_slots=0, total_slots_used=2)
+        for index in range(1, 6)
+    ]) as session:
+        yield session
+
+class TestExpiryEngine:
+    """Test batched expiry and side effects"""
+
+    @pytest.mark.asyncio
+    async def test_expires_in_bounded_batches(self, session):
+        past = datetime.utcnow() - timedelta(hours=2)
+        session.add_all([
+            QueueEntry(user_id=index, status="waiting", created_at=past)
+            for index in range(1, 6)
+        ])
+        await session.commit()
+
+        expired = await expire_rows(
+            session,
+            "test_batches",
+            QueueEntry,
+            QueueEntry.status == "waiting",
+            {"status": "expired"},
+            batch_size=2
+        )
+
+        assert expired == 5
+        assert expiry_metrics["test_batches"]["batches"] == 3
+        assert get_expiry_stats()["test_batches"]["last_rows"] == 5
+
+        statuses = (await session.execute(select(QueueEntry.status))).scalars().all()
+        assert set(statuses) == {"expired"}
+
+    @pytest.mark.asyncio
+    async def test_failing_notifications_dont_stop_the_sweep(self, session):
+        past = datetime.utcnow() - timedelta(hours=2)
+        session.add_all([
+            QueueEntry(user_id=index, status="waiting", created_at=past)
+            for index in range(1, 6)
+        ])
+        await session.commit()
+        notify = AsyncMock(side_effect=RuntimeError("socket gone"))
+
+        expired = await expire_rows(
+            session,
+            "test_notify_errors",
+            QueueEntry,
+            QueueEntry.status == "waiting",
+            {"status": "expired"},
+            after_commit=notify,
+            batch_size=2
+        )
+
+        assert expired == 5
+        assert notify.await_count == 3
+        assert expiry_metrics["test_notify_errors"]["errors"] == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_entries(self, session):
+        session.add_all([
+            QueueEntry(user_id=1, status="waiting", created_at=datetime.utcnow() - timedelta(hours=2)),
+            QueueEntry(user_id=2, status="waiting", created_at=datetime.utcnow()),
+        ])
+        await session.commit()
+
+        assert await queue_manager.cleanup_expired_entries(session) == 1
+
+    @pytest.mark.asyncio
+    async def test_match_requests_refund_slots_per_sender(self, session):
+        past = datetime.utcnow() - timedelta(hours=1)
+        session.add_all([
+            MatchRequest(sender_id=1, receiver_id=2, status="pending", expires_at=past),
+            MatchRequest(sender_id=1, receiver_id=3, status="pending", expires_at=past),
+            MatchRequest(sender_id=2, receiver_id=3, status="pending", expires_at=past),
+            MatchRequest(sender_id=3, receiver_id=4, status="pending",
+                         expires_at=datetime.utcnow() + timedelta(hours=1)),
+        ])
+        await session.commit()
+
+        assert await match_request_service.cleanup_expired_requests(session) == 3
+
+        users = {
+            user.id: user
+            for user in (await session.execute(
+                select(User).execution_options(populate_existing=True)
+            )).scalars()
+        }
+        assert (users[1].available_slots, users[1].total_slots_used) == (2, 0)
+        assert (users[2].available_slots, users[2].total_slots_used) == (1, 1)
+        assert users[3].available_slots == 0
+
+    @pytest.mark.asyncio
+    async def test_tasks_and_slots(self, session):
+        session.add(Match(id=1, user1_id=1, user2_id=2, status="active"))
+        session.add_all([
+            Task(title="old", description="d", match_id=1, is_completed=False,
+                 expires_at=datetime.utcnow() - timedelta(minutes=1)),
+            Task(title="new", description="d", match_id=1, is_completed=False,
+                 expires_at=datetime.utcnow() + timedelta(hours=1)),
+        ])
+        await session.commit()
+
+        assert await task_service.cleanup_expired_tasks(session) == 1
+        assert await user_service.reset_expired_slots(session) == 5
+        assert await user_service.reset_expired_slots(session) == 0
+
+    @pytest.mark.asyncio
+    async def test_matches_post_one_notice_each_after_commit(self, session):
+        old = datetime.utcnow() - timedelta(days=3)
+        session.add_all([
+            Match(id=1, user1_id=1, user2_id=2, status="active", created_at=old),
+            Match(id=2, user1_id=3, user2_id=4, status="active", created_at=old),
+            Match(id=3, user1_id=4, user2_id=5, status="active", created_at=datetime.utcnow()),
+        ])
+        await session.commit()
+
+        with patch.object(chat_service, "_emit_message_to_room", new=AsyncMock()) as emit:
+            assert await chat_service.cleanup_expired_matches(session) == 2
+
+        assert sorted(call.args[0] for call in emit.await_args_list) == [1, 2]
+
+        notices = (await session.execute(
+            select(ChatMessage).where(ChatMessage.is_system_message == True)
+        )).scalars().all()
+        assert sorted(message.match_id for message in notices) == [1, 2]
+        assert all(message.sender_id is None for message in notices)
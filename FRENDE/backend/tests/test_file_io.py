@@ -0,0 +1,126 @@
+"""
+Tests for the async file I/O layer.
+Covers thread-offloaded file operations, batched directory walks and the
+incrementally maintained storage statistics.
+"""
+
+import os
+import time
+import pytest
+from unittest.mock import patch
+
+from core import file_io
+from core.file_io import StorageStats
+
+@pytest.fixture
+def stats(tmp_path):
+    root = tmp_path / "uploads"
+    root.mkdir()
+    stats = StorageStats(root)
+    with patch.object(file_io, "storage_stats", stats):
+        yield stats
+
+class TestFileOperations:
+    """Test file operations and the statistics they record"""
+
+    @pytest.mark.asyncio
+    async def test_write_overwrite_and_unlink(self, stats):
+        path = stats.root / "profiles" / "1" / "a.jpg"
+
+        assert await file_io.write_bytes(path, b"x" * 10) == 10
+        assert path.read_bytes() == b"x" * 10
+        await file_io.write_bytes(path, b"y" * 4)
+
+        assert (stats.total_files, stats.total_size) == (1, 4)
+        assert stats.get_stats()["files_by_type"] == {".jpg": {"count": 1, "size": 4}}
+        assert stats.get_stats()["files_by_area"] == {"profiles": {"count": 1, "size": 4}}
+
+        assert await file_io.unlink(path) == 4
+        assert await file_io.unlink(path) is None
+        assert (stats.total_files, stats.total_size) == (0, 0)
+        assert stats.get_stats()["files_by_type"] == {}
+        assert stats.largest_file is None
+
+    @pytest.mark.asyncio
+    async def test_replace_into_tree(self, stats, tmp_path):
+        source = tmp_path / "spooled.tmp"
+        source.write_bytes(b"z" * 7)
+
+        assert await file_io.replace(source, stats.root / "blobs" / "ab" / "cd" / "abcd.png") == 7
+
+        assert not source.exists()
+        assert stats.get_stats()["files_by_area"] == {"blobs": {"count": 1, "size": 7}}
+        assert stats.get_stats()["largest_file"] == {"path": "blobs/ab/cd/abcd.png", "size": 7}
+
+    @pytest.mark.asyncio
+    async def test_files_outside_root_not_counted(self, stats, tmp_path):
+        await file_io.write_bytes(tmp_path / "elsewhere.txt", b"abc")
+
+        assert stats.total_files == 0
+        assert (await file_io.stat(tmp_path / "elsewhere.txt")).st_size == 3
+        assert await file_io.stat(tmp_path / "missing.txt") is None
+
+    @pytest.mark.asyncio
+    async def test_rmtree(self, stats):
+        for name in ("a", "b", "c"):
+            await file_io.write_bytes(stats.root / "old" / "nested" / name, b"12345")
+
+        assert await file_io.rmtree(stats.root / "old") == (3, 15)
+        assert not (stats.root / "old").exists()
+        assert stats.total_files == 0
+
+class TestWalk:
+    """Test batched directory walks"""
+
+    @pytest.mark.asyncio
+    async def test_walk_in_batches(self, tmp_path):
+        for index in range(25):
+            path = tmp_path / f"dir{index % 3}" / f"file{index}.bin"
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(b"x" * index)
+
+        calls_before = file_io.file_io_metrics["calls"]
+        batches = [batch async for batch in file_io.walk(tmp_path, batch_size=10)]
+
+        assert [len(batch) for batch in batches] == [10, 10, 5]
+        assert sorted(entry.size for batch in batches for entry in batch) == list(range(25))
+        # One thread hop per batch, plus the one that finds the walk finished
+        assert file_io.file_io_metrics["calls"] - calls_before == 4
+
+    @pytest.mark.asyncio
+    async def test_walk_missing_directory(self, tmp_path):
+        assert [batch async for batch in file_io.walk(tmp_path / "missing")] == []
+
+class TestStorageStats:
+    """Test running totals and reconciliation"""
+
+    @pytest.mark.asyncio
+    async def test_reconcile_matches_tree_and_reports_drift(self, stats):
+        await file_io.write_bytes(stats.root / "profiles" / "a.jpg", b"a" * 100)
+        await file_io.write_bytes(stats.root / "thumbnails" / "b.jpg", b"b" * 10)
+        # Written behind the layer's back
+        (stats.root / "optimized").mkdir()
+        (stats.root / "optimized" / "c.webp").write_bytes(b"c" * 5)
+        old = stats.root / "profiles" / "old.jpg"
+        old.write_bytes(b"o")
+        os.utime(old, (time.time() - 86400, time.time() - 86400))
+
+        drift = await stats.reconcile(batch_size=2)
+
+        assert drift == {"files": 2, "bytes": 6}
+        result = stats.get_stats()
+        assert (result["total_files"], result["total_size"]) == (4, 116)
+        assert result["files_by_type"] == {".jpg": {"count": 3, "size": 111}, ".webp": {"count": 1, "size": 5}}
+        assert result["oldest_file"]["path"] == "profiles/old.jpg"
+        assert result["largest_file"] == {"path": "profiles/a.jpg", "size": 100}
+        assert result["reconciles"] == 1
+
+    @pytest.mark.asyncio
+    async def test_storage_statistics_do_not_walk(self, stats):
+        from services.file_management import file_management_service
+
+        await file_io.write_bytes(stats.root / "profiles" / "a.jpg", b"a" * 3)
+        with patch.object(file_io, "walk", side_effect=AssertionError("walked the tree")):
+            result = await file_management_service.get_storage_statistics()
+
+        assert (result["total_files"], result["total_size"]) == (1, 3)
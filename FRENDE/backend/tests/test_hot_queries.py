@@ -0,0 +1,126 @@
+"""
+Tests for the pre-compiled hot query registry.
+Checks that lambda statements bind fresh parameters on every call.
+"""
+
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select
+
+from core.hot_queries import (
+    hot_queries,
+    user_by_id,
+    match_for_user,
+    active_match_for_user,
+    chat_history,
+    chat_message_count,
+    user_match_versions,
+    match_task_versions
+)
+from models.user import User
+from models.match import Match
+from models.chat import ChatMessage
+from models.task import Task
+from tests.sqlite_db import sqlite_session
+
+@pytest_asyncio.fixture
+async def session():
+    base = datetime.utcnow()
+    # Only the tables these queries touch
+    async with sqlite_session(("users", "tasks", "matches", "chat_messages"), [
+        User(id=1, email="a@example.com", hashed_password="x", name="A"),
+        User(id=2, email="b@example.com", hashed_password="x", name="B"),
+        User(id=3, email="c@example.com", hashed_password="x", name="C"),
+        Match(id=1, user1_id=1, user2_id=2, status="active"),
+        Match(id=2, user1_id=2, user2_id=3, status="expired"),
+        *(
+            ChatMessage(
+                match_id=1,
+                sender_id=1,
+                message_text=f"message {index}",
+                is_system_message=index == 0,
+                created_at=base + timedelta(seconds=index)
+            )
+            for index in range(5)
+        ),
+    ]) as session:
+        yield session
+
+class TestHotQueries:
+    """Test hot query statements"""
+
+    @pytest.mark.asyncio
+    async def test_user_by_id_binds_each_call(self, session):
+        for user_id in (1, 2, 3):
+            result = await session.execute(user_by_id(user_id))
+            assert result.scalar_one().id == user_id
+
+        result = await session.execute(user_by_id(99))
+        assert result.scalar_one_or_none() is None
+
+    @pytest.mark.asyncio
+    async def test_match_membership(self, session):
+        assert (await session.execute(match_for_user(1, 2))).scalar_one_or_none() is not None
+        assert (await session.execute(match_for_user(1, 3))).scalar_one_or_none() is None
+
+        # Expired matches only pass the status-agnostic check
+        assert (await session.execute(match_for_user(2, 3))).scalar_one_or_none() is not None
+        assert (await session.execute(active_match_for_user(2, 3))).scalar_one_or_none() is None
+        assert (await session.execute(active_match_for_user(1, 1))).scalar_one_or_none() is not None
+
+    @pytest.mark.asyncio
+    async def test_chat_history_paging_and_system_filter(self, session):
+        result = await session.execute(chat_history(1, limit=2, offset=0))
+        assert [m.message_text for m in result.scalars()] == ["message 4", "message 3"]
+
+        result = await session.execute(chat_history(1, limit=2, offset=2))
+        assert [m.message_text for m in result.scalars()] == ["message 2", "message 1"]
+
+        result = await session.execute(chat_history(1, limit=10, offset=0, include_system=True))
+        assert len(result.scalars().all()) == 5
+
+    @pytest.mark.asyncio
+    async def test_chat_message_count(self, session):
+        assert (await session.execute(chat_message_count(1))).scalar() == 5
+        assert (await session.execute(chat_message_count(1, include_system=False))).scalar() == 4
+        assert (await session.execute(chat_message_count(2))).scalar() == 0
+
+    @pytest.mark.asyncio
+    async def test_user_match_versions_track_changes(self, session):
+        before = (await session.execute(user_match_versions(2, limit=10, offset=0))).all()
+        assert sorted(row.id for row in before) == [1, 2]
+        assert (await session.execute(user_match_versions(2, limit=10, offset=0, status="active"))).all()[0].id == 1
+
+        match = await session.get(Match, 1)
+        match.coins_earned_user1 = 5
+        await session.commit()
+
+        after = (await session.execute(user_match_versions(2, limit=10, offset=0))).all()
+        assert set(map(tuple, after)) != set(map(tuple, before))
+
+    @pytest.mark.asyncio
+    async def test_match_task_versions_membership_and_expiry(self, session):
+        now = datetime.utcnow()
+        session.add_all([
+            Task(match_id=1, title="open", description="d", expires_at=now + timedelta(hours=1)),
+            Task(match_id=1, title="expired", description="d", expires_at=now - timedelta(hours=1)),
+        ])
+        await session.commit()
+
+        rows = (await session.execute(match_task_versions(1, 1, now))).all()
+        assert [row.title for row in rows] == ["open"]
+        assert (await session.execute(match_task_versions(1, 3, now))).all() == []
+
+        # Any change a task list response would show changes the version
+        task = await session.scalar(select(Task).where(Task.title == "open"))
+        task.completed_by_user1 = True
+        task.completed_at_user1 = now
+        await session.commit()
+        assert (await session.execute(match_task_versions(1, 1, now))).all() != rows
+
+    def test_registry_counts_calls(self):
+        before = hot_queries.get_stats()["user_by_id"]
+        hot_queries.get("user_by_id")(1)
+        assert hot_queries.get_stats()["user_by_id"] == before + 1
+        assert "chat_history" in hot_queries.names()
@@ -0,0 +1,240 @@
+"""
+Tests for on-request image derivatives.
+Covers width snapping, Accept negotiation, the disk LRU, coalesced
+generation and the /uploads/{hash} endpoint.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api import uploads
+from core.database import get_async_session
+from services import image_derivatives as derivatives_module
+from services.blob_store import BlobStore, LocalBlobBackend
+from services.image_derivatives import DerivativeCache, ImageDerivativeService
+from services.image_pipeline import ImagePipeline
+from tests.sqlite_db import sqlite_session
+
+def _jpeg(width: int = 1200, height: int = 800) -> bytes:
+    output = io.BytesIO()
+    Image.radial_gradient("L").resize((width, height)).convert("RGB").save(output, "JPEG")
+    return output.getvalue()
+
+@pytest_asyncio.fixture
+async def session():
+    async with sqlite_session(("blobs",)) as session:
+        yield session
+
+@pytest_asyncio.fixture
+async def pipeline():
+    pipeline = ImagePipeline(workers=1, max_queue=4, queue_timeout=30.0)
+    yield pipeline
+    await pipeline.shutdown()
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(LocalBlobBackend(str(tmp_path / "uploads")), gc_grace=timedelta(hours=1))
+
+@pytest.fixture
+def service(tmp_path, store, pipeline):
+    service = ImageDerivativeService(
+        DerivativeCache(str(tmp_path / "derivatives"), 10 * 1024 * 1024), widths=[80, 240, 640], quality=80
+    )
+    with patch.object(derivatives_module, "blob_store", store), \
+         patch.object(derivatives_module, "image_pipeline", pipeline), \
+         patch.object(uploads, "blob_store", store), \
+         patch.object(uploads, "image_derivatives", service):
+        yield service
+
+async def _store_image(session: AsyncSession, store: BlobStore, tmp_path) -> str:
+    data = _jpeg()
+    sha256 = hashlib.sha256(data).hexdigest()
+    source = tmp_path / "rendered.jpg"
+    source.write_bytes(data)
+    await store.put_file(session, source, sha256, content_type="image/jpeg", extension=".jpg")
+    await session.commit()
+    return sha256
+
+class TestNegotiation:
+    """Test width snapping and format negotiation"""
+
+    def test_snap_width(self):
+        service = ImageDerivativeService(DerivativeCache("unused", 0), widths=[80, 240, 640], quality=80)
+
+        assert service.snap_width(50) == 80
+        assert service.snap_width(240) == 240
+        assert service.snap_width(241) == 640
+        assert service.snap_width(5000) == 640
+        assert service.snap_width(None) is None
+
+    def test_negotiate(self):
+        service = ImageDerivativeService(DerivativeCache("unused", 0), widths=[], quality=80)
+
+        assert service.negotiate(None, "image/webp,image/*;q=0.8") == ("webp", True)
+        assert service.negotiate("auto", "image/png,image/*") == ("jpeg", True)
+        assert service.negotiate("png", "image/webp") == ("png", False)
+        with patch.object(derivatives_module, "AVIF_AVAILABLE", False):
+            assert service.negotiate("avif", "image/avif") == ("webp", False)
+            assert service.negotiate(None, "image/avif,image/webp") == ("webp", True)
+
+class TestDerivativeCache:
+    """Test the disk LRU"""
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self, tmp_path):
+        cache = DerivativeCache(str(tmp_path), max_bytes=250)
+        await cache.load()
+        names = [DerivativeCache.name(f"{index:064x}", 80, "webp") for index in range(3)]
+        for name in names:
+            cache.path(name).parent.mkdir(parents=True, exist_ok=True)
+            cache.path(name).write_bytes(b"x" * 100)
+
+        await cache.add(names[0], 100)
+        await cache.add(names[1], 100)
+        assert cache.get(names[0]) is not None
+        await cache.add(names[2], 100)
+
+        assert cache.get(names[1]) is None
+        assert not cache.path(names[1]).exists()
+        assert cache.get_stats()["bytes"] == 200
+        assert cache.metrics["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_load_indexes_disk_oldest_first(self, tmp_path):
+        old, new = (DerivativeCache.name(f"{index:064x}", 80, "jpeg") for index in range(2))
+        for name, age in ((old, 100), (new, 0)):
+            path = tmp_path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (time.time() - age, time.time() - age))
+
+        cache = DerivativeCache(str(tmp_path), max_bytes=150)
+        await cache.load()
+
+        assert cache.get(new) is not None
+        assert cache.get(old) is None
+        assert not (tmp_path / old).exists()
+
+    @pytest.mark.asyncio
+    async def test_purge(self, tmp_path):
+        cache = DerivativeCache(str(tmp_path), max_bytes=10_000)
+        sha256 = "a" * 64
+        for width in (80, 240):
+            name = DerivativeCache.name(sha256, width, "webp")
+            cache.path(name).parent.mkdir(parents=True, exist_ok=True)
+            cache.path(name).write_bytes(b"x")
+            await cache.add(name, 1)
+
+        assert await cache.purge(sha256) == 2
+        assert cache.get_stats()["entries"] == 0
+        assert not list((tmp_path / "aa").iterdir())
+
+class TestDerivativeService:
+    """Test generation through the pipeline"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_generate_once(self, session, store, service, tmp_path):
+        sha256 = await _store_image(session, store, tmp_path)
+
+        results = await asyncio.gather(*(service.get(session, sha256, 240, "webp") for _ in range(3)))
+
+        assert service.metrics["generated"] == 1
+        assert service.metrics["coalesced"] == 2
+        path, stat_result, content_type = results[0]
+        assert content_type == "image/webp"
+        assert Image.open(path).size == (240, 160)
+        assert stat_result.st_size == path.stat().st_size
+
+    @pytest.mark.asyncio
+    async def test_released_image_purged(self, session, store, service, tmp_path):
+        store.on_release(service.cache.purge)
+        sha256 = await _store_image(session, store, tmp_path)
+        path, _, _ = await service.get(session, sha256, 80, "jpeg")
+
+        await store.release(session, sha256)
+        await session.commit()
+        await store.flush_releases()
+
+        assert not path.exists()
+        with pytest.raises(derivatives_module.DerivativeNotFound):
+            await service.get(session, sha256, 80, "jpeg")
+
+class TestUploadsEndpoint:
+    """Test /uploads/{hash}"""
+
+    @pytest_asyncio.fixture
+    async def client(self, session, service):
+        app = FastAPI()
+        app.include_router(uploads.router)
+        app.dependency_overrides[get_async_session] = lambda: session
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            yield client
+
+    @pytest.mark.asyncio
+    async def test_derivative_negotiated_and_cached(self, session, store, service, client, tmp_path):
+        sha256 = await _store_image(session, store, tmp_path)
+
+        response = await client.get(f"/uploads/{sha256}?w=100", headers={"Accept": "image/webp,*/*"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert response.headers["vary"] == "Accept"
+        assert "immutable" in response.headers["cache-control"]
+        assert Image.open(io.BytesIO(response.content)).size == (240, 160)
+
+        again = await client.get(f"/uploads/{sha256}?w=200", headers={"Accept": "image/webp"})
+        assert again.content == response.content
+        assert service.metrics["generated"] == 1
+        assert service.cache.metrics["hits"] == 1
+
+        not_modified = await client.get(
+            f"/uploads/{sha256}?w=240&fmt=webp", headers={"If-None-Match": response.headers["etag"]}
+        )
+        assert not_modified.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_original_and_missing(self, session, store, service, client, tmp_path):
+        sha256 = await _store_image(session, store, tmp_path)
+
+        response = await client.get(f"/uploads/{sha256}")
+        assert response.status_code == 200
+        assert hashlib.sha256(response.content).hexdigest() == sha256
+        assert response.headers["content-type"] == "image/jpeg"
+
+        assert (await client.get(f"/uploads/{'0' * 64}?w=80")).status_code == 404
+        assert (await client.get(f"/uploads/{'0' * 64}")).status_code == 404
+        assert (await client.get("/uploads/not-a-hash")).status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_released_upload_not_revalidated(self, session, store, service, client, tmp_path):
+        sha256 = await _store_image(session, store, tmp_path)
+        await store.release(session, sha256)
+        await session.commit()
+
+        assert (await client.get(f"/uploads/{sha256}", headers={"If-None-Match": f'"{sha256}"'})).status_code == 404
+        etag = f'"{sha256}-w80-jpeg"'
+        assert (await client.get(f"/uploads/{sha256}?w=80&fmt=jpeg", headers={"If-None-Match": etag})).status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_undecodable_image(self, session, store, service, client, tmp_path):
+        data = b"not really a jpeg"
+        sha256 = hashlib.sha256(data).hexdigest()
+        source = tmp_path / "broken.jpg"
+        source.write_bytes(data)
+        await store.put_file(session, source, sha256, content_type="image/jpeg", extension=".jpg")
+        await session.commit()
+
+        response = await client.get(f"/uploads/{sha256}?w=80")
+        assert response.status_code == 415
+        assert service.metrics["failed"] == 1
@@ -0,0 +1,237 @@
+"""
+Tests for the off-loop image processing pipeline.
+Covers process pool execution, backpressure, background renditions and
+cancellation of superseded jobs.
+"""
+
+import asyncio
+import hashlib
+import io
+import pytest
+import pytest_asyncio
+import time
+from fastapi import UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+from unittest.mock import patch
+
+from core.exceptions import ServiceBusyError
+from services import image_processing
+from services.image_pipeline import ImagePipeline
+from services.image_processing import ImageProcessingService
+from services.image_renditions import render_primary, render_renditions
+from services.upload_spool import UploadSpool
+
+def _jpeg(width: int = 2400, height: int = 1600) -> bytes:
+    output = io.BytesIO()
+    Image.radial_gradient("L").resize((width, height)).convert("RGB").save(output, "JPEG")
+    return output.getvalue()
+
+def _upload(data: bytes, filename: str = "photo.jpg") -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(data), size=len(data), filename=filename,
+        headers=Headers({"content-type": "image/jpeg"})
+    )
+
+@pytest_asyncio.fixture
+async def pipeline():
+    pipeline = ImagePipeline(workers=1, max_queue=4, queue_timeout=30.0)
+    yield pipeline
+    await pipeline.shutdown()
+
+class TestImagePipeline:
+    """Test the process pool pipeline"""
+
+    @pytest.mark.asyncio
+    async def test_run_primary(self, pipeline, tmp_path):
+        path = tmp_path / "primary.jpg"
+
+        result = await pipeline.run("primary", render_primary, _jpeg(), str(path), 1200, 1200, 85)
+
+        assert result["original_dimensions"] == {"width": 2400, "height": 1600}
+        assert result["dimensions"] == {"width": 1200, "height": 800}
+        assert Image.open(path).size == (1200, 800)
+
+        stats = pipeline.get_stats()
+        assert stats["tasks"] == 1
+        for stage in ("queue_wait", "primary", "primary.decode", "primary.resize", "primary.encode"):
+            assert stats["stage_ms"][stage]["max"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_responsive(self, pipeline):
+        data = _jpeg(4000, 3000)
+        await pipeline.run("primary", render_primary, data, None, 1200, 1200, 85)  # start the worker
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        await pipeline.run("primary", render_primary, data, None, 1200, 1200, 85)
+        ticking.cancel()
+
+        assert ticks > 1
+
+    @pytest.mark.asyncio
+    async def test_saturated_pool_rejects(self):
+        pipeline = ImagePipeline(workers=1, max_queue=0, queue_timeout=0.05)
+        assert await pipeline.gate.acquire()
+
+        with pytest.raises(ServiceBusyError) as exc_info:
+            await pipeline.run("primary", render_primary, _jpeg(), None, 1200, 1200, 85)
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"] == "2"
+        pipeline.gate.release()
+        await pipeline.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_job_holds_slot_until_worker_finishes(self, pipeline):
+        await pipeline.run("warmup", dict)  # start the worker
+        job = pipeline.submit("slow", time.sleep, 0.5)
+        await asyncio.sleep(0.1)
+
+        assert pipeline.cancel(job.id)
+        await pipeline.wait(job.id)
+
+        assert job.status == "cancelled"
+        assert pipeline.gate.active == 1
+        for _ in range(100):
+            if pipeline.gate.active == 0:
+                break
+            await asyncio.sleep(0.02)
+        assert pipeline.gate.active == 0
+
+    @pytest.mark.asyncio
+    async def test_newer_job_supersedes_older(self, pipeline, tmp_path):
+        data = _jpeg()
+        source = tmp_path / "source.jpg"
+        source.write_bytes(data)
+        first = pipeline.submit("renditions", render_renditions, str(source),
+                                [("webp", "WEBP", str(tmp_path / "first.webp"), None, {})], key="1:profile")
+        second = pipeline.submit("renditions", render_renditions, str(source),
+                                 [("webp", "WEBP", str(tmp_path / "second.webp"), None, {})], key="1:profile")
+
+        await pipeline.wait(first.id)
+        await pipeline.wait(second.id)
+
+        assert first.status == "cancelled"
+        assert second.status == "completed"
+        assert second.result["written"] == ["webp"]
+        assert pipeline.get_stats()["superseded"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_rendition_reported_per_key(self, pipeline, tmp_path):
+        source = tmp_path / "source.jpg"
+        source.write_bytes(_jpeg())
+        results = []
+        job = pipeline.submit("renditions", render_renditions, str(source), [
+            ("jpeg", "JPEG", str(tmp_path / "ok.jpg"), None, {}),
+            ("bad", "JPEG", str(tmp_path / "missing" / "bad.jpg"), None, {})
+        ], on_result=results.append)
+
+        await pipeline.wait(job.id)
+
+        assert job.status == "completed"
+        assert job.result["written"] == ["jpeg"]
+        assert "bad" in job.result["failed"]
+        assert results == [job.result]
+        assert job.result["files"] == {str(tmp_path / "ok.jpg"): (tmp_path / "ok.jpg").stat().st_size}
+
+class TestRenditions:
+    """Test the worker functions"""
+
+    def test_draft_decode_keeps_exact_dimensions(self):
+        result = render_primary(_jpeg(4000, 3000), None, 1200, 1200, 85)
+
+        assert result["original_dimensions"] == {"width": 4000, "height": 3000}
+        assert Image.open(io.BytesIO(result["content"])).size == (1200, 900)
+
+    def test_thumbnail_pyramid(self, tmp_path):
+        source = tmp_path / "source.jpg"
+        source.write_bytes(render_primary(_jpeg(), None, 1200, 1200, 85)["content"])
+        specs = [(name, "JPEG", str(tmp_path / f"{name}.jpg"), (edge, edge), {})
+                 for name, edge in (("xs", 40), ("xl", 240), ("md", 120))]
+
+        result = render_renditions(str(source), specs)
+
+        assert result["written"] == ["xl", "md", "xs"]
+        assert Image.open(tmp_path / "xs.jpg").size == (40, 27)
+        assert Image.open(tmp_path / "md.jpg").size == (120, 80)
+        assert not list(tmp_path.glob("*.tmp"))
+
+class TestImageProcessingService:
+    """Test uploads through the pipeline"""
+
+    @pytest.mark.asyncio
+    async def test_upload_returns_primary_then_renders_in_background(self, pipeline, tmp_path):
+        service = ImageProcessingService(upload_dir=str(tmp_path))
+
+        with patch.object(image_processing, "image_pipeline", pipeline):
+            result = await service.process_uploaded_image(_upload(_jpeg()), user_id="7")
+
+        assert (tmp_path / "profiles" / result["filename"]).exists()
+        assert result["optimized_dimensions"] == {"width": 1200, "height": 800}
+
+        job = await pipeline.wait(result["renditions"]["job_id"])
+        assert job.status == "completed"
+        assert not job.result["failed"]
+        for url in [*result["thumbnails"].values(), *result["optimized_versions"].values(),
+                    *result["modern_formats"].values()]:
+            assert (tmp_path / url.removeprefix("/uploads/")).exists()
+
+    @pytest.mark.asyncio
+    async def test_reupload_reuses_renditions(self, pipeline, tmp_path):
+        service = ImageProcessingService(upload_dir=str(tmp_path))
+        data = _jpeg()
+
+        with patch.object(image_processing, "image_pipeline", pipeline):
+            first = await service.process_uploaded_image(_upload(data), user_id="7")
+            await pipeline.wait(first["renditions"]["job_id"])
+            second = await service.process_uploaded_image(_upload(data, "again.jpg"), user_id="8")
+
+        assert second["url"] == first["url"]
+        assert second["optimized_dimensions"] == first["optimized_dimensions"]
+        assert second["renditions"] == {"job_id": None, "status": "completed"}
+        assert pipeline.get_stats()["tasks"] == 2
+        assert service.metrics["reused_primaries"] == 1
+
+    def test_plan_skips_duplicate_and_unneeded_formats(self, tmp_path):
+        service = ImageProcessingService(upload_dir=str(tmp_path))
+
+        specs, optimized, thumbnails, modern = service._plan_renditions("k", "medium", True, True)
+
+        assert "png" not in optimized
+        assert modern["webp"] == optimized["webp"]
+        assert len({(spec[1], spec[3]) for spec in specs}) == len(specs) == 1 + len(thumbnails)
+
+    @pytest.mark.asyncio
+    async def test_process_profile_picture(self, pipeline, tmp_path):
+        service = ImageProcessingService(upload_dir=str(tmp_path))
+        spool = UploadSpool(str(tmp_path / "spool"))
+        destination = tmp_path / "picture.jpg"
+
+        with patch.object(image_processing, "image_pipeline", pipeline):
+            async with await spool.spool(_upload(_jpeg()), service.max_file_size) as upload:
+                result = await service.process_profile_picture(upload, destination)
+
+        assert result["dimensions"] == {"width": 1200, "height": 800}
+        assert Image.open(destination).size == (1200, 800)
+        assert result["sha256"] == hashlib.sha256(destination.read_bytes()).hexdigest()
+        assert not list((tmp_path / "spool").iterdir())
+
+    @pytest.mark.asyncio
+    async def test_validate_image(self, tmp_path):
+        service = ImageProcessingService(upload_dir=str(tmp_path))
+        spool = UploadSpool(str(tmp_path / "spool"))
+
+        async def validate(data: bytes, filename: str):
+            async with await spool.spool(_upload(data, filename), service.max_file_size) as upload:
+                return service.validate_image(upload)
+
+        assert await validate(_jpeg(), "photo.jpg") == (True, None)
+        assert (await validate(b"not an image", "photo.jpg"))[0] is False
+        assert (await validate(_jpeg(), "photo.exe"))[0] is False
@@ -0,0 +1,150 @@
+"""
+Tests for the queued logging pipeline.
+Covers background writing, drop-on-full, per-logger sampling and the JSON
+encoder.
+"""
+
+import json
+import logging
+import queue
+import pytest
+from unittest.mock import patch
+
+from core import logging_config
+from core.config import settings
+from core.logging_config import (
+    JSONFormatter, NonBlockingQueueHandler, SamplingFilter,
+    get_logging_stats, setup_logging, shutdown_logging
+)
+
+def _record(name="api", level=logging.INFO, msg="hello", **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, None, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+@pytest.fixture
+def pipeline(tmp_path):
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    log_file = tmp_path / "app.log"
+    with patch.object(settings, "LOG_FILE_PATH", str(log_file)), \
+         patch.object(settings, "LOG_FORMAT", "json"), \
+         patch.object(settings, "LOG_SAMPLE_RATES", "api=0.5"):
+        setup_logging()
+        yield log_file
+        shutdown_logging()
+        logging_config.configure_sampling({})
+    root.handlers[:] = saved_handlers
+    root.setLevel(saved_level)
+
+def _lines(log_file):
+    return [json.loads(line) for line in log_file.read_text().splitlines()]
+
+class TestLoggingPipeline:
+    """Test the queue handler and background writer"""
+
+    def test_records_written_by_listener(self, pipeline):
+        logging.getLogger("test.pipeline").info("user %s logged in", 42)
+        shutdown_logging()
+
+        entries = _lines(pipeline)
+        assert entries[-1]["message"] == "user 42 logged in"
+        assert entries[-1]["logger"] == "test.pipeline"
+
+    def test_exception_rendered_before_enqueue(self, pipeline):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("test.pipeline").exception("failed")
+        shutdown_logging()
+
+        assert "ValueError: boom" in _lines(pipeline)[-1]["exception"]
+
+    def test_stats(self, pipeline):
+        logging.getLogger("test.pipeline").warning("queued")
+
+        stats = get_logging_stats()
+        assert stats["writer_running"] is True
+        assert stats["queue_capacity"] == settings.LOG_QUEUE_SIZE
+        assert stats["enqueued"] >= 1
+        assert stats["sampling"]["api"]["rate"] == 0.5
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+
+        handler.handle(_record(msg="first"))
+        handler.handle(_record(msg="second"))
+
+        assert handler.enqueued == 1
+        assert handler.dropped == 1
+
+    def test_prepare_defers_formatting(self):
+        handler = NonBlockingQueueHandler(queue.Queue())
+        record = _record(msg="count=%d")
+        record.args = (3,)
+
+        prepared = handler.prepare(record)
+
+        assert prepared.msg == "count=3"
+        assert prepared.args is None
+        # Formatting is left to the listener thread
+        assert not hasattr(prepared, "message")
+
+class TestSamplingFilter:
+    """Test per-logger sampling"""
+
+    def test_counter_sampling_keeps_rate(self):
+        sampling_filter = SamplingFilter(0.1)
+
+        kept = sum(sampling_filter.filter(_record()) for _ in range(1000))
+
+        assert kept == 100
+        assert sampling_filter.sampled_out == 900
+
+    def test_warnings_always_kept(self):
+        sampling_filter = SamplingFilter(0.0)
+
+        assert sampling_filter.filter(_record(level=logging.WARNING))
+        assert not sampling_filter.filter(_record(level=logging.INFO))
+
+    def test_request_and_response_sampled_together(self):
+        sampling_filter = SamplingFilter(0.5)
+
+        for i in range(200):
+            request = sampling_filter.filter(_record(request_id=f"req-{i}"))
+            response = sampling_filter.filter(_record(request_id=f"req-{i}"))
+            assert request == response
+
+    def test_logger_level_filter(self, pipeline):
+        sampling_filter = logging_config._sampling_filters["api"]
+        for _ in range(10):
+            logging.getLogger("api").info("sampled")
+
+        assert sampling_filter.kept + sampling_filter.sampled_out == 10
+        assert sampling_filter.sampled_out > 0
+
+class TestJSONFormatter:
+    """Test the structured formatter"""
+
+    def test_context_fields_and_unserialisable_values(self):
+        record = _record(msg="done", request_id="abc", status_code=200, user_id=object())
+
+        entry = json.loads(JSONFormatter().format(record))
+
+        assert entry["request_id"] == "abc"
+        assert entry["status_code"] == 200
+        assert isinstance(entry["user_id"], str)
+
+    def test_json_fallback(self):
+        with patch.object(logging_config, "ORJSON_AVAILABLE", False):
+            entry = json.loads(JSONFormatter().format(_record(msg="plain")))
+
+        assert entry["message"] == "plain"
+
+class TestSampleRateSetting:
+    """Test LOG_SAMPLE_RATES parsing"""
+
+    def test_parse(self):
+        with patch.object(settings, "LOG_SAMPLE_RATES", "api=0.25, performance=2,bad,x=oops"):
+            assert settings.get_log_sample_rates() == {"api": 0.25, "performance": 1.0}
@@ -0,0 +1,87 @@
+"""
+Tests for the raw ASGI middleware stack.
+Covers the shared request context, streaming pass-through and the
+short-circuit responses of the security layers.
+"""
+
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from core.logging_middleware import create_logging_middleware_stack
+from core.rate_limiting import RateLimiter, RateLimitPolicy
+from core.security_middleware import create_security_middleware_stack
+
+@pytest.fixture
+def stack_client():
+    app = FastAPI()
+    seen = {}
+
+    @app.get("/api/echo")
+    async def echo(request: Request):
+        context = request.state.context
+        seen["context"] = context
+        return {"request_id": request.state.request_id, "client_ip": context.client_ip}
+
+    @app.get("/api/stream")
+    async def stream():
+        async def chunks():
+            for index in range(3):
+                yield f"chunk {index}\n".encode()
+        return StreamingResponse(chunks(), media_type="application/octet-stream")
+
+    limiter = RateLimiter()
+    limiter.use_redis = False
+    limiter.ip_policy = RateLimitPolicy("ip", 1000)
+
+    with patch("core.rate_limiting_middleware.rate_limiter", limiter):
+        stacked = create_security_middleware_stack(create_logging_middleware_stack(app))
+        yield TestClient(stacked), seen
+
+class TestMiddlewareStack:
+    """Test the middleware stack end to end"""
+
+    def test_shared_context_and_headers(self, stack_client):
+        client, seen = stack_client
+
+        response = client.get("/api/echo", headers={"X-Forwarded-For": "203.0.113.9, 10.0.0.1"})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert response.headers["X-Request-ID"] == body["request_id"] == seen["context"].request_id
+        assert body["client_ip"] == "203.0.113.9"
+        for header in ("X-Response-Time", "X-Processing-Time", "X-RateLimit-Limit", "X-Content-Type-Options"):
+            assert header in response.headers
+
+    def test_streaming_response_passes_through(self, stack_client):
+        client, _ = stack_client
+
+        with client.stream("GET", "/api/stream") as response:
+            chunks = [chunk for chunk in response.iter_raw() if chunk]
+
+        assert response.status_code == 200
+        assert b"".join(chunks) == b"chunk 0\nchunk 1\nchunk 2\n"
+        assert "X-Request-ID" in response.headers
+
+    def test_request_too_large(self, stack_client):
+        client, _ = stack_client
+
+        response = client.post("/api/echo", content=b"x" * (11 * 1024 * 1024))
+
+        assert response.status_code == 413
+
+    def test_suspicious_query_rejected(self, stack_client):
+        client, _ = stack_client
+
+        response = client.get("/api/echo", params={"q": "<script>alert(1)</script>"})
+
+        assert response.status_code == 400
+
+    def test_disallowed_origin_rejected(self, stack_client):
+        client, _ = stack_client
+
+        response = client.get("/api/echo", headers={"Origin": "https://evil.example"})
+
+        assert response.status_code == 403
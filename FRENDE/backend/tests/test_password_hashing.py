@@ -0,0 +1,96 @@
+"""
+Tests for the bounded password hashing pool.
+Covers off-loop hashing, fast rejection when saturated and transparent
+rehash of deprecated hashes.
+"""
+
+import asyncio
+import threading
+import pytest
+from passlib.context import CryptContext
+from unittest.mock import patch
+
+from core.exceptions import ServiceBusyError
+from core.security import PasswordHasher
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_queue=1, queue_timeout=5.0)
+    yield hasher
+    hasher.shutdown()
+
+class TestPasswordHasher:
+    """Test the password hashing pool"""
+
+    @pytest.mark.asyncio
+    async def test_hash_and_verify(self, hasher):
+        hashed = await hasher.hash("SecurePassword123!")
+
+        assert await hasher.verify("SecurePassword123!", hashed) == (True, None)
+        assert (await hasher.verify("wrong", hashed))[0] is False
+
+        stats = hasher.get_stats()
+        assert stats["hashes"] == 1
+        assert stats["verifications"] == 2
+        assert stats["hash_ms"]["max"] > 0
+
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_responsive(self, hasher):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        await hasher.hash("SecurePassword123!")
+        task.cancel()
+
+        # A bcrypt hash takes tens of milliseconds; the loop kept ticking throughout
+        assert ticks > 5
+
+    @pytest.mark.asyncio
+    async def test_saturated_pool_rejects_quickly(self, hasher):
+        # One hashing, one queued; the third is shed
+        calls = [asyncio.create_task(hasher.hash("a")), asyncio.create_task(hasher.hash("b"))]
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ServiceBusyError) as exc_info:
+            await hasher.hash("c")
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"] == "1"
+
+        await asyncio.gather(*calls)
+        assert hasher.get_stats()["queue"]["rejected_queue_full"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_call_holds_slot_until_thread_finishes(self, hasher):
+        release = threading.Event()
+        call = asyncio.create_task(hasher._run("hash", release.wait, 5))
+        await asyncio.sleep(0.01)
+
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        assert hasher.gate.active == 1
+
+        release.set()
+        for _ in range(100):
+            if hasher.gate.active == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert hasher.gate.active == 0
+
+    @pytest.mark.asyncio
+    async def test_deprecated_hash_rehashed_on_verify(self, hasher):
+        legacy = CryptContext(schemes=["sha256_crypt"]).hash("SecurePassword123!")
+        context = CryptContext(schemes=["bcrypt", "sha256_crypt"], deprecated="auto")
+
+        with patch("core.security.pwd_context", context):
+            is_valid, new_hash = await hasher.verify("SecurePassword123!", legacy)
+
+        assert is_valid
+        assert new_hash.startswith("$2b$")
+        assert hasher.get_stats()["rehashes"] == 1
@@ -0,0 +1,149 @@
+"""
+Tests for database pool instrumentation and admission control.
+Covers wait/hold tracking, timeouts, sizing advice and the admission gate.
+"""
+
+import asyncio
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from core.database_middleware import AdmissionControlMiddleware
+from core.pool_monitor import (
+    AdmissionGate,
+    InstrumentedAsyncAdaptedQueuePool,
+    PoolStats,
+    current_request_scope,
+    latency_summary,
+    pool_monitor
+)
+
+def make_engine(name: str, pool_size: int = 1, pool_timeout: float = 0.1):
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=pool_timeout
+    )
+    pool_monitor.instrument(engine, name)
+    return engine
+
+def test_latency_summary():
+    assert latency_summary([]) == {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    assert latency_summary(range(100, 0, -1)) == {"p50": 50, "p95": 95, "max": 100}
+    assert latency_summary([1.23456], digits=3) == {"p50": 1.235, "p95": 1.235, "max": 1.235}
+
+class TestPoolMonitor:
+    """Test pool event instrumentation"""
+
+    @pytest.mark.asyncio
+    async def test_hold_time_attributed_to_endpoint(self):
+        engine = make_engine("test_hold")
+
+        def list_users():
+            pass
+
+        token = current_request_scope.set({"path": "/api/users", "endpoint": list_users})
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        finally:
+            current_request_scope.reset(token)
+
+        stats = pool_monitor.get_stats()["test_hold"]
+        assert stats["checkouts"] == 1
+        assert stats["checked_out"] == 0
+        assert stats["hold_ms_by_endpoint"]["list_users"]["count"] == 1
+        assert pool_monitor.pools["test_hold"].wait_ms
+
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_checkout_timeout_is_counted(self):
+        engine = make_engine("test_timeout")
+
+        async with engine.connect():
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect():
+                    pass
+
+        stats = pool_monitor.get_stats()["test_timeout"]
+        assert stats["timeouts"] == 1
+        assert stats["peak_checked_out"] == 1
+        assert pool_monitor.get_pool_status("test_timeout")["timeouts"] == 1
+
+        await engine.dispose()
+
+    def test_recommendation_needs_samples(self):
+        pool_monitor.pools["test_empty"] = PoolStats("test_empty")
+        advice = pool_monitor.recommend_pool_size("test_empty")
+        assert advice["recommendation"] == "insufficient_data"
+
+    def test_recommendation_from_concurrency(self):
+        stats = PoolStats("test_advice")
+        stats.concurrency.extend([4] * 95 + [10] * 5)
+        stats.peak_checked_out = 12
+        stats.timeouts = 3
+        pool_monitor.pools["test_advice"] = stats
+
+        advice = pool_monitor.recommend_pool_size("test_advice")
+
+        # p95 of 4 with 20% headroom is 5, bumped 25% for the observed timeouts
+        assert advice["recommended"]["pool_size"] == 7
+        assert advice["observed"]["peak_concurrency"] == 12
+        assert any("timeout" in reason for reason in advice["reasons"])
+
+class TestAdmissionGate:
+    """Test bounded concurrency ahead of the pool"""
+
+    @pytest.mark.asyncio
+    async def test_excess_requests_wait_for_a_slot(self):
+        gate = AdmissionGate(limit=1, max_queue=5, queue_timeout=1.0)
+        assert await gate.acquire()
+
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+
+        gate.release()
+        assert await waiter
+        assert gate.metrics["queued"] == 1
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_immediately(self):
+        gate = AdmissionGate(limit=1, max_queue=0, queue_timeout=1.0)
+        assert await gate.acquire()
+        assert not await gate.acquire()
+        assert gate.metrics["rejected_queue_full"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_timeout_rejects(self):
+        gate = AdmissionGate(limit=1, max_queue=5, queue_timeout=0.01)
+        assert await gate.acquire()
+        assert not await gate.acquire()
+        assert gate.metrics["rejected_timeout"] == 1
+        assert gate.waiting == 0
+
+    def test_middleware_returns_503_when_saturated(self):
+        async def homepage(request):
+            return PlainTextResponse("ok")
+
+        gate = AdmissionGate(limit=0, max_queue=0, queue_timeout=0.01)
+        app = AdmissionControlMiddleware(Starlette(routes=[
+            Route("/", homepage),
+            Route("/health", homepage)
+        ]), gate=gate)
+        client = TestClient(app)
+
+        response = client.get("/")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+        # Health checks bypass the gate
+        assert client.get("/health").status_code == 200
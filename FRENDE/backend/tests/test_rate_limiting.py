@@ -9,12 +9,17 @@ import time
 from unittest.mock import Mock, patch, AsyncMock
 from fastapi.testclient import TestClient
 from fastapi import FastAPI, Request
+from starlette.datastructures import State
+from redis.exceptions import NoScriptError
 
 from core.rate_limiting import (
     RateLimiter, 
     FixedWindowRateLimiter, 
     SlidingWindowRateLimiter, 
+    SlidingWindowLogRateLimiter,
     TokenBucketRateLimiter,
+    GCRARateLimiter,
+    RateLimitPolicy,
     RateLimitScope
 )
 from core.rate_limiting_middleware import RateLimitMiddleware
@@ -57,121 +62,194 @@ def mock_request():
     request.method = "GET"
     request.client.host = "127.0.0.1"
     request.headers = {}
-    request.state = Mock()
+    request.state = State()
     return request
 
+@pytest.fixture
+def script_redis():
+    """Redis double that executes Lua scripts"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeAsyncRedis()
+
 class TestRateLimitAlgorithms:
     """Test rate limiting algorithms"""
     
     @pytest.mark.asyncio
-    async def test_fixed_window_rate_limiter(self, mock_redis):
+    async def test_fixed_window_rate_limiter(self, script_redis):
         """Test fixed window rate limiter"""
         limiter = FixedWindowRateLimiter(5, 60)
         key = "test:key"
         
         # First 5 requests should be allowed
         for i in range(5):
-            is_allowed, info = await limiter.is_allowed(key, mock_redis)
+            is_allowed, info = await limiter.is_allowed(key, script_redis)
             assert is_allowed
             assert info["remaining"] == 4 - i
         
         # 6th request should be blocked
-        is_allowed, info = await limiter.is_allowed(key, mock_redis)
+        is_allowed, info = await limiter.is_allowed(key, script_redis)
         assert not is_allowed
         assert info["remaining"] == 0
+        assert 0 < info["retry_after"] <= 60
     
     @pytest.mark.asyncio
-    async def test_sliding_window_rate_limiter(self, mock_redis):
+    async def test_sliding_window_rate_limiter(self, script_redis):
         """Test sliding window rate limiter"""
         limiter = SlidingWindowRateLimiter(5, 60)
         key = "test:key"
         
-        # Mock Redis pipeline results
-        mock_redis.pipeline.return_value.__aenter__.return_value.execute.return_value = [0, 0, 1, True]
-        
         # First request should be allowed
-        is_allowed, info = await limiter.is_allowed(key, mock_redis)
+        is_allowed, info = await limiter.is_allowed(key, script_redis)
         assert is_allowed
         assert info["remaining"] == 4
+        
+        for _ in range(4):
+            await limiter.is_allowed(key, script_redis)
+        is_allowed, info = await limiter.is_allowed(key, script_redis)
+        assert not is_allowed
+        
+        # Counter approximation keeps a fixed-size hash per key
+        assert await script_redis.hlen(key) == 3
+    
+    @pytest.mark.asyncio
+    async def test_sliding_window_log_rate_limiter(self, script_redis):
+        """Test exact sliding window rate limiter"""
+        limiter = SlidingWindowLogRateLimiter(3, 60)
+        key = "test:log"
+        
+        results = [(await limiter.is_allowed(key, script_redis))[0] for _ in range(4)]
+        assert results == [True, True, True, False]
+        
+        # Denied requests are not recorded
+        assert await script_redis.zcard(key) == 3
     
     @pytest.mark.asyncio
-    async def test_token_bucket_rate_limiter(self, mock_redis):
+    async def test_token_bucket_rate_limiter(self, script_redis):
         """Test token bucket rate limiter"""
         limiter = TokenBucketRateLimiter(10, 60, burst_limit=5)
         key = "test:key"
         
-        # Mock empty bucket
-        mock_redis.hgetall.return_value = {}
-        
         # First request should be allowed (bucket starts full)
-        is_allowed, info = await limiter.is_allowed(key, mock_redis)
+        is_allowed, info = await limiter.is_allowed(key, script_redis)
         assert is_allowed
         assert info["remaining"] == 4  # 5 - 1
+        
+        for _ in range(4):
+            await limiter.is_allowed(key, script_redis)
+        is_allowed, info = await limiter.is_allowed(key, script_redis)
+        assert not is_allowed
+        assert info["retry_after"] >= 1
+    
+    @pytest.mark.asyncio
+    async def test_single_round_trip(self, mock_redis):
+        """Each check is one EVALSHA; the script is loaded only on NOSCRIPT"""
+        limiter = FixedWindowRateLimiter(5, 60)
+        mock_redis.evalsha.side_effect = [NoScriptError("NOSCRIPT"), [1, 4, 60000, 0], [1, 3, 60000, 0]]
+        
+        await limiter.is_allowed("test:key", mock_redis)
+        await limiter.is_allowed("test:key", mock_redis)
+        
+        assert mock_redis.script_load.await_count == 1
+        assert mock_redis.evalsha.await_count == 3
+        assert mock_redis.evalsha.await_args.args[0] == FixedWindowRateLimiter.script.sha
+        mock_redis.get.assert_not_called()
+        mock_redis.pipeline.assert_not_called()
+
+class TestGCRARateLimiter:
+    """Test the in-process GCRA limiter"""
+    
+    def test_allows_burst_then_blocks(self):
+        limiter = GCRARateLimiter()
+        
+        results = [limiter.check("ip:1", 5, 60)[0] for _ in range(6)]
+        assert results == [True] * 5 + [False]
+        
+        is_allowed, info = limiter.check("ip:1", 5, 60)
+        assert not is_allowed
+        assert 0 < info["retry_after"] <= 12  # one emission interval
+    
+    def test_remaining_counts_down(self):
+        limiter = GCRARateLimiter()
+        remaining = [limiter.check("ip:1", 3, 60)[1]["remaining"] for _ in range(3)]
+        assert remaining == [2, 1, 0]
+    
+    def test_single_float_per_key(self):
+        limiter = GCRARateLimiter()
+        for _ in range(50):
+            limiter.check("ip:1", 100, 60)
+        assert len(limiter) == 1
+        assert isinstance(limiter._tat["ip:1"], float)
+    
+    def test_lru_bound(self):
+        limiter = GCRARateLimiter(max_keys=3)
+        for index in range(5):
+            limiter.check(f"ip:{index}", 10, 60)
+        
+        assert len(limiter) == 3
+        assert "ip:0" not in limiter._tat
+        assert limiter.metrics["evicted_lru"] == 2
+    
+    def test_sweep_drops_idle_keys(self):
+        limiter = GCRARateLimiter()
+        limiter.check("idle", 10, 60)
+        limiter.check("busy", 10, 60)
+        limiter._tat["idle"] = time.time() - 1
+        
+        assert limiter.sweep() == 1
+        assert list(limiter._tat) == ["busy"]
+    
+    @pytest.mark.asyncio
+    async def test_sweeper_runs_in_background(self):
+        limiter = GCRARateLimiter(sweep_interval=0.01)
+        limiter.check("idle", 10, 60)
+        limiter._tat["idle"] = time.time() - 1
+        
+        await asyncio.sleep(0.05)
+        assert len(limiter) == 0
+        await limiter.close()
 
 class TestRateLimiter:
     """Test main rate limiter service"""
     
     @pytest.mark.asyncio
-    async def test_check_rate_limit_ip_scope(self, rate_limiter, mock_request):
+    async def test_check_rate_limit_ip_scope(self, rate_limiter, script_redis, mock_request):
         """Test IP-based rate limiting"""
-        # Mock algorithm
-        with patch.object(rate_limiter, '_get_rate_limit_config') as mock_config:
-            mock_config.return_value = {
-                "requests_per_minute": 10,
-                "algorithm": "fixed_window",
-                "scope": RateLimitScope.IP
-            }
-            
-            # Mock algorithm result
-            with patch.object(FixedWindowRateLimiter, 'is_allowed') as mock_algorithm:
-                mock_algorithm.return_value = (True, {
-                    "limit": 10,
-                    "remaining": 9,
-                    "reset": int(time.time()) + 60,
-                    "retry_after": 0
-                })
-                
-                is_allowed, info = await rate_limiter.check_rate_limit(mock_request)
-                assert is_allowed
-                assert info["limit"] == 10
+        rate_limiter.redis_client = script_redis
+        policy = RateLimitPolicy("test", 10, 60, "fixed_window", RateLimitScope.IP)
+        
+        with patch.object(rate_limiter, '_match_route', return_value=(policy,)):
+            is_allowed, info = await rate_limiter.check_rate_limit(mock_request)
+        
+        assert is_allowed
+        assert info["limit"] == 10
+        assert info["remaining"] == 9
+        assert await script_redis.exists("rate_limit:ip:127.0.0.1:test")
     
     @pytest.mark.asyncio
-    async def test_check_rate_limit_user_scope(self, rate_limiter, mock_request):
+    async def test_check_rate_limit_user_scope(self, rate_limiter, script_redis, mock_request):
         """Test user-based rate limiting"""
+        rate_limiter.redis_client = script_redis
         # Set user ID in request state
         mock_request.state.user_id = "user123"
+        policy = RateLimitPolicy("test", 10, 60, "sliding_window", RateLimitScope.USER)
         
-        with patch.object(rate_limiter, '_get_rate_limit_config') as mock_config:
-            mock_config.return_value = {
-                "requests_per_minute": 10,
-                "algorithm": "sliding_window",
-                "scope": RateLimitScope.USER
-            }
-            
-            with patch.object(SlidingWindowRateLimiter, 'is_allowed') as mock_algorithm:
-                mock_algorithm.return_value = (True, {
-                    "limit": 10,
-                    "remaining": 9,
-                    "reset": int(time.time()) + 60,
-                    "retry_after": 0
-                })
-                
-                is_allowed, info = await rate_limiter.check_rate_limit(mock_request)
-                assert is_allowed
+        with patch.object(rate_limiter, '_match_route', return_value=(policy,)):
+            is_allowed, info = await rate_limiter.check_rate_limit(mock_request)
+        
+        assert is_allowed
+        assert await script_redis.exists("rate_limit:user:user:user123:test")
+        # The per-IP policy is still keyed on the client address
+        assert await script_redis.exists("rate_limit:ip:127.0.0.1:ip")
     
     @pytest.mark.asyncio
     async def test_memory_fallback(self, mock_request):
         """Test in-memory rate limiting fallback"""
         limiter = RateLimiter()  # No Redis URL
         limiter.use_redis = False
+        policy = RateLimitPolicy("test", 5, 60, "fixed_window", RateLimitScope.IP)
         
-        with patch.object(limiter, '_get_rate_limit_config') as mock_config:
-            mock_config.return_value = {
-                "requests_per_minute": 5,
-                "algorithm": "fixed_window",
-                "scope": RateLimitScope.IP
-            }
-            
+        with patch.object(limiter, '_match_route', return_value=(policy,)):
             # First 5 requests should be allowed
             for i in range(5):
                 is_allowed, info = await limiter.check_rate_limit(mock_request)
@@ -180,6 +258,64 @@ class TestRateLimiter:
             # 6th request should be blocked
             is_allowed, info = await limiter.check_rate_limit(mock_request)
             assert not is_allowed
+            assert info["policy"] == "test"
+    
+    def test_route_lookup(self, rate_limiter):
+        """One precompiled lookup resolves the route policy under /api and /api/v1"""
+        def policy_name(method, path, is_admin=False):
+            return rate_limiter._match_route(method, path, is_admin)[0].name
+        
+        assert policy_name("POST", "/api/login") == "auth.login"
+        assert policy_name("POST", "/api/v1/auth/login") == "auth.login"
+        assert policy_name("GET", "/api/chat/1/messages") == "api.chat"
+        assert policy_name("GET", "/api/tasks/submissions/3") == "api.tasks"
+        assert policy_name("GET", "/api/chatter") == "api.default"
+        assert policy_name("GET", "/ws/chat") == "resources.websocket"
+        assert policy_name("GET", "/api/monitoring/database/pool") == "api.default"
+        assert policy_name("GET", "/api/monitoring/database/pool", is_admin=True) == "admin"
+    
+    def test_hourly_policies_use_hour_window(self, rate_limiter):
+        """requests_per_hour entries are enforced per hour, not per minute"""
+        register = rate_limiter._match_route("POST", "/api/register")[0]
+        assert (register.limit, register.window_seconds) == (3, 3600)
+        
+        upload = rate_limiter._match_route("POST", "/api/upload")[0]
+        assert upload.window_seconds == 3600
+    
+    @pytest.mark.asyncio
+    async def test_all_policies_in_one_backend_call(self, rate_limiter, script_redis, mock_request):
+        """IP, route and global policies are evaluated in a single pipelined call"""
+        rate_limiter.redis_client = script_redis
+        rate_limiter.global_policy = RateLimitPolicy("global", 1000, 60, scope=RateLimitScope.GLOBAL)
+        mock_request.url.path = "/api/chat/1/messages"
+        
+        # The first call loads the scripts after NOSCRIPT
+        await rate_limiter.check_rate_limit(mock_request)
+        calls = rate_limiter.backend_calls
+        await rate_limiter.check_rate_limit(mock_request)
+        
+        assert rate_limiter.backend_calls == calls + 1
+        analytics = await rate_limiter.get_analytics()
+        assert set(analytics["policies"]) == {"ip", "api.chat", "global"}
+        assert analytics["policies"]["api.chat"]["checks"] == 2
+        assert analytics["policies"]["api.chat"]["latency_ms"]["max"] > 0
+    
+    @pytest.mark.asyncio
+    async def test_most_restrictive_policy_decides(self, mock_request):
+        """A denial by any policy denies the request and reports that policy"""
+        limiter = RateLimiter()
+        limiter.use_redis = False
+        strict = RateLimitPolicy("strict", 1, 60, "fixed_window")
+        
+        with patch.object(limiter, '_match_route', return_value=(strict,)):
+            is_allowed, info = await limiter.check_rate_limit(mock_request)
+            assert is_allowed
+            assert info["policy"] == "strict"
+            
+            is_allowed, info = await limiter.check_rate_limit(mock_request)
+            assert not is_allowed
+            assert info["policy"] == "strict"
+            assert info["retry_after"] > 0
     
     @pytest.mark.asyncio
     async def test_analytics(self, rate_limiter):
@@ -211,11 +347,15 @@ class TestRateLimitMiddleware:
         assert not middleware._should_skip_rate_limit("/api/v1/users")
         assert not middleware._should_skip_rate_limit("/api/v1/auth/login")
     
-    @pytest.mark.asyncio
-    async def test_middleware_rate_limit_exceeded(self, mock_request):
+    def test_middleware_rate_limit_exceeded(self):
         """Test middleware when rate limit is exceeded"""
         app = FastAPI()
-        middleware = RateLimitMiddleware(app)
+        
+        @app.get("/api/v1/test")
+        async def endpoint():
+            return {"ok": True}
+        
+        client = TestClient(RateLimitMiddleware(app))
         
         # Mock rate limiter to return exceeded
         with patch('core.rate_limiting.rate_limiter.check_rate_limit') as mock_check:
@@ -226,14 +366,11 @@ class TestRateLimitMiddleware:
                 "retry_after": 60
             })
             
-            # Mock call_next
-            async def mock_call_next(request):
-                return Mock()
-            
-            response = await middleware.dispatch(mock_request, mock_call_next)
+            response = client.get("/api/v1/test")
             
             assert response.status_code == 429
-            assert "Rate limit exceeded" in response.body.decode()
+            assert "Rate limit exceeded" in response.text
+            assert response.headers["Retry-After"] == "60"
 
 class TestRateLimitDecorators:
     """Test rate limiting decorators"""
@@ -277,6 +414,43 @@ class TestRateLimitDecorators:
             assert response.status_code == 429
             assert "Authentication rate limit exceeded" in response.body.decode()
 
+class TestRateLimitIntegration:
+    """Test middleware and decorators sharing a single pass"""
+    
+    @pytest.fixture
+    def limited_app(self):
+        limiter = RateLimiter()
+        limiter.use_redis = False
+        app = FastAPI()
+        
+        with patch('core.rate_limiting_middleware.rate_limiter', limiter), \
+             patch('core.rate_limiting_decorators.rate_limiter', limiter):
+            @app.get("/api/items/{item_id}")
+            @rate_limit(requests_per_minute=2, algorithm="fixed_window", scope=RateLimitScope.IP)
+            async def get_item(request: Request, item_id: int):
+                return {"item_id": item_id}
+            
+            assert limiter.bind_routes(app.routes) == 1
+            app.add_middleware(RateLimitMiddleware)
+            yield TestClient(app), limiter
+    
+    def test_decorated_endpoint_checked_once(self, limited_app):
+        client, limiter = limited_app
+        
+        first = client.get("/api/items/1")
+        assert first.status_code == 200
+        assert first.headers["X-RateLimit-Remaining"] == "1"
+        assert first.headers["X-RateLimit-Policy"].endswith("get_item")
+        assert client.get("/api/items/2").status_code == 200
+        
+        denied = client.get("/api/items/3")
+        assert denied.status_code == 429
+        assert int(denied.headers["Retry-After"]) > 0
+        
+        stats = limiter.policy_stats
+        assert stats["ip"].checks == 3
+        assert sum(s.checks for name, s in stats.items() if name.endswith("get_item")) == 3
+
 class TestRateLimitAPI:
     """Test rate limiting API endpoints"""
     
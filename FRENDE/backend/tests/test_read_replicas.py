@@ -0,0 +1,136 @@
+"""
+Tests for read replica routing.
+Covers round-robin routing, lag-aware fallback and health tracking.
+"""
+
+import pytest
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.database import read_session_scope
+from core.read_replicas import ReplicaRouter, get_pool_stats, is_replica_failure
+
+def make_engine(dialect: str = "sqlite", lag: float = 0.0, fail: bool = False):
+    """Build a mock async engine whose connection reports the given lag"""
+    engine = MagicMock()
+    engine.dialect.name = dialect
+    engine.sync_engine.pool = Mock(spec=["size", "checkedin", "checkedout", "overflow"])
+    engine.sync_engine.pool.size.return_value = 5
+    engine.sync_engine.pool.checkedin.return_value = 4
+    engine.sync_engine.pool.checkedout.return_value = 1
+    engine.sync_engine.pool.overflow.return_value = 0
+    engine.dispose = AsyncMock()
+
+    conn = AsyncMock()
+    if fail:
+        conn.execute.side_effect = ConnectionError("replica down")
+    else:
+        result = Mock()
+        result.scalar.return_value = lag
+        conn.execute.return_value = result
+    engine.connect.return_value.__aenter__.return_value = conn
+    engine.connect.return_value.__aexit__.return_value = None
+    return engine
+
+class TestReplicaRouter:
+    """Test read replica routing"""
+
+    def test_no_replicas_uses_primary(self):
+        primary = make_engine()
+        router = ReplicaRouter(primary, [])
+
+        assert not router.enabled
+        assert router.get_read_engine() is primary
+        assert router.metrics["primary_reads"] == 1
+
+    def test_round_robin_across_replicas(self):
+        primary = make_engine()
+        replica_a, replica_b = make_engine(), make_engine()
+        router = ReplicaRouter(primary, [replica_a, replica_b])
+
+        chosen = [router.get_read_engine() for _ in range(4)]
+        assert chosen == [replica_a, replica_b, replica_a, replica_b]
+        assert router.metrics["replica_reads"] == 4
+
+    @pytest.mark.asyncio
+    async def test_lagging_replica_falls_back_to_primary(self):
+        primary = make_engine()
+        replica = make_engine(dialect="postgresql", lag=30.0)
+        router = ReplicaRouter(primary, [replica], max_lag_seconds=5.0)
+
+        await router.check_all()
+
+        assert router.replicas[0].lag_seconds == 30.0
+        assert router.get_read_engine() is primary
+        assert router.metrics["fallbacks"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_health_check_marks_replica_unhealthy(self):
+        primary = make_engine()
+        replica = make_engine(fail=True)
+        router = ReplicaRouter(primary, [replica])
+
+        await router.check_all()
+
+        assert not router.replicas[0].healthy
+        assert "replica down" in router.replicas[0].last_error
+        assert router.get_read_engine() is primary
+
+    def test_mark_failed_respects_threshold(self):
+        primary = make_engine()
+        replica = make_engine()
+        router = ReplicaRouter(primary, [replica], failure_threshold=2)
+
+        router.mark_failed(replica, RuntimeError("timeout"))
+        assert router.replicas[0].healthy
+
+        router.mark_failed(replica, RuntimeError("timeout"))
+        assert not router.replicas[0].healthy
+
+    def test_is_replica_failure(self):
+        assert is_replica_failure(OperationalError("SELECT 1", {}, Exception("server closed the connection")))
+        assert is_replica_failure(ConnectionError("reset"))
+        assert not is_replica_failure(HTTPException(status_code=404))
+        assert not is_replica_failure(ValueError("bad input"))
+
+    @pytest.mark.asyncio
+    async def test_read_session_only_counts_replica_errors(self):
+        primary = create_async_engine("sqlite+aiosqlite://")
+        replica = create_async_engine("sqlite+aiosqlite://")
+        router = ReplicaRouter(primary, [replica], failure_threshold=2)
+
+        with patch("core.database.replica_router", router):
+            for _ in range(3):
+                with pytest.raises(HTTPException):
+                    async with read_session_scope():
+                        raise HTTPException(status_code=404)
+            assert router.replicas[0].healthy
+            assert router.replicas[0].consecutive_failures == 0
+
+            # A successful read clears an earlier failure
+            router.mark_failed(replica, OperationalError("SELECT 1", {}, Exception("timeout")))
+            async with read_session_scope() as session:
+                await session.execute(text("SELECT 1"))
+            assert router.replicas[0].consecutive_failures == 0
+
+        await primary.dispose()
+        await replica.dispose()
+
+    def test_status_includes_pool_stats(self):
+        router = ReplicaRouter(make_engine(), [make_engine()])
+        status = router.get_status()
+
+        assert status["enabled"] is True
+        assert status["primary"]["pool"]["checkedout"] == 1
+        assert status["replicas"][0]["pool"]["size"] == 5
+
+def test_get_pool_stats_static_pool():
+    """Pools without QueuePool counters only report their class"""
+    engine = Mock()
+    engine.sync_engine.pool = Mock(spec=[])
+    stats = get_pool_stats(engine)
+    assert set(stats) == {"pool_class"}
@@ -0,0 +1,278 @@
+"""
+Tests for the pre-generated task pool.
+Covers templating, drawing, rate-limited refills and task creation from
+the pool with live and built-in fallbacks.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.exceptions import AIGenerationError
+from models.match import Match
+from models.task import Task, TaskDifficulty
+from models.task_pool import PooledTask
+from models.user import User
+from services import task_pool as task_pool_module
+from services.ai import GeminiService, ai_service
+from services.task_pool import TaskPool, interest_category, is_valid_template, render_template
+from services.tasks import TaskService
+from tests.sqlite_db import sqlite_session
+
+@pytest_asyncio.fixture
+async def session():
+    async with sqlite_session(("users", "matches", "tasks", "task_pool"), [
+        User(id=1, email="a@example.com", hashed_password="x", name="Alice", profile_text="I love hiking and music"),
+        User(id=2, email="b@example.com", hashed_password="x", name="Bob", profile_text="Hiking every weekend"),
+        Match(id=1, user1_id=1, user2_id=2, status="active", compatibility_score=70),
+    ], indexes=("task_pool",)) as session:
+        yield session
+
+@pytest.fixture
+def ai():
+    """Stands in for the Gemini service; pool refills answer with numbered templates"""
+    service = Mock()
+    service.is_available.return_value = True
+    service.scheduler = None
+
+    async def generate_pool_tasks(task_type, difficulty, category, count):
+        return [(f"{category} {n}", f"{{user1}} and {{user2}} try {difficulty} thing {n}") for n in range(count)]
+
+    service.generate_pool_tasks = AsyncMock(side_effect=generate_pool_tasks)
+    with patch.object(task_pool_module, "ai_service", service):
+        yield service
+
+async def _stock(session: AsyncSession) -> int:
+    return await session.scalar(select(func.count()).select_from(PooledTask))
+
+class TestTemplates:
+    """Test placeholder validation and rendering"""
+
+    def test_valid_templates(self):
+        assert is_valid_template("{user1} and {user2} talk about {interest}")
+        assert is_valid_template("No placeholders at all")
+        assert not is_valid_template("{user3} is unknown")
+        assert not is_valid_template("{user1!r}")
+        assert not is_valid_template("{user1:>10}")
+        assert not is_valid_template("Stray { brace")
+
+    def test_render(self):
+        values = {"user1": "Alice", "user2": "Bob", "interest": "hiking"}
+
+        assert render_template("{user1} and {user2} go {interest}", values) == "Alice and Bob go hiking"
+        assert render_template("Broken {template", values) == "Broken {template"
+
+    def test_interest_category(self):
+        assert interest_category(["hiking", "music"]) == ("outdoors", "hiking")
+        assert interest_category([]) == ("general", None)
+
+class TestTaskPool:
+    """Test drawing and refilling"""
+
+    @pytest.mark.asyncio
+    async def test_draw_takes_oldest(self, session):
+        pool = TaskPool(target_per_bucket=4, batch_size=2, calls_per_minute=10)
+        session.add_all([
+            PooledTask(task_type="bonding", difficulty="easy", interest_category="general", title="first", description="d"),
+            PooledTask(task_type="bonding", difficulty="easy", interest_category="general", title="second", description="d"),
+        ])
+        await session.commit()
+
+        assert await pool.draw(session, "bonding", "easy", "general") == ("first", "d")
+        assert await _stock(session) == 1
+        assert await pool.draw(session, "bonding", "hard", "general") is None
+        assert pool.get_stats()["misses"] == 1
+        assert pool.get_stats()["wanted_buckets"] == 1
+
+    @pytest.mark.asyncio
+    async def test_refill_within_budget(self, session, ai):
+        pool = TaskPool(target_per_bucket=4, batch_size=3, calls_per_minute=5)
+        pool.request_refill(("bonding", "hard", "food"))
+
+        added = await pool.refill(session)
+
+        # Five calls: the wanted bucket first (3 + 1), the next (3 + 1), then 3
+        assert ai.generate_pool_tasks.await_count == 5
+        assert ai.generate_pool_tasks.await_args_list[0].args == ("bonding", "hard", "food")
+        assert ai.generate_pool_tasks.await_args_list[1].kwargs == {"count": 1}
+        assert added == 11
+        assert await _stock(session) == 11
+        stats = pool.get_stats()
+        assert stats["refills_deferred"] == 1
+        assert stats["calls_last_minute"] == 5
+        assert stats["wanted_buckets"] == 0
+
+    @pytest.mark.asyncio
+    async def test_refill_waits_for_live_requests(self, session, ai):
+        ai.scheduler = Mock(queue_depth=2)
+        pool = TaskPool(target_per_bucket=2, batch_size=2, calls_per_minute=10)
+
+        assert await pool.refill(session) == 0
+        ai.generate_pool_tasks.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_refill_rejects_bad_templates(self, session, ai):
+        ai.generate_pool_tasks.side_effect = None
+        ai.generate_pool_tasks.return_value = [("ok", "{user1} waves"), ("bad", "{name} waves")]
+        pool = TaskPool(target_per_bucket=1, batch_size=2, calls_per_minute=1)
+
+        assert await pool.refill(session) == 1
+        assert pool.get_stats()["rejected_templates"] == 1
+
+    @pytest.mark.asyncio
+    async def test_refill_stops_on_ai_failure(self, session, ai):
+        ai.generate_pool_tasks.side_effect = AIGenerationError("Gemini API error")
+        pool = TaskPool(target_per_bucket=2, batch_size=2, calls_per_minute=10)
+
+        assert await pool.refill(session) == 0
+        assert pool.get_stats()["refill_failures"] == 1
+
+class TestTaskGeneration:
+    """Test TaskService drawing from the pool"""
+
+    @pytest.fixture
+    def pool(self):
+        pool = TaskPool(target_per_bucket=2, batch_size=2, calls_per_minute=10)
+        with patch("services.tasks.task_pool", pool):
+            yield pool
+
+    @pytest.mark.asyncio
+    async def test_generate_from_pool(self, session, pool):
+        session.add(PooledTask(
+            task_type="bonding", difficulty="medium", interest_category="outdoors",
+            title="Trail talk", description="{user1}, ask {user2} about their favourite {interest} spot"
+        ))
+        await session.commit()
+
+        with patch("services.tasks.ai_service.generate_task", new=AsyncMock()) as live:
+            task = await TaskService().generate_task(1, "bonding", TaskDifficulty.MEDIUM, session=session)
+
+        live.assert_not_awaited()
+        assert task.title == "Trail talk"
+        assert task.description == "Alice, ask Bob about their favourite hiking spot"
+        assert task.ai_generated is True
+        assert task.final_coin_reward == 20
+        assert task.expires_at > datetime.utcnow()
+        assert await _stock(session) == 0
+
+    @pytest.mark.asyncio
+    async def test_empty_bucket_falls_back_to_general(self, session, pool):
+        session.add(PooledTask(
+            task_type="bonding", difficulty="medium", interest_category="general",
+            title="Anything", description="{user1} and {user2} share {interest}"
+        ))
+        await session.commit()
+
+        task = await TaskService().generate_task(1, session=session)
+
+        assert task.description == "Alice and Bob share hiking"
+        assert pool.get_stats()["wanted_buckets"] == 1
+
+    @pytest.mark.asyncio
+    async def test_live_generation_when_pool_empty(self, session, pool):
+        service = TaskService()
+        with patch("services.tasks.ai_service.generate_task", new=AsyncMock(return_value=("AI Task", "Live description"))) as live:
+            task = await service.generate_task(1, session=session)
+
+        live.assert_awaited_once()
+        assert live.await_args.args[0].common_interests == ["hiking"]
+        assert task.description == "Live description"
+        assert service.generation_sources["live"] == 1
+
+    @pytest.mark.asyncio
+    async def test_built_in_task_when_ai_fails(self, session, pool):
+        with patch("services.tasks.ai_service.generate_task", new=AsyncMock(side_effect=AIGenerationError("down"))):
+            task = await TaskService().generate_task(1, session=session)
+
+        assert task.ai_generated is False
+        assert "bonding" in task.title.lower()
+        assert "{" not in task.description
+
+    @pytest.mark.asyncio
+    async def test_built_in_task_when_ai_is_slow(self, session, pool):
+        async def slow_task(context):
+            await asyncio.sleep(0.2)
+            return "AI Task", "Late description"
+
+        service = TaskService()
+        with patch("services.tasks.ai_service.generate_task", new=slow_task), \
+                patch("services.ai.settings.AI_LATENCY_BUDGET_MS", 20):
+            task = await service.generate_task(1, session=session)
+            # The late answer still finishes in the background
+            await asyncio.sleep(0.3)
+
+        assert task.ai_generated is False
+        assert service.generation_sources["fallback"] == 1
+        assert ai_service.hedge_metrics["finished_late"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_replace_expired_tasks(self, session, pool):
+        session.add(Task(
+            id=10, title="Old", description="Old task", task_type="bonding", difficulty=TaskDifficulty.EASY,
+            match_id=1, is_completed=False, expires_at=datetime.utcnow() - timedelta(hours=1)
+        ))
+        session.add(PooledTask(
+            task_type="bonding", difficulty="easy", interest_category="outdoors", title="New", description="Go {interest}"
+        ))
+        await session.commit()
+
+        replacements = await TaskService().replace_expired_tasks(session)
+
+        assert [task.title for task in replacements] == ["New"]
+        assert replacements[0].difficulty == TaskDifficulty.EASY
+        assert (await session.get(Task, 10)).is_completed is True
+        assert await TaskService().replace_expired_tasks(session) == []
+
+    @pytest.mark.asyncio
+    async def test_generate_several_tasks(self, session, pool):
+        session.add(PooledTask(
+            task_type="bonding", difficulty="medium", interest_category="outdoors", title="Pooled", description="Go {interest}"
+        ))
+        await session.commit()
+
+        service = TaskService()
+        live = AsyncMock(return_value=[("AI Task", "Live description"), None])
+        with patch("services.tasks.ai_service.generate_tasks", new=live):
+            tasks = await service.generate_tasks(1, 3, session=session)
+
+        # The two the pool couldn't cover go to Gemini together
+        live.assert_awaited_once()
+        assert len(live.await_args.args[0]) == 2
+        assert [task.title for task in tasks[:2]] == ["Pooled", "AI Task"]
+        assert tasks[2].ai_generated is False
+        assert all(task.id for task in tasks)
+        assert service.generation_sources == {"pool": 1, "live": 1, "fallback": 1}
+
+class TestPoolPrompt:
+    """Test generating pool templates against a fake model"""
+
+    @pytest.mark.asyncio
+    async def test_generate_pool_tasks(self):
+        model = Mock()
+        model.generate_content.return_value = Mock(text="```json\n" + json.dumps([
+            {"title": "Snack swap", "description": "{user1} and {user2} each pick a {interest} snack"},
+            {"title": "", "description": "missing title"},
+            "not an object",
+        ]) + "\n```")
+        with patch("services.ai.genai") as genai, patch("services.ai.settings") as settings:
+            settings.GEMINI_API_KEY = "test_key"
+            settings.AI_RATE_LIMIT_PER_MINUTE = 60
+            genai.GenerativeModel.return_value = model
+            service = GeminiService()
+
+        try:
+            tasks = await service.generate_pool_tasks("bonding", "easy", "food", count=3)
+        finally:
+            await service.shutdown()
+
+        assert tasks == [("Snack swap", "{user1} and {user2} each pick a {interest} snack")]
+        prompt = model.generate_content.call_args.args[0]
+        assert "{user1}" in prompt and "{interest}" in prompt
+        assert "cooking, food" in prompt
+        assert "3 objects" in prompt
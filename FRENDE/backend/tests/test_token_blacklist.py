@@ -0,0 +1,181 @@
+"""
+Tests for the in-memory token blacklist.
+Covers the bloom filter, the exact set with expiry, loading from the table,
+cross-worker updates (pub/sub and polling) and the token service / auth
+integration.
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import fakeredis.aioredis
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from unittest.mock import patch
+
+from core import auth
+from core.security import blacklist_token, create_access_token
+from core.token_blacklist import BloomFilter, TokenBlacklist
+from models.blacklisted_token import BlacklistedToken
+from services.token_service import TokenService
+from tests.sqlite_db import sqlite_session
+
+@pytest.fixture
+def blacklist():
+    return TokenBlacklist(capacity=1000, error_rate=0.01, channel="test")
+
+@pytest_asyncio.fixture
+async def session():
+    now = datetime.utcnow()
+    async with sqlite_session(("blacklisted_tokens",), [
+        BlacklistedToken(token_hash="live", expires_at=now + timedelta(hours=1)),
+        BlacklistedToken(token_hash="stale", expires_at=now - timedelta(hours=1)),
+    ]) as session:
+        yield session
+
+class TestBloomFilter:
+    """Test the bloom filter"""
+
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        members = [f"member-{i}" for i in range(1000)]
+        for member in members:
+            bloom.add(member)
+
+        assert all(member in bloom for member in members)
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300  # ~1% expected
+
+class TestTokenBlacklist:
+    """Test the exact set behind the filter"""
+
+    def test_add_contains_and_expiry(self, blacklist):
+        now = datetime.utcnow()
+        blacklist.add("a", now + timedelta(minutes=5))
+        blacklist.add("b", now - timedelta(seconds=1))
+
+        assert blacklist.contains("a")
+        assert not blacklist.contains("b")
+        assert not blacklist.contains("c")
+        assert blacklist.get_stats()["hits"] == 1
+
+    def test_prune_rebuilds_filter(self, blacklist):
+        now = datetime.utcnow()
+        blacklist.add("a", now + timedelta(minutes=5))
+        blacklist.add("b", now - timedelta(seconds=1))
+
+        assert blacklist.prune() == 1
+        assert len(blacklist) == 1
+        # The filter forgot the pruned hash, so it is answered without the set
+        before = blacklist.metrics["bloom_negatives"]
+        blacklist.contains("b")
+        assert blacklist.metrics["bloom_negatives"] == before + 1
+
+    def test_grows_past_capacity(self):
+        blacklist = TokenBlacklist(capacity=10, error_rate=0.01, channel="test")
+        expires_at = datetime.utcnow() + timedelta(minutes=5)
+        for i in range(50):
+            blacklist.add(f"token-{i}", expires_at)
+
+        assert all(blacklist.contains(f"token-{i}") for i in range(50))
+        assert blacklist.get_stats()["bloom_capacity"] >= 50
+
+    def test_remote_update_applied(self, blacklist):
+        expires_at = datetime.utcnow() + timedelta(minutes=5)
+        blacklist._apply_message(f'{{"token_hash": "remote", "expires_at": "{expires_at.isoformat()}"}}')
+        blacklist._apply_message("not json")
+
+        assert blacklist.contains("remote")
+        assert blacklist.metrics["remote_updates"] == 1
+
+    @pytest.mark.asyncio
+    async def test_load_skips_expired_rows(self, blacklist, session):
+        blacklist.add("local", datetime.utcnow() + timedelta(minutes=5))
+
+        assert await blacklist.load(session) == 2
+        assert blacklist.loaded
+        assert blacklist.contains("live")
+        assert blacklist.contains("local")
+        assert not blacklist.contains("stale")
+
+class TestWorkerSync:
+    """Test following other workers' additions"""
+
+    @pytest.mark.asyncio
+    async def test_update_published_during_load_not_lost(self, blacklist, session):
+        client = fakeredis.aioredis.FakeRedis()
+        expires_at = datetime.utcnow() + timedelta(minutes=5)
+
+        @asynccontextmanager
+        async def session_factory():
+            # Another worker revokes a token after the rows were read but before we'd have subscribed
+            await client.publish("test", json.dumps({"token_hash": "racing", "expires_at": expires_at.isoformat()}))
+            yield session
+
+        with patch("core.token_blacklist.redis.from_url", return_value=client):
+            await blacklist.start("redis://localhost", session_factory)
+        try:
+            for _ in range(50):
+                if blacklist.contains("racing"):
+                    break
+                await asyncio.sleep(0.01)
+
+            assert blacklist.contains("racing")
+            assert blacklist.contains("live")
+            assert blacklist.get_stats()["sync_mode"] == "pubsub"
+        finally:
+            await blacklist.stop()
+
+    @pytest.mark.asyncio
+    async def test_polls_table_without_redis(self, blacklist, session):
+        @asynccontextmanager
+        async def session_factory():
+            yield session
+
+        await blacklist.start(None, session_factory, reload_interval=0.05)
+        try:
+            assert blacklist.contains("live")
+            assert blacklist.get_stats()["sync_mode"] == "polling"
+
+            # Written by another worker
+            session.add(BlacklistedToken(token_hash="elsewhere", expires_at=datetime.utcnow() + timedelta(hours=1)))
+            await session.commit()
+            await asyncio.sleep(0.15)
+
+            assert blacklist.contains("elsewhere")
+            assert blacklist.metrics["reloads"] >= 1
+        finally:
+            await blacklist.stop()
+
+class TestBlacklistIntegration:
+    """Test the token service and auth path"""
+
+    @pytest.mark.asyncio
+    async def test_token_service_checks_memory_once_loaded(self, blacklist, session):
+        await blacklist.load(session)
+        service = TokenService(session)
+
+        with patch("services.token_service.token_blacklist", blacklist):
+            await service.blacklist_token("revoked-token")
+            await session.close()
+
+            # Answered without the database
+            with patch.object(session, "execute", side_effect=AssertionError("queried the table")):
+                assert await service.is_token_blacklisted("revoked-token")
+                assert not await service.is_token_blacklisted("other-token")
+
+    def test_auth_rejects_blacklisted_token(self, blacklist):
+        token = create_access_token({"sub": "1"})
+        blacklist.add(blacklist_token(token), datetime.utcnow() + timedelta(minutes=5))
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+        with patch("core.auth.token_blacklist", blacklist):
+            with pytest.raises(HTTPException) as exc_info:
+                auth._user_id_from_credentials(credentials)
+
+        assert exc_info.value.status_code == 401
+        assert exc_info.value.detail == "Token has been revoked"
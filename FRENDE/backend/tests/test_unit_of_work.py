@@ -0,0 +1,83 @@
+"""
+Tests for the request-scoped unit of work.
+Covers session sharing, deterministic cleanup and leak detection.
+"""
+
+import pytest
+
+from core.database import (
+    async_session,
+    get_async_session,
+    session_scope,
+    unit_of_work,
+    unit_of_work_metrics,
+    with_unit_of_work
+)
+
+class TestUnitOfWork:
+    """Test request-scoped session sharing"""
+
+    @pytest.mark.asyncio
+    async def test_nested_scopes_share_one_session(self):
+        async with unit_of_work("test") as unit:
+            async with session_scope() as first:
+                pass
+            async with session_scope() as second:
+                pass
+
+            assert first is second
+            assert unit.sessions_opened == 1
+
+    @pytest.mark.asyncio
+    async def test_dependency_joins_unit_of_work(self):
+        async with unit_of_work("test") as unit:
+            async for dependency_session in get_async_session():
+                assert dependency_session is unit.session
+
+    @pytest.mark.asyncio
+    async def test_nested_unit_of_work_joins_outer(self):
+        async with unit_of_work("outer") as outer:
+            async with unit_of_work("inner") as inner:
+                assert inner is outer
+
+    @pytest.mark.asyncio
+    async def test_session_scope_without_unit_opens_and_closes(self):
+        async with session_scope() as first:
+            pass
+        async with session_scope() as second:
+            pass
+
+        assert first is not second
+
+    @pytest.mark.asyncio
+    async def test_leaked_session_is_reported(self):
+        leaked_before = unit_of_work_metrics["leaked_sessions"]
+
+        async with unit_of_work("test") as unit:
+            async_session()  # opened and never closed
+
+        assert unit.closed
+        assert not unit.open_sessions
+        assert unit_of_work_metrics["leaked_sessions"] == leaked_before + 1
+
+    @pytest.mark.asyncio
+    async def test_closed_unit_is_not_reused(self):
+        async with unit_of_work("test") as unit:
+            shared = unit.session
+
+        # Tasks spawned from a finished request must not reuse its session
+        async with session_scope() as session:
+            assert session is not shared
+
+    @pytest.mark.asyncio
+    async def test_with_unit_of_work_decorator(self):
+        seen = []
+
+        @with_unit_of_work
+        async def handler(sid, data):
+            async with session_scope() as first:
+                async with session_scope() as second:
+                    seen.append(first is second)
+
+        await handler("sid", {})
+        assert seen == [True]
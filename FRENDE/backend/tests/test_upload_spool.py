@@ -0,0 +1,113 @@
+"""
+Tests for streaming upload ingestion.
+Covers chunked spooling, incremental size limits, header sniffing and
+bounded memory per upload.
+"""
+
+import hashlib
+import io
+import tracemalloc
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+
+from core.exceptions import FileUploadError
+from services.upload_spool import UploadSpool
+
+def _upload(data: bytes, filename: str = "file.bin", declare_size: bool = True) -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(data), size=len(data) if declare_size else None, filename=filename,
+        headers=Headers({"content-type": "application/octet-stream"})
+    )
+
+def _png(width: int, height: int) -> bytes:
+    output = io.BytesIO()
+    Image.new("L", (width, height)).save(output, "PNG")
+    return output.getvalue()
+
+@pytest.fixture
+def spool(tmp_path):
+    return UploadSpool(str(tmp_path / "spool"), chunk_size=64 * 1024, max_image_pixels=1_000_000)
+
+class TestUploadSpool:
+    """Test chunked spooling"""
+
+    @pytest.mark.asyncio
+    async def test_spool_copies_and_hashes(self, spool):
+        data = bytes(range(256)) * 1000
+
+        async with await spool.spool(_upload(data), max_size=len(data)) as upload:
+            assert upload.path.read_bytes() == data
+            assert upload.size == len(data)
+            assert upload.sha256 == hashlib.sha256(data).hexdigest()
+            path = upload.path
+
+        assert not path.exists()
+        assert spool.get_stats()["uploads"] == 1
+
+    @pytest.mark.asyncio
+    async def test_undeclared_size_rejected_incrementally(self, spool):
+        data = b"x" * (300 * 1024)
+
+        with pytest.raises(FileUploadError):
+            await spool.spool(_upload(data, declare_size=False), max_size=100 * 1024)
+
+        assert not list(spool.spool_dir.iterdir())
+        assert spool.get_stats()["rejected_too_large"] == 1
+
+    @pytest.mark.asyncio
+    async def test_declared_size_rejected_before_copying(self, spool):
+        with pytest.raises(FileUploadError):
+            await spool.spool(_upload(b"x" * 200), max_size=100)
+
+        assert not spool.spool_dir.exists()
+
+    @pytest.mark.asyncio
+    async def test_move_to_storage(self, spool, tmp_path):
+        destination = tmp_path / "store" / "evidence.bin"
+
+        async with await spool.spool(_upload(b"evidence"), max_size=100) as upload:
+            await upload.move_to(destination)
+
+        assert destination.read_bytes() == b"evidence"
+
+    @pytest.mark.asyncio
+    async def test_memory_bounded_by_chunk(self, spool):
+        data = b"\0" * (20 * 1024 * 1024)
+        file = _upload(data, declare_size=False)
+
+        tracemalloc.start()
+        upload = await spool.spool(file, max_size=len(data))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await upload.cleanup()
+
+        assert peak < 2 * 1024 * 1024
+        assert spool.get_stats()["peak_buffered_bytes"] == 64 * 1024
+
+class TestSniffImage:
+    """Test header-only image validation"""
+
+    @pytest.mark.asyncio
+    async def test_sniff_reads_header(self, spool):
+        async with await spool.spool(_upload(_png(800, 600)), max_size=10**7) as upload:
+            assert spool.sniff_image(upload, {"PNG"}) == ("PNG", (800, 600))
+
+    @pytest.mark.asyncio
+    async def test_rejects_non_images_and_formats(self, spool):
+        async with await spool.spool(_upload(b"plain text"), max_size=100) as upload:
+            with pytest.raises(FileUploadError):
+                spool.sniff_image(upload, {"PNG"})
+
+        async with await spool.spool(_upload(_png(10, 10)), max_size=10**7) as upload:
+            with pytest.raises(FileUploadError):
+                spool.sniff_image(upload, {"JPEG"})
+
+    @pytest.mark.asyncio
+    async def test_rejects_oversized_bitmap_before_decode(self, spool):
+        async with await spool.spool(_upload(_png(2000, 1000)), max_size=10**7) as upload:
+            with pytest.raises(FileUploadError) as exc_info:
+                spool.sniff_image(upload, {"PNG"})
+
+        assert "2000x1000" in exc_info.value.message